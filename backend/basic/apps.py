@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BasicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'basic'
+
+    def ready(self):
+        # Señales que invalidan el caché de catálogos
+        import basic.signals  # noqa F401
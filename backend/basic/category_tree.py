@@ -0,0 +1,183 @@
+"""
+Árbol de categorías materializado en Categoria.path y Categoria.level.
+
+La ruta de cada categoría es la de su padre más su código ("EQ/CAR/MON"), de
+modo que un subárbol completo se obtiene con path = X o path LIKE 'X/%', que
+usa el índice sobre path. Cuando una categoría cambia de padre o de código,
+las rutas de sus descendientes se reescriben con un único UPDATE; cuando se
+elimina, sus hijas pasan a ser raíces (ver reubicar_hijas).
+
+Los prefijos se comparan con istartswith: en MySQL startswith genera
+LIKE BINARY, que no puede usar el índice de una columna con intercalación
+insensible a mayúsculas. Como los códigos son únicos sin distinguir
+mayúsculas, el resultado es el mismo.
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.utils import timezone
+
+SEPARADOR = '/'
+
+
+def _categoria():
+    from .models import Categoria
+    return Categoria
+
+
+def ruta_anterior(categoria):
+    """(path, level) guardados de una categoría existente, o None si es nueva"""
+    if not categoria.pk:
+        return None
+    return _categoria().objects.filter(pk=categoria.pk).values_list('path', 'level').first()
+
+
+def propagar_ruta(anterior, nivel_anterior, nueva, nivel_nuevo):
+    """
+    Reemplaza el prefijo `anterior` por `nueva` en las rutas de todos los
+    descendientes y ajusta su nivel, en una sola sentencia.
+
+    Returns:
+        int: Descendientes actualizados
+    """
+    return _categoria().objects.filter(path__istartswith=anterior + SEPARADOR).update(
+        path=Concat(Value(nueva), Substr('path', len(anterior) + 1)),
+        level=F('level') + (nivel_nuevo - nivel_anterior),
+        updated_at=timezone.now(),
+    )
+
+
+def reubicar_hijas(categoria):
+    """
+    Convierte en raíces a las hijas de una categoría que se va a eliminar,
+    con su subárbol. El SET_NULL de parent no pasa por save(), así que sin
+    esto las hijas conservarían la ruta y el nivel de la categoría eliminada.
+
+    Returns:
+        int: Categorías actualizadas
+    """
+    actualizadas = 0
+    for hija in _categoria().objects.filter(parent=categoria).order_by():
+        actualizadas += propagar_ruta(hija.path, hija.level, hija.code, 0)
+        actualizadas += _categoria().objects.filter(pk=hija.pk).update(
+            path=hija.code, level=0, updated_at=timezone.now()
+        )
+    return actualizadas
+
+
+def es_descendiente(candidato, categoria):
+    """Indica si `candidato` es `categoria` o está debajo de ella (sigue la cadena de padres)"""
+    visitados = set()
+    actual = candidato
+    while actual is not None and actual.pk not in visitados:
+        if actual.pk == categoria.pk:
+            return True
+        visitados.add(actual.pk)
+        actual = actual.parent
+    return False
+
+
+def filtro_subarbol(categoria, campo='path'):
+    """
+    Q que selecciona la categoría y todos sus descendientes.
+    `campo` permite filtrar otros modelos, p. ej. 'id_categoria__path'.
+    """
+    return Q(**{campo: categoria.path}) | Q(**{f'{campo}__istartswith': categoria.path + SEPARADOR})
+
+
+def reconstruir_rutas():
+    """
+    Recalcula path y level de todas las categorías desde la relación parent.
+    Corrige rutas desactualizadas por cambios hechos antes de la propagación
+    automática o con update().
+
+    Returns:
+        int: Categorías corregidas
+    """
+    Categoria = _categoria()
+    categorias = {c.pk: c for c in Categoria.objects.order_by()}
+    calculadas = {}
+
+    def calcular(categoria, cadena=()):
+        if categoria.pk in calculadas:
+            return calculadas[categoria.pk]
+        padre = categorias.get(categoria.parent_id)
+        if padre is None or padre.pk in cadena:
+            # Sin padre, o con un ciclo que se rompe tratándola como raíz
+            resultado = (categoria.code, 0)
+        else:
+            ruta, nivel = calcular(padre, cadena + (categoria.pk,))
+            resultado = (f"{ruta}{SEPARADOR}{categoria.code}", nivel + 1)
+        calculadas[categoria.pk] = resultado
+        return resultado
+
+    corregidas = []
+    ahora = timezone.now()
+    for categoria in categorias.values():
+        ruta, nivel = calcular(categoria)
+        if (categoria.path, categoria.level) != (ruta, nivel):
+            categoria.path, categoria.level, categoria.updated_at = ruta, nivel, ahora
+            corregidas.append(categoria)
+    Categoria.objects.bulk_update(corregidas, ['path', 'level', 'updated_at'], batch_size=500)
+    if corregidas:
+        # bulk_update no dispara las señales que invalidan el caché de catálogos
+        from . import reference_cache
+        reference_cache.invalidar('categoria')
+    return len(corregidas)
+
+
+def _conteo_productos(relacion, solo_activos):
+    """Subconsulta con la cantidad de productos de la categoría en una relación inversa"""
+    campo = _categoria()._meta.get_field(relacion)
+    productos = campo.related_model.objects.filter(**{campo.field.name: OuterRef('pk')})
+    if solo_activos:
+        productos = productos.filter(is_active=True)
+    return Coalesce(Subquery(
+        productos.order_by().values(campo.field.name).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def arbol(raiz=None, solo_activas=False, solo_productos_activos=False):
+    """
+    Árbol completo (o el subárbol de `raiz`) con la cantidad de productos de cada
+    nodo y el total acumulado con sus descendientes, leído en una sola consulta.
+
+    Returns:
+        list: Nodos raíz, cada uno con su lista 'hijos'
+    """
+    categorias = _categoria().objects.annotate(
+        cantidad_ofertados=_conteo_productos('productos_ofertados', solo_productos_activos),
+        cantidad_disponibles=_conteo_productos('productos_disponibles', solo_productos_activos),
+    ).order_by('path', 'nombre')
+    if raiz is not None:
+        categorias = categorias.filter(filtro_subarbol(raiz))
+    if solo_activas:
+        categorias = categorias.filter(is_active=True)
+
+    nodos = {}
+    orden = []
+    for categoria in categorias.values(
+            'id', 'nombre', 'code', 'parent', 'level', 'path', 'is_active',
+            'cantidad_ofertados', 'cantidad_disponibles'):
+        categoria.update({
+            'total_ofertados': categoria['cantidad_ofertados'],
+            'total_disponibles': categoria['cantidad_disponibles'],
+            'hijos': [],
+        })
+        nodos[categoria['id']] = categoria
+        orden.append(categoria)
+
+    # El orden por ruta pone a cada padre antes que sus hijos: se acumula de abajo hacia arriba
+    raices = []
+    for nodo in orden:
+        padre = nodos.get(nodo['parent'])
+        if padre is None:
+            raices.append(nodo)
+        else:
+            padre['hijos'].append(nodo)
+    for nodo in reversed(orden):
+        padre = nodos.get(nodo['parent'])
+        if padre is not None:
+            padre['total_ofertados'] += nodo['total_ofertados']
+            padre['total_disponibles'] += nodo['total_disponibles']
+    return raices
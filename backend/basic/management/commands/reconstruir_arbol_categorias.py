@@ -0,0 +1,16 @@
+"""
+Comando para recalcular la ruta y el nivel de todas las categorías.
+Categoria.save() mantiene el árbol al día; este comando corrige las rutas
+guardadas antes de que los cambios de padre se propagaran a los descendientes.
+"""
+
+from django.core.management.base import BaseCommand
+from basic import category_tree
+
+
+class Command(BaseCommand):
+    help = 'Recalcula path y level de todas las categorías a partir de sus padres'
+
+    def handle(self, *args, **options):
+        corregidas = category_tree.reconstruir_rutas()
+        self.stdout.write(self.style.SUCCESS(f'{corregidas} categorías corregidas'))
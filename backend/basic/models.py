@@ -1,6 +1,7 @@
 # backend/basic/models.py
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, RegexValidator
 
 
@@ -37,15 +38,37 @@ class Categoria(TimeStampedModel):
     def __str__(self):
         return f"{self.path}: {self.nombre}" if self.path else self.nombre
     
+    def validar_padre(self):
+        """Evita ciclos: el padre no puede ser la categoría ni uno de sus descendientes"""
+        if self.pk and self.parent_id:
+            from .category_tree import es_descendiente
+            if es_descendiente(self.parent, self):
+                raise ValidationError({'parent': 'Una categoría no puede depender de sí misma ni de una subcategoría suya.'})
+
+    def clean(self):
+        super().clean()
+        self.validar_padre()
+
     def save(self, *args, **kwargs):
-        """Actualiza automáticamente el nivel y la ruta basado en el padre"""
+        """
+        Actualiza automáticamente el nivel y la ruta basado en el padre.
+        Si la ruta cambia (nuevo padre o nuevo código), actualiza la de todos
+        los descendientes con un único UPDATE (ver basic/category_tree.py).
+        """
+        from .category_tree import ruta_anterior, propagar_ruta
+
+        self.validar_padre()
+        anterior = ruta_anterior(self)
         if self.parent:
             self.level = self.parent.level + 1
             self.path = f"{self.parent.path}/{self.code}"
         else:
             self.level = 0
             self.path = self.code
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if anterior is not None and anterior[0] != self.path:
+                propagar_ruta(anterior[0], anterior[1], self.path, self.level)
 
 
 class Ciudad(TimeStampedModel):
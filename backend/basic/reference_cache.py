@@ -0,0 +1,177 @@
+"""
+Caché en memoria de los catálogos básicos (categorías, marcas, unidades, etc.).
+
+Cada proceso guarda una copia completa de cada catálogo junto con la versión
+con la que la cargó. La versión vigente vive en el caché de Django
+(settings.CACHES), compartido entre workers cuando se usa Redis o Memcached;
+las señales de basic/signals.py la cambian al confirmarse cualquier alta,
+edición o baja, y los demás procesos recargan el catálogo en su siguiente
+lectura. Consultar la versión es una lectura de caché, no de base de datos.
+
+Si el caché de Django es local de cada proceso (LocMemCache, el valor por
+defecto), los cambios hechos en otro worker no cambian la versión que ve este
+proceso. En ese caso la copia se recarga cuando pasa de
+REFERENCE_CACHE['local_ttl_seconds']. Además, un id o nombre que no está en la
+copia se busca una vez en la base de datos y, si existe, el catálogo se
+recarga, así que los registros nuevos nunca se rechazan por una copia vieja.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_VERSION = 'basic:catalogo:version:'
+
+
+def _modelos():
+    from .models import Categoria, Marca, Unidad, Procedencia, Especialidad, Zona, Ciudad
+    return {
+        'categoria': Categoria,
+        'marca': Marca,
+        'unidad': Unidad,
+        'procedencia': Procedencia,
+        'especialidad': Especialidad,
+        'zona': Zona,
+        'ciudad': Ciudad,
+    }
+
+
+_catalogos = {}
+_lock = threading.Lock()
+
+
+def configuracion():
+    config = {
+        'local_ttl_seconds': 60,
+    }
+    config.update(getattr(settings, 'REFERENCE_CACHE', {}))
+    return config
+
+
+def cache_compartido():
+    """Indica si el caché de Django es común a todos los procesos"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def catalogo_de_modelo(model):
+    """Nombre del catálogo de un modelo, o None si el modelo no se cachea"""
+    for nombre, modelo in _modelos().items():
+        if modelo is model:
+            return nombre
+    return None
+
+
+def _version_actual(catalogo):
+    """Versión vigente del catálogo; si el caché no la tiene, se publica una nueva"""
+    clave = PREFIJO_VERSION + catalogo
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, uuid.uuid4().hex, None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar(catalogo):
+    """Publica una nueva versión del catálogo para que todos los procesos lo recarguen"""
+    cache.set(PREFIJO_VERSION + catalogo, uuid.uuid4().hex, None)
+    with _lock:
+        _catalogos.pop(catalogo, None)
+
+
+def _cargar(catalogo):
+    """
+    Retorna {'por_id': {pk: fila}, 'por_nombre': {nombre: pk}} del catálogo,
+    recargándolo desde la base de datos si la versión cambió.
+    """
+    version = _version_actual(catalogo)
+    datos = _catalogos.get(catalogo)
+    if datos is not None and datos['version'] == version and (
+            cache_compartido()
+            or time.monotonic() - datos['cargado'] < configuracion()['local_ttl_seconds']):
+        return datos
+
+    model = _modelos()[catalogo]
+    campos = [f.attname for f in model._meta.concrete_fields]
+    por_id = {fila['id']: fila for fila in model.objects.order_by().values(*campos)}
+    datos = {
+        'version': version,
+        'cargado': time.monotonic(),
+        'por_id': por_id,
+        'por_nombre': {fila['nombre']: pk for pk, fila in por_id.items()},
+    }
+    with _lock:
+        _catalogos[catalogo] = datos
+    logger.debug(f"Catálogo {catalogo} cargado: {len(por_id)} registros")
+    return datos
+
+
+def _recargar_si_existe(catalogo, **filtro):
+    """
+    Busca en la base de datos un registro que no está en la copia local.
+    Si existe, la copia estaba vieja (creado en otro worker): se invalida y se recarga.
+    """
+    if not _modelos()[catalogo].objects.filter(**filtro).exists():
+        return None
+    invalidar(catalogo)
+    return _cargar(catalogo)
+
+
+def obtener(catalogo, pk):
+    """Fila del catálogo como diccionario, o None si no existe"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    fila = _cargar(catalogo)['por_id'].get(pk)
+    if fila is None:
+        datos = _recargar_si_existe(catalogo, pk=pk)
+        fila = datos['por_id'].get(pk) if datos else None
+    return fila
+
+
+def existe(catalogo, pk):
+    """Indica si existe un registro del catálogo con ese id"""
+    return obtener(catalogo, pk) is not None
+
+
+def instancia(catalogo, pk):
+    """
+    Instancia del modelo construida desde el caché, sin consultar la base de datos.
+    Sirve para asignar claves foráneas; no debe usarse para modificar el registro.
+    """
+    fila = obtener(catalogo, pk)
+    if fila is None:
+        return None
+    model = _modelos()[catalogo]
+    objeto = model(**fila)
+    objeto._state.adding = False
+    objeto._state.db = 'default'
+    return objeto
+
+
+def id_por_nombre(catalogo, nombre):
+    """Id del registro con ese nombre, o None"""
+    pk = _cargar(catalogo)['por_nombre'].get(nombre)
+    if pk is None:
+        datos = _recargar_si_existe(catalogo, nombre=nombre)
+        pk = datos['por_nombre'].get(nombre) if datos else None
+    return pk
+
+
+def obtener_o_crear(catalogo, nombre, code):
+    """
+    Id del registro con ese nombre, creándolo si no existe.
+    Solo consulta la base de datos la primera vez que hace falta crearlo.
+    """
+    pk = id_por_nombre(catalogo, nombre)
+    if pk is not None:
+        return pk
+    objeto, _ = _modelos()[catalogo].objects.get_or_create(nombre=nombre, defaults={'code': code})
+    return objeto.pk
@@ -5,6 +5,7 @@ from .models import (
     Categoria, Ciudad, EmpresaClc, Especialidad, Marca, 
     Procedencia, TipoCliente, TipoContratacion, Unidad, Zona, ZonaCiudad
 )
+from .category_tree import es_descendiente
 
 
 class CategoriaSerializer(serializers.ModelSerializer):
@@ -14,6 +15,12 @@ class CategoriaSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('level', 'path')  # Calculados automáticamente
 
+    def validate_parent(self, parent):
+        """El padre no puede ser la propia categoría ni una de sus subcategorías"""
+        if parent is not None and self.instance is not None and es_descendiente(parent, self.instance):
+            raise serializers.ValidationError('Una categoría no puede depender de sí misma ni de una subcategoría suya.')
+        return parent
+
 
 class CiudadSerializer(serializers.ModelSerializer):
     """Serializer para el modelo Ciudad"""
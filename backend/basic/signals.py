@@ -0,0 +1,39 @@
+"""
+Señales que invalidan el caché de catálogos básicos (ver basic/reference_cache.py)
+y mantienen el árbol de categorías al eliminar una (ver basic/category_tree.py).
+"""
+
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from .models import Categoria, Marca, Unidad, Procedencia, Especialidad, Zona, Ciudad
+from . import reference_cache, category_tree
+
+
+CATALOGOS_POR_MODELO = {
+    Categoria: 'categoria',
+    Marca: 'marca',
+    Unidad: 'unidad',
+    Procedencia: 'procedencia',
+    Especialidad: 'especialidad',
+    Zona: 'zona',
+    Ciudad: 'ciudad',
+}
+
+
+def invalidar_catalogo(sender, instance, **kwargs):
+    """Publica una nueva versión del catálogo cuando se confirma el cambio"""
+    transaction.on_commit(partial(reference_cache.invalidar, CATALOGOS_POR_MODELO[sender]))
+
+
+for modelo in CATALOGOS_POR_MODELO:
+    post_save.connect(invalidar_catalogo, sender=modelo, dispatch_uid=f'catalogo_post_save_{modelo.__name__}')
+    post_delete.connect(invalidar_catalogo, sender=modelo, dispatch_uid=f'catalogo_post_delete_{modelo.__name__}')
+
+
+def reubicar_hijas_categoria(sender, instance, **kwargs):
+    """Las hijas de la categoría eliminada pasan a ser raíces con su subárbol"""
+    category_tree.reubicar_hijas(instance)
+
+
+pre_delete.connect(reubicar_hijas_categoria, sender=Categoria, dispatch_uid='categoria_pre_delete_reubicar_hijas')
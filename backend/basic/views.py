@@ -16,10 +16,12 @@ from .serializers import (
     CategoriaDetalleSerializer
 )
 from .pagination import BasicStandardResultsSetPagination
+from core.conditional import RespuestaCondicionalMixin
+from . import category_tree
 
 
-class BaseCrudViewSet(viewsets.ModelViewSet):
-    """ViewSet base con funcionalidades comunes para todos los modelos"""
+class BaseCrudViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
+    """ViewSet base con funcionalidades comunes para todos los modelos (con GET condicional)"""
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     pagination_class = BasicStandardResultsSetPagination
     # Usar la clase de permisos estándar de DRF
@@ -52,6 +54,36 @@ class CategoriaViewSet(BaseCrudViewSet):
         categorias = Categoria.objects.filter(parent=None)
         serializer = self.get_serializer(categorias, many=True)
         return Response(serializer.data)
+    
+    def get_queryset(self):
+        """Permite filtrar una categoría con todos sus descendientes (?subarbol=<id>)"""
+        queryset = super().get_queryset()
+        subarbol = self.request.query_params.get('subarbol')
+        if subarbol:
+            categoria = Categoria.objects.filter(pk=subarbol).first() if subarbol.isdigit() else None
+            if categoria is None:
+                return queryset.none()
+            queryset = queryset.filter(category_tree.filtro_subarbol(categoria))
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def arbol(self, request):
+        """
+        Árbol completo de categorías en una sola consulta, con la cantidad de
+        productos ofertados y disponibles de cada nodo y su total acumulado.
+        Parámetros: raiz (id del subárbol), solo_activas y productos_activos (true/false).
+        """
+        raiz = None
+        if request.query_params.get('raiz'):
+            raiz = Categoria.objects.filter(pk=request.query_params['raiz']).first() \
+                if request.query_params['raiz'].isdigit() else None
+            if raiz is None:
+                return Response({'error': 'Categoría raíz no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(category_tree.arbol(
+            raiz=raiz,
+            solo_activas=request.query_params.get('solo_activas', 'false').lower() == 'true',
+            solo_productos_activos=request.query_params.get('productos_activos', 'false').lower() == 'true',
+        ))
 
 
 class CiudadViewSet(BaseCrudViewSet):
@@ -146,6 +178,7 @@ class ZonaCiudadViewSet(BaseCrudViewSet):
     """ViewSet para operaciones CRUD de ZonaCiudad"""
     queryset = ZonaCiudad.objects.all()
     serializer_class = ZonaCiudadSerializer
+    relaciones_version = ('zona', 'ciudad')
     filterset_fields = ['zona', 'ciudad']
     ordering_fields = ['zona', 'ciudad']
     
@@ -0,0 +1,120 @@
+"""
+Peticiones condicionales (ETag / Last-Modified) para los ViewSets de catálogo.
+
+Antes de consultar y serializar, se calcula una huella barata del queryset
+filtrado: cantidad de registros y MAX(updated_at), más las relaciones
+indicadas en `relaciones_version` (y, en el detalle, las de
+`relaciones_version_detalle`, que solo devuelve el serializer detallado). Si el cliente ya tiene esa versión
+(If-None-Match / If-Modified-Since) se responde 304 sin cuerpo. La huella
+incluye la ruta con sus parámetros, así que cada página, filtro u orden
+tiene su propio ETag.
+
+Solo aplica a las acciones `list` y `retrieve`; las acciones propias de cada
+ViewSet responden como siempre.
+"""
+
+import hashlib
+from calendar import timegm
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class NoModificado(Exception):
+    """Interrumpe la vista para devolver la respuesta 304 ya armada"""
+    def __init__(self, response):
+        self.response = response
+
+
+class RespuestaCondicionalMixin:
+    """
+    Agrega ETag débil y Last-Modified a list/retrieve y responde 304 cuando
+    el cliente ya tiene la versión vigente.
+
+    Atributos:
+        campo_version: Campo de fecha de modificación del modelo
+        relaciones_version: Relaciones cuyos cambios también invalidan la respuesta
+            (p. ej. 'imagenes' o 'id_marca'); deben tener el mismo campo de fecha
+        relaciones_version_detalle: Relaciones que solo se consideran en retrieve
+    """
+    campo_version = 'updated_at'
+    relaciones_version = ()
+    relaciones_version_detalle = ()
+    acciones_condicionales = ('list', 'retrieve')
+
+    def huella(self, queryset):
+        """
+        Retorna (datos, ultima_modificacion) del queryset, o None si el modelo
+        no tiene campo de versión o el queryset está vacío en un detalle.
+        """
+        opts = queryset.model._meta
+        try:
+            opts.get_field(self.campo_version)
+        except FieldDoesNotExist:
+            return None
+
+        agregados = {
+            'total': Count('pk', distinct=True),
+            'ultima': Max(self.campo_version),
+        }
+        relaciones = tuple(self.relaciones_version)
+        if self.action == 'retrieve':
+            relaciones += tuple(self.relaciones_version_detalle)
+        for relacion in relaciones:
+            agregados[f'ultima_{relacion}'] = Max(f'{relacion}__{self.campo_version}')
+            campo = opts.get_field(relacion)
+            if campo.one_to_many or campo.many_to_many:
+                # Las bajas en relaciones múltiples no cambian ninguna fecha
+                agregados[f'total_{relacion}'] = Count(relacion, distinct=True)
+
+        datos = queryset.order_by().aggregate(**agregados)
+        fechas = [valor for clave, valor in datos.items() if clave.startswith('ultima') and valor]
+        return datos, max(fechas) if fechas else None
+
+    def _queryset_condicional(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validadores = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.acciones_condicionales:
+            return
+
+        resultado = self.huella(self._queryset_condicional())
+        if resultado is None:
+            return
+        datos, ultima = resultado
+        if self.action == 'retrieve' and not datos['total']:
+            # Que la vista responda el 404 de siempre
+            return
+
+        contenido = f"{request.get_full_path()}|{sorted((k, str(v)) for k, v in datos.items())}"
+        etag = f'W/"{hashlib.md5(contenido.encode()).hexdigest()}"'
+        last_modified = timegm(ultima.utctimetuple()) if ultima else None
+        self._validadores = (etag, last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NoModificado(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NoModificado):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validadores = getattr(self, '_validadores', None)
+        if validadores and response.status_code in (200, 304):
+            etag, last_modified = validadores
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            # El navegador debe revalidar siempre; los datos dependen del usuario autenticado
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
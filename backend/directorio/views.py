@@ -7,6 +7,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from core.conditional import RespuestaCondicionalMixin
+
 from .models import Cliente, Proveedor, Vendedor, Contacto, RelacionBlue, Tag
 from .serializers import (
     ClienteSerializer, ClienteDetalladoSerializer,
@@ -20,12 +22,13 @@ from .pagination import StandardResultsSetPagination, LargeResultsSetPagination,
 # Utilizamos los permisos estándar de DRF en lugar de redefiniciones personalizadas
 from .throttling import BurstRateThrottle, SustainedRateThrottle, UserBurstRateThrottle, UserSustainedRateThrottle
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar clientes.
     
     Permite crear, ver, editar y eliminar clientes en el sistema.
     """
+    relaciones_version = ('tags', 'zona', 'ciudad', 'tipo_cliente')
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     pagination_class = StandardResultsSetPagination
@@ -86,12 +89,13 @@ class ClienteViewSet(viewsets.ModelViewSet):
         serializer = ContactoSerializer(contactos, many=True)
         return Response(serializer.data)
 
-class ProveedorViewSet(viewsets.ModelViewSet):
+class ProveedorViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar proveedores.
     
     Permite crear, ver, editar y eliminar proveedores en el sistema.
     """
+    relaciones_version = ('tags', 'ciudad')
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
     pagination_class = StandardResultsSetPagination
@@ -172,12 +176,13 @@ class ProveedorViewSet(viewsets.ModelViewSet):
         serializer = VendedorSerializer(vendedores, many=True)
         return Response(serializer.data)
 
-class VendedorViewSet(viewsets.ModelViewSet):
+class VendedorViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar vendedores.
     
     Permite crear, ver, editar y eliminar vendedores en el sistema.
     """
+    relaciones_version = ('proveedor',)
     queryset = Vendedor.objects.all()
     serializer_class = VendedorSerializer
     pagination_class = StandardResultsSetPagination
@@ -243,12 +248,13 @@ class VendedorViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({"error": "Se requiere el parámetro proveedor_id"}, status=status.HTTP_400_BAD_REQUEST)
 
-class ContactoViewSet(viewsets.ModelViewSet):
+class ContactoViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar contactos.
     
     Permite crear, ver, editar y eliminar contactos en el sistema.
     """
+    relaciones_version = ('tags',)
     queryset = Contacto.objects.all()
     serializer_class = ContactoSerializer
     pagination_class = StandardResultsSetPagination
@@ -287,12 +293,13 @@ class ContactoViewSet(viewsets.ModelViewSet):
         serializer = ClienteSerializer(clientes, many=True)
         return Response(serializer.data)
 
-class RelacionBlueViewSet(viewsets.ModelViewSet):
+class RelacionBlueViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar relaciones entre clientes y contactos.
     
     Permite crear, ver, editar y eliminar relaciones en el sistema.
     """
+    relaciones_version = ('cliente', 'contacto')
     queryset = RelacionBlue.objects.all()
     serializer_class = RelacionBlueSerializer
     pagination_class = CustomLimitOffsetPagination  # Usando paginación de tipo límite/offset
@@ -371,7 +378,7 @@ class RelacionBlueViewSet(viewsets.ModelViewSet):
         return Response({"error": "Se requiere el parámetro contacto_id"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     """API endpoint para gestionar etiquetas del directorio."""
 
     queryset = Tag.objects.all()
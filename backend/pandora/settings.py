@@ -178,6 +178,20 @@ DATABASES = {
     }
 }
 
+# Caché compartido entre workers. Con varios workers debe apuntar a un backend
+# común (p. ej. CACHE_URL=redis://127.0.0.1:6379/1); sin él cada proceso tiene
+# su propio caché en memoria y el caché de catálogos básicos
+# (basic/reference_cache.py) se refresca por antigüedad.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Segundos que un proceso conserva su copia de un catálogo básico cuando el
+# caché no es compartido (ver CACHES)
+REFERENCE_CACHE = {
+    'local_ttl_seconds': 60,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -325,6 +339,72 @@ IMAGE_PROCESSING_CONFIG = {
     'webp_folder': 'webp',
 }
 
+# Procesamiento asíncrono de imágenes de productos: las subidas se encolan y el
+# comando `procesar_imagenes` genera las versiones en segundo plano. Desactivado
+# por defecto; activarlo solo donde ese comando corre como servicio, porque sin
+# él las imágenes quedan pendientes y sin miniaturas
+IMAGE_PROCESSING_ASYNC = env.bool('IMAGE_PROCESSING_ASYNC', default=False)
+IMAGE_PROCESSING_MAX_ATTEMPTS = 3  # Reintentos antes de marcar la tarea como error
+
+# Subida masiva de imágenes (productos/images/bulk-upload/). Con
+# IMAGE_PROCESSING_ASYNC las imágenes nuevas se encolan; sin él se procesan en
+# la petición con un pool de un proceso por CPU
+IMAGE_BULK_UPLOAD_MAX_FILES = 50
+
+# Versiones responsivas generadas bajo demanda (productos/images/<id>/responsive/)
+RESPONSIVE_IMAGE_CONFIG = {
+    'widths': (160, 320, 480, 640, 800, 1024, 1280, 1600),  # Anchos permitidos
+    'formats': ('avif', 'webp', 'jpeg'),  # Orden de preferencia al negociar con Accept
+    'quality': {'webp': 80, 'avif': 60, 'jpeg': 82},
+    'cache_folder': 'cache/imagenes',  # Relativo a MEDIA_ROOT
+    'cache_max_bytes': env.int('RESPONSIVE_IMAGE_CACHE_MAX_MB', default=512) * 1024 * 1024,
+    'cache_control': 'private',  # El endpoint exige autenticación: sin caché en proxies/CDN
+    'max_age': 31536000,  # Un año: el original de una imagen no cambia una vez subido
+}
+
+# Subida reanudable por partes de documentos de productos
+DOCUMENT_CHUNKED_UPLOAD = {
+    'chunk_size': 5 * 1024 * 1024,  # Tamaño máximo de cada fragmento
+    'max_size_mb': 500,             # Tamaño máximo del documento completo
+    'session_hours': 24,            # Las sesiones sin completar expiran tras este plazo
+    'temp_folder': 'temp/chunks',   # Relativo a MEDIA_ROOT
+}
+
+# Copia completa del catálogo de productos para clientes sin conexión
+# (productos/catalogo/snapshot/) y sincronización incremental (productos/catalogo/delta/)
+CATALOG_SNAPSHOT = {
+    # Fuera de MEDIA_ROOT, que se sirve sin autenticación: la copia solo se
+    # descarga por la API
+    'root': env('CATALOG_SNAPSHOT_ROOT', default=str(BASE_DIR / 'privado' / 'catalogo')),
+    'max_age_minutes': 15,          # Pasado este tiempo se regenera en segundo plano
+    'delta_max_rows': 5000,         # Deltas más grandes deben descargar la copia completa
+    'tombstone_days': 30,           # Antigüedad máxima de las bajas registradas
+    'delta_margin_seconds': 30,     # Solapamiento para no perder transacciones confirmadas tarde
+}
+
+# Caché en disco de los PDF de proformas (proformas/pdf_cache.py)
+PROFORMA_PDF_CACHE = {
+    'folder': 'proformas/pdf',      # Relativo a MEDIA_ROOT
+    'enabled': True,
+}
+
+# Exportación en lote de PDF de proformas a ZIP (proformas/pdf_export.py)
+PROFORMA_PDF_EXPORT = {
+    # Fuera de MEDIA_ROOT, que se sirve sin autenticación: los ZIP solo se
+    # descargan por la API
+    'root': env('PROFORMA_PDF_EXPORT_ROOT', default=str(BASE_DIR / 'privado' / 'exportaciones')),
+    'workers': 2,                # Procesos que generan los PDF en paralelo
+    'max_proformas': 500,        # Máximo de proformas por exportación
+    'retention_hours': 24,       # Se borran las exportaciones más antiguas
+    'stale_minutes': 15,         # Sin avance en este plazo se marcan como fallidas
+}
+
+# Numeración de proformas (proformas/numeracion.py)
+PROFORMA_NUMERACION = {
+    'mode': 'strict',            # 'strict': sin huecos | 'block': bloques por proceso, sin contención
+    'block_size': 20,            # Números reservados por bloque en modo 'block'
+}
+
 # Configuraciones adicionales de imagen requeridas
 IMAGE_FORMAT = 'WEBP'  # Formato por defecto para imágenes
 IMAGE_QUALITY = 85     # Calidad por defecto
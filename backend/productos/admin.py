@@ -1,4 +1,8 @@
-from django.contrib import admin
+import os
+from django.conf import settings
+from django.contrib import admin, messages
+from django.utils import timezone
+from .image_processor import ImageProcessor
 from .models import (
     ProductoOfertado,
     ImagenReferenciaProductoOfertado,
@@ -8,9 +12,64 @@ from .models import (
     DocumentoProductoDisponible,
     ProductsPrice,
     HistorialDeCompras,
-    HistorialDeVentas
+    HistorialDeVentas,
+    TareaProcesamientoImagen,
+    ArchivoContenido,
+    SesionSubidaDocumento,
+    EjecucionLimpiezaMedia
 )
 
+
+def _guardar_metadatos(model, imagenes, campos):
+    """
+    Guarda un lote de imágenes. bulk_update no toca updated_at: se asigna a mano
+    para que el índice de hashes perceptuales (phash_index) detecte el cambio.
+    """
+    ahora = timezone.now()
+    for imagen in imagenes:
+        imagen.updated_at = ahora
+    model.objects.bulk_update(imagenes, campos)
+
+
+@admin.action(description='Recalcular metadatos de las imágenes seleccionadas')
+def recalcular_metadatos_imagenes(modeladmin, request, queryset):
+    """
+    Regenera el manifiesto (dimensiones, formato, tamaños y hashes de cada versión)
+    y los metadatos del original a partir de los archivos existentes.
+    Pensado para imágenes antiguas subidas antes de que se calcularan al procesar.
+    """
+    campos = ['manifest', 'width', 'height', 'format', 'file_size', 'phash', 'updated_at']
+    pendientes = []
+    actualizadas = 0
+    sin_archivos = 0
+    for imagen in queryset.iterator(chunk_size=200):
+        versions = {}
+        for name, relative_path in (('original', imagen.imagen_original),
+                                    ('thumbnail', imagen.imagen_thumbnail),
+                                    ('webp', imagen.imagen_webp)):
+            full_path = os.path.join(settings.MEDIA_ROOT, relative_path) if relative_path else None
+            if full_path and os.path.exists(full_path):
+                versions[name] = full_path
+        if not versions:
+            sin_archivos += 1
+            continue
+
+        imagen.manifest = ImageProcessor.build_manifest(versions)
+        for campo, valor in ImageProcessor.metadata_from_manifest(imagen.manifest).items():
+            setattr(imagen, campo, valor)
+        pendientes.append(imagen)
+        actualizadas += 1
+        if len(pendientes) >= 200:
+            _guardar_metadatos(queryset.model, pendientes, campos)
+            pendientes = []
+
+    if pendientes:
+        _guardar_metadatos(queryset.model, pendientes, campos)
+
+    modeladmin.message_user(request, f'{actualizadas} imágenes actualizadas')
+    if sin_archivos:
+        modeladmin.message_user(request, f'{sin_archivos} imágenes sin archivos en disco', level=messages.WARNING)
+
 @admin.register(ProductoOfertado)
 class ProductoOfertadoAdmin(admin.ModelAdmin):
     list_display = ('code', 'nombre', 'id_categoria', 'is_active', 'created_at', 'updated_at')
@@ -60,6 +119,7 @@ class ImagenReferenciaProductoOfertadoAdmin(admin.ModelAdmin):
     search_fields = ('producto_ofertado__nombre', 'descripcion')
     list_filter = ('is_primary', 'created_at')
     readonly_fields = ('created_at', 'updated_at', 'created_by')
+    actions = [recalcular_metadatos_imagenes]
 
     def save_model(self, request, obj, form, change):
         if not obj.pk:
@@ -119,6 +179,7 @@ class ImagenProductoDisponibleAdmin(admin.ModelAdmin):
     search_fields = ('producto_disponible__nombre', 'descripcion')
     list_filter = ('is_primary', 'created_at')
     readonly_fields = ('created_at', 'updated_at', 'created_by')
+    actions = [recalcular_metadatos_imagenes]
 
     def save_model(self, request, obj, form, change):
         if not obj.pk:
@@ -166,3 +227,33 @@ class HistorialDeVentasAdmin(admin.ModelAdmin):
     def valor_total(self, obj):
         return obj.valor_total
     valor_total.short_description = 'Valor Total (IVA Inc.)'
+
+
+@admin.register(TareaProcesamientoImagen)
+class TareaProcesamientoImagenAdmin(admin.ModelAdmin):
+    list_display = ('id', 'imagen_ofertado', 'imagen_disponible', 'estado', 'intentos', 'created_at', 'finalizado_en')
+    list_filter = ('estado', 'created_at')
+    readonly_fields = ('created_at', 'updated_at', 'iniciado_en', 'finalizado_en')
+
+
+@admin.register(ArchivoContenido)
+class ArchivoContenidoAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'tipo', 'ruta', 'tamano', 'created_at')
+    list_filter = ('tipo', 'created_at')
+    search_fields = ('sha256', 'ruta')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(SesionSubidaDocumento)
+class SesionSubidaDocumentoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre_archivo', 'estado', 'bytes_recibidos', 'tamano_total', 'created_by', 'expira_en')
+    list_filter = ('estado', 'created_at')
+    search_fields = ('nombre_archivo', 'titulo')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(EjecucionLimpiezaMedia)
+class EjecucionLimpiezaMediaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'estado', 'eliminar', 'archivos_revisados', 'huerfanos', 'eliminados', 'iniciado_en', 'finalizado_en')
+    list_filter = ('estado', 'eliminar')
+    readonly_fields = ('iniciado_en', 'actualizado_en', 'finalizado_en')
@@ -15,3 +15,6 @@ class ProductosConfig(AppConfig):
 
         # Configurar directorios de medios
         setup_media_directories()
+
+        # Señales que mantienen el índice de búsqueda
+        import productos.signals  # noqa F401
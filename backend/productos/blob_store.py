@@ -0,0 +1,140 @@
+"""
+Almacén de archivos direccionado por contenido.
+
+Cada archivo de producto (imagen o documento) se identifica por el SHA-256 de su
+contenido mediante ArchivoContenido. Cuando se sube un archivo idéntico a uno ya
+registrado se reutilizan el archivo y, para imágenes, sus versiones ya generadas,
+sin volver a guardarlo ni procesarlo.
+"""
+
+import os
+import hashlib
+import logging
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .image_processor import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def calcular_sha256(archivo):
+    """
+    Calcula el SHA-256 de un archivo subido o abierto sin cargarlo entero en memoria.
+    Deja el puntero al inicio para que el archivo pueda volver a leerse.
+    """
+    sha = hashlib.sha256()
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    if hasattr(archivo, 'chunks'):
+        for chunk in archivo.chunks(CHUNK_SIZE):
+            sha.update(chunk)
+    else:
+        for chunk in iter(lambda: archivo.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    return sha.hexdigest()
+
+
+def calcular_sha256_ruta(path):
+    """Calcula el SHA-256 de un archivo en disco"""
+    with open(path, 'rb') as f:
+        return calcular_sha256(f)
+
+
+def es_archivo_nuevo(field_file):
+    """Indica si el FieldFile contiene una subida que aún no se ha guardado en el storage"""
+    return bool(field_file) and not getattr(field_file, '_committed', True)
+
+
+def buscar_blob(sha256, tipo):
+    """
+    Retorna el ArchivoContenido reutilizable para un hash, o None.
+    Solo se reutiliza si el archivo referenciado sigue existiendo.
+    """
+    from .models import ArchivoContenido
+
+    blob = ArchivoContenido.objects.filter(sha256=sha256, tipo=tipo).first()
+    if blob is None:
+        return None
+    if not os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.ruta)):
+        logger.warning(f"Blob {sha256} sin archivo en disco ({blob.ruta}); se ignora")
+        return None
+    if tipo == 'imagen' and not (blob.manifest or {}).get('variants'):
+        return None
+    return blob
+
+
+def registrar_blob(sha256, tipo, ruta, tamano, manifest=None):
+    """
+    Registra el contenido en el almacén. Si otro proceso lo registró antes,
+    retorna el existente.
+    """
+    from .models import ArchivoContenido
+
+    try:
+        with transaction.atomic():
+            blob, _ = ArchivoContenido.objects.get_or_create(
+                sha256=sha256,
+                defaults={
+                    'tipo': tipo,
+                    'ruta': ruta,
+                    'tamano': tamano or 0,
+                    'manifest': manifest or {},
+                }
+            )
+    except IntegrityError:
+        blob = ArchivoContenido.objects.get(sha256=sha256)
+    return blob
+
+
+def aplicar_blob_imagen(imagen, blob):
+    """
+    Copia en una imagen las versiones ya generadas de un blob.
+    No guarda la imagen; lo hace el llamador.
+    """
+    variants = blob.manifest.get('variants', {})
+    rutas = {name: variant['path'] for name, variant in variants.items()}
+
+    imagen.blob = blob
+    imagen.manifest = blob.manifest
+    imagen.imagen_original = rutas.get('original', '')
+    imagen.imagen_thumbnail = rutas.get('thumbnail', '')
+    imagen.imagen_webp = rutas.get('webp', '')
+    # Asignar la ruta existente evita que el FileField vuelva a escribir la subida
+    imagen.imagen = imagen.imagen_webp or imagen.imagen_thumbnail or imagen.imagen_original
+    imagen.estado_procesamiento = 'completado'
+
+    for campo, valor in ImageProcessor.metadata_from_manifest(blob.manifest).items():
+        setattr(imagen, campo, valor)
+
+
+def registrar_blob_imagen(imagen, sha256):
+    """Registra las versiones recién generadas de una imagen como blob y lo enlaza"""
+    if not sha256 or not imagen.imagen_original:
+        return None
+    blob = registrar_blob(
+        sha256, 'imagen', imagen.imagen_original, imagen.file_size, imagen.manifest
+    )
+    imagen.blob = blob
+    return blob
+
+
+def deduplicar_documento(documento, field_name='documento'):
+    """
+    Prepara un documento nuevo antes de guardarlo.
+    Si su contenido ya existe, apunta el FileField al archivo registrado y
+    retorna (blob, sha256); si no, retorna (None, sha256) para registrarlo después.
+    """
+    field_file = getattr(documento, field_name)
+    if not es_archivo_nuevo(field_file):
+        return None, None
+
+    sha256 = calcular_sha256(field_file.file)
+    blob = buscar_blob(sha256, 'documento')
+    if blob is not None:
+        setattr(documento, field_name, blob.ruta)
+        documento.blob = blob
+    return blob, sha256
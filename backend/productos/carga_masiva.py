@@ -0,0 +1,294 @@
+"""
+Carga masiva de productos disponibles (p. ej. el catálogo nuevo de un proveedor).
+
+La carga se hace en dos fases:
+
+1. Validación: todas las filas se validan en memoria contra mapas precargados
+   (códigos existentes, productos ofertados y el caché de catálogos básicos),
+   con un número fijo de consultas sin importar la cantidad de filas. Cada
+   fila inválida se reporta con sus errores y no impide cargar las demás.
+2. Escritura: las filas válidas se escriben en una sola transacción con
+   bulk_create / bulk_update, junto con sus precios iniciales. Como las
+   operaciones masivas no disparan señales, el índice de búsqueda y los
+   resúmenes de precios se actualizan aquí mismo.
+
+Una fila con "id" o con un "code" ya existente actualiza ese producto; el
+resto se crean. La clave opcional "precio" registra un ProductsPrice.
+"""
+
+import logging
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from basic import reference_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_FILAS = 2000
+
+# Claves foráneas a catálogos básicos: campo -> catálogo de basic.reference_cache
+CAMPOS_CATALOGO = {
+    'id_categoria': 'categoria',
+    'id_marca': 'marca',
+    'unidad_presentacion': 'unidad',
+    'procedencia': 'procedencia',
+    'id_especialidad': 'especialidad',
+}
+
+CAMPOS_SIMPLES = (
+    'code', 'nombre', 'modelo', 'referencia',
+    'tz_oferta', 'tz_demanda', 'tz_inflacion', 'tz_calidad', 'tz_eficiencia', 'tz_referencial',
+    'costo_referencial', 'precio_sie_referencial', 'precio_sie_tipob', 'precio_venta_privado',
+    'is_active',
+)
+
+CAMPOS_OBLIGATORIOS = ('id_categoria', 'code', 'nombre', 'modelo')
+
+
+def _mensajes(error):
+    return list(error.messages) if hasattr(error, 'messages') else [str(error)]
+
+
+def _limpiar_simple(model, campo, valor):
+    """Convierte y valida un campo no relacional con las reglas del modelo"""
+    field = model._meta.get_field(campo)
+    if isinstance(valor, str):
+        valor = valor.strip()
+    if valor is None or valor == '':
+        if field.has_default():
+            return field.get_default()
+        if field.blank and not field.null:
+            return ''
+        return None
+    valor = field.to_python(valor)
+    field.run_validators(valor)
+    return valor
+
+
+def _limpiar_fila(fila, defectos, ofertados, nueva):
+    """
+    Valida una fila contra los mapas precargados.
+
+    Returns:
+        tuple: (valores, errores) con los valores listos para asignar al modelo
+    """
+    from .models import ProductoDisponible
+
+    valores = {}
+    errores = {}
+
+    for campo in CAMPOS_SIMPLES:
+        if campo not in fila:
+            continue
+        try:
+            valores[campo] = _limpiar_simple(ProductoDisponible, campo, fila[campo])
+        except DjangoValidationError as e:
+            errores[campo] = _mensajes(e)
+
+    for campo, catalogo in CAMPOS_CATALOGO.items():
+        if campo not in fila:
+            continue
+        valor = fila[campo]
+        if valor in (None, ''):
+            valores[f'{campo}_id'] = defectos.get(campo)
+        elif not reference_cache.existe(catalogo, valor):
+            errores[campo] = [f'No existe el registro {valor}.']
+        else:
+            valores[f'{campo}_id'] = int(valor)
+
+    if 'id_producto_ofertado' in fila:
+        valor = fila['id_producto_ofertado']
+        if valor in (None, ''):
+            valores['id_producto_ofertado_id'] = None
+        else:
+            try:
+                valor = int(valor)
+            except (TypeError, ValueError):
+                valor = None
+            if valor not in ofertados:
+                errores['id_producto_ofertado'] = [f"No existe el producto ofertado {fila['id_producto_ofertado']}."]
+            else:
+                valores['id_producto_ofertado_id'] = valor
+
+    if nueva:
+        for campo, valor in defectos.items():
+            valores.setdefault(f'{campo}_id', valor)
+    for campo in CAMPOS_OBLIGATORIOS:
+        # Las filas nuevas deben traerlos; las actualizaciones no pueden vaciarlos
+        if campo in errores or not (nueva or campo in fila):
+            continue
+        clave = f'{campo}_id' if campo in CAMPOS_CATALOGO else campo
+        if valores.get(clave) in (None, ''):
+            errores[campo] = ['Este campo es requerido.']
+
+    if fila.get('precio') not in (None, ''):
+        try:
+            precio = Decimal(str(fila['precio']))
+            if precio <= 0:
+                raise InvalidOperation
+            valores['precio'] = precio.quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            errores['precio'] = ['Debe ser un número mayor que cero.']
+
+    return valores, errores
+
+
+def planificar(filas, defectos=None):
+    """
+    Valida todas las filas y arma el plan de escritura.
+
+    Args:
+        filas: Lista de diccionarios con los campos de ProductoDisponible
+        defectos: {campo: id} de catálogos por defecto para filas nuevas
+
+    Returns:
+        dict: {'crear': [(indice, valores)], 'actualizar': [(indice, producto, valores)],
+               'errores': [{'indice', 'code', 'errores'}]}
+    """
+    from .models import ProductoDisponible, ProductoOfertado
+
+    defectos = defectos or {}
+    plan = {'crear': [], 'actualizar': [], 'errores': []}
+
+    codigos = {str(f.get('code')).strip() for f in filas if isinstance(f, dict) and f.get('code')}
+    ids = set()
+    ofertados_solicitados = set()
+    for fila in filas:
+        if not isinstance(fila, dict):
+            continue
+        for campo, destino in (('id', ids), ('id_producto_ofertado', ofertados_solicitados)):
+            try:
+                if fila.get(campo) not in (None, ''):
+                    destino.add(int(fila[campo]))
+            except (TypeError, ValueError):
+                pass
+
+    # Mapas precargados: una consulta por tabla para todo el lote
+    existentes = ProductoDisponible.objects.in_bulk(ids) if ids else {}
+    por_codigo = {
+        producto.code: producto
+        for producto in ProductoDisponible.objects.filter(code__in=codigos)
+    } if codigos else {}
+    existentes.update({producto.pk: producto for producto in por_codigo.values()})
+    ofertados = set(
+        ProductoOfertado.objects.filter(pk__in=ofertados_solicitados).values_list('pk', flat=True)
+    ) if ofertados_solicitados else set()
+
+    codigos_lote = {}
+    productos_lote = set()
+    for indice, fila in enumerate(filas):
+        if not isinstance(fila, dict):
+            plan['errores'].append({'indice': indice, 'code': None, 'errores': {'fila': ['Debe ser un objeto.']}})
+            continue
+
+        producto = None
+        if fila.get('id') not in (None, ''):
+            try:
+                producto = existentes.get(int(fila['id']))
+            except (TypeError, ValueError):
+                pass
+            if producto is None:
+                plan['errores'].append({
+                    'indice': indice, 'code': fila.get('code'),
+                    'errores': {'id': [f"No existe el producto {fila['id']}."]}
+                })
+                continue
+        elif fila.get('code'):
+            producto = por_codigo.get(str(fila['code']).strip())
+
+        valores, errores = _limpiar_fila(fila, defectos, ofertados, nueva=producto is None)
+
+        code = valores.get('code')
+        if code:
+            otro = por_codigo.get(code)
+            if otro is not None and (producto is None or otro.pk != producto.pk):
+                errores.setdefault('code', []).append('Ya existe un producto con este código.')
+            elif code in codigos_lote:
+                errores.setdefault('code', []).append(f'Código repetido en la fila {codigos_lote[code]}.')
+        if producto is not None and producto.pk in productos_lote:
+            errores.setdefault('id', []).append('El producto aparece más de una vez en la carga.')
+
+        if errores:
+            plan['errores'].append({'indice': indice, 'code': fila.get('code'), 'errores': errores})
+            continue
+
+        if code:
+            codigos_lote[code] = indice
+        if producto is None:
+            plan['crear'].append((indice, valores))
+        else:
+            productos_lote.add(producto.pk)
+            plan['actualizar'].append((indice, producto, valores))
+
+    return plan
+
+
+def ejecutar(plan, usuario=None, batch_size=500):
+    """
+    Escribe el plan en una sola transacción.
+
+    Returns:
+        list: [{'indice', 'id', 'code', 'accion'}] de las filas escritas
+    """
+    from .models import ProductoDisponible, ProductsPrice
+    from . import search_index, price_analytics
+
+    usuario = usuario if usuario is not None and usuario.is_authenticated else None
+    ahora = timezone.now()
+    resultados = []
+    precios = {}
+
+    with transaction.atomic():
+        nuevos = []
+        for indice, valores in plan['crear']:
+            valores = dict(valores)
+            precio = valores.pop('precio', None)
+            producto = ProductoDisponible(**valores, created_by=usuario, updated_by=usuario)
+            nuevos.append((indice, producto, precio))
+        ProductoDisponible.objects.bulk_create([producto for _, producto, _ in nuevos], batch_size=batch_size)
+
+        # MySQL no devuelve las claves de bulk_create: se leen por código
+        ids_por_codigo = dict(ProductoDisponible.objects.filter(
+            code__in=[producto.code for _, producto, _ in nuevos]
+        ).values_list('code', 'pk')) if nuevos else {}
+        for indice, producto, precio in nuevos:
+            producto.pk = ids_por_codigo[producto.code]
+            resultados.append({'indice': indice, 'id': producto.pk, 'code': producto.code, 'accion': 'creado'})
+            if precio is not None:
+                precios[producto.pk] = precio
+
+        campos = {'updated_by', 'updated_at'}
+        modificados = []
+        for indice, producto, valores in plan['actualizar']:
+            valores = dict(valores)
+            precio = valores.pop('precio', None)
+            for campo, valor in valores.items():
+                setattr(producto, campo, valor)
+            campos.update(valores)
+            producto.updated_by = usuario
+            producto.updated_at = ahora
+            modificados.append(producto)
+            resultados.append({'indice': indice, 'id': producto.pk, 'code': producto.code, 'accion': 'actualizado'})
+            if precio is not None:
+                precios[producto.pk] = precio
+        if modificados:
+            ProductoDisponible.objects.bulk_update(
+                modificados, [campo.removesuffix('_id') for campo in campos], batch_size=batch_size
+            )
+
+        filas_precio = [ProductsPrice(producto_disponible_id=pk, valor=valor) for pk, valor in precios.items()]
+        ProductsPrice.objects.bulk_create(filas_precio, batch_size=batch_size)
+        price_analytics.registrar_lote('precio', filas_precio)
+
+        escritos = list(ProductoDisponible.objects.select_related('id_marca').filter(
+            pk__in=[resultado['id'] for resultado in resultados]
+        ))
+        search_index.indexar_productos(escritos, 'disponible', batch_size=batch_size)
+
+    logger.info(
+        f"Carga masiva: {len(plan['crear'])} creados, {len(plan['actualizar'])} actualizados, "
+        f"{len(filas_precio)} precios, {len(plan['errores'])} filas con errores"
+    )
+    resultados.sort(key=lambda resultado: resultado['indice'])
+    return resultados
@@ -0,0 +1,324 @@
+"""
+Copia completa y sincronización incremental del catálogo de productos.
+
+Los clientes que trabajan con el catálogo en memoria (p. ej. el editor de
+proformas) descargan una copia completa en NDJSON comprimido con gzip y
+luego piden solo los cambios desde el token de esa copia:
+
+- La copia se genera en segundo plano y se guarda en <root>, fuera de
+  MEDIA_ROOT (que se sirve sin autenticación); solo se descarga por la API.
+  La primera línea es {"op": "meta", "token": ...}; cada una de las demás es
+  un producto ({"op": "upsert", "tipo": "ofertado"|"disponible", ...}).
+- El delta devuelve los productos creados, modificados o desactivados desde
+  el token (por updated_at, o por el updated_at de sus catálogos, cuyo nombre
+  se incluye en la fila) y las bajas registradas en ProductoEliminado.
+
+El token codifica el instante en que empezó la lectura. Los deltas se
+solapan unos segundos con la lectura anterior para no perder transacciones
+confirmadas tarde; los clientes aplican las filas como upsert, así que
+recibir una fila dos veces no tiene efecto.
+"""
+
+import os
+import json
+import gzip
+import glob
+import base64
+import logging
+import threading
+from itertools import islice
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Columnas de cada fila: nombre en la salida -> lookup del ORM
+CAMPOS = {
+    'ofertado': {
+        'id': 'id',
+        'code': 'code',
+        'cudim': 'cudim',
+        'nombre': 'nombre',
+        'descripcion': 'descripcion',
+        'referencias': 'referencias',
+        'id_categoria': 'id_categoria',
+        'categoria_nombre': 'id_categoria__nombre',
+        'especialidad': 'especialidad',
+        'especialidad_nombre': 'especialidad__nombre',
+        'is_active': 'is_active',
+        'updated_at': 'updated_at',
+    },
+    'disponible': {
+        'id': 'id',
+        'code': 'code',
+        'nombre': 'nombre',
+        'modelo': 'modelo',
+        'referencia': 'referencia',
+        'id_producto_ofertado': 'id_producto_ofertado',
+        'id_categoria': 'id_categoria',
+        'categoria_nombre': 'id_categoria__nombre',
+        'id_marca': 'id_marca',
+        'marca_nombre': 'id_marca__nombre',
+        'unidad_presentacion': 'unidad_presentacion',
+        'unidad_nombre': 'unidad_presentacion__nombre',
+        'procedencia': 'procedencia',
+        'procedencia_nombre': 'procedencia__nombre',
+        'id_especialidad': 'id_especialidad',
+        'especialidad_nombre': 'id_especialidad__nombre',
+        'costo_referencial': 'costo_referencial',
+        'precio_sie_referencial': 'precio_sie_referencial',
+        'precio_sie_tipob': 'precio_sie_tipob',
+        'precio_venta_privado': 'precio_venta_privado',
+        'is_active': 'is_active',
+        'updated_at': 'updated_at',
+    },
+}
+
+# Catálogos cuyo nombre viaja en la fila: si cambian, el producto entra en el delta
+RELACIONES_DELTA = {
+    'ofertado': ('id_categoria', 'especialidad'),
+    'disponible': ('id_categoria', 'id_marca', 'unidad_presentacion', 'procedencia', 'id_especialidad'),
+}
+
+ARCHIVO_MANIFIESTO = 'ultimo.json'
+ARCHIVO_BLOQUEO = '.generando'
+# Un bloqueo más antiguo que esto se considera abandonado
+BLOQUEO_MAXIMO = timedelta(minutes=30)
+# Copias anteriores que se conservan para descargas en curso
+COPIAS_CONSERVADAS = 2
+
+
+class TokenInvalido(Exception):
+    """El token de sincronización no es válido o es demasiado antiguo"""
+    pass
+
+
+def configuracion():
+    config = {
+        'root': os.path.join(settings.BASE_DIR, 'privado', 'catalogo'),
+        'max_age_minutes': 15,
+        'delta_max_rows': 5000,
+        'tombstone_days': 30,
+        'delta_margin_seconds': 30,
+    }
+    config.update(getattr(settings, 'CATALOG_SNAPSHOT', {}))
+    return config
+
+
+def directorio():
+    return str(configuracion()['root'])
+
+
+def codificar_token(instante):
+    """Token opaco a partir de un instante"""
+    texto = instante.astimezone(dt_timezone.utc).isoformat()
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    """Instante codificado en el token; TokenInvalido si no se puede leer"""
+    try:
+        relleno = '=' * (-len(token) % 4)
+        instante = datetime.fromisoformat(base64.urlsafe_b64decode(token + relleno).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise TokenInvalido('Token de sincronización inválido')
+    if timezone.is_naive(instante):
+        raise TokenInvalido('Token de sincronización inválido')
+    return instante
+
+
+def _modelo(tipo):
+    from .models import ProductoOfertado, ProductoDisponible
+    return ProductoOfertado if tipo == 'ofertado' else ProductoDisponible
+
+
+def filas(tipo, queryset=None):
+    """Genera las filas de un tipo de producto como diccionarios"""
+    campos = CAMPOS[tipo]
+    queryset = queryset if queryset is not None else _modelo(tipo).objects.all()
+    for valores in queryset.order_by('pk').values(*campos.values()).iterator(chunk_size=2000):
+        fila = {'op': 'upsert', 'tipo': tipo}
+        fila.update((salida, valores[lookup]) for salida, lookup in campos.items())
+        yield fila
+
+
+def _linea(datos):
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+# Copia completa
+
+def manifiesto():
+    """Datos de la última copia generada, o None si no hay ninguna"""
+    try:
+        with open(os.path.join(directorio(), ARCHIVO_MANIFIESTO), encoding='utf-8') as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    datos['ruta'] = os.path.join(directorio(), datos['archivo'])
+    if not os.path.exists(datos['ruta']):
+        return None
+    return datos
+
+
+def vigente(datos):
+    """Indica si la copia todavía no supera la antigüedad configurada"""
+    generado = datetime.fromisoformat(datos['generado'])
+    return timezone.now() - generado < timedelta(minutes=configuracion()['max_age_minutes'])
+
+
+def _tomar_bloqueo():
+    ruta = os.path.join(directorio(), ARCHIVO_BLOQUEO)
+    os.makedirs(directorio(), exist_ok=True)
+    try:
+        creado = datetime.fromtimestamp(os.path.getmtime(ruta), tz=dt_timezone.utc)
+        if timezone.now() - creado > BLOQUEO_MAXIMO:
+            os.remove(ruta)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _liberar_bloqueo():
+    try:
+        os.remove(os.path.join(directorio(), ARCHIVO_BLOQUEO))
+    except OSError:
+        pass
+
+
+def generando():
+    """Indica si otra generación está en curso"""
+    try:
+        creado = datetime.fromtimestamp(os.path.getmtime(os.path.join(directorio(), ARCHIVO_BLOQUEO)), tz=dt_timezone.utc)
+    except OSError:
+        return False
+    return timezone.now() - creado <= BLOQUEO_MAXIMO
+
+
+def generar():
+    """
+    Genera una copia completa del catálogo y actualiza el manifiesto.
+    Si ya hay una generación en curso no hace nada.
+
+    Returns:
+        dict: Manifiesto de la copia generada, o None si no se generó
+    """
+    if not _tomar_bloqueo():
+        logger.info("Copia del catálogo: ya hay una generación en curso")
+        return None
+    try:
+        instante = timezone.now()
+        token = codificar_token(instante)
+        archivo = f"snapshot_{instante.strftime('%Y%m%d%H%M%S')}.ndjson.gz"
+        ruta = os.path.join(directorio(), archivo)
+        temporal = ruta + '.tmp'
+
+        totales = {'ofertado': 0, 'disponible': 0}
+        with gzip.open(temporal, 'wt', encoding='utf-8', compresslevel=6) as salida:
+            salida.write(_linea({'op': 'meta', 'token': token, 'generado': instante}))
+            for tipo in totales:
+                for fila in filas(tipo):
+                    salida.write(_linea(fila))
+                    totales[tipo] += 1
+        os.replace(temporal, ruta)
+
+        datos = {
+            'archivo': archivo,
+            'token': token,
+            'generado': instante.isoformat(),
+            'filas': totales,
+            'bytes': os.path.getsize(ruta),
+        }
+        manifiesto_temporal = os.path.join(directorio(), ARCHIVO_MANIFIESTO + '.tmp')
+        with open(manifiesto_temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(manifiesto_temporal, os.path.join(directorio(), ARCHIVO_MANIFIESTO))
+
+        # Las copias más antiguas ya no se sirven
+        anteriores = sorted(glob.glob(os.path.join(directorio(), 'snapshot_*.ndjson.gz')), reverse=True)
+        for antigua in anteriores[COPIAS_CONSERVADAS:]:
+            try:
+                os.remove(antigua)
+            except OSError:
+                pass
+
+        logger.info(f"Copia del catálogo generada: {archivo} ({totales}, {datos['bytes']} bytes)")
+        return datos
+    finally:
+        _liberar_bloqueo()
+
+
+def generar_en_segundo_plano():
+    """Lanza la generación en un hilo si no hay otra en curso"""
+    if generando():
+        return
+
+    def tarea():
+        try:
+            generar()
+        except Exception as e:
+            logger.error(f"Error al generar la copia del catálogo: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=tarea, name='copia-catalogo', daemon=True).start()
+
+
+def purgar_eliminados():
+    """Borra las bajas más antiguas que el plazo configurado"""
+    from .models import ProductoEliminado
+
+    limite = timezone.now() - timedelta(days=configuracion()['tombstone_days'])
+    eliminados, _ = ProductoEliminado.objects.filter(eliminado_en__lt=limite).delete()
+    return eliminados
+
+
+# Sincronización incremental
+
+def delta(token):
+    """
+    Cambios del catálogo desde el token.
+
+    Returns:
+        dict: {'token', 'ofertados', 'disponibles', 'eliminados', 'completo'}.
+        'completo' es False si los cambios superan delta_max_rows; en ese
+        caso el cliente debe descargar la copia completa.
+
+    Raises:
+        TokenInvalido: Si el token no es válido o es más antiguo que las bajas registradas
+    """
+    from .models import ProductoEliminado
+
+    config = configuracion()
+    instante = timezone.now()
+    desde = decodificar_token(token)
+    if instante - desde > timedelta(days=config['tombstone_days']):
+        raise TokenInvalido('El token es demasiado antiguo; descargue la copia completa')
+    desde = desde - timedelta(seconds=config['delta_margin_seconds'])
+
+    maximo = config['delta_max_rows']
+    resultado = {'token': codificar_token(instante), 'completo': True}
+    for tipo, clave in (('ofertado', 'ofertados'), ('disponible', 'disponibles')):
+        condicion = Q(updated_at__gte=desde)
+        for relacion in RELACIONES_DELTA[tipo]:
+            condicion |= Q(**{f'{relacion}__updated_at__gte': desde})
+        cambios = list(islice(filas(tipo, _modelo(tipo).objects.filter(condicion)), maximo + 1))
+        if len(cambios) > maximo:
+            return {'token': None, 'completo': False}
+        resultado[clave] = cambios
+
+    resultado['eliminados'] = [
+        {'op': 'delete', 'tipo': tipo, 'id': producto_id, 'code': code}
+        for tipo, producto_id, code in ProductoEliminado.objects.filter(
+            eliminado_en__gte=desde
+        ).values_list('tipo_producto', 'producto_id', 'code')
+    ]
+    return resultado
@@ -0,0 +1,73 @@
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse, HttpResponseNotModified
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from . import catalog_snapshot
+from .catalog_snapshot import TokenInvalido
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_NDJSON = 'application/x-ndjson; charset=utf-8'
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_snapshot_view(request):
+    """
+    Copia completa del catálogo de productos en NDJSON.
+
+    Se envía comprimida con gzip (Content-Encoding) si el cliente lo acepta.
+    Si la copia está vencida se sirve igual y se regenera en segundo plano;
+    si todavía no existe ninguna se responde 202 y el cliente debe reintentar.
+    """
+    datos = catalog_snapshot.manifiesto()
+    if datos is None:
+        catalog_snapshot.generar_en_segundo_plano()
+        response = JsonResponse({'estado': 'generando', 'mensaje': 'La copia del catálogo se está generando'}, status=202)
+        response['Retry-After'] = '5'
+        return response
+    if not catalog_snapshot.vigente(datos):
+        catalog_snapshot.generar_en_segundo_plano()
+
+    etag = f'"{datos["token"]}"'
+    if etag in [valor.strip() for valor in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = FileResponse(open(datos['ruta'], 'rb'), content_type=CONTENT_TYPE_NDJSON)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(gzip.open(datos['ruta'], 'rb'), content_type=CONTENT_TYPE_NDJSON)
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'private, no-cache'
+    response['X-Catalogo-Token'] = datos['token']
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_delta_view(request):
+    """
+    Cambios del catálogo desde un token (?since=<token>) de la copia completa o
+    de un delta anterior. Responde 410 si el token es demasiado antiguo o los
+    cambios son demasiados: el cliente debe descargar la copia completa.
+    """
+    token = request.GET.get('since', '').strip()
+    if not token:
+        return JsonResponse({'error': 'Se requiere el parámetro since'}, status=400)
+    try:
+        resultado = catalog_snapshot.delta(token)
+    except TokenInvalido as e:
+        return JsonResponse({'error': str(e), 'requiere_copia_completa': True}, status=410)
+
+    if not resultado['completo']:
+        return JsonResponse({
+            'error': 'Demasiados cambios desde el token; descargue la copia completa',
+            'requiere_copia_completa': True,
+        }, status=410)
+    del resultado['completo']
+    return JsonResponse(resultado, json_dumps_params={'ensure_ascii': False})
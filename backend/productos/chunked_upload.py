@@ -0,0 +1,282 @@
+"""
+Subida reanudable por partes de documentos de productos.
+
+Protocolo:
+    1. iniciar_sesion: registra nombre, tamaño y SHA-256 esperado del archivo.
+    2. agregar_fragmento: agrega bytes al archivo temporal en el offset esperado.
+       Si la conexión se corta, el cliente consulta el offset y continúa desde ahí.
+    3. completar_sesion: verifica tamaño y SHA-256, mueve el archivo de forma
+       atómica a la ruta upload_documento_* y crea el documento.
+
+Los archivos temporales viven en MEDIA_ROOT/temp/chunks. Las sesiones no
+completadas expiran y se eliminan con el comando limpiar_subidas.
+"""
+
+import os
+import logging
+import mimetypes
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from .media_setup import MediaConfig
+from .blob_store import calcular_sha256_ruta, buscar_blob, registrar_blob
+
+logger = logging.getLogger(__name__)
+
+
+def obtener_config():
+    """Configuración de la subida por partes con valores por defecto"""
+    config = {
+        'chunk_size': 5 * 1024 * 1024,
+        'max_size_mb': 500,
+        'session_hours': 24,
+        'temp_folder': 'temp/chunks',
+    }
+    config.update(getattr(settings, 'DOCUMENT_CHUNKED_UPLOAD', {}))
+    return config
+
+
+def iniciar_sesion(producto, product_type, datos, user):
+    """
+    Crea una sesión de subida y su archivo temporal vacío.
+
+    Args:
+        producto: ProductoOfertado o ProductoDisponible
+        product_type: 'ofertado' o 'disponible'
+        datos: dict con filename, size, sha256, tipo_documento, titulo, descripcion, is_public
+        user: Usuario que sube el documento
+
+    Returns:
+        SesionSubidaDocumento: Sesión creada
+    """
+    from .models import SesionSubidaDocumento
+
+    config = obtener_config()
+    nombre = os.path.basename(str(datos.get('filename') or ''))
+    sha256 = str(datos.get('sha256') or '').lower()
+    try:
+        tamano = int(datos.get('size'))
+    except (TypeError, ValueError):
+        raise ValidationError("Debe indicarse el tamaño del archivo")
+
+    if not nombre:
+        raise ValidationError("Debe indicarse el nombre del archivo")
+    if not datos.get('tipo_documento') or not datos.get('titulo'):
+        raise ValidationError("tipo_documento y titulo son obligatorios")
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        raise ValidationError("sha256 debe ser un hash hexadecimal de 64 caracteres")
+    if tamano <= 0 or tamano > config['max_size_mb'] * 1024 * 1024:
+        raise ValidationError(f"El tamaño debe estar entre 1 byte y {config['max_size_mb']} MB")
+
+    content_type = mimetypes.guess_type(nombre)[0]
+    if content_type not in MediaConfig.ALLOWED_DOCUMENT_TYPES:
+        raise ValidationError(f"Tipo de documento no permitido: {content_type or nombre}")
+
+    sesion = SesionSubidaDocumento(
+        nombre_archivo=nombre,
+        tipo_documento=datos['tipo_documento'],
+        titulo=datos['titulo'],
+        descripcion=datos.get('descripcion', ''),
+        is_public=str(datos.get('is_public', False)).lower() == 'true',
+        tamano_total=tamano,
+        sha256=sha256,
+        created_by=user,
+        expira_en=timezone.now() + timedelta(hours=config['session_hours']),
+    )
+    if product_type == 'ofertado':
+        sesion.producto_ofertado = producto
+    else:
+        sesion.producto_disponible = producto
+    sesion.ruta_temporal = os.path.join(config['temp_folder'], f"{sesion.id}.part")
+
+    full_path = os.path.join(settings.MEDIA_ROOT, sesion.ruta_temporal)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    open(full_path, 'wb').close()
+
+    sesion.save()
+    return sesion
+
+
+def agregar_fragmento(sesion_id, offset, stream, usuario):
+    """
+    Agrega un fragmento al archivo temporal de la sesión.
+    El offset debe coincidir con los bytes ya recibidos para que los reintentos
+    no dupliquen ni salteen datos.
+
+    Args:
+        sesion_id: UUID de la sesión
+        offset: Posición del primer byte del fragmento
+        stream: Objeto con read() del que se lee el fragmento
+        usuario: Usuario que subió la sesión; las de otros usuarios no existen para él
+
+    Returns:
+        SesionSubidaDocumento: Sesión actualizada
+    """
+    from .models import SesionSubidaDocumento
+
+    config = obtener_config()
+    with transaction.atomic():
+        # Bloquear la sesión para serializar fragmentos concurrentes
+        sesion = SesionSubidaDocumento.objects.select_for_update().get(pk=sesion_id, created_by=usuario)
+        _validar_activa(sesion)
+        if offset != sesion.bytes_recibidos:
+            raise OffsetInvalidoError(sesion.bytes_recibidos)
+
+        full_path = os.path.join(settings.MEDIA_ROOT, sesion.ruta_temporal)
+        restante = sesion.tamano_total - sesion.bytes_recibidos
+        recibidos = 0
+        with open(full_path, 'r+b') as f:
+            # Descartar restos de un fragmento anterior que falló a mitad de escritura
+            f.truncate(sesion.bytes_recibidos)
+            f.seek(sesion.bytes_recibidos)
+            while stream is not None:
+                data = stream.read(64 * 1024)
+                if not data:
+                    break
+                recibidos += len(data)
+                if recibidos > restante or recibidos > config['chunk_size']:
+                    raise ValidationError("El fragmento excede el tamaño permitido")
+                f.write(data)
+
+        sesion.bytes_recibidos += recibidos
+        sesion.save(update_fields=['bytes_recibidos', 'updated_at'])
+    return sesion
+
+
+def completar_sesion(sesion_id, usuario):
+    """
+    Verifica el archivo recibido y crea el documento en su ruta definitiva.
+
+    Returns:
+        SesionSubidaDocumento: Sesión completada, con el documento creado
+    """
+    from .models import SesionSubidaDocumento, DocumentoProductoOfertado, DocumentoProductoDisponible
+    from .models import upload_documento_producto_ofertado, upload_documento_producto_disponible
+
+    movido = False
+    try:
+        with transaction.atomic():
+            sesion = SesionSubidaDocumento.objects.select_for_update().get(pk=sesion_id, created_by=usuario)
+            _validar_activa(sesion)
+            if sesion.bytes_recibidos != sesion.tamano_total:
+                raise ValidationError(
+                    f"Faltan datos: recibidos {sesion.bytes_recibidos} de {sesion.tamano_total} bytes"
+                )
+
+            temp_path = os.path.join(settings.MEDIA_ROOT, sesion.ruta_temporal)
+            sha256 = calcular_sha256_ruta(temp_path)
+            if sha256 != sesion.sha256:
+                raise ValidationError("El SHA-256 del archivo recibido no coincide")
+
+            if sesion.producto_ofertado_id:
+                documento = DocumentoProductoOfertado(producto_ofertado=sesion.producto_ofertado)
+                upload_to = upload_documento_producto_ofertado
+            else:
+                documento = DocumentoProductoDisponible(producto_disponible=sesion.producto_disponible)
+                upload_to = upload_documento_producto_disponible
+            documento.tipo_documento = sesion.tipo_documento
+            documento.titulo = sesion.titulo
+            documento.descripcion = sesion.descripcion
+            documento.is_public = sesion.is_public
+            documento.created_by = sesion.created_by
+
+            # Reutilizar el archivo si el mismo contenido ya fue subido
+            blob = buscar_blob(sha256, 'documento')
+            if blob is not None:
+                documento.documento = blob.ruta
+                documento.blob = blob
+            else:
+                ruta_final = upload_to(documento, sesion.nombre_archivo)
+                full_final = os.path.join(settings.MEDIA_ROOT, ruta_final)
+                documento.documento = ruta_final
+                documento.blob = registrar_blob(sha256, 'documento', ruta_final, sesion.tamano_total)
+            documento.save()
+
+            if sesion.producto_ofertado_id:
+                sesion.documento_ofertado = documento
+            else:
+                sesion.documento_disponible = documento
+            sesion.estado = 'completada'
+            sesion.save(update_fields=['estado', 'documento_ofertado', 'documento_disponible', 'updated_at'])
+
+            if blob is None:
+                # El archivo se mueve al final, cuando ya se guardó todo: si algo falla
+                # antes, el temporal sigue en su lugar y la sesión puede reintentarse.
+                # Mismo sistema de archivos que MEDIA_ROOT: el movimiento es atómico
+                os.makedirs(os.path.dirname(full_final), exist_ok=True)
+                os.replace(temp_path, full_final)
+                movido = True
+    except Exception:
+        if movido:
+            # La transacción no se confirmó: devolver el archivo a la sesión
+            os.replace(full_final, temp_path)
+        raise
+
+    if blob is not None:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    return sesion
+
+
+def cancelar_sesion(sesion_id, usuario):
+    """Cancela una sesión activa y elimina su archivo temporal"""
+    from .models import SesionSubidaDocumento
+
+    with transaction.atomic():
+        sesion = SesionSubidaDocumento.objects.select_for_update().get(pk=sesion_id, created_by=usuario)
+        _validar_activa(sesion)
+        _eliminar_temporal(sesion)
+        sesion.estado = 'cancelada'
+        sesion.save(update_fields=['estado', 'updated_at'])
+    return sesion
+
+
+def limpiar_sesiones_abandonadas(dry_run=False):
+    """
+    Marca como expiradas las sesiones activas vencidas y elimina sus temporales.
+
+    Returns:
+        tuple: (sesiones expiradas, bytes liberados)
+    """
+    from .models import SesionSubidaDocumento
+
+    expiradas = 0
+    liberados = 0
+    vencidas = SesionSubidaDocumento.objects.filter(estado='activa', expira_en__lt=timezone.now())
+    for sesion in vencidas.iterator():
+        full_path = os.path.join(settings.MEDIA_ROOT, sesion.ruta_temporal)
+        if os.path.exists(full_path):
+            liberados += os.path.getsize(full_path)
+        if not dry_run:
+            _eliminar_temporal(sesion)
+            sesion.estado = 'expirada'
+            sesion.save(update_fields=['estado', 'updated_at'])
+        expiradas += 1
+    return expiradas, liberados
+
+
+def _validar_activa(sesion):
+    """Verifica que la sesión siga aceptando datos"""
+    if sesion.estado != 'activa':
+        raise ValidationError(f"La sesión está {sesion.get_estado_display().lower()}")
+    if sesion.expira_en < timezone.now():
+        raise ValidationError("La sesión expiró")
+
+
+def _eliminar_temporal(sesion):
+    """Elimina el archivo temporal de una sesión si existe"""
+    full_path = os.path.join(settings.MEDIA_ROOT, sesion.ruta_temporal)
+    if os.path.exists(full_path):
+        os.remove(full_path)
+
+
+class OffsetInvalidoError(Exception):
+    """El fragmento no empieza donde termina lo ya recibido"""
+
+    def __init__(self, offset_actual):
+        self.offset_actual = offset_actual
+        super().__init__(f"Offset inválido; se esperaba {offset_actual}")
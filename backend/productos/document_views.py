@@ -0,0 +1,115 @@
+from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAuthenticated
+from .models import ProductoOfertado, ProductoDisponible, SesionSubidaDocumento
+from .throttling import ProductsUploadThrottle
+from . import chunked_upload
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _estado_sesion(sesion):
+    """Representación de una sesión de subida para el cliente"""
+    config = chunked_upload.obtener_config()
+    data = {
+        'upload_id': str(sesion.id),
+        'estado': sesion.estado,
+        'offset': sesion.bytes_recibidos,
+        'size': sesion.tamano_total,
+        'chunk_size': config['chunk_size'],
+        'expira_en': sesion.expira_en.isoformat(),
+    }
+    documento = sesion.documento
+    if documento is not None:
+        data['documento'] = {
+            'id': documento.id,
+            'titulo': documento.titulo,
+            'tipo_documento': documento.tipo_documento,
+            'url': documento.documento.url,
+        }
+    return data
+
+def _error_validacion(error):
+    return JsonResponse({'error': ' '.join(error.messages)}, status=400)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ProductsUploadThrottle])
+def init_document_upload(request, product_id, product_type='ofertado'):
+    """
+    Inicia una subida por partes de un documento de producto.
+    Cuerpo JSON: filename, size, sha256, tipo_documento, titulo, descripcion, is_public.
+    """
+    try:
+        if product_type == 'ofertado':
+            producto = ProductoOfertado.objects.get(pk=product_id)
+        else:
+            producto = ProductoDisponible.objects.get(pk=product_id)
+        
+        sesion = chunked_upload.iniciar_sesion(producto, product_type, request.data, request.user)
+        return JsonResponse(_estado_sesion(sesion), status=201)
+        
+    except (ProductoOfertado.DoesNotExist, ProductoDisponible.DoesNotExist):
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    except ValidationError as e:
+        return _error_validacion(e)
+    except Exception as e:
+        logger.error(f"Error al iniciar subida de documento: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def document_upload_session(request, upload_id):
+    """
+    GET: estado y offset actual para reanudar la subida.
+    PUT: agrega un fragmento (cuerpo binario). El offset se indica en la cabecera
+         Upload-Offset o en el parámetro ?offset=.
+    DELETE: cancela la subida y elimina el archivo temporal.
+    """
+    try:
+        if request.method == 'GET':
+            sesion = SesionSubidaDocumento.objects.get(pk=upload_id, created_by=request.user)
+            return JsonResponse(_estado_sesion(sesion))
+        
+        if request.method == 'DELETE':
+            sesion = chunked_upload.cancelar_sesion(upload_id, request.user)
+            return JsonResponse(_estado_sesion(sesion))
+        
+        offset = request.META.get('HTTP_UPLOAD_OFFSET', request.GET.get('offset'))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Debe indicarse el offset del fragmento'}, status=400)
+        
+        # Leer el cuerpo como flujo para no cargar el fragmento entero en memoria
+        sesion = chunked_upload.agregar_fragmento(upload_id, offset, request.stream, request.user)
+        return JsonResponse(_estado_sesion(sesion))
+        
+    except SesionSubidaDocumento.DoesNotExist:
+        return JsonResponse({'error': 'Sesión de subida no encontrada'}, status=404)
+    except chunked_upload.OffsetInvalidoError as e:
+        return JsonResponse({'error': str(e), 'offset': e.offset_actual}, status=409)
+    except ValidationError as e:
+        return _error_validacion(e)
+    except Exception as e:
+        logger.error(f"Error en sesión de subida {upload_id}: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def complete_document_upload(request, upload_id):
+    """
+    Completa la subida: verifica tamaño y SHA-256 y crea el documento.
+    """
+    try:
+        sesion = chunked_upload.completar_sesion(upload_id, request.user)
+        return JsonResponse(_estado_sesion(sesion), status=201)
+        
+    except SesionSubidaDocumento.DoesNotExist:
+        return JsonResponse({'error': 'Sesión de subida no encontrada'}, status=404)
+    except ValidationError as e:
+        return _error_validacion(e)
+    except Exception as e:
+        logger.error(f"Error al completar subida {upload_id}: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
@@ -8,6 +8,12 @@ Maneja la creación de múltiples versiones de una imagen:
 
 import os
 import io
+import re
+import time
+import hashlib
+from collections.abc import Mapping
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Optional
 from PIL import Image
 from django.conf import settings
 from datetime import datetime
@@ -15,6 +21,63 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Versión del formato del manifiesto de variantes guardado en cada imagen
+MANIFEST_VERSION = 1
+
+# Timestamp embebido en los nombres de archivo generados (con o sin microsegundos)
+TIMESTAMP_PATTERN = re.compile(r'_(\d{8}_\d{6}(?:_\d+)?)\.')
+
+
+@dataclass
+class VarianteImagen:
+    """Metadatos de una variante generada, calculados al escribirla"""
+    path: str  # Ruta absoluta
+    width: int
+    height: int
+    format: str
+    bytes: int
+    sha256: str
+    phash: Optional[str] = None  # dHash de 64 bits en hexadecimal
+
+    def as_manifest(self):
+        """Entrada del manifiesto, con la ruta relativa a MEDIA_ROOT"""
+        data = asdict(self)
+        data['path'] = os.path.relpath(self.path, settings.MEDIA_ROOT)
+        return data
+
+
+@dataclass
+class ResultadoProcesamiento(Mapping):
+    """
+    Resultado de ImageProcessor.process_image.
+    Se comporta como el diccionario {variante: ruta absoluta} que se devolvía
+    antes, y además expone los metadatos de cada variante.
+    """
+    timestamp: str
+    variantes: Dict[str, VarianteImagen] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def __getitem__(self, name):
+        return self.variantes[name].path
+
+    def __iter__(self):
+        return iter(self.variantes)
+
+    def __len__(self):
+        return len(self.variantes)
+
+    @property
+    def original(self):
+        return self.variantes.get('original')
+
+    def manifest(self):
+        """Manifiesto de variantes, construido sin acceder al disco"""
+        return {
+            'version': MANIFEST_VERSION,
+            'timestamp': self.timestamp,
+            'variants': {name: variante.as_manifest() for name, variante in self.variantes.items()},
+        }
+
 
 class ImageProcessor:
     """Clase para procesar imágenes de productos y generar diferentes versiones"""
@@ -47,53 +110,148 @@ class ImageProcessor:
         """
         Procesa una imagen y genera las versiones requeridas.
         
+        La imagen se decodifica una sola vez y las versiones se encadenan de mayor a
+        menor (original -> WebP -> miniatura). Para fuentes JPEG se usa Image.draft()
+        para decodificar directamente a 1/2, 1/4 u 1/8 de escala cuando basta para la
+        versión más grande, y el original se guarda byte a byte si su formato es aceptado.
+        Los tiempos de cada etapa quedan en self.timings.
+        
         Args:
             image_file: Archivo de imagen original
             base_path: Ruta base donde guardar las imágenes (ej: productos/productosofertados/imagenes/CODE)
             
         Returns:
-            dict: Diccionario con las rutas de las imágenes generadas
+            ResultadoProcesamiento: Variantes generadas con sus metadatos. Se comporta
+            como un diccionario {variante: ruta absoluta}
         """
-        results = {}
+        variantes = {}
+        self.timings = {}
         # Usar microsegundos para evitar colisiones entre nombres
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         
         try:
-            # Abrir la imagen original
-            img = Image.open(image_file)
-            
-            # Convertir a RGB si es necesario (para imágenes con transparencia)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Crear fondo blanco
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
+            # Leer los bytes una sola vez: sirven para decodificar y para guardar el original
+            inicio = time.perf_counter()
+            if hasattr(image_file, 'seek'):
+                image_file.seek(0)
+            data = image_file.read()
+            img = Image.open(io.BytesIO(data))
+            self._registrar_tiempo('lectura', inicio)
             
             # Guardar imagen original
             if self.config.get('preserve_original', True):
-                original_path = self._save_original(img, base_path, timestamp, image_file.name)
-                results['original'] = original_path
+                inicio = time.perf_counter()
+                variantes['original'] = self._save_original(data, img, base_path, timestamp, image_file.name)
+                self._registrar_tiempo('original', inicio)
             
-            # Crear miniatura
-            if self.config.get('create_thumbnail', True):
-                thumbnail_path = self._create_thumbnail(img, base_path, timestamp)
-                results['thumbnail'] = thumbnail_path
+            # Decodificar a escala reducida cuando el formato lo permite (JPEG)
+            inicio = time.perf_counter()
+            target = self._largest_variant_size()
+            if target:
+                img.draft(img.mode, target)
+            img.load()
+            img = self._to_rgb(img)
+            if 'original' in variantes:
+                # El hash perceptual del original se calcula sobre la decodificación reducida
+                variantes['original'].phash = self.dhash(img)
+            self._registrar_tiempo('decodificacion', inicio)
             
-            # Crear versión WebP
+            # Crear versión WebP; la miniatura se deriva de ella en lugar del original
             if self.config.get('create_webp', True):
-                webp_path = self._create_webp(img, base_path, timestamp)
-                results['webp'] = webp_path
+                inicio = time.perf_counter()
+                variantes['webp'], img = self._create_webp(img, base_path, timestamp)
+                self._registrar_tiempo('webp', inicio)
+            
+            # Crear miniatura
+            if self.config.get('create_thumbnail', True):
+                inicio = time.perf_counter()
+                variantes['thumbnail'] = self._create_thumbnail(img, base_path, timestamp)
+                self._registrar_tiempo('thumbnail', inicio)
             
-            return results
+            logger.debug(f"Tiempos de procesamiento de {image_file.name}: {self.timings}")
+            return ResultadoProcesamiento(timestamp=timestamp, variantes=variantes, timings=self.timings)
             
         except Exception as e:
             logger.error(f"Error al procesar imagen: {str(e)}")
             raise
     
-    def _save_original(self, img, base_path, timestamp, original_filename):
-        """Guarda la imagen original"""
+    def _registrar_tiempo(self, etapa, inicio):
+        """Registra la duración de una etapa en milisegundos"""
+        self.timings[etapa] = round((time.perf_counter() - inicio) * 1000, 2)
+    
+    def _largest_variant_size(self):
+        """Retorna el tamaño de la versión derivada más grande que se va a generar"""
+        sizes = []
+        if self.config.get('create_webp', True) and self.sizes.get('webp'):
+            sizes.append(self.sizes['webp'])
+        if self.config.get('create_thumbnail', True) and self.sizes.get('thumbnail'):
+            sizes.append(self.sizes['thumbnail'])
+        if not sizes:
+            return None
+        return max(sizes, key=lambda size: size[0] * size[1])
+    
+    @staticmethod
+    def _to_rgb(img):
+        """Convierte a RGB, aplanando la transparencia sobre fondo blanco"""
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Crear fondo blanco
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            return background
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        return img
+    
+    @staticmethod
+    def _fit(img, size):
+        """Reduce la imagen para que quepa en `size` manteniendo la proporción"""
+        if not size or (img.width <= size[0] and img.height <= size[1]):
+            return img
+        ratio = min(size[0] / img.width, size[1] / img.height)
+        new_size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+        return img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    
+    @staticmethod
+    def dhash(img, hash_size=8):
+        """
+        Hash perceptual por diferencias (dHash) de 64 bits en hexadecimal.
+        Imágenes visualmente parecidas producen hashes a poca distancia de Hamming.
+        """
+        gray = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = gray.tobytes()
+        value = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        return f"{value:0{hash_size * hash_size // 4}x}"
+    
+    @staticmethod
+    def _write_variant(filepath, data, size, image_format, phash=None):
+        """Escribe los bytes de una variante y retorna sus metadatos sin volver a leerla"""
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        return VarianteImagen(
+            path=filepath,
+            width=size[0],
+            height=size[1],
+            format=image_format,
+            bytes=len(data),
+            sha256=hashlib.sha256(data).hexdigest(),
+            phash=phash,
+        )
+    
+    @staticmethod
+    def _encode(img, image_format, **params):
+        """Codifica la imagen en memoria"""
+        buffer = io.BytesIO()
+        img.save(buffer, image_format, **params)
+        return buffer.getvalue()
+    
+    def _save_original(self, data, img, base_path, timestamp, original_filename):
+        """Guarda la imagen original, sin recodificar si su formato es aceptado"""
         # Obtener extensión original
         ext = os.path.splitext(original_filename)[1].lower()
         if not ext:
@@ -107,11 +265,17 @@ class ImageProcessor:
         filename = f"original_{timestamp}{ext}"
         filepath = os.path.join(original_folder, filename)
         
-        # Guardar imagen
-        quality = self.quality_settings.get('original', 100)
-        img.save(filepath, quality=quality, optimize=True)
+        passthrough = self.config.get('original_passthrough_formats', ('JPEG', 'PNG', 'WEBP', 'GIF'))
+        if img.format in passthrough:
+            # Guardar los bytes subidos tal cual: sin pérdida y sin coste de CPU
+            image_format = img.format
+        else:
+            image_format = Image.registered_extensions().get(ext, 'JPEG')
+            quality = self.quality_settings.get('original', 100)
+            data = self._encode(self._to_rgb(img), image_format, quality=quality, optimize=True)
         
-        return filepath
+        # Las dimensiones vienen de la cabecera; el hash perceptual se asigna tras decodificar
+        return self._write_variant(filepath, data, img.size, image_format)
     
     def _create_thumbnail(self, img, base_path, timestamp):
         """Crea una miniatura de la imagen"""
@@ -123,8 +287,7 @@ class ImageProcessor:
         os.makedirs(thumbnail_folder, exist_ok=True)
         
         # Crear miniatura
-        thumbnail = img.copy()
-        thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
+        thumbnail = self._fit(img, size)
         
         # Nombre del archivo
         filename = f"miniatura_{timestamp}.jpg"
@@ -132,12 +295,14 @@ class ImageProcessor:
         
         # Guardar miniatura
         quality = self.quality_settings.get('thumbnail', 75)
-        thumbnail.save(filepath, 'JPEG', quality=quality, optimize=True)
-        
-        return filepath
+        data = self._encode(thumbnail, 'JPEG', quality=quality, optimize=True)
+        return self._write_variant(filepath, data, thumbnail.size, 'JPEG', self.dhash(thumbnail))
     
     def _create_webp(self, img, base_path, timestamp):
-        """Crea una versión WebP optimizada"""
+        """
+        Crea una versión WebP optimizada.
+        Retorna la variante y la imagen redimensionada para encadenar la siguiente versión.
+        """
         # Obtener tamaño para WebP
         size = self.sizes.get('webp', (800, 600))
         
@@ -146,9 +311,7 @@ class ImageProcessor:
         os.makedirs(webp_folder, exist_ok=True)
         
         # Redimensionar si es necesario
-        webp_img = img.copy()
-        if size and (img.width > size[0] or img.height > size[1]):
-            webp_img.thumbnail(size, Image.Resampling.LANCZOS)
+        webp_img = self._fit(img, size)
         
         # Nombre del archivo
         filename = f"webp_{timestamp}.webp"
@@ -156,9 +319,8 @@ class ImageProcessor:
         
         # Guardar como WebP
         quality = self.quality_settings.get('webp', 85)
-        webp_img.save(filepath, 'WEBP', quality=quality, optimize=True)
-        
-        return filepath
+        data = self._encode(webp_img, 'WEBP', quality=quality, optimize=True)
+        return self._write_variant(filepath, data, webp_img.size, 'WEBP', self.dhash(webp_img)), webp_img
     
     @staticmethod
     def get_image_versions(base_path, timestamp=None):
@@ -219,4 +381,108 @@ class ImageProcessor:
                 if webps:
                     versions['webp'] = os.path.join(webp_folder, webps[-1])
         
-        return versions
\ No newline at end of file
+        return versions
+    
+    @staticmethod
+    def describe_file(filepath):
+        """
+        Describe un archivo de variante: dimensiones, formato, tamaño y hash de contenido.
+        
+        Args:
+            filepath: Ruta absoluta del archivo generado
+            
+        Returns:
+            dict: Metadatos de la variante con la ruta relativa a MEDIA_ROOT
+        """
+        sha256 = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                sha256.update(chunk)
+        
+        with Image.open(filepath) as img:
+            width, height = img.size
+            image_format = img.format
+            # Para el hash perceptual basta una decodificación reducida
+            img.draft('RGB', (64, 64))
+            phash = ImageProcessor.dhash(ImageProcessor._to_rgb(img))
+        
+        return {
+            'path': os.path.relpath(filepath, settings.MEDIA_ROOT),
+            'width': width,
+            'height': height,
+            'format': image_format,
+            'bytes': os.path.getsize(filepath),
+            'sha256': sha256.hexdigest(),
+            'phash': phash,
+        }
+    
+    @staticmethod
+    def build_manifest(versions):
+        """
+        Construye el manifiesto de variantes generadas para persistirlo junto a la imagen.
+        
+        Args:
+            versions: ResultadoProcesamiento devuelto por process_image, o un
+                diccionario {variante: ruta absoluta} de archivos ya existentes
+            
+        Returns:
+            dict: Manifiesto con el timestamp y los metadatos de cada variante
+        """
+        # El resultado de process_image ya trae los metadatos: no se relee el disco
+        if isinstance(versions, ResultadoProcesamiento):
+            return versions.manifest()
+        
+        variants = {}
+        timestamp = None
+        for name, filepath in versions.items():
+            if not filepath or not os.path.exists(filepath):
+                continue
+            variants[name] = ImageProcessor.describe_file(filepath)
+            if timestamp is None:
+                match = TIMESTAMP_PATTERN.search(os.path.basename(filepath))
+                if match:
+                    timestamp = match.group(1)
+        
+        return {
+            'version': MANIFEST_VERSION,
+            'timestamp': timestamp,
+            'variants': variants,
+        }
+    
+    @staticmethod
+    def manifest_urls(manifest):
+        """
+        Resuelve las URLs de cada variante a partir de un manifiesto, sin acceder al disco.
+        
+        Args:
+            manifest: Manifiesto generado por build_manifest
+            
+        Returns:
+            dict: URLs de original, thumbnail, webp, default y el timestamp
+        """
+        variants = manifest.get('variants', {})
+        urls = {'timestamp': manifest.get('timestamp')}
+        for name in ('original', 'thumbnail', 'webp'):
+            variant = variants.get(name)
+            urls[name] = f"{settings.MEDIA_URL}{variant['path']}" if variant else None
+        urls['default'] = urls['webp'] or urls['thumbnail'] or urls['original']
+        return urls
+    
+    @staticmethod
+    def metadata_from_manifest(manifest):
+        """
+        Metadatos del original (width, height, format, file_size, phash) tomados del manifiesto.
+        
+        Returns:
+            dict: Campos del modelo de imagen a actualizar; vacío si no hay original
+        """
+        original = (manifest or {}).get('variants', {}).get('original')
+        if not original:
+            return {}
+        return {
+            'width': original['width'],
+            'height': original['height'],
+            'format': original['format'],
+            'file_size': original['bytes'],
+            'phash': original.get('phash') or '',
+        }
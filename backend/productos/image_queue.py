@@ -0,0 +1,257 @@
+"""
+Cola de procesamiento de imágenes de productos.
+
+Las subidas se registran como TareaProcesamientoImagen y el comando
+`procesar_imagenes` las consume con un pool de procesos. Las funciones que se
+ejecutan en los procesos hijos no acceden a la base de datos: solo generan las
+versiones y devuelven sus rutas y manifiesto para que el proceso principal
+actualice los registros.
+
+Sin IMAGE_PROCESSING_ASYNC, la subida masiva genera las versiones durante la
+petición con procesar_en_paralelo(), en un pool de un proceso por CPU.
+"""
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_imagen(imagen):
+    """
+    Registra una tarea de procesamiento para una imagen recién subida.
+
+    Args:
+        imagen: ImagenReferenciaProductoOfertado o ImagenProductoDisponible ya guardada
+    """
+    from .models import TareaProcesamientoImagen, ImagenReferenciaProductoOfertado
+
+    if isinstance(imagen, ImagenReferenciaProductoOfertado):
+        kwargs = {'imagen_ofertado': imagen}
+        base_path = f'productos/productosofertados/imagenes/{imagen.producto_ofertado.code}'
+    else:
+        kwargs = {'imagen_disponible': imagen}
+        base_path = f'productos/productosdisponibles/imagenes/{imagen.producto_disponible.code}'
+
+    tarea = TareaProcesamientoImagen.objects.create(
+        archivo_origen=imagen.imagen.name,
+        base_path=base_path,
+        **kwargs
+    )
+    logger.info(f"Imagen {imagen.pk} encolada para procesamiento (tarea {tarea.pk})")
+    return tarea
+
+
+def reclamar_tareas(limite):
+    """
+    Toma hasta `limite` tareas pendientes y las marca como en proceso.
+    Usa SKIP LOCKED para que varios workers no reclamen la misma tarea.
+
+    Returns:
+        list: Tareas reclamadas
+    """
+    from .models import TareaProcesamientoImagen
+
+    with transaction.atomic():
+        tareas = list(
+            TareaProcesamientoImagen.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado='pendiente')
+            .order_by('created_at')[:limite]
+        )
+        if not tareas:
+            return []
+
+        ids = [tarea.pk for tarea in tareas]
+        ahora = timezone.now()
+        TareaProcesamientoImagen.objects.filter(pk__in=ids).update(
+            estado='procesando',
+            iniciado_en=ahora,
+            intentos=F('intentos') + 1,
+        )
+        _actualizar_estado_imagenes(tareas, 'procesando')
+
+    for tarea in tareas:
+        tarea.estado = 'procesando'
+        tarea.iniciado_en = ahora
+        tarea.intentos += 1
+    return tareas
+
+
+def recuperar_tareas_bloqueadas(minutos=30):
+    """
+    Devuelve a pendiente las tareas que quedaron en proceso por la caída de un worker.
+
+    Returns:
+        int: Cantidad de tareas recuperadas
+    """
+    from .models import TareaProcesamientoImagen
+
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TareaProcesamientoImagen.objects.filter(
+        estado='procesando',
+        iniciado_en__lt=limite,
+    ).update(estado='pendiente')
+
+
+def inicializar_worker():
+    """Inicializa Django en cada proceso hijo del pool"""
+    import django
+    django.setup()
+
+
+def generar_versiones(archivo_origen, base_path, media_root=None):
+    """
+    Genera las versiones de una imagen. Se ejecuta en un proceso hijo.
+
+    Args:
+        archivo_origen: Ruta de la imagen subida relativa a MEDIA_ROOT
+        base_path: Carpeta de versiones del producto relativa a MEDIA_ROOT
+        media_root: MEDIA_ROOT del proceso que encarga el trabajo (por defecto el de settings)
+
+    Returns:
+        dict: Rutas absolutas de las versiones, su manifiesto y el SHA-256 de la subida
+    """
+    from .image_processor import ImageProcessor
+    from .blob_store import calcular_sha256
+
+    media_root = media_root or settings.MEDIA_ROOT
+    processor = ImageProcessor()
+    full_base_path = os.path.join(media_root, base_path)
+    with open(os.path.join(media_root, archivo_origen), 'rb') as image_file:
+        sha256 = calcular_sha256(image_file)
+        versions = processor.process_image(image_file, full_base_path)
+
+    return {
+        'versions': versions,
+        'manifest': processor.build_manifest(versions),
+        'sha256': sha256,
+    }
+
+
+def procesar_en_paralelo(trabajos):
+    """
+    Genera las versiones de varias imágenes en un pool de un proceso por CPU.
+    Un solo trabajo se procesa en el mismo proceso.
+
+    Args:
+        trabajos: {clave: (archivo_origen, base_path)}
+
+    Returns:
+        dict: {clave: resultado de generar_versiones, o la excepción que lo impidió}
+    """
+    media_root = settings.MEDIA_ROOT
+    resultados = {}
+    if len(trabajos) <= 1:
+        for clave, (archivo_origen, base_path) in trabajos.items():
+            try:
+                resultados[clave] = generar_versiones(archivo_origen, base_path, media_root)
+            except Exception as e:
+                resultados[clave] = e
+        return resultados
+
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(trabajos)), mp_context=contexto,
+                             initializer=inicializar_worker) as pool:
+        futuros = {
+            pool.submit(generar_versiones, archivo_origen, base_path, media_root): clave
+            for clave, (archivo_origen, base_path) in trabajos.items()
+        }
+        for futuro in as_completed(futuros):
+            try:
+                resultados[futuros[futuro]] = futuro.result()
+            except Exception as e:
+                resultados[futuros[futuro]] = e
+    return resultados
+
+
+def aplicar_resultado(tarea, resultado):
+    """
+    Persiste las versiones generadas en la imagen y da la tarea por completada.
+
+    Args:
+        tarea: TareaProcesamientoImagen reclamada
+        resultado: Diccionario devuelto por generar_versiones
+    """
+    media_root = settings.MEDIA_ROOT
+    versions = resultado['versions']
+    manifest = resultado['manifest']
+    imagen = tarea.imagen
+
+    if imagen is not None:
+        if 'original' in versions:
+            imagen.imagen_original = os.path.relpath(versions['original'], media_root)
+        if 'thumbnail' in versions:
+            imagen.imagen_thumbnail = os.path.relpath(versions['thumbnail'], media_root)
+        if 'webp' in versions:
+            imagen.imagen_webp = os.path.relpath(versions['webp'], media_root)
+        imagen.manifest = manifest
+
+        # Usar preferiblemente la versión WebP como imagen principal
+        imagen.imagen = imagen.imagen_webp or imagen.imagen_thumbnail or imagen.imagen_original
+
+        from .image_processor import ImageProcessor
+        for campo, valor in ImageProcessor.metadata_from_manifest(manifest).items():
+            setattr(imagen, campo, valor)
+
+        # Registrar el contenido para que las próximas subidas idénticas no se procesen
+        from .blob_store import registrar_blob_imagen
+        registrar_blob_imagen(imagen, resultado.get('sha256'))
+
+        imagen.estado_procesamiento = 'completado'
+        imagen.save(update_fields=[
+            'imagen', 'imagen_original', 'imagen_thumbnail', 'imagen_webp', 'manifest',
+            'width', 'height', 'format', 'file_size', 'phash', 'estado_procesamiento', 'blob', 'updated_at',
+        ])
+
+    tarea.estado = 'completado'
+    tarea.mensaje = ''
+    tarea.finalizado_en = timezone.now()
+    tarea.save(update_fields=['estado', 'mensaje', 'finalizado_en', 'updated_at'])
+
+    # La subida temporal ya no es necesaria
+    if tarea.archivo_origen.startswith('temp/') and default_storage.exists(tarea.archivo_origen):
+        default_storage.delete(tarea.archivo_origen)
+
+
+def registrar_error(tarea, mensaje):
+    """
+    Registra el fallo de una tarea. Vuelve a pendiente mientras queden intentos.
+
+    Args:
+        tarea: TareaProcesamientoImagen reclamada
+        mensaje: Descripción del error
+    """
+    max_intentos = getattr(settings, 'IMAGE_PROCESSING_MAX_ATTEMPTS', 3)
+    logger.error(f"Error en tarea de imagen {tarea.pk} (intento {tarea.intentos}): {mensaje}")
+
+    tarea.mensaje = mensaje
+    if tarea.intentos < max_intentos:
+        tarea.estado = 'pendiente'
+    else:
+        tarea.estado = 'error'
+        tarea.finalizado_en = timezone.now()
+    tarea.save(update_fields=['estado', 'mensaje', 'finalizado_en', 'updated_at'])
+
+    estado_imagen = 'pendiente' if tarea.estado == 'pendiente' else 'error'
+    _actualizar_estado_imagenes([tarea], estado_imagen)
+
+
+def _actualizar_estado_imagenes(tareas, estado):
+    """Actualiza el estado de procesamiento de las imágenes de varias tareas"""
+    from .models import ImagenReferenciaProductoOfertado, ImagenProductoDisponible
+
+    ofertados = [t.imagen_ofertado_id for t in tareas if t.imagen_ofertado_id]
+    disponibles = [t.imagen_disponible_id for t in tareas if t.imagen_disponible_id]
+    if ofertados:
+        ImagenReferenciaProductoOfertado.objects.filter(pk__in=ofertados).update(estado_procesamiento=estado)
+    if disponibles:
+        ImagenProductoDisponible.objects.filter(pk__in=disponibles).update(estado_procesamiento=estado)
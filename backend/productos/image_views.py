@@ -1,10 +1,14 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, FileResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from .models import ProductoOfertado, ProductoDisponible, ImagenReferenciaProductoOfertado, ImagenProductoDisponible
 from .image_processor import ImageProcessor
+from .throttling import ProductsUploadThrottle
+from .responsive_images import ResponsiveImageCache, ResponsiveImageError, FORMATOS
 import json
 import logging
 
@@ -58,6 +62,17 @@ def upload_product_image(request, product_id, product_type='ofertado'):
         # Guardar - el procesamiento se hace automáticamente en el método save()
         imagen.save()
         
+        # Con procesamiento asíncrono las versiones se generan en segundo plano
+        if imagen.estado_procesamiento in ('pendiente', 'procesando'):
+            return JsonResponse({
+                'id': imagen.id,
+                'titulo': imagen.titulo,
+                'descripcion': imagen.descripcion,
+                'orden': imagen.orden,
+                'is_primary': imagen.is_primary,
+                'estado_procesamiento': imagen.estado_procesamiento,
+            }, status=202)
+        
         # Verificar que se hayan guardado correctamente las rutas de imagen
         if not imagen.imagen_webp or not imagen.imagen_original or not imagen.imagen_thumbnail:
             logger.error(f"Imagen guardada pero faltan rutas: webp={imagen.imagen_webp}, original={imagen.imagen_original}, thumbnail={imagen.imagen_thumbnail}")
@@ -89,9 +104,10 @@ def upload_product_image(request, product_id, product_type='ofertado'):
                 imagen.imagen_thumbnail = os.path.relpath(versions['thumbnail'], media_root)
             if 'webp' in versions:
                 imagen.imagen_webp = os.path.relpath(versions['webp'], media_root)
+            imagen.manifest = processor.build_manifest(versions)
             
             # Guardar el modelo actualizado
-            imagen.save(update_fields=['imagen_original', 'imagen_thumbnail', 'imagen_webp'])
+            imagen.save(update_fields=['imagen_original', 'imagen_thumbnail', 'imagen_webp', 'manifest'])
         
         # Extraer el timestamp para la consistencia entre versiones
         timestamp = imagen.extract_timestamp()
@@ -103,6 +119,7 @@ def upload_product_image(request, product_id, product_type='ofertado'):
             'descripcion': imagen.descripcion,
             'orden': imagen.orden,
             'is_primary': imagen.is_primary,
+            'estado_procesamiento': imagen.estado_procesamiento,
             'urls': imagen.get_version_urls(),
             'imagen_original': imagen.imagen_original,
             'imagen_thumbnail': imagen.imagen_thumbnail,
@@ -150,6 +167,7 @@ def get_product_images(request, product_id, product_type='ofertado'):
                 'descripcion': imagen.descripcion,
                 'orden': imagen.orden,
                 'is_primary': imagen.is_primary,
+                'estado_procesamiento': imagen.estado_procesamiento,
                 'urls': imagen.get_version_urls(),
                 'metadata': {
                     'width': imagen.width,
@@ -159,7 +177,10 @@ def get_product_images(request, product_id, product_type='ofertado'):
                 }
             })
         
-        return JsonResponse({'images': images_data})
+        # Permite al frontend seguir consultando mientras haya versiones en proceso
+        procesando = any(img['estado_procesamiento'] in ('pendiente', 'procesando') for img in images_data)
+        
+        return JsonResponse({'images': images_data, 'procesando': procesando})
         
     except (ProductoOfertado.DoesNotExist, ProductoDisponible.DoesNotExist):
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
@@ -229,4 +250,338 @@ def update_image_order(request, product_id, product_type='ofertado'):
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
     except Exception as e:
         logger.error(f"Error al actualizar orden: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+class ImagenRenderer(BaseRenderer):
+    """Permite que la negociación de DRF acepte peticiones con Accept: image/*"""
+    media_type = 'image/*'
+    format = 'imagen'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, ImagenRenderer])
+def get_responsive_image(request, image_id, product_type='ofertado'):
+    """
+    Sirve una imagen de producto en el ancho y formato solicitados.
+    Parámetros: ?ancho=320&formato=webp|avif|jpeg (sin formato se negocia con Accept).
+    Las versiones se generan bajo demanda y se guardan en una caché en disco.
+    """
+    try:
+        if product_type == 'ofertado':
+            imagen = ImagenReferenciaProductoOfertado.objects.get(pk=image_id)
+        else:
+            imagen = ImagenProductoDisponible.objects.get(pk=image_id)
+        
+        cache = ResponsiveImageCache()
+        formato_explicito = request.GET.get('formato')
+        formato = cache.negociar_formato(formato_explicito, request.META.get('HTTP_ACCEPT'))
+        ancho = cache.ajustar_ancho(request.GET.get('ancho', cache.widths[-1]))
+        
+        source_path = cache.ruta_origen(imagen)
+        if not source_path:
+            return JsonResponse({'error': 'La imagen original no está disponible'}, status=404)
+        
+        clave = cache.clave(cache.huella_origen(imagen, source_path), ancho, formato)
+        etag = f'"{clave}"'
+        max_age = cache.config.get('max_age', 31536000)
+        
+        def agregar_cabeceras(response):
+            response['ETag'] = etag
+            response['Cache-Control'] = f'{cache.config.get("cache_control", "private")}, max-age={max_age}, immutable'
+            if not formato_explicito:
+                response['Vary'] = 'Accept'
+            return response
+        
+        # Responder 304 sin tocar el disco si el cliente ya tiene esta versión
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in [valor.strip() for valor in if_none_match.split(',')]:
+            return agregar_cabeceras(HttpResponseNotModified())
+        
+        path = cache.obtener(source_path, clave, ancho, formato)
+        response = FileResponse(open(path, 'rb'), content_type=FORMATOS[formato][1])
+        return agregar_cabeceras(response)
+        
+    except (ImagenReferenciaProductoOfertado.DoesNotExist, ImagenProductoDisponible.DoesNotExist):
+        return JsonResponse({'error': 'Imagen no encontrada'}, status=404)
+    except ResponsiveImageError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error al generar imagen responsiva: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ProductsUploadThrottle])
+def bulk_upload_product_images(request, product_type='ofertado'):
+    """
+    Sube varias imágenes para uno o más productos en una sola petición multipart.
+    
+    Campos:
+        images: archivos (repetido)
+        product_ids: id del producto de cada archivo (repetido, mismo orden que images)
+                     o product_id: un único producto para todos los archivos
+        metadata: opcional, lista JSON con titulo/descripcion/orden/is_primary por archivo
+    
+    Las imágenes idénticas a otras ya procesadas reutilizan sus versiones. Con
+    IMAGE_PROCESSING_ASYNC, el contenido nuevo se guarda en temp/uploads y se
+    encola (ver image_queue.py): la petición responde 202 y el worker
+    `procesar_imagenes` genera las versiones. Sin él, cada contenido distinto se
+    procesa una vez en un pool de procesos y la petición responde 201 con las
+    imágenes completas. Todas las filas se insertan con un único bulk_create.
+    Se devuelve el resultado de cada archivo con el id y el estado de la imagen.
+    """
+    from django.core.files.storage import default_storage
+    from django.db import connection, transaction
+    from django.db.models import Max
+    from .blob_store import calcular_sha256, registrar_blob, aplicar_blob_imagen
+    from .models import ArchivoContenido, TareaProcesamientoImagen
+    from . import image_queue
+    import os
+    import uuid
+    
+    if product_type == 'ofertado':
+        ProductModel, ImageModel, fk_name = ProductoOfertado, ImagenReferenciaProductoOfertado, 'producto_ofertado'
+        type_folder = 'productosofertados'
+        tarea_fk = 'imagen_ofertado'
+    else:
+        ProductModel, ImageModel, fk_name = ProductoDisponible, ImagenProductoDisponible, 'producto_disponible'
+        type_folder = 'productosdisponibles'
+        tarea_fk = 'imagen_disponible'
+    
+    archivos = request.FILES.getlist('images')
+    if not archivos:
+        return JsonResponse({'error': 'No se proporcionó ninguna imagen'}, status=400)
+    max_files = getattr(settings, 'IMAGE_BULK_UPLOAD_MAX_FILES', 50)
+    if len(archivos) > max_files:
+        return JsonResponse({'error': f'Se permiten como máximo {max_files} imágenes por petición'}, status=400)
+    
+    # Producto de cada archivo
+    product_ids = request.POST.getlist('product_ids')
+    if not product_ids and request.POST.get('product_id'):
+        product_ids = [request.POST.get('product_id')] * len(archivos)
+    if len(product_ids) != len(archivos):
+        return JsonResponse({'error': 'Debe indicarse un producto por cada imagen'}, status=400)
+    try:
+        product_ids = [int(pid) for pid in product_ids]
+        metadata = json.loads(request.POST.get('metadata') or '[]')
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'product_ids o metadata con formato inválido'}, status=400)
+    if not isinstance(metadata, list):
+        return JsonResponse({'error': 'metadata debe ser una lista'}, status=400)
+    
+    # Metadatos de cada archivo, validados antes de guardar nada
+    metadatos = []
+    for index in range(len(archivos)):
+        meta = metadata[index] if index < len(metadata) and isinstance(metadata[index], dict) else {}
+        if meta.get('orden') not in (None, ''):
+            try:
+                meta = {**meta, 'orden': int(meta['orden'])}
+            except (TypeError, ValueError):
+                return JsonResponse({'error': f'metadata[{index}].orden debe ser un número entero'}, status=400)
+        else:
+            meta = {**meta, 'orden': None}
+        metadatos.append(meta)
+    
+    productos = ProductModel.objects.in_bulk(set(product_ids))
+    
+    # Siguiente orden disponible por producto, con una sola consulta
+    siguiente_orden = {
+        fila[fk_name]: (fila['max_orden'] if fila['max_orden'] is not None else -1) + 1
+        for fila in ImageModel.objects.filter(**{f'{fk_name}__in': list(productos)})
+        .values(fk_name).annotate(max_orden=Max('orden'))
+    }
+    
+    # Preparar cada archivo: hash, producto y metadatos
+    resultados = []
+    entradas = []
+    for index, archivo in enumerate(archivos):
+        producto = productos.get(product_ids[index])
+        resultado = {'index': index, 'filename': archivo.name, 'product_id': product_ids[index]}
+        resultados.append(resultado)
+        if producto is None:
+            resultado.update({'status': 'error', 'error': 'Producto no encontrado'})
+            continue
+        
+        meta = metadatos[index]
+        orden = meta['orden']
+        if orden is None:
+            orden = siguiente_orden.get(producto.pk, 0)
+            siguiente_orden[producto.pk] = orden + 1
+        entradas.append({
+            'index': index,
+            'resultado': resultado,
+            'archivo': archivo,
+            'producto': producto,
+            'sha256': calcular_sha256(archivo),
+            'titulo': meta.get('titulo', ''),
+            'descripcion': meta.get('descripcion', ''),
+            'orden': orden,
+            'is_primary': str(meta.get('is_primary', False)).lower() == 'true',
+        })
+    
+    # Contenido ya procesado anteriormente: se reutiliza sin procesar
+    blobs = {
+        blob.sha256: blob
+        for blob in ArchivoContenido.objects.filter(
+            tipo='imagen', sha256__in={entrada['sha256'] for entrada in entradas}
+        )
+        if (blob.manifest or {}).get('variants')
+        and os.path.exists(os.path.join(settings.MEDIA_ROOT, blob.ruta))
+    }
+    
+    # El contenido nuevo queda en temp/uploads: un archivo por imagen si se encola,
+    # porque cada tarea borra el suyo al terminar, o uno por contenido si se procesa aquí
+    asincrono = getattr(settings, 'IMAGE_PROCESSING_ASYNC', False)
+    token = uuid.uuid4().hex[:12]
+    temporales = []
+    errores = {}
+    procesados = set()
+    if not asincrono:
+        trabajos = {}
+        for entrada in entradas:
+            sha256 = entrada['sha256']
+            if sha256 in blobs or sha256 in trabajos:
+                continue
+            archivo_origen = default_storage.save(
+                f"temp/uploads/{token}_{entrada['index']}_{entrada['archivo'].name}", entrada['archivo']
+            )
+            temporales.append(archivo_origen)
+            trabajos[sha256] = (archivo_origen, f"productos/{type_folder}/imagenes/{entrada['producto'].code}")
+        try:
+            for sha256, resultado in image_queue.procesar_en_paralelo(trabajos).items():
+                if isinstance(resultado, Exception):
+                    logger.error(f"Error al procesar imagen en subida masiva: {str(resultado)}")
+                    errores[sha256] = str(resultado)
+                    continue
+                versions = resultado['versions']
+                original = resultado['manifest']['variants'].get('original', {})
+                procesados.add(sha256)
+                blobs[sha256] = registrar_blob(
+                    sha256, 'imagen',
+                    os.path.relpath(versions['original'], settings.MEDIA_ROOT) if 'original' in versions else '',
+                    original.get('bytes'), resultado['manifest']
+                )
+        finally:
+            for archivo_origen in temporales:
+                default_storage.delete(archivo_origen)
+        temporales = []
+    
+    # Construir todas las filas en memoria
+    nuevas = []
+    for entrada in entradas:
+        sha256 = entrada['sha256']
+        if sha256 in errores:
+            entrada['resultado'].update({'status': 'error', 'error': errores[sha256]})
+            continue
+        producto = entrada['producto']
+        imagen = ImageModel(**{
+            fk_name: producto,
+            'titulo': entrada['titulo'] or f"Imagen {entrada['orden'] + 1} - {producto.nombre}",
+            'descripcion': entrada['descripcion'],
+            'alt_text': f"{producto.nombre} - {entrada['descripcion'] or 'Imagen del producto'}",
+            'orden': entrada['orden'],
+            'is_primary': entrada['is_primary'],
+            'created_by': request.user,
+        })
+        blob = blobs.get(sha256)
+        if blob is not None:
+            aplicar_blob_imagen(imagen, blob)
+            # Solo la primera aparición de un contenido recién procesado cuenta como creada
+            if sha256 in procesados:
+                procesados.discard(sha256)
+                entrada['resultado']['status'] = 'creado'
+            else:
+                entrada['resultado']['status'] = 'reutilizado'
+        else:
+            archivo_origen = default_storage.save(
+                f"temp/uploads/{token}_{entrada['index']}_{entrada['archivo'].name}", entrada['archivo']
+            )
+            temporales.append(archivo_origen)
+            imagen.imagen = archivo_origen
+            imagen.estado_procesamiento = 'pendiente'
+            entrada['resultado']['status'] = 'encolado'
+        entrada['imagen'] = imagen
+        nuevas.append(entrada)
+    
+    # Solo puede quedar una imagen principal por producto: la última marcada
+    principales = {}
+    for entrada in nuevas:
+        if entrada['is_primary']:
+            if entrada['producto'].pk in principales:
+                principales[entrada['producto'].pk]['imagen'].is_primary = False
+            principales[entrada['producto'].pk] = entrada
+    
+    # MySQL no devuelve las claves de bulk_create: cada fila se inserta con una ruta
+    # única de esta petición, se leen las claves por esa ruta y luego se le asigna
+    # la ruta definitiva con un solo UPDATE
+    devuelve_claves = connection.features.can_return_rows_from_bulk_insert
+    definitivas = {}
+    if not devuelve_claves:
+        for entrada in nuevas:
+            imagen = entrada['imagen']
+            if entrada['resultado']['status'] == 'encolado':
+                clave = imagen.imagen.name
+            else:
+                clave = f"temp/uploads/{token}_{entrada['index']}"
+            definitivas[clave] = imagen.imagen.name
+            imagen.imagen = clave
+    
+    try:
+        with transaction.atomic():
+            if principales:
+                ImageModel.objects.filter(
+                    **{f'{fk_name}__in': list(principales)}, is_primary=True
+                ).update(is_primary=False)
+            ImageModel.objects.bulk_create([entrada['imagen'] for entrada in nuevas])
+            if not devuelve_claves and definitivas:
+                claves = dict(ImageModel.objects.filter(imagen__in=list(definitivas)).values_list('imagen', 'pk'))
+                cambiadas = []
+                for entrada in nuevas:
+                    imagen = entrada['imagen']
+                    clave = imagen.imagen.name
+                    imagen.pk = claves[clave]
+                    if definitivas[clave] != clave:
+                        imagen.imagen = definitivas[clave]
+                        cambiadas.append(imagen)
+                if cambiadas:
+                    ImageModel.objects.bulk_update(cambiadas, ['imagen'])
+            TareaProcesamientoImagen.objects.bulk_create([
+                TareaProcesamientoImagen(**{
+                    tarea_fk: entrada['imagen'],
+                    'archivo_origen': entrada['imagen'].imagen.name,
+                    'base_path': f"productos/{type_folder}/imagenes/{entrada['producto'].code}",
+                })
+                for entrada in nuevas if entrada['resultado']['status'] == 'encolado'
+            ])
+    except Exception:
+        for archivo_origen in temporales:
+            default_storage.delete(archivo_origen)
+        raise
+    
+    for entrada in nuevas:
+        imagen = entrada['imagen']
+        entrada['resultado'].update({
+            'id': imagen.pk,
+            'orden': imagen.orden,
+            'is_primary': imagen.is_primary,
+            'estado_procesamiento': imagen.estado_procesamiento,
+            'urls': imagen.get_version_urls() if imagen.estado_procesamiento == 'completado' else None,
+        })
+    
+    creados = len(nuevas)
+    encolados = len(temporales)
+    if encolados:
+        logger.info(f"Subida masiva: {encolados} imágenes encoladas para procesamiento")
+    status = 202 if encolados else (201 if creados else 400)
+    return JsonResponse({
+        'created': creados,
+        'queued': encolados,
+        'failed': len(resultados) - creados,
+        'results': resultados,
+    }, status=status)
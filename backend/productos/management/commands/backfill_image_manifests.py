@@ -0,0 +1,104 @@
+"""
+Comando para generar el manifiesto de versiones de las imágenes existentes,
+de modo que get_version_urls no necesite escanear directorios.
+"""
+
+import os
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from productos.image_processor import ImageProcessor
+from productos.models import ImagenReferenciaProductoOfertado, ImagenProductoDisponible
+
+
+class Command(BaseCommand):
+    help = 'Genera el manifiesto de versiones para las imágenes de productos existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Simula la generación sin guardar cambios',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenera también los manifiestos ya existentes',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Cantidad de imágenes actualizadas por consulta',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.force = options['force']
+        self.batch_size = options['batch_size']
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('MODO DRY RUN - No se harán cambios reales'))
+
+        self.backfill(ImagenReferenciaProductoOfertado, 'producto_ofertado', 'productosofertados')
+        self.backfill(ImagenProductoDisponible, 'producto_disponible', 'productosdisponibles')
+
+        self.stdout.write(self.style.SUCCESS('Manifiestos generados exitosamente'))
+
+    def backfill(self, model, product_field, type_folder):
+        """Genera los manifiestos faltantes de un modelo de imagen"""
+        self.stdout.write(f'Procesando {model._meta.verbose_name_plural}...')
+
+        imagenes = model.objects.select_related(product_field).order_by('pk')
+        if not self.force:
+            imagenes = imagenes.filter(manifest={})
+
+        pending = []
+        updated = 0
+        skipped = 0
+        for imagen in imagenes.iterator(chunk_size=self.batch_size):
+            versions = self._resolve_versions(imagen, product_field, type_folder)
+            if not versions:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f'Sin archivos para imagen {imagen.pk}'))
+                continue
+
+            imagen.manifest = ImageProcessor.build_manifest(versions)
+            pending.append(imagen)
+            updated += 1
+
+            if len(pending) >= self.batch_size:
+                self._flush(model, pending)
+                pending = []
+
+        self._flush(model, pending)
+        self.stdout.write(f'  {updated} actualizadas, {skipped} sin archivos')
+
+    def _resolve_versions(self, imagen, product_field, type_folder):
+        """Obtiene las rutas absolutas de las versiones de una imagen"""
+        media_root = settings.MEDIA_ROOT
+        versions = {}
+        stored = {
+            'original': imagen.imagen_original,
+            'thumbnail': imagen.imagen_thumbnail,
+            'webp': imagen.imagen_webp,
+        }
+        for name, relative_path in stored.items():
+            if relative_path and os.path.exists(os.path.join(media_root, relative_path)):
+                versions[name] = os.path.join(media_root, relative_path)
+
+        # Completar con un escaneo por timestamp las versiones no registradas en la fila
+        if len(versions) < len(stored):
+            timestamp = imagen.extract_timestamp()
+            if timestamp:
+                codigo = getattr(imagen, product_field).code
+                base_path = os.path.join(media_root, 'productos', type_folder, 'imagenes', codigo)
+                for name, path in ImageProcessor.get_image_versions(base_path, timestamp).items():
+                    versions.setdefault(name, path)
+
+        return versions
+
+    def _flush(self, model, imagenes):
+        """Persiste un lote de manifiestos con una sola consulta"""
+        if not imagenes or self.dry_run:
+            return
+        model.objects.bulk_update(imagenes, ['manifest'])
@@ -0,0 +1,223 @@
+"""
+Comando para agrupar las imágenes y documentos de productos con contenido
+idéntico en un único archivo direccionado por SHA-256 (ArchivoContenido) y
+eliminar las copias que quedan sin referencias bajo media/productos.
+"""
+
+import os
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from productos.blob_store import (
+    calcular_sha256_ruta, registrar_blob, aplicar_blob_imagen
+)
+from productos.image_processor import ImageProcessor
+from productos.models import (
+    ArchivoContenido,
+    ImagenReferenciaProductoOfertado,
+    ImagenProductoDisponible,
+    DocumentoProductoOfertado,
+    DocumentoProductoDisponible
+)
+
+CAMPOS_IMAGEN = ['imagen', 'imagen_original', 'imagen_thumbnail', 'imagen_webp']
+
+
+class Command(BaseCommand):
+    help = 'Agrupa imágenes y documentos duplicados de productos por SHA-256'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Simula la deduplicación sin guardar cambios ni borrar archivos',
+        )
+        parser.add_argument(
+            '--keep-files',
+            action='store_true',
+            help='No elimina las copias duplicadas del disco',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Cantidad de registros actualizados por consulta',
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.keep_files = options['keep_files']
+        self.batch_size = options['batch_size']
+        self.media_root = str(settings.MEDIA_ROOT)
+        self.candidatos = set()
+
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING('MODO DRY RUN - No se harán cambios reales'))
+
+        # Los hashes se comparten entre ambos modelos de imagen y de documento
+        blobs_imagen = {}
+        self.deduplicar_imagenes(ImagenReferenciaProductoOfertado, blobs_imagen)
+        self.deduplicar_imagenes(ImagenProductoDisponible, blobs_imagen)
+
+        blobs_documento = {}
+        self.deduplicar_documentos(DocumentoProductoOfertado, blobs_documento)
+        self.deduplicar_documentos(DocumentoProductoDisponible, blobs_documento)
+
+        if not self.keep_files:
+            self.eliminar_copias()
+
+        self.stdout.write(self.style.SUCCESS('Deduplicación completada exitosamente'))
+
+    def _ruta_absoluta(self, relative_path):
+        """Ruta absoluta de un archivo existente, o None"""
+        if not relative_path:
+            return None
+        full_path = os.path.join(self.media_root, relative_path)
+        return full_path if os.path.isfile(full_path) else None
+
+    def _sha_imagen(self, imagen):
+        """SHA-256 del original de una imagen, tomado del manifiesto si está disponible"""
+        original = (imagen.manifest or {}).get('variants', {}).get('original')
+        if original and original.get('sha256') and original.get('path') == imagen.imagen_original:
+            return original['sha256']
+        full_path = self._ruta_absoluta(imagen.imagen_original)
+        return calcular_sha256_ruta(full_path) if full_path else None
+
+    def _blob_para_imagen(self, imagen, sha256):
+        """Registra una imagen como contenido canónico de su hash"""
+        manifest = imagen.manifest
+        if not (manifest or {}).get('variants'):
+            versions = {}
+            for name, field in (('original', 'imagen_original'), ('thumbnail', 'imagen_thumbnail'),
+                                ('webp', 'imagen_webp')):
+                full_path = self._ruta_absoluta(getattr(imagen, field))
+                if full_path:
+                    versions[name] = full_path
+            manifest = ImageProcessor.build_manifest(versions)
+        if self.dry_run:
+            return ArchivoContenido(sha256=sha256, tipo='imagen', ruta=imagen.imagen_original,
+                                    tamano=imagen.file_size or 0, manifest=manifest)
+        return registrar_blob(sha256, 'imagen', imagen.imagen_original, imagen.file_size, manifest)
+
+    def deduplicar_imagenes(self, model, blobs):
+        """Apunta las imágenes con el mismo original a las versiones de la primera"""
+        self.stdout.write(f'Procesando {model._meta.verbose_name_plural}...')
+
+        existentes = ArchivoContenido.objects.filter(tipo='imagen')
+        for blob in existentes.iterator(chunk_size=self.batch_size):
+            blobs.setdefault(blob.sha256, blob)
+
+        pending = []
+        plegadas = 0
+        for imagen in model.objects.exclude(imagen_original='').order_by('pk').iterator(chunk_size=self.batch_size):
+            sha256 = self._sha_imagen(imagen)
+            if not sha256:
+                continue
+
+            blob = blobs.get(sha256)
+            if blob is None:
+                blob = blobs[sha256] = self._blob_para_imagen(imagen, sha256)
+                if imagen.blob_id != blob.pk:
+                    imagen.blob = blob
+                    pending.append(imagen)
+            elif imagen.imagen_original != blob.ruta:
+                self.candidatos.update(getattr(imagen, field) and str(getattr(imagen, field))
+                                       for field in CAMPOS_IMAGEN)
+                aplicar_blob_imagen(imagen, blob)
+                pending.append(imagen)
+                plegadas += 1
+            elif imagen.blob_id != blob.pk:
+                imagen.blob = blob
+                pending.append(imagen)
+
+            if len(pending) >= self.batch_size:
+                self._flush(model, pending, CAMPOS_IMAGEN + [
+                    'manifest', 'width', 'height', 'format', 'file_size', 'phash', 'blob'])
+                pending = []
+
+        self._flush(model, pending, CAMPOS_IMAGEN + [
+            'manifest', 'width', 'height', 'format', 'file_size', 'phash', 'blob'])
+        self.stdout.write(f'  {plegadas} imágenes duplicadas reutilizan versiones existentes')
+
+    def deduplicar_documentos(self, model, blobs):
+        """Apunta los documentos con el mismo contenido al archivo del primero"""
+        self.stdout.write(f'Procesando {model._meta.verbose_name_plural}...')
+
+        for blob in ArchivoContenido.objects.filter(tipo='documento').iterator(chunk_size=self.batch_size):
+            blobs.setdefault(blob.sha256, blob)
+
+        pending = []
+        plegados = 0
+        for documento in model.objects.order_by('pk').iterator(chunk_size=self.batch_size):
+            full_path = self._ruta_absoluta(documento.documento.name)
+            if not full_path:
+                continue
+            sha256 = calcular_sha256_ruta(full_path)
+
+            blob = blobs.get(sha256)
+            if blob is None:
+                tamano = os.path.getsize(full_path)
+                if self.dry_run:
+                    blob = ArchivoContenido(sha256=sha256, tipo='documento', ruta=documento.documento.name, tamano=tamano)
+                else:
+                    blob = registrar_blob(sha256, 'documento', documento.documento.name, tamano)
+                blobs[sha256] = blob
+                if documento.blob_id != blob.pk:
+                    documento.blob = blob
+                    pending.append(documento)
+            elif documento.documento.name != blob.ruta:
+                self.candidatos.add(documento.documento.name)
+                documento.documento = blob.ruta
+                documento.blob = blob
+                pending.append(documento)
+                plegados += 1
+            elif documento.blob_id != blob.pk:
+                documento.blob = blob
+                pending.append(documento)
+
+            if len(pending) >= self.batch_size:
+                self._flush(model, pending, ['documento', 'blob'])
+                pending = []
+
+        self._flush(model, pending, ['documento', 'blob'])
+        self.stdout.write(f'  {plegados} documentos duplicados reutilizan un archivo existente')
+
+    def _flush(self, model, registros, campos):
+        """Persiste un lote de registros con una sola consulta"""
+        if not registros or self.dry_run:
+            return
+        model.objects.bulk_update(registros, campos)
+
+    def _rutas_referenciadas(self):
+        """Todas las rutas de media que siguen referenciadas por algún registro"""
+        referenciadas = set()
+        for model in (ImagenReferenciaProductoOfertado, ImagenProductoDisponible):
+            for fila in model.objects.values_list(*CAMPOS_IMAGEN).iterator():
+                referenciadas.update(fila)
+        for model in (DocumentoProductoOfertado, DocumentoProductoDisponible):
+            referenciadas.update(model.objects.values_list('documento', flat=True).iterator())
+        referenciadas.update(ArchivoContenido.objects.values_list('ruta', flat=True).iterator())
+        return referenciadas
+
+    def eliminar_copias(self):
+        """Elimina del disco las copias duplicadas que ya nadie referencia"""
+        if not self.candidatos:
+            return
+
+        referenciadas = set() if self.dry_run else self._rutas_referenciadas()
+        eliminados = 0
+        liberados = 0
+        for relative_path in sorted(filter(None, self.candidatos)):
+            if relative_path in referenciadas or not relative_path.startswith('productos/'):
+                continue
+            full_path = self._ruta_absoluta(relative_path)
+            if not full_path:
+                continue
+            size = os.path.getsize(full_path)
+            if self.dry_run:
+                self.stdout.write(f'  [DRY RUN] Se eliminaría {relative_path}')
+            else:
+                os.remove(full_path)
+            eliminados += 1
+            liberados += size
+
+        self.stdout.write(f'{eliminados} archivos duplicados eliminados ({liberados / (1024 * 1024):.2f} MB)')
@@ -0,0 +1,33 @@
+"""
+Comando para generar la copia completa del catálogo de productos.
+El endpoint la regenera en segundo plano cuando vence; programar este comando
+(p. ej. con cron) evita que el primer cliente reciba una copia vencida.
+"""
+
+from django.core.management.base import BaseCommand
+from productos import catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Genera la copia completa del catálogo (NDJSON con gzip) y purga las bajas antiguas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sin-purgar',
+            action='store_true',
+            help='No borrar los productos eliminados más antiguos que tombstone_days',
+        )
+
+    def handle(self, *args, **options):
+        if not options['sin_purgar']:
+            eliminados = catalog_snapshot.purgar_eliminados()
+            self.stdout.write(f'{eliminados} bajas antiguas purgadas')
+
+        datos = catalog_snapshot.generar()
+        if datos is None:
+            self.stdout.write(self.style.WARNING('Ya hay una generación en curso'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Copia {datos['archivo']}: {datos['filas']['ofertado']} ofertados, "
+            f"{datos['filas']['disponible']} disponibles, {datos['bytes']} bytes"
+        ))
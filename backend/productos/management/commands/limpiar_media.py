@@ -0,0 +1,116 @@
+"""
+Comando para detectar y eliminar archivos de media de productos que ya no
+están referenciados por ningún registro (versiones de imágenes borradas,
+subidas temporales abandonadas, etc.).
+
+Trabaja por tramos reanudables y con límite de velocidad para poder
+ejecutarse en horario laboral, por ejemplo desde cron:
+
+    python manage.py limpiar_media --delete --max-archivos 5000
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from productos.media_gc import RecolectorMedia, DIRECTORIOS_POR_DEFECTO
+from productos.models import EjecucionLimpiezaMedia
+
+
+class Command(BaseCommand):
+    help = 'Informa o elimina archivos huérfanos de media de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Elimina los huérfanos (por defecto solo se informan)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Archivos revisados por lote antes de guardar el avance',
+        )
+        parser.add_argument(
+            '--max-por-segundo',
+            type=int,
+            default=200,
+            help='Máximo de archivos revisados por segundo (0 sin límite)',
+        )
+        parser.add_argument(
+            '--max-archivos',
+            type=int,
+            default=None,
+            help='Archivos a revisar en esta ejecución; el resto queda para la siguiente',
+        )
+        parser.add_argument(
+            '--antiguedad-horas',
+            type=float,
+            default=24,
+            help='Ignora archivos modificados hace menos de estas horas',
+        )
+        parser.add_argument(
+            '--directorio',
+            action='append',
+            dest='directorios',
+            help=f'Directorio relativo a MEDIA_ROOT (por defecto: {", ".join(DIRECTORIOS_POR_DEFECTO)})',
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Descarta el recorrido en curso y empieza desde el principio',
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Repite tramos indefinidamente, esperando --intervalo segundos entre ellos',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=60,
+            help='Segundos de espera entre tramos en modo continuo',
+        )
+
+    def handle(self, *args, **options):
+        if not options['delete']:
+            self.stdout.write(self.style.WARNING('Solo se informarán los huérfanos (use --delete para eliminarlos)'))
+
+        if options['reiniciar']:
+            EjecucionLimpiezaMedia.objects.filter(estado='en_curso').update(estado='completada')
+
+        while True:
+            terminado = self.ejecutar_tramo(options)
+            if not options['continuo']:
+                break
+            # Tras completar un recorrido se espera antes de empezar el siguiente
+            time.sleep(options['intervalo'])
+            if terminado:
+                self.stdout.write('Iniciando un nuevo recorrido')
+
+    def ejecutar_tramo(self, options):
+        """Ejecuta un tramo sobre la ejecución en curso (o una nueva)"""
+        ejecucion = EjecucionLimpiezaMedia.objects.filter(
+            estado='en_curso', eliminar=options['delete']
+        ).first()
+        if ejecucion is None:
+            ejecucion = EjecucionLimpiezaMedia.objects.create(eliminar=options['delete'])
+        elif ejecucion.cursor:
+            self.stdout.write(f'Reanudando recorrido {ejecucion.pk} desde {ejecucion.cursor}')
+
+        recolector = RecolectorMedia(
+            ejecucion,
+            directorios=options['directorios'] or DIRECTORIOS_POR_DEFECTO,
+            batch_size=options['batch_size'],
+            max_por_segundo=options['max_por_segundo'],
+            antiguedad_minima_horas=options['antiguedad_horas'],
+            informar=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        terminado = recolector.ejecutar_tramo(options['max_archivos'])
+
+        estado = 'completado' if terminado else 'pausado'
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorrido {ejecucion.pk} {estado}: {ejecucion.archivos_revisados} revisados, '
+            f'{ejecucion.huerfanos} huérfanos ({ejecucion.bytes_huerfanos / (1024 * 1024):.2f} MB), '
+            f'{ejecucion.eliminados} eliminados'
+        ))
+        return terminado
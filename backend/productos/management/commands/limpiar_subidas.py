@@ -0,0 +1,50 @@
+"""
+Comando para eliminar las sesiones de subida por partes abandonadas y sus
+archivos temporales en media/temp/chunks.
+"""
+
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from productos.chunked_upload import obtener_config, limpiar_sesiones_abandonadas
+from productos.models import SesionSubidaDocumento
+
+
+class Command(BaseCommand):
+    help = 'Elimina las subidas de documentos por partes abandonadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Muestra lo que se eliminaría sin hacer cambios',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('MODO DRY RUN - No se harán cambios reales'))
+
+        expiradas, liberados = limpiar_sesiones_abandonadas(dry_run=dry_run)
+        self.stdout.write(f'{expiradas} sesiones expiradas ({liberados / (1024 * 1024):.2f} MB)')
+
+        # Temporales sin sesión activa (por ejemplo, tras borrar sesiones desde el admin).
+        # iniciar_sesion crea el archivo antes de guardar la sesión, así que solo se
+        # borran los que no se modifican desde hace más que la duración de una sesión
+        config = obtener_config()
+        temp_dir = os.path.join(settings.MEDIA_ROOT, config['temp_folder'])
+        limite = time.time() - config['session_hours'] * 3600
+        if not os.path.isdir(temp_dir):
+            return
+        activas = {
+            os.path.basename(ruta)
+            for ruta in SesionSubidaDocumento.objects.filter(estado='activa').values_list('ruta_temporal', flat=True)
+        }
+        huerfanos = 0
+        for entry in os.scandir(temp_dir):
+            if entry.is_file() and entry.name not in activas and entry.stat().st_mtime < limite:
+                if not dry_run:
+                    os.remove(entry.path)
+                huerfanos += 1
+        self.stdout.write(self.style.SUCCESS(f'{huerfanos} archivos temporales huérfanos eliminados'))
@@ -0,0 +1,83 @@
+"""
+Worker que consume la cola de procesamiento de imágenes de productos.
+Genera las versiones de cada imagen en un pool de procesos.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connections
+from productos.image_queue import (
+    reclamar_tareas, recuperar_tareas_bloqueadas, inicializar_worker,
+    generar_versiones, aplicar_resultado, registrar_error
+)
+
+
+class Command(BaseCommand):
+    help = 'Procesa las imágenes de productos encoladas usando un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Cantidad de procesos del pool (por defecto, uno por CPU)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Tareas reclamadas por iteración (por defecto, el doble de workers)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando la cola está vacía',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesa la cola pendiente y termina',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size'] or workers * 2
+        intervalo = options['intervalo']
+
+        recuperadas = recuperar_tareas_bloqueadas()
+        if recuperadas:
+            self.stdout.write(self.style.WARNING(f'{recuperadas} tareas bloqueadas devueltas a pendiente'))
+
+        self.stdout.write(f'Procesando imágenes con {workers} procesos...')
+
+        # Los hijos no heredan las conexiones abiertas del proceso principal
+        connections.close_all()
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                 initializer=inicializar_worker) as pool:
+            while True:
+                tareas = reclamar_tareas(batch_size)
+                if not tareas:
+                    if options['once']:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                futuros = {
+                    pool.submit(generar_versiones, tarea.archivo_origen, tarea.base_path): tarea
+                    for tarea in tareas
+                }
+                for futuro in as_completed(futuros):
+                    tarea = futuros[futuro]
+                    try:
+                        aplicar_resultado(tarea, futuro.result())
+                        self.stdout.write(self.style.SUCCESS(f'Tarea {tarea.pk} completada'))
+                    except Exception as e:
+                        registrar_error(tarea, str(e))
+                        self.stdout.write(self.style.ERROR(f'Tarea {tarea.pk} con error: {e}'))
+
+        self.stdout.write(self.style.SUCCESS('Cola de imágenes procesada'))
@@ -0,0 +1,29 @@
+"""
+Comando para reconstruir los resúmenes de precios, compras y ventas desde el
+historial. Las señales los mantienen al día; este comando se usa para poblarlos
+la primera vez o después de cargas masivas que no disparan señales.
+"""
+
+from django.core.management.base import BaseCommand
+from productos import price_analytics
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes de precios de productos disponibles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--producto',
+            type=int,
+            help='ID del producto disponible (por defecto todos)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Registros leídos y resúmenes guardados por lote',
+        )
+
+    def handle(self, *args, **options):
+        total = price_analytics.reconstruir(options['producto'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} resúmenes generados'))
@@ -0,0 +1,32 @@
+"""
+Comando para reconstruir el índice de búsqueda de productos.
+Las señales mantienen el índice al día; este comando se usa para poblarlo la
+primera vez o después de cambios masivos hechos con update() o SQL directo.
+"""
+
+from django.core.management.base import BaseCommand
+from productos import search_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos ofertados y disponibles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo',
+            choices=['ofertado', 'disponible', 'todos'],
+            default='todos',
+            help='Tipo de producto a reindexar',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Productos leídos por lote',
+        )
+
+    def handle(self, *args, **options):
+        tipos = ('ofertado', 'disponible') if options['tipo'] == 'todos' else (options['tipo'],)
+        for tipo in tipos:
+            total = search_index.reindexar(tipo, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{total} productos {tipo}s indexados'))
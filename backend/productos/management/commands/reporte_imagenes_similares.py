@@ -0,0 +1,110 @@
+"""
+Comando para listar grupos de imágenes de productos casi idénticas según su
+hash perceptual, normalmente subidas bajo códigos de producto distintos.
+"""
+
+import csv
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from productos.image_processor import ImageProcessor
+from productos.models import ImagenReferenciaProductoOfertado, ImagenProductoDisponible
+from productos.phash_index import BKTree, DISTANCIA_POR_DEFECTO
+
+
+class Command(BaseCommand):
+    help = 'Reporta imágenes de productos casi idénticas por hash perceptual'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--distancia',
+            type=int,
+            default=DISTANCIA_POR_DEFECTO,
+            help='Distancia de Hamming máxima entre hashes',
+        )
+        parser.add_argument(
+            '--tipo',
+            choices=['ofertado', 'disponible'],
+            default='ofertado',
+            help='Modelo de imagen a revisar',
+        )
+        parser.add_argument(
+            '--mismo-producto',
+            action='store_true',
+            help='Incluye también coincidencias dentro del mismo producto',
+        )
+        parser.add_argument(
+            '--calcular-faltantes',
+            action='store_true',
+            help='Calcula el hash de las imágenes antiguas que no lo tienen',
+        )
+        parser.add_argument(
+            '--csv',
+            help='Ruta de un archivo CSV donde guardar el reporte',
+        )
+
+    def handle(self, *args, **options):
+        if options['tipo'] == 'ofertado':
+            model, product_field = ImagenReferenciaProductoOfertado, 'producto_ofertado'
+        else:
+            model, product_field = ImagenProductoDisponible, 'producto_disponible'
+
+        if options['calcular_faltantes']:
+            self.calcular_faltantes(model)
+
+        filas = list(
+            model.objects.exclude(phash='')
+            .values_list('pk', 'phash', f'{product_field}_id', f'{product_field}__code')
+        )
+        arbol = BKTree()
+        for pk, phash, producto_id, code in filas:
+            arbol.agregar(int(phash, 16), (pk, producto_id, code))
+
+        pares = []
+        for pk, phash, producto_id, code in filas:
+            for distancia, (otro_pk, otro_producto, otro_code) in arbol.buscar(int(phash, 16), options['distancia']):
+                # Cada par se reporta una sola vez
+                if otro_pk <= pk:
+                    continue
+                if otro_producto == producto_id and not options['mismo_producto']:
+                    continue
+                pares.append((distancia, pk, code, otro_pk, otro_code))
+
+        pares.sort()
+        self.stdout.write(f'{len(filas)} imágenes con hash, {len(pares)} pares similares')
+        for distancia, pk, code, otro_pk, otro_code in pares:
+            self.stdout.write(f'  d={distancia}: imagen {pk} ({code}) ~ imagen {otro_pk} ({otro_code})')
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['distancia', 'imagen', 'producto', 'imagen_similar', 'producto_similar'])
+                writer.writerows(pares)
+            self.stdout.write(self.style.SUCCESS(f'Reporte guardado en {options["csv"]}'))
+
+    def calcular_faltantes(self, model):
+        """Calcula el hash perceptual de las imágenes que no lo tienen"""
+        import os
+        from django.conf import settings
+
+        pendientes = []
+        for imagen in model.objects.filter(phash='').exclude(imagen_original='').iterator(chunk_size=200):
+            full_path = os.path.join(settings.MEDIA_ROOT, imagen.imagen_original)
+            if not os.path.exists(full_path):
+                continue
+            imagen.phash = ImageProcessor.describe_file(full_path)['phash']
+            pendientes.append(imagen)
+            if len(pendientes) >= 200:
+                self.guardar_hashes(model, pendientes)
+                pendientes = []
+        if pendientes:
+            self.guardar_hashes(model, pendientes)
+
+    def guardar_hashes(self, model, imagenes):
+        """
+        Guarda los hashes de un lote. bulk_update no toca updated_at: se asigna a
+        mano para que el índice de hashes perceptuales (phash_index) detecte el cambio.
+        """
+        ahora = timezone.now()
+        for imagen in imagenes:
+            imagen.updated_at = ahora
+        model.objects.bulk_update(imagenes, ['phash', 'updated_at'])
@@ -0,0 +1,219 @@
+"""
+Recolector de archivos huérfanos de media de productos.
+
+Recorre los directorios de media con os.scandir en orden determinista, sin
+listar el árbol completo en memoria, y compara cada archivo contra el conjunto
+de rutas referenciadas en la base de datos (una consulta values_list por
+modelo). El avance se guarda en EjecucionLimpiezaMedia para reanudar el
+recorrido en el siguiente tramo.
+
+Un ArchivoContenido solo mantiene vivos sus archivos mientras alguna imagen o
+documento apunte a él. Al eliminar, los registros sin uso se borran antes de
+tomar el conjunto de rutas, así ninguna subida nueva puede reutilizarlos
+mientras el recorrido borra sus archivos.
+"""
+
+import os
+import time
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Directorios revisados, relativos a MEDIA_ROOT. La caché de imágenes responsivas
+# y los temporales de subidas por partes tienen su propia limpieza.
+DIRECTORIOS_POR_DEFECTO = ('productos', 'temp/uploads')
+
+# Relaciones inversas de ArchivoContenido que lo mantienen en uso
+RELACIONES_BLOB = ('imagenes_ofertado', 'imagenes_disponible', 'documentos_ofertado', 'documentos_disponible')
+
+
+def _blob_en_uso():
+    """Q de los ArchivoContenido a los que apunta alguna imagen o documento"""
+    condicion = Q()
+    for relacion in RELACIONES_BLOB:
+        condicion |= Q(**{f'{relacion}__isnull': False})
+    return condicion
+
+
+def purgar_blobs_sin_uso(antiguedad_minima_horas=24):
+    """
+    Borra los ArchivoContenido sin imágenes ni documentos que los usen. Sus
+    archivos quedan huérfanos y los elimina el recorrido. Se respeta la misma
+    antigüedad mínima que para los archivos, por las subidas en curso.
+
+    Returns:
+        int: Registros eliminados
+    """
+    from .models import ArchivoContenido
+
+    limite = timezone.now() - timedelta(hours=antiguedad_minima_horas)
+    sin_uso = ArchivoContenido.objects.filter(created_at__lt=limite).exclude(
+        pk__in=ArchivoContenido.objects.filter(_blob_en_uso()).values('pk')
+    )
+    eliminados, _ = sin_uso.delete()
+    return eliminados
+
+
+def rutas_referenciadas():
+    """
+    Conjunto de rutas (relativas a MEDIA_ROOT) referenciadas por algún registro.
+    """
+    from .models import (
+        ImagenReferenciaProductoOfertado, ImagenProductoDisponible,
+        DocumentoProductoOfertado, DocumentoProductoDisponible,
+        ArchivoContenido, TareaProcesamientoImagen, SesionSubidaDocumento
+    )
+
+    referenciadas = set()
+    campos_imagen = ('imagen', 'imagen_original', 'imagen_thumbnail', 'imagen_webp')
+    for model in (ImagenReferenciaProductoOfertado, ImagenProductoDisponible):
+        for fila in model.objects.values_list(*campos_imagen).iterator():
+            referenciadas.update(fila)
+    for model in (DocumentoProductoOfertado, DocumentoProductoDisponible):
+        referenciadas.update(model.objects.values_list('documento', flat=True).iterator())
+    en_uso = ArchivoContenido.objects.filter(_blob_en_uso()).distinct()
+    for ruta, manifest in en_uso.values_list('ruta', 'manifest').iterator():
+        referenciadas.add(ruta)
+        for variant in (manifest or {}).get('variants', {}).values():
+            referenciadas.add(variant.get('path'))
+    # Subidas que todavía esperan ser procesadas
+    referenciadas.update(
+        TareaProcesamientoImagen.objects.filter(estado__in=('pendiente', 'procesando'))
+        .values_list('archivo_origen', flat=True).iterator()
+    )
+    referenciadas.update(
+        SesionSubidaDocumento.objects.filter(estado='activa').values_list('ruta_temporal', flat=True).iterator()
+    )
+
+    return {os.path.normpath(ruta) for ruta in referenciadas if ruta}
+
+
+def recorrer(directorios, cursor=''):
+    """
+    Genera (ruta relativa, DirEntry) de los archivos bajo `directorios` en orden
+    lexicográfico por componentes, saltando todo lo que esté antes de `cursor`.
+    """
+    media_root = str(settings.MEDIA_ROOT)
+    cursor_partes = tuple(cursor.split('/')) if cursor else ()
+
+    def _recorrer(relative_dir):
+        full_dir = os.path.join(media_root, relative_dir)
+        try:
+            with os.scandir(full_dir) as it:
+                # Solo se ordena un directorio a la vez
+                entries = sorted(it, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}"
+            partes = tuple(relative_path.split('/'))
+            if entry.is_dir(follow_symlinks=False):
+                # Omitir subárboles completos ya revisados
+                if cursor_partes and partes < cursor_partes[:len(partes)]:
+                    continue
+                yield from _recorrer(relative_path)
+            elif entry.is_file(follow_symlinks=False):
+                if cursor_partes and partes <= cursor_partes:
+                    continue
+                yield relative_path, entry
+
+    for directorio in sorted(d.strip('/') for d in directorios):
+        partes = tuple(directorio.split('/'))
+        if cursor_partes and partes < cursor_partes[:len(partes)]:
+            continue
+        yield from _recorrer(directorio)
+
+
+class RecolectorMedia:
+    """
+    Revisa un tramo de archivos desde el cursor de la ejecución, en lotes y con
+    límite de archivos por segundo para no competir con el tráfico normal.
+    """
+
+    def __init__(self, ejecucion, directorios=DIRECTORIOS_POR_DEFECTO, batch_size=500,
+                 max_por_segundo=200, antiguedad_minima_horas=24, informar=None):
+        self.ejecucion = ejecucion
+        self.directorios = directorios
+        self.batch_size = batch_size
+        self.max_por_segundo = max_por_segundo
+        self.antiguedad_minima = antiguedad_minima_horas * 3600
+        self.informar = informar or (lambda mensaje: None)
+        if ejecucion.eliminar:
+            blobs = purgar_blobs_sin_uso(antiguedad_minima_horas)
+            if blobs:
+                self.informar(f'{blobs} archivos de contenido sin uso eliminados')
+        self.referenciadas = rutas_referenciadas()
+
+    def ejecutar_tramo(self, max_archivos=None):
+        """
+        Revisa hasta `max_archivos` archivos (todos si es None).
+
+        Returns:
+            bool: True si el recorrido terminó
+        """
+        limite_mtime = time.time() - self.antiguedad_minima
+        lote = []
+        revisados = 0
+        inicio_lote = time.monotonic()
+
+        for relative_path, entry in recorrer(self.directorios, self.ejecucion.cursor):
+            stat = entry.stat(follow_symlinks=False)
+            # Los archivos recientes pueden pertenecer a una subida en curso
+            huerfano = (os.path.normpath(relative_path) not in self.referenciadas
+                        and stat.st_mtime < limite_mtime)
+            lote.append((relative_path, entry.path, stat.st_size, huerfano))
+            revisados += 1
+
+            if len(lote) >= self.batch_size:
+                self._procesar_lote(lote)
+                lote = []
+                inicio_lote = self._limitar_tasa(inicio_lote, self.batch_size)
+
+            if max_archivos and revisados >= max_archivos:
+                self._procesar_lote(lote)
+                return False
+
+        self._procesar_lote(lote)
+        self.ejecucion.estado = 'completada'
+        self.ejecucion.finalizado_en = timezone.now()
+        self.ejecucion.save(update_fields=['estado', 'finalizado_en', 'actualizado_en'])
+        return True
+
+    def _procesar_lote(self, lote):
+        """Informa o elimina los huérfanos de un lote y guarda el cursor"""
+        if not lote:
+            return
+        ejecucion = self.ejecucion
+        for relative_path, full_path, size, huerfano in lote:
+            if not huerfano:
+                continue
+            ejecucion.huerfanos += 1
+            ejecucion.bytes_huerfanos += size
+            if ejecucion.eliminar:
+                try:
+                    os.remove(full_path)
+                    ejecucion.eliminados += 1
+                    self.informar(f'Eliminado {relative_path}')
+                except OSError as e:
+                    logger.warning(f"No se pudo eliminar {relative_path}: {e}")
+            else:
+                self.informar(f'Huérfano {relative_path} ({size} bytes)')
+
+        ejecucion.archivos_revisados += len(lote)
+        ejecucion.cursor = lote[-1][0]
+        ejecucion.save(update_fields=[
+            'cursor', 'archivos_revisados', 'huerfanos', 'bytes_huerfanos', 'eliminados', 'actualizado_en'
+        ])
+
+    def _limitar_tasa(self, inicio_lote, cantidad):
+        """Duerme lo necesario para no superar max_por_segundo"""
+        if self.max_por_segundo:
+            minimo = cantidad / self.max_por_segundo
+            transcurrido = time.monotonic() - inicio_lote
+            if transcurrido < minimo:
+                time.sleep(minimo - transcurrido)
+        return time.monotonic()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_make_marca_optional_add_especialidad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproductodisponible',
+            name='manifest',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Manifiesto de versiones'),
+        ),
+        migrations.AddField(
+            model_name='imagenreferenciaproductoofertado',
+            name='manifest',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Manifiesto de versiones'),
+        ),
+    ]
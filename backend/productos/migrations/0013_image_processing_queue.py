@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_image_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproductodisponible',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='completado', max_length=20, verbose_name='Estado de procesamiento'),
+        ),
+        migrations.AddField(
+            model_name='imagenreferenciaproductoofertado',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='completado', max_length=20, verbose_name='Estado de procesamiento'),
+        ),
+        migrations.CreateModel(
+            name='TareaProcesamientoImagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo_origen', models.CharField(max_length=500, verbose_name='Archivo de origen')),
+                ('base_path', models.CharField(max_length=500, verbose_name='Ruta base de versiones')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('mensaje', models.TextField(blank=True, verbose_name='Mensaje')),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado en')),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado en')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('imagen_disponible', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tareas_procesamiento', to='productos.imagenproductodisponible', verbose_name='Imagen de Producto Disponible')),
+                ('imagen_ofertado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tareas_procesamiento', to='productos.imagenreferenciaproductoofertado', verbose_name='Imagen de Producto Ofertado')),
+            ],
+            options={
+                'verbose_name': 'Tarea de Procesamiento de Imagen',
+                'verbose_name_plural': 'Tareas de Procesamiento de Imágenes',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['estado', 'created_at'], name='productos_t_estado_dbaab9_idx')],
+            },
+        ),
+    ]
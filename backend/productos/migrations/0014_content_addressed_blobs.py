@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_image_processing_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('tipo', models.CharField(choices=[('imagen', 'Imagen'), ('documento', 'Documento')], max_length=20, verbose_name='Tipo')),
+                ('ruta', models.CharField(max_length=500, verbose_name='Ruta del archivo')),
+                ('tamano', models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('manifest', models.JSONField(blank=True, default=dict, verbose_name='Manifiesto de versiones')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Archivo de Contenido',
+                'verbose_name_plural': 'Archivos de Contenido',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='documentoproductodisponible',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documentos_disponible', to='productos.archivocontenido', verbose_name='Contenido'),
+        ),
+        migrations.AddField(
+            model_name='documentoproductoofertado',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='documentos_ofertado', to='productos.archivocontenido', verbose_name='Contenido'),
+        ),
+        migrations.AddField(
+            model_name='imagenproductodisponible',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='imagenes_disponible', to='productos.archivocontenido', verbose_name='Contenido'),
+        ),
+        migrations.AddField(
+            model_name='imagenreferenciaproductoofertado',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='imagenes_ofertado', to='productos.archivocontenido', verbose_name='Contenido'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 03:35
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_content_addressed_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionSubidaDocumento',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre_archivo', models.CharField(max_length=255, verbose_name='Nombre del archivo')),
+                ('tipo_documento', models.CharField(max_length=100, verbose_name='Tipo de documento')),
+                ('titulo', models.CharField(max_length=255, verbose_name='Título')),
+                ('descripcion', models.TextField(blank=True, verbose_name='Descripción')),
+                ('is_public', models.BooleanField(default=False, verbose_name='Público')),
+                ('tamano_total', models.PositiveBigIntegerField(verbose_name='Tamaño total (bytes)')),
+                ('bytes_recibidos', models.PositiveBigIntegerField(default=0, verbose_name='Bytes recibidos')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256 esperado')),
+                ('ruta_temporal', models.CharField(max_length=500, verbose_name='Ruta temporal')),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('completada', 'Completada'), ('cancelada', 'Cancelada'), ('expirada', 'Expirada')], default='activa', max_length=20, verbose_name='Estado')),
+                ('expira_en', models.DateTimeField(verbose_name='Expira en')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sesiones_subida_documento', to=settings.AUTH_USER_MODEL, verbose_name='Creado por')),
+                ('documento_disponible', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='productos.documentoproductodisponible', verbose_name='Documento creado')),
+                ('documento_ofertado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='productos.documentoproductoofertado', verbose_name='Documento creado')),
+                ('producto_disponible', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_subida', to='productos.productodisponible', verbose_name='Producto Disponible')),
+                ('producto_ofertado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_subida', to='productos.productoofertado', verbose_name='Producto Ofertado')),
+            ],
+            options={
+                'verbose_name': 'Sesión de Subida de Documento',
+                'verbose_name_plural': 'Sesiones de Subida de Documentos',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['estado', 'expira_en'], name='productos_s_estado_294eb0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0015_document_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionLimpiezaMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('en_curso', 'En curso'), ('completada', 'Completada')], default='en_curso', max_length=20, verbose_name='Estado')),
+                ('eliminar', models.BooleanField(default=False, verbose_name='Elimina huérfanos')),
+                ('cursor', models.CharField(blank=True, max_length=1000, verbose_name='Último archivo revisado')),
+                ('archivos_revisados', models.PositiveIntegerField(default=0, verbose_name='Archivos revisados')),
+                ('huerfanos', models.PositiveIntegerField(default=0, verbose_name='Archivos huérfanos')),
+                ('bytes_huerfanos', models.PositiveBigIntegerField(default=0, verbose_name='Bytes huérfanos')),
+                ('eliminados', models.PositiveIntegerField(default=0, verbose_name='Archivos eliminados')),
+                ('iniciado_en', models.DateTimeField(auto_now_add=True, verbose_name='Iniciado en')),
+                ('actualizado_en', models.DateTimeField(auto_now=True, verbose_name='Actualizado en')),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado en')),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Limpieza de Media',
+                'verbose_name_plural': 'Ejecuciones de Limpieza de Media',
+                'ordering': ['-iniciado_en'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0016_media_gc_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenproductodisponible',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='Hash perceptual'),
+        ),
+        migrations.AddField(
+            model_name='imagenreferenciaproductoofertado',
+            name='phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='Hash perceptual'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0017_image_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusquedaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=64, verbose_name='Término')),
+                ('tipo_producto', models.CharField(choices=[('ofertado', 'Producto Ofertado'), ('disponible', 'Producto Disponible')], max_length=20, verbose_name='Tipo de producto')),
+                ('producto_id', models.PositiveBigIntegerField(verbose_name='ID del producto')),
+                ('peso', models.PositiveIntegerField(default=1, verbose_name='Peso')),
+                ('activo', models.BooleanField(default=True, verbose_name='Producto activo')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'indexes': [models.Index(fields=['termino', 'tipo_producto'], name='busqueda_termino_idx')],
+                'unique_together': {('tipo_producto', 'producto_id', 'termino')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-18 03:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basic', '0001_initial'),
+        ('directorio', '0002_tagging'),
+        ('productos', '0018_product_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialdecompras',
+            index=models.Index(fields=['fecha', 'id'], name='compra_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialdecompras',
+            index=models.Index(fields=['producto', 'fecha', 'id'], name='compra_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialdecompras',
+            index=models.Index(fields=['created_at', 'id'], name='compra_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialdeventas',
+            index=models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialdeventas',
+            index=models.Index(fields=['producto', 'fecha', 'id'], name='venta_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialdeventas',
+            index=models.Index(fields=['created_at', 'id'], name='venta_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productodisponible',
+            index=models.Index(fields=['nombre', 'id'], name='prod_disp_nombre_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productodisponible',
+            index=models.Index(fields=['created_at', 'id'], name='prod_disp_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoofertado',
+            index=models.Index(fields=['nombre', 'id'], name='prod_ofertado_nombre_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoofertado',
+            index=models.Index(fields=['created_at', 'id'], name='prod_ofertado_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 03:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0019_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPrecioProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fuente', models.CharField(choices=[('precio', 'Precio'), ('compra', 'Compra'), ('venta', 'Venta')], max_length=10, verbose_name='Fuente')),
+                ('periodo', models.CharField(choices=[('dia', 'Día'), ('semana', 'Semana'), ('mes', 'Mes')], max_length=10, verbose_name='Período')),
+                ('inicio', models.DateField(verbose_name='Inicio del período')),
+                ('registros', models.PositiveIntegerField(default=0, verbose_name='Registros')),
+                ('unidades', models.PositiveIntegerField(default=0, verbose_name='Unidades')),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Importe total')),
+                ('minimo', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='Valor unitario mínimo')),
+                ('maximo', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='Valor unitario máximo')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_precio', to='productos.productodisponible', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Precios',
+                'verbose_name_plural': 'Resúmenes de Precios',
+                'ordering': ['producto', 'fuente', 'periodo', 'inicio'],
+                'unique_together': {('producto', 'fuente', 'periodo', 'inicio')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0020_price_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_producto', models.CharField(choices=[('ofertado', 'Producto ofertado'), ('disponible', 'Producto disponible')], max_length=10, verbose_name='Tipo de producto')),
+                ('producto_id', models.BigIntegerField(verbose_name='ID del producto')),
+                ('code', models.CharField(blank=True, max_length=100, verbose_name='Código')),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de eliminación')),
+            ],
+            options={
+                'verbose_name': 'Producto Eliminado',
+                'verbose_name_plural': 'Productos Eliminados',
+                'ordering': ['eliminado_en'],
+            },
+        ),
+    ]
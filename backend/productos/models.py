@@ -5,11 +5,20 @@ from django.conf import settings
 from django.utils import timezone
 import logging
 import os
+import uuid
 from datetime import datetime
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# Estados del procesamiento de versiones de una imagen
+ESTADO_PROCESAMIENTO_CHOICES = (
+    ('pendiente', 'Pendiente'),
+    ('procesando', 'Procesando'),
+    ('completado', 'Completado'),
+    ('error', 'Error'),
+)
+
 # Funciones upload_to personalizadas
 def upload_imagen_producto_ofertado(instance, filename):
     """
@@ -122,10 +131,42 @@ class ProductoOfertado(models.Model):
         verbose_name = 'Producto Ofertado'
         verbose_name_plural = 'Productos Ofertados'
         ordering = ['nombre']
+        indexes = [
+            # Paginación por clave sobre el orden por defecto
+            models.Index(fields=['nombre', 'id'], name='prod_ofertado_nombre_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='prod_ofertado_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.code} - {self.nombre}"
 
+class ArchivoContenido(models.Model):
+    """
+    Archivo de producto direccionado por contenido (SHA-256).
+    Las imágenes y documentos con el mismo contenido apuntan al mismo registro y
+    reutilizan su archivo y, en el caso de imágenes, sus versiones ya generadas.
+    """
+    TIPO_CHOICES = (
+        ('imagen', 'Imagen'),
+        ('documento', 'Documento'),
+    )
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name='Tipo')
+    ruta = models.CharField(max_length=500, verbose_name='Ruta del archivo')
+    tamano = models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')
+    # Para imágenes, manifiesto de las versiones generadas a partir de este contenido
+    manifest = models.JSONField(default=dict, blank=True, verbose_name='Manifiesto de versiones')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+
+    class Meta:
+        verbose_name = 'Archivo de Contenido'
+        verbose_name_plural = 'Archivos de Contenido'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.get_tipo_display()})"
+
 class ImagenReferenciaProductoOfertado(models.Model):
     """
     Modelo para imágenes de referencia asociadas a productos ofertados.
@@ -164,6 +205,25 @@ class ImagenReferenciaProductoOfertado(models.Model):
     imagen_original = models.CharField(max_length=500, blank=True, verbose_name='Ruta imagen original')
     imagen_thumbnail = models.CharField(max_length=500, blank=True, verbose_name='Ruta miniatura')
     imagen_webp = models.CharField(max_length=500, blank=True, verbose_name='Ruta WebP')
+    # Manifiesto de variantes generadas (rutas, dimensiones, tamaños y hash)
+    manifest = models.JSONField(default=dict, blank=True, verbose_name='Manifiesto de versiones')
+    estado_procesamiento = models.CharField(
+        max_length=20,
+        choices=ESTADO_PROCESAMIENTO_CHOICES,
+        default='completado',
+        verbose_name='Estado de procesamiento'
+    )
+    # Hash perceptual (dHash de 64 bits) del original para detectar imágenes casi idénticas
+    phash = models.CharField(max_length=16, blank=True, db_index=True, verbose_name='Hash perceptual')
+    # Contenido deduplicado al que apunta el archivo
+    blob = models.ForeignKey(
+        ArchivoContenido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='imagenes_ofertado',
+        verbose_name='Contenido'
+    )
 
     class Meta:
         verbose_name = 'Imagen de Referencia'
@@ -208,8 +268,27 @@ class ImagenReferenciaProductoOfertado(models.Model):
         return None
     
     def save(self, *args, **kwargs):
+        encolar = False
+        reutilizada = False
+        sha256 = None
+        # Una imagen idéntica a otra ya procesada reutiliza sus versiones sin procesarse
+        if self.imagen and not self.pk:
+            from productos.blob_store import es_archivo_nuevo, calcular_sha256, buscar_blob, aplicar_blob_imagen
+            if es_archivo_nuevo(self.imagen):
+                sha256 = calcular_sha256(self.imagen.file)
+                blob = buscar_blob(sha256, 'imagen')
+                if blob is not None:
+                    aplicar_blob_imagen(self, blob)
+                    reutilizada = True
+        
+        if reutilizada:
+            logger.info(f"Imagen duplicada de {self.producto_ofertado.code}: se reutilizan las versiones de {sha256[:12]}")
+        # Con procesamiento asíncrono la imagen queda en temp/uploads y un worker genera las versiones
+        elif self.imagen and hasattr(self.imagen, 'file') and not self.pk and settings.IMAGE_PROCESSING_ASYNC:
+            self.estado_procesamiento = 'pendiente'
+            encolar = True
         # Si es una imagen nueva y no ha sido procesada
-        if self.imagen and hasattr(self.imagen, 'file') and not self.pk:
+        elif self.imagen and hasattr(self.imagen, 'file') and not self.pk:
             from productos.image_processor import ImageProcessor
             from django.core.files.storage import default_storage
             import os
@@ -249,6 +328,9 @@ class ImagenReferenciaProductoOfertado(models.Model):
                 if 'webp' in versions:
                     self.imagen_webp = os.path.relpath(versions['webp'], media_root)
                 
+                # Registrar el manifiesto para resolver URLs sin escanear directorios
+                self.manifest = processor.build_manifest(versions)
+                
                 # Ya procesamos la imagen, pero debemos establecer el campo imagen
                 # para que las relaciones funcionen correctamente en el frontend
                 # IMPORTANTE: El campo `imagen` debe tener siempre un valor
@@ -269,13 +351,13 @@ class ImagenReferenciaProductoOfertado(models.Model):
                     elif self.imagen_original:
                         self.imagen = self.imagen_original
                 
-                # Obtener metadatos de la imagen original
-                if versions.get('original'):
-                    img = Image.open(versions['original'])
-                    self.width = img.width
-                    self.height = img.height
-                    self.format = img.format
-                    self.file_size = os.path.getsize(versions['original'])
+                # Metadatos del original calculados durante el procesamiento, sin releer el archivo
+                for campo, valor in ImageProcessor.metadata_from_manifest(self.manifest).items():
+                    setattr(self, campo, valor)
+                
+                # Registrar el contenido para reutilizar estas versiones en próximas subidas
+                from productos.blob_store import registrar_blob_imagen
+                registrar_blob_imagen(self, sha256)
                 
             except Exception as e:
                 logger.error(f"Error al procesar imagen: {e}")
@@ -295,6 +377,10 @@ class ImagenReferenciaProductoOfertado(models.Model):
             ).update(is_primary=False)
         
         super().save(*args, **kwargs)
+        
+        if encolar:
+            from productos.image_queue import encolar_imagen
+            encolar_imagen(self)
     
     def extract_timestamp(self):
         """Extrae el timestamp de la imagen para uso en búsqueda de versiones"""
@@ -332,6 +418,13 @@ class ImagenReferenciaProductoOfertado(models.Model):
         
     def get_version_urls(self):
         """Retorna un diccionario con todas las URLs disponibles"""
+        # Con manifiesto la resolución es una búsqueda en memoria
+        if self.manifest and self.manifest.get('variants'):
+            from productos.image_processor import ImageProcessor
+            urls = ImageProcessor.manifest_urls(self.manifest)
+            urls['default'] = urls['default'] or self.get_absolute_url
+            return urls
+        
         # Extraer timestamp para obtener versiones específicas
         timestamp = self.extract_timestamp()
         
@@ -409,6 +502,15 @@ class DocumentoProductoOfertado(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+    # Contenido deduplicado al que apunta el archivo
+    blob = models.ForeignKey(
+        ArchivoContenido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='documentos_ofertado',
+        verbose_name='Contenido'
+    )
 
     class Meta:
         verbose_name = 'Documento de Producto Ofertado'
@@ -418,6 +520,17 @@ class DocumentoProductoOfertado(models.Model):
     def __str__(self):
         return f"{self.titulo} ({self.tipo_documento})"
 
+    def save(self, *args, **kwargs):
+        from productos.blob_store import deduplicar_documento, registrar_blob
+        # Un documento idéntico a otro ya subido reutiliza su archivo
+        blob, sha256 = deduplicar_documento(self)
+        super().save(*args, **kwargs)
+        
+        # Registrar el contenido nuevo para reutilizarlo en próximas subidas
+        if blob is None and sha256:
+            self.blob = registrar_blob(sha256, 'documento', self.documento.name, self.documento.size)
+            type(self).objects.filter(pk=self.pk).update(blob=self.blob)
+
 class ProductoDisponible(models.Model):
     """
     Modelo para productos disponibles para la venta.
@@ -526,6 +639,11 @@ class ProductoDisponible(models.Model):
         verbose_name = 'Producto Disponible'
         verbose_name_plural = 'Productos Disponibles'
         ordering = ['nombre']
+        indexes = [
+            # Paginación por clave sobre el orden por defecto
+            models.Index(fields=['nombre', 'id'], name='prod_disp_nombre_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='prod_disp_created_id_idx'),
+        ]
 
     def __str__(self):
         marca_nombre = self.id_marca.nombre if self.id_marca else "Sin marca"
@@ -569,6 +687,25 @@ class ImagenProductoDisponible(models.Model):
     imagen_original = models.CharField(max_length=500, blank=True, verbose_name='Ruta imagen original')
     imagen_thumbnail = models.CharField(max_length=500, blank=True, verbose_name='Ruta miniatura')
     imagen_webp = models.CharField(max_length=500, blank=True, verbose_name='Ruta WebP')
+    # Manifiesto de variantes generadas (rutas, dimensiones, tamaños y hash)
+    manifest = models.JSONField(default=dict, blank=True, verbose_name='Manifiesto de versiones')
+    estado_procesamiento = models.CharField(
+        max_length=20,
+        choices=ESTADO_PROCESAMIENTO_CHOICES,
+        default='completado',
+        verbose_name='Estado de procesamiento'
+    )
+    # Hash perceptual (dHash de 64 bits) del original para detectar imágenes casi idénticas
+    phash = models.CharField(max_length=16, blank=True, db_index=True, verbose_name='Hash perceptual')
+    # Contenido deduplicado al que apunta el archivo
+    blob = models.ForeignKey(
+        ArchivoContenido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='imagenes_disponible',
+        verbose_name='Contenido'
+    )
 
     class Meta:
         verbose_name = 'Imagen de Producto Disponible'
@@ -613,8 +750,27 @@ class ImagenProductoDisponible(models.Model):
         return None
     
     def save(self, *args, **kwargs):
-        # Si es una imagen nueva y no ha sido procesada
+        encolar = False
+        reutilizada = False
+        sha256 = None
+        # Una imagen idéntica a otra ya procesada reutiliza sus versiones sin procesarse
         if self.imagen and not self.pk:
+            from productos.blob_store import es_archivo_nuevo, calcular_sha256, buscar_blob, aplicar_blob_imagen
+            if es_archivo_nuevo(self.imagen):
+                sha256 = calcular_sha256(self.imagen.file)
+                blob = buscar_blob(sha256, 'imagen')
+                if blob is not None:
+                    aplicar_blob_imagen(self, blob)
+                    reutilizada = True
+        
+        if reutilizada:
+            logger.info(f"Imagen duplicada de {self.producto_disponible.code}: se reutilizan las versiones de {sha256[:12]}")
+        # Con procesamiento asíncrono la imagen queda en temp/uploads y un worker genera las versiones
+        elif self.imagen and not self.pk and settings.IMAGE_PROCESSING_ASYNC:
+            self.estado_procesamiento = 'pendiente'
+            encolar = True
+        # Si es una imagen nueva y no ha sido procesada
+        elif self.imagen and not self.pk:
             from productos.image_processor import ImageProcessor
             from django.core.files.storage import default_storage
             import os
@@ -641,13 +797,16 @@ class ImagenProductoDisponible(models.Model):
                     # Usar la versión WebP como imagen principal
                     self.imagen = self.imagen_webp
                 
-                # Obtener metadatos de la imagen original
-                if versions.get('original'):
-                    img = Image.open(versions['original'])
-                    self.width = img.width
-                    self.height = img.height
-                    self.format = img.format
-                    self.file_size = os.path.getsize(versions['original'])
+                # Registrar el manifiesto para resolver URLs sin escanear directorios
+                self.manifest = processor.build_manifest(versions)
+                
+                # Metadatos del original calculados durante el procesamiento, sin releer el archivo
+                for campo, valor in ImageProcessor.metadata_from_manifest(self.manifest).items():
+                    setattr(self, campo, valor)
+                
+                # Registrar el contenido para reutilizar estas versiones en próximas subidas
+                from productos.blob_store import registrar_blob_imagen
+                registrar_blob_imagen(self, sha256)
                 
             except Exception as e:
                 logger.error(f"Error al procesar imagen: {e}")
@@ -667,6 +826,10 @@ class ImagenProductoDisponible(models.Model):
             ).update(is_primary=False)
         
         super().save(*args, **kwargs)
+        
+        if encolar:
+            from productos.image_queue import encolar_imagen
+            encolar_imagen(self)
     
     def extract_timestamp(self):
         """Extrae el timestamp de la imagen para uso en búsqueda de versiones"""
@@ -704,6 +867,13 @@ class ImagenProductoDisponible(models.Model):
         
     def get_version_urls(self):
         """Retorna un diccionario con todas las URLs disponibles"""
+        # Con manifiesto la resolución es una búsqueda en memoria
+        if self.manifest and self.manifest.get('variants'):
+            from productos.image_processor import ImageProcessor
+            urls = ImageProcessor.manifest_urls(self.manifest)
+            urls['default'] = urls['default'] or self.get_absolute_url
+            return urls
+        
         # Extraer timestamp para obtener versiones específicas
         timestamp = self.extract_timestamp()
         
@@ -781,6 +951,15 @@ class DocumentoProductoDisponible(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+    # Contenido deduplicado al que apunta el archivo
+    blob = models.ForeignKey(
+        ArchivoContenido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='documentos_disponible',
+        verbose_name='Contenido'
+    )
 
     class Meta:
         verbose_name = 'Documento de Producto Disponible'
@@ -790,6 +969,217 @@ class DocumentoProductoDisponible(models.Model):
     def __str__(self):
         return f"{self.titulo} ({self.tipo_documento})"
 
+    def save(self, *args, **kwargs):
+        from productos.blob_store import deduplicar_documento, registrar_blob
+        # Un documento idéntico a otro ya subido reutiliza su archivo
+        blob, sha256 = deduplicar_documento(self)
+        super().save(*args, **kwargs)
+        
+        # Registrar el contenido nuevo para reutilizarlo en próximas subidas
+        if blob is None and sha256:
+            self.blob = registrar_blob(sha256, 'documento', self.documento.name, self.documento.size)
+            type(self).objects.filter(pk=self.pk).update(blob=self.blob)
+
+class TareaProcesamientoImagen(models.Model):
+    """
+    Cola persistente de procesamiento de imágenes de productos.
+    Cada tarea genera las versiones (original, miniatura y WebP) de una imagen subida
+    y es consumida por el comando procesar_imagenes.
+    """
+    imagen_ofertado = models.ForeignKey(
+        ImagenReferenciaProductoOfertado,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='tareas_procesamiento',
+        verbose_name='Imagen de Producto Ofertado'
+    )
+    imagen_disponible = models.ForeignKey(
+        ImagenProductoDisponible,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='tareas_procesamiento',
+        verbose_name='Imagen de Producto Disponible'
+    )
+    archivo_origen = models.CharField(max_length=500, verbose_name='Archivo de origen')
+    base_path = models.CharField(max_length=500, verbose_name='Ruta base de versiones')
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_PROCESAMIENTO_CHOICES,
+        default='pendiente',
+        verbose_name='Estado'
+    )
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    mensaje = models.TextField(blank=True, verbose_name='Mensaje')
+    iniciado_en = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado en')
+    finalizado_en = models.DateTimeField(null=True, blank=True, verbose_name='Finalizado en')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+
+    class Meta:
+        verbose_name = 'Tarea de Procesamiento de Imagen'
+        verbose_name_plural = 'Tareas de Procesamiento de Imágenes'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['estado', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Tarea {self.pk} ({self.get_estado_display()})"
+
+    @property
+    def imagen(self):
+        """Retorna la imagen asociada, sea de producto ofertado o disponible"""
+        return self.imagen_ofertado or self.imagen_disponible
+
+class SesionSubidaDocumento(models.Model):
+    """
+    Sesión de subida por partes (reanudable) de un documento de producto.
+    Los fragmentos se agregan a un archivo temporal y, al completarse, el archivo
+    verificado se mueve a la ruta definitiva del documento.
+    """
+    ESTADO_CHOICES = (
+        ('activa', 'Activa'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+        ('expirada', 'Expirada'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    producto_ofertado = models.ForeignKey(
+        ProductoOfertado,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='sesiones_subida',
+        verbose_name='Producto Ofertado'
+    )
+    producto_disponible = models.ForeignKey(
+        ProductoDisponible,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='sesiones_subida',
+        verbose_name='Producto Disponible'
+    )
+    nombre_archivo = models.CharField(max_length=255, verbose_name='Nombre del archivo')
+    tipo_documento = models.CharField(max_length=100, verbose_name='Tipo de documento')
+    titulo = models.CharField(max_length=255, verbose_name='Título')
+    descripcion = models.TextField(blank=True, verbose_name='Descripción')
+    is_public = models.BooleanField(default=False, verbose_name='Público')
+    tamano_total = models.PositiveBigIntegerField(verbose_name='Tamaño total (bytes)')
+    bytes_recibidos = models.PositiveBigIntegerField(default=0, verbose_name='Bytes recibidos')
+    sha256 = models.CharField(max_length=64, verbose_name='SHA-256 esperado')
+    ruta_temporal = models.CharField(max_length=500, verbose_name='Ruta temporal')
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='activa', verbose_name='Estado')
+    documento_ofertado = models.ForeignKey(
+        DocumentoProductoOfertado,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Documento creado'
+    )
+    documento_disponible = models.ForeignKey(
+        DocumentoProductoDisponible,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Documento creado'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='sesiones_subida_documento',
+        verbose_name='Creado por'
+    )
+    expira_en = models.DateTimeField(verbose_name='Expira en')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+
+    class Meta:
+        verbose_name = 'Sesión de Subida de Documento'
+        verbose_name_plural = 'Sesiones de Subida de Documentos'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'expira_en']),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.bytes_recibidos}/{self.tamano_total})"
+
+    @property
+    def producto(self):
+        """Retorna el producto asociado, sea ofertado o disponible"""
+        return self.producto_ofertado or self.producto_disponible
+
+    @property
+    def documento(self):
+        """Retorna el documento creado al completar la sesión"""
+        return self.documento_ofertado or self.documento_disponible
+
+class EjecucionLimpiezaMedia(models.Model):
+    """
+    Ejecución del recolector de archivos huérfanos de media (comando limpiar_media).
+    Guarda el cursor del recorrido para poder reanudarlo por tramos.
+    """
+    ESTADO_CHOICES = (
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+    )
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_curso', verbose_name='Estado')
+    eliminar = models.BooleanField(default=False, verbose_name='Elimina huérfanos')
+    cursor = models.CharField(max_length=1000, blank=True, verbose_name='Último archivo revisado')
+    archivos_revisados = models.PositiveIntegerField(default=0, verbose_name='Archivos revisados')
+    huerfanos = models.PositiveIntegerField(default=0, verbose_name='Archivos huérfanos')
+    bytes_huerfanos = models.PositiveBigIntegerField(default=0, verbose_name='Bytes huérfanos')
+    eliminados = models.PositiveIntegerField(default=0, verbose_name='Archivos eliminados')
+    iniciado_en = models.DateTimeField(auto_now_add=True, verbose_name='Iniciado en')
+    actualizado_en = models.DateTimeField(auto_now=True, verbose_name='Actualizado en')
+    finalizado_en = models.DateTimeField(null=True, blank=True, verbose_name='Finalizado en')
+
+    class Meta:
+        verbose_name = 'Ejecución de Limpieza de Media'
+        verbose_name_plural = 'Ejecuciones de Limpieza de Media'
+        ordering = ['-iniciado_en']
+
+    def __str__(self):
+        return f"Limpieza {self.pk} ({self.get_estado_display()})"
+
+class TerminoBusquedaProducto(models.Model):
+    """
+    Índice invertido de búsqueda de productos.
+    Cada fila asocia un término normalizado (sin tildes, en minúsculas) con un
+    producto ofertado o disponible y su peso. Se mantiene con señales sobre
+    ambos modelos; ver productos/search_index.py.
+    """
+    TIPO_CHOICES = (
+        ('ofertado', 'Producto Ofertado'),
+        ('disponible', 'Producto Disponible'),
+    )
+
+    termino = models.CharField(max_length=64, verbose_name='Término')
+    tipo_producto = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name='Tipo de producto')
+    producto_id = models.PositiveBigIntegerField(verbose_name='ID del producto')
+    peso = models.PositiveIntegerField(default=1, verbose_name='Peso')
+    activo = models.BooleanField(default=True, verbose_name='Producto activo')
+
+    class Meta:
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        unique_together = ('tipo_producto', 'producto_id', 'termino')
+        indexes = [
+            # Búsquedas exactas y por prefijo (LIKE 'abc%') usan este índice
+            models.Index(fields=['termino', 'tipo_producto'], name='busqueda_termino_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.termino} → {self.tipo_producto} {self.producto_id}"
+
 class ProductsPrice(models.Model):
     """
     Modelo para el historial de precios de productos disponibles.
@@ -848,6 +1238,12 @@ class HistorialDeCompras(models.Model):
         verbose_name = 'Historial de Compra'
         verbose_name_plural = 'Historial de Compras'
         ordering = ['-fecha']
+        indexes = [
+            # Paginación por clave: listado general y por producto
+            models.Index(fields=['fecha', 'id'], name='compra_fecha_id_idx'),
+            models.Index(fields=['producto', 'fecha', 'id'], name='compra_producto_fecha_idx'),
+            models.Index(fields=['created_at', 'id'], name='compra_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Compra a {self.proveedor} - Factura: {self.factura}"
@@ -892,6 +1288,12 @@ class HistorialDeVentas(models.Model):
         verbose_name = 'Historial de Venta'
         verbose_name_plural = 'Historial de Ventas'
         ordering = ['-fecha']
+        indexes = [
+            # Paginación por clave: listado general y por producto
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+            models.Index(fields=['producto', 'fecha', 'id'], name='venta_producto_fecha_idx'),
+            models.Index(fields=['created_at', 'id'], name='venta_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Venta a {self.cliente} - Factura: {self.factura}"
@@ -899,4 +1301,78 @@ class HistorialDeVentas(models.Model):
     @property
     def valor_total(self):
         """Calcula el valor total de la venta incluyendo IVA"""
-        return self.valor + self.iva
\ No newline at end of file
+        return self.valor + self.iva
+
+class ResumenPrecioProducto(models.Model):
+    """
+    Resumen por período de los precios, compras y ventas de un producto disponible.
+    Se actualiza de forma incremental al registrar cada precio, compra o venta
+    (ver productos/price_analytics.py) para que la analítica no recorra el historial.
+    """
+    FUENTE_CHOICES = (
+        ('precio', 'Precio'),
+        ('compra', 'Compra'),
+        ('venta', 'Venta'),
+    )
+    PERIODO_CHOICES = (
+        ('dia', 'Día'),
+        ('semana', 'Semana'),
+        ('mes', 'Mes'),
+    )
+
+    producto = models.ForeignKey(
+        ProductoDisponible,
+        on_delete=models.CASCADE,
+        related_name='resumenes_precio',
+        verbose_name='Producto'
+    )
+    fuente = models.CharField(max_length=10, choices=FUENTE_CHOICES, verbose_name='Fuente')
+    periodo = models.CharField(max_length=10, choices=PERIODO_CHOICES, verbose_name='Período')
+    inicio = models.DateField(verbose_name='Inicio del período')
+    registros = models.PositiveIntegerField(default=0, verbose_name='Registros')
+    unidades = models.PositiveIntegerField(default=0, verbose_name='Unidades')
+    importe = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='Importe total')
+    minimo = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True, verbose_name='Valor unitario mínimo')
+    maximo = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True, verbose_name='Valor unitario máximo')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')
+
+    class Meta:
+        verbose_name = 'Resumen de Precios'
+        verbose_name_plural = 'Resúmenes de Precios'
+        ordering = ['producto', 'fuente', 'periodo', 'inicio']
+        unique_together = ('producto', 'fuente', 'periodo', 'inicio')
+
+    def __str__(self):
+        return f"{self.producto_id} {self.fuente} {self.periodo} {self.inicio}"
+
+    @property
+    def promedio(self):
+        """Valor unitario promedio ponderado por unidades"""
+        if not self.unidades:
+            return None
+        return self.importe / self.unidades
+
+
+class ProductoEliminado(models.Model):
+    """
+    Registro (tombstone) de un producto ofertado o disponible eliminado.
+    Permite que la sincronización incremental del catálogo informe las bajas
+    a los clientes que guardan el catálogo localmente (ver productos/catalog_snapshot.py).
+    """
+    TIPO_PRODUCTO_CHOICES = (
+        ('ofertado', 'Producto ofertado'),
+        ('disponible', 'Producto disponible'),
+    )
+
+    tipo_producto = models.CharField(max_length=10, choices=TIPO_PRODUCTO_CHOICES, verbose_name='Tipo de producto')
+    producto_id = models.BigIntegerField(verbose_name='ID del producto')
+    code = models.CharField(max_length=100, blank=True, verbose_name='Código')
+    eliminado_en = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Fecha de eliminación')
+
+    class Meta:
+        verbose_name = 'Producto Eliminado'
+        verbose_name_plural = 'Productos Eliminados'
+        ordering = ['eliminado_en']
+
+    def __str__(self):
+        return f"{self.tipo_producto} {self.producto_id} ({self.code})"
@@ -1,6 +1,15 @@
 # backend/productos/pagination.py
 
-from rest_framework.pagination import PageNumberPagination, LimitOffsetPagination, CursorPagination
+import json
+from datetime import datetime, time
+from base64 import b64decode, b64encode
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination, LimitOffsetPagination, CursorPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     """
@@ -48,4 +57,157 @@ class HistoricalRecordsPagination(CursorPagination):
     """
     page_size = 20
     ordering = '-created_at'
-    cursor_query_param = 'cursor'
\ No newline at end of file
+    cursor_query_param = 'cursor'
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por clave (keyset) sobre el ordenamiento del queryset.
+
+    El cursor guarda los valores de los campos de ordenamiento del último
+    registro entregado y la siguiente página se obtiene con un WHERE sobre
+    ellos, sin COUNT(*) ni OFFSET, así que cada página cuesta lo mismo sin
+    importar la profundidad. El id se agrega como desempate para que el orden
+    sea total. Solo avanza hacia adelante (enlace next).
+    Uso: ?paginacion=cursor&page_size=100, luego seguir el enlace next
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.campos = self.get_ordering(queryset)
+
+        queryset = queryset.order_by(*[('-' if desc else '') + campo for campo, desc in self.campos])
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.filtro_cursor(queryset.model, cursor))
+
+        # Un registro extra indica si hay página siguiente
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Campos de ordenamiento [(campo, descendente)] con el id como desempate.
+        Toma el order_by del queryset (incluido el de OrderingFilter) o el de Meta.
+        """
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        campos = []
+        for item in ordering:
+            if not isinstance(item, str) or '__' in item or item.lstrip('-') == '?':
+                raise ValidationError({'paginacion': f'Ordenamiento no soportado por el cursor: {item}'})
+            desc = item.startswith('-')
+            nombre = item.lstrip('-')
+            if nombre == 'pk':
+                nombre = queryset.model._meta.pk.name
+            field = queryset.model._meta.get_field(nombre)
+            if field.null:
+                raise ValidationError({'paginacion': f'No se puede paginar por cursor sobre {nombre} (admite nulos)'})
+            campos.append((field.attname, desc))
+
+        pk_name = queryset.model._meta.pk.attname
+        if pk_name not in [campo for campo, _ in campos]:
+            # El desempate sigue la dirección del primer campo para recorrer un solo índice
+            campos.append((pk_name, campos[0][1] if campos else False))
+        return campos
+
+    def filtro_cursor(self, model, valores):
+        """
+        Condición "después del cursor" para el orden compuesto:
+        (a > va) OR (a = va AND b > vb) OR (a = va AND b = vb AND id > vid)
+        """
+        if len(valores) != len(self.campos):
+            raise NotFound(self.invalid_cursor_message)
+        convertidos = []
+        for (campo, _), valor in zip(self.campos, valores):
+            field = next(f for f in model._meta.concrete_fields if f.attname == campo)
+            try:
+                convertidos.append(field.to_python(valor))
+            except DjangoValidationError:
+                raise NotFound(self.invalid_cursor_message)
+
+        condicion = Q()
+        iguales = {}
+        for (campo, desc), valor in zip(self.campos, convertidos):
+            condicion |= Q(**iguales, **{f"{campo}__{'lt' if desc else 'gt'}": valor})
+            iguales[campo] = valor
+        # Condición redundante sobre el primer campo para que el motor use el índice como rango
+        primero, desc = self.campos[0]
+        return Q(**{f"{primero}__{'lte' if desc else 'gte'}": convertidos[0]}) & condicion
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        # Los listados armados con .values() entregan diccionarios
+        if isinstance(instance, dict):
+            valores = [instance[campo] for campo, _ in self.campos]
+        else:
+            valores = [getattr(instance, campo) for campo, _ in self.campos]
+        # DjangoJSONEncoder recorta fechas y horas a milisegundos; el cursor necesita
+        # la precisión completa o los registros del mismo milisegundo se repiten o se saltan
+        valores = [valor.isoformat() if isinstance(valor, (datetime, time)) else valor for valor in valores]
+        encoded = b64encode(json.dumps(valores, cls=DjangoJSONEncoder).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+class SelectablePagination(StandardResultsSetPagination):
+    """
+    Paginación por número de página (por defecto) o por clave, elegida en cada
+    petición. Los consumidores que recorren todo el listado (exportaciones)
+    deberían usar la paginación por clave.
+    Uso: ?page=2 o ?paginacion=cursor
+    """
+    mode_query_param = 'paginacion'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        modo = request.query_params.get(self.mode_query_param)
+        if modo == 'cursor' or KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,126 @@
+"""
+Índice de hashes perceptuales para detectar imágenes de productos casi idénticas.
+
+Usa un BK-tree sobre la distancia de Hamming entre dHash de 64 bits: la
+desigualdad triangular permite descartar ramas completas, de modo que buscar
+las imágenes a distancia <= k no recorre todo el catálogo.
+"""
+
+import logging
+import threading
+from django.db.models import Count, Max
+
+logger = logging.getLogger(__name__)
+
+# Distancia máxima por defecto para considerar dos imágenes casi idénticas
+DISTANCIA_POR_DEFECTO = 6
+
+
+def hamming(a, b):
+    """Distancia de Hamming entre dos hashes enteros"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Árbol BK para búsquedas por distancia de Hamming.
+    Cada nodo guarda un hash y los elementos con ese mismo hash.
+    """
+
+    def __init__(self):
+        self.raiz = None
+        self.tamano = 0
+
+    def agregar(self, valor, elemento):
+        """Agrega un elemento identificado por su hash entero"""
+        self.tamano += 1
+        if self.raiz is None:
+            self.raiz = [valor, [elemento], {}]
+            return
+        nodo = self.raiz
+        while True:
+            distancia = hamming(valor, nodo[0])
+            if distancia == 0:
+                nodo[1].append(elemento)
+                return
+            hijo = nodo[2].get(distancia)
+            if hijo is None:
+                nodo[2][distancia] = [valor, [elemento], {}]
+                return
+            nodo = hijo
+
+    def buscar(self, valor, distancia_maxima):
+        """
+        Retorna [(distancia, elemento)] a distancia <= distancia_maxima, ordenados por distancia.
+        """
+        if self.raiz is None:
+            return []
+        resultados = []
+        pendientes = [self.raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            distancia = hamming(valor, nodo[0])
+            if distancia <= distancia_maxima:
+                resultados.extend((distancia, elemento) for elemento in nodo[1])
+            # Solo los hijos en [d - k, d + k] pueden contener resultados
+            for distancia_hijo, hijo in nodo[2].items():
+                if distancia - distancia_maxima <= distancia_hijo <= distancia + distancia_maxima:
+                    pendientes.append(hijo)
+        resultados.sort(key=lambda resultado: resultado[0])
+        return resultados
+
+
+class IndicePHash:
+    """
+    Índice en memoria de los hashes perceptuales de un modelo de imagen.
+    Se reconstruye cuando cambia la cantidad de imágenes o su última modificación.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.arbol = None
+        self.firma = None
+        self.lock = threading.Lock()
+
+    def _firma_actual(self):
+        """
+        Firma barata del estado de la tabla para detectar cambios. Quien reescriba
+        phash con bulk_update debe asignar también updated_at.
+        """
+        datos = self.model.objects.exclude(phash='').aggregate(total=Count('pk'), ultima=Max('updated_at'))
+        return datos['total'], datos['ultima']
+
+    def obtener_arbol(self):
+        """Retorna el BK-tree vigente, reconstruyéndolo si la tabla cambió"""
+        firma = self._firma_actual()
+        with self.lock:
+            if self.arbol is None or firma != self.firma:
+                arbol = BKTree()
+                for pk, phash in self.model.objects.exclude(phash='').values_list('pk', 'phash').iterator():
+                    arbol.agregar(int(phash, 16), pk)
+                self.arbol = arbol
+                self.firma = firma
+                logger.info(f"Índice de hashes perceptuales de {self.model.__name__}: {arbol.tamano} imágenes")
+            return self.arbol
+
+    def similares(self, phash, distancia=DISTANCIA_POR_DEFECTO, excluir=None):
+        """
+        Imágenes cuyo hash está a distancia <= `distancia` de `phash`.
+
+        Returns:
+            list: [(distancia, pk)] ordenados por distancia
+        """
+        if not phash:
+            return []
+        resultados = self.obtener_arbol().buscar(int(phash, 16), distancia)
+        return [(d, pk) for d, pk in resultados if pk != excluir]
+
+
+_indices = {}
+
+
+def obtener_indice(model):
+    """Índice compartido por proceso para un modelo de imagen"""
+    if model not in _indices:
+        _indices[model] = IndicePHash(model)
+    return _indices[model]
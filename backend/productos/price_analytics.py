@@ -0,0 +1,345 @@
+"""
+Analítica de precios de productos disponibles sobre tablas de resumen.
+
+ResumenPrecioProducto guarda, por producto, fuente (precio, compra o venta) y
+período (día, semana o mes), la cantidad de registros, unidades, importe y los
+valores unitarios mínimo y máximo. Las señales suman cada registro nuevo a
+sus tres períodos; si un registro se edita o elimina, solo se recalculan los
+períodos afectados de ese producto. Las consultas de la API leen únicamente
+los resúmenes.
+"""
+
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PERIODOS = ('dia', 'semana', 'mes')
+
+# Cómo leer cada fuente: modelo, campo del producto, fecha, importe y unidades
+FUENTES = {
+    'precio': {'model': 'ProductsPrice', 'producto': 'producto_disponible', 'fecha': 'created_at',
+               'importe': 'valor', 'cantidad': None},
+    'compra': {'model': 'HistorialDeCompras', 'producto': 'producto', 'fecha': 'fecha',
+               'importe': 'valor', 'cantidad': 'cantidad'},
+    'venta': {'model': 'HistorialDeVentas', 'producto': 'producto', 'fecha': 'fecha',
+              'importe': 'valor', 'cantidad': 'cantidad'},
+}
+
+CUATRO_DECIMALES = Decimal('0.0001')
+
+
+def _model(fuente):
+    from . import models
+    return getattr(models, FUENTES[fuente]['model'])
+
+
+def inicio_periodo(fecha, periodo):
+    """Primer día del período que contiene la fecha (las semanas empiezan el lunes)"""
+    if periodo == 'dia':
+        return fecha
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+
+def fin_periodo(inicio, periodo):
+    """Último día del período que empieza en `inicio`"""
+    if periodo == 'dia':
+        return inicio
+    if periodo == 'semana':
+        return inicio + timedelta(days=6)
+    siguiente = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return siguiente - timedelta(days=1)
+
+
+def datos_registro(fuente, instance):
+    """
+    Extrae (producto_id, fecha, importe, unidades) de un registro de la fuente.
+    Retorna None si el registro no aporta (p. ej. cantidad cero).
+    """
+    config = FUENTES[fuente]
+    fecha = getattr(instance, config['fecha'])
+    if fecha is None:
+        return None
+    if hasattr(fecha, 'hour'):
+        fecha = timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    unidades = getattr(instance, config['cantidad']) if config['cantidad'] else 1
+    if not unidades or unidades <= 0:
+        return None
+    return (
+        getattr(instance, f"{config['producto']}_id"),
+        fecha,
+        Decimal(getattr(instance, config['importe'])),
+        unidades,
+    )
+
+
+def registrar(fuente, instance):
+    """Suma un registro nuevo a los resúmenes de sus tres períodos"""
+    from .models import ResumenPrecioProducto
+
+    datos = datos_registro(fuente, instance)
+    if datos is None:
+        return
+    producto_id, fecha, importe, unidades = datos
+    unitario = (importe / unidades).quantize(CUATRO_DECIMALES)
+
+    for periodo in PERIODOS:
+        clave = dict(producto_id=producto_id, fuente=fuente, periodo=periodo,
+                     inicio=inicio_periodo(fecha, periodo))
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    resumen, _ = ResumenPrecioProducto.objects.select_for_update().get_or_create(**clave)
+            except IntegrityError:
+                # Otro proceso creó el mismo período al mismo tiempo
+                resumen = ResumenPrecioProducto.objects.select_for_update().get(**clave)
+            resumen.registros += 1
+            resumen.unidades += unidades
+            resumen.importe += importe
+            resumen.minimo = unitario if resumen.minimo is None else min(resumen.minimo, unitario)
+            resumen.maximo = unitario if resumen.maximo is None else max(resumen.maximo, unitario)
+            resumen.save()
+
+
+def registrar_lote(fuente, instances, batch_size=1000):
+    """
+    Suma varios registros nuevos a sus resúmenes con una lectura y dos
+    escrituras masivas. Se usa en las cargas masivas, que no disparan señales.
+    """
+    from .models import ResumenPrecioProducto
+
+    acumulados = {}
+    for instance in instances:
+        datos = datos_registro(fuente, instance)
+        if datos is None:
+            continue
+        producto_id, fecha, importe, unidades = datos
+        unitario = (importe / unidades).quantize(CUATRO_DECIMALES)
+        for periodo in PERIODOS:
+            clave = (producto_id, periodo, inicio_periodo(fecha, periodo))
+            acumulado = acumulados.setdefault(clave, {
+                'registros': 0, 'unidades': 0, 'importe': Decimal('0'), 'minimo': unitario, 'maximo': unitario
+            })
+            acumulado['registros'] += 1
+            acumulado['unidades'] += unidades
+            acumulado['importe'] += importe
+            acumulado['minimo'] = min(acumulado['minimo'], unitario)
+            acumulado['maximo'] = max(acumulado['maximo'], unitario)
+    if not acumulados:
+        return
+
+    with transaction.atomic():
+        existentes = {
+            (r.producto_id, r.periodo, r.inicio): r
+            for r in ResumenPrecioProducto.objects.select_for_update().filter(
+                fuente=fuente,
+                producto_id__in={clave[0] for clave in acumulados},
+                inicio__in={clave[2] for clave in acumulados},
+            )
+        }
+        nuevos = []
+        modificados = []
+        for clave, acumulado in acumulados.items():
+            resumen = existentes.get(clave)
+            if resumen is None:
+                nuevos.append(ResumenPrecioProducto(
+                    producto_id=clave[0], fuente=fuente, periodo=clave[1], inicio=clave[2], **acumulado
+                ))
+                continue
+            resumen.registros += acumulado['registros']
+            resumen.unidades += acumulado['unidades']
+            resumen.importe += acumulado['importe']
+            resumen.minimo = acumulado['minimo'] if resumen.minimo is None else min(resumen.minimo, acumulado['minimo'])
+            resumen.maximo = acumulado['maximo'] if resumen.maximo is None else max(resumen.maximo, acumulado['maximo'])
+            resumen.updated_at = timezone.now()
+            modificados.append(resumen)
+        ResumenPrecioProducto.objects.bulk_create(nuevos, batch_size=batch_size)
+        ResumenPrecioProducto.objects.bulk_update(
+            modificados, ['registros', 'unidades', 'importe', 'minimo', 'maximo', 'updated_at'], batch_size=batch_size
+        )
+
+
+def recalcular(fuente, producto_id, fecha):
+    """
+    Recalcula desde el historial los tres períodos de un producto que contienen la fecha.
+    Se usa cuando un registro se edita o elimina.
+    """
+    from .models import ResumenPrecioProducto
+
+    config = FUENTES[fuente]
+    for periodo in PERIODOS:
+        inicio = inicio_periodo(fecha, periodo)
+        fin = fin_periodo(inicio, periodo)
+        filtro_fecha = f"{config['fecha']}__date__range" if fuente == 'precio' else f"{config['fecha']}__range"
+        registros = _model(fuente).objects.filter(**{
+            f"{config['producto']}_id": producto_id, filtro_fecha: (inicio, fin)
+        })
+        acumulado = _acumular(fuente, registros)
+        clave = dict(producto_id=producto_id, fuente=fuente, periodo=periodo, inicio=inicio)
+        with transaction.atomic():
+            if acumulado is None:
+                ResumenPrecioProducto.objects.filter(**clave).delete()
+            else:
+                ResumenPrecioProducto.objects.update_or_create(**clave, defaults=acumulado)
+
+
+def _acumular(fuente, registros):
+    """Totales de un conjunto de registros, o None si no hay ninguno válido"""
+    acumulado = None
+    for instance in registros.iterator():
+        datos = datos_registro(fuente, instance)
+        if datos is None:
+            continue
+        _, _, importe, unidades = datos
+        unitario = (importe / unidades).quantize(CUATRO_DECIMALES)
+        if acumulado is None:
+            acumulado = {'registros': 0, 'unidades': 0, 'importe': Decimal('0'), 'minimo': unitario, 'maximo': unitario}
+        acumulado['registros'] += 1
+        acumulado['unidades'] += unidades
+        acumulado['importe'] += importe
+        acumulado['minimo'] = min(acumulado['minimo'], unitario)
+        acumulado['maximo'] = max(acumulado['maximo'], unitario)
+    return acumulado
+
+
+def reconstruir(producto_id=None, batch_size=1000):
+    """
+    Reconstruye los resúmenes desde el historial completo.
+
+    Returns:
+        int: Resúmenes creados
+    """
+    from .models import ResumenPrecioProducto
+
+    resumenes = {}
+    for fuente, config in FUENTES.items():
+        registros = _model(fuente).objects.order_by('pk')
+        if producto_id is not None:
+            registros = registros.filter(**{f"{config['producto']}_id": producto_id})
+        for instance in registros.iterator(chunk_size=batch_size):
+            datos = datos_registro(fuente, instance)
+            if datos is None:
+                continue
+            pid, fecha, importe, unidades = datos
+            unitario = (importe / unidades).quantize(CUATRO_DECIMALES)
+            for periodo in PERIODOS:
+                clave = (pid, fuente, periodo, inicio_periodo(fecha, periodo))
+                resumen = resumenes.get(clave)
+                if resumen is None:
+                    resumen = resumenes[clave] = ResumenPrecioProducto(
+                        producto_id=pid, fuente=fuente, periodo=periodo, inicio=clave[3],
+                        importe=Decimal('0'), minimo=unitario, maximo=unitario
+                    )
+                resumen.registros += 1
+                resumen.unidades += unidades
+                resumen.importe += importe
+                resumen.minimo = min(resumen.minimo, unitario)
+                resumen.maximo = max(resumen.maximo, unitario)
+
+    with transaction.atomic():
+        existentes = ResumenPrecioProducto.objects.all()
+        if producto_id is not None:
+            existentes = existentes.filter(producto_id=producto_id)
+        existentes.delete()
+        ResumenPrecioProducto.objects.bulk_create(resumenes.values(), batch_size=batch_size)
+    return len(resumenes)
+
+
+def _decimal(valor):
+    return None if valor is None else float(Decimal(valor).quantize(CUATRO_DECIMALES))
+
+
+def serie(producto_id, fuente, periodo='mes', desde=None, hasta=None, ventana=3):
+    """
+    Serie por período de una fuente, con media móvil sobre `ventana` períodos.
+
+    Returns:
+        list: [{inicio, registros, unidades, importe, promedio, minimo, maximo, media_movil}]
+    """
+    from .models import ResumenPrecioProducto
+
+    resumenes = ResumenPrecioProducto.objects.filter(producto_id=producto_id, fuente=fuente, periodo=periodo)
+    if desde:
+        resumenes = resumenes.filter(inicio__gte=inicio_periodo(desde, periodo))
+    if hasta:
+        resumenes = resumenes.filter(inicio__lte=hasta)
+
+    puntos = []
+    promedios = []
+    for resumen in resumenes.order_by('inicio'):
+        promedio = resumen.promedio
+        promedios.append(promedio)
+        ultimos = promedios[-ventana:] if ventana else []
+        puntos.append({
+            'inicio': resumen.inicio.isoformat(),
+            'registros': resumen.registros,
+            'unidades': resumen.unidades,
+            'importe': _decimal(resumen.importe),
+            'promedio': _decimal(promedio),
+            'minimo': _decimal(resumen.minimo),
+            'maximo': _decimal(resumen.maximo),
+            'media_movil': _decimal(sum(ultimos) / len(ultimos)) if ventana and len(ultimos) == ventana else None,
+        })
+    return puntos
+
+
+def tendencia(puntos, ultimos=6):
+    """
+    Tendencia de los últimos N períodos de una serie: pendiente por período
+    (mínimos cuadrados sobre el promedio) y variación porcentual.
+    """
+    valores = [p['promedio'] for p in puntos[-ultimos:] if p['promedio'] is not None]
+    if len(valores) < 2:
+        return {'periodos': len(valores), 'pendiente': None, 'variacion_pct': None, 'direccion': None}
+    n = len(valores)
+    media_x = (n - 1) / 2
+    media_y = sum(valores) / n
+    pendiente = sum((x - media_x) * (y - media_y) for x, y in enumerate(valores)) / sum(
+        (x - media_x) ** 2 for x in range(n)
+    )
+    variacion = (valores[-1] - valores[0]) / valores[0] * 100 if valores[0] else None
+    return {
+        'periodos': n,
+        'pendiente': round(pendiente, 4),
+        'variacion_pct': round(variacion, 2) if variacion is not None else None,
+        'direccion': 'sube' if pendiente > 0 else 'baja' if pendiente < 0 else 'estable',
+    }
+
+
+def margenes(compras, ventas):
+    """
+    Margen por período entre el valor unitario promedio de venta y el de compra.
+    Solo incluye los períodos con compras y ventas.
+    """
+    costos = {p['inicio']: p['promedio'] for p in compras}
+    resultado = []
+    for punto in ventas:
+        costo = costos.get(punto['inicio'])
+        precio = punto['promedio']
+        if costo is None or precio is None:
+            continue
+        margen = precio - costo
+        resultado.append({
+            'inicio': punto['inicio'],
+            'costo_promedio': costo,
+            'precio_promedio': precio,
+            'margen': round(margen, 4),
+            'margen_pct': round(margen / precio * 100, 2) if precio else None,
+        })
+    return resultado
+
+
+def analitica_producto(producto_id, periodo='mes', desde=None, hasta=None, ventana=3, ultimos=6):
+    """Series, tendencias y márgenes de un producto en una sola respuesta"""
+    series = {fuente: serie(producto_id, fuente, periodo, desde, hasta, ventana) for fuente in FUENTES}
+    return {
+        'periodo': periodo,
+        'series': series,
+        'tendencias': {fuente: tendencia(puntos, ultimos) for fuente, puntos in series.items()},
+        'margenes': margenes(series['compra'], series['venta']),
+    }
@@ -0,0 +1,254 @@
+"""
+Versiones responsivas de las imágenes de productos.
+
+Genera bajo demanda, a partir del original almacenado, la imagen en el ancho y
+formato solicitados y la guarda en una caché en disco bajo MEDIA_ROOT con un
+tamaño máximo. Cuando la caché supera ese tamaño se eliminan los archivos usados
+hace más tiempo (LRU): cada acierto actualiza la fecha de modificación del archivo.
+
+El tamaño de la caché se recorre en disco una sola vez por proceso; luego cada
+versión generada suma sus bytes a ese total y el árbol solo se vuelve a recorrer
+cuando supera el límite. El desalojo baja hasta un margen por debajo del límite
+para que las siguientes escrituras no vuelvan a disparar el recorrido. Los
+archivos que escriben otros procesos no se ven hasta ese recorrido, que corrige
+el total con lo que hay en disco.
+"""
+
+import os
+import io
+import hashlib
+import logging
+import tempfile
+import threading
+from PIL import Image
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Formatos de salida soportados: (formato PIL, content type, extensión)
+FORMATOS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'avif': ('AVIF', 'image/avif', 'avif'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+}
+
+# Fracción del límite hasta la que se desaloja
+MARGEN_DESALOJO = 0.9
+
+# {cache_dir: bytes} tamaño estimado de cada caché en este proceso
+_tamanos = {}
+_lock = threading.Lock()
+
+
+class ResponsiveImageError(Exception):
+    """Error de validación de los parámetros de una versión responsiva"""
+    pass
+
+
+class ResponsiveImageCache:
+    """
+    Caché en disco de versiones responsivas con desalojo LRU por tamaño total.
+    """
+
+    def __init__(self):
+        self.config = getattr(settings, 'RESPONSIVE_IMAGE_CONFIG', {})
+        self.widths = sorted(self.config.get('widths', (160, 320, 480, 640, 800, 1024, 1280, 1600)))
+        self.quality = self.config.get('quality', {'webp': 80, 'avif': 60, 'jpeg': 82})
+        self.max_bytes = self.config.get('cache_max_bytes', 512 * 1024 * 1024)
+        self.cache_dir = os.path.join(settings.MEDIA_ROOT, self.config.get('cache_folder', 'cache/imagenes'))
+
+    @staticmethod
+    def formato_soportado(formato):
+        """Indica si Pillow puede codificar el formato en este entorno"""
+        if formato not in FORMATOS:
+            return False
+        Image.init()
+        return FORMATOS[formato][0] in Image.SAVE
+
+    def formatos_disponibles(self):
+        """Formatos configurados que Pillow puede codificar"""
+        configurados = self.config.get('formats', ('avif', 'webp', 'jpeg'))
+        return [formato for formato in configurados if self.formato_soportado(formato)]
+
+    def negociar_formato(self, formato, accept):
+        """
+        Resuelve el formato de salida.
+        Sin formato explícito elige el primero disponible que acepte el cliente.
+        """
+        disponibles = self.formatos_disponibles()
+        if formato:
+            formato = formato.lower()
+            if formato == 'jpg':
+                formato = 'jpeg'
+            if formato not in disponibles:
+                raise ResponsiveImageError(f"Formato no soportado: {formato}")
+            return formato
+
+        accept = accept or ''
+        for candidato in disponibles:
+            if FORMATOS[candidato][1] in accept:
+                return candidato
+        return 'jpeg' if 'jpeg' in disponibles else disponibles[-1]
+
+    def ajustar_ancho(self, ancho):
+        """Ajusta el ancho solicitado al menor ancho permitido que lo cubra"""
+        try:
+            ancho = int(ancho)
+        except (TypeError, ValueError):
+            raise ResponsiveImageError("El ancho debe ser un número entero")
+        if ancho <= 0:
+            raise ResponsiveImageError("El ancho debe ser mayor que cero")
+        for permitido in self.widths:
+            if permitido >= ancho:
+                return permitido
+        return self.widths[-1]
+
+    @staticmethod
+    def ruta_origen(imagen):
+        """Ruta absoluta del original almacenado de una imagen, o None si no existe"""
+        for relative_path in (imagen.imagen_original, imagen.imagen.name if imagen.imagen else None):
+            if relative_path:
+                full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+                if os.path.exists(full_path):
+                    return full_path
+        return None
+
+    @staticmethod
+    def huella_origen(imagen, source_path):
+        """
+        Identificador estable del contenido original.
+        Usa el sha256 del manifiesto y, si no existe, la ruta, tamaño y fecha del archivo.
+        """
+        original = (imagen.manifest or {}).get('variants', {}).get('original')
+        if original and original.get('sha256') and source_path.endswith(original.get('path', '')):
+            return original['sha256']
+        stat = os.stat(source_path)
+        return f"{source_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def clave(self, huella, ancho, formato):
+        """Clave de caché; también se usa como ETag fuerte"""
+        calidad = self.quality.get(formato, 80)
+        return hashlib.sha256(f"{huella}|{ancho}|{formato}|{calidad}".encode()).hexdigest()
+
+    def ruta_cache(self, clave, formato):
+        """Ruta del archivo cacheado, repartida en subcarpetas por prefijo"""
+        return os.path.join(self.cache_dir, clave[:2], f"{clave}.{FORMATOS[formato][2]}")
+
+    def obtener(self, source_path, clave, ancho, formato):
+        """
+        Devuelve la ruta de la versión cacheada, generándola si no existe.
+
+        Returns:
+            str: Ruta absoluta del archivo en caché
+        """
+        path = self.ruta_cache(clave, formato)
+        if os.path.exists(path):
+            # Marcar como usado recientemente para el desalojo LRU
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+
+        data = self.generar(source_path, ancho, formato)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Escritura atómica para que peticiones simultáneas no lean archivos a medias
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.registrar_escritura(len(data), conservar=path)
+        return path
+
+    def generar(self, source_path, ancho, formato):
+        """Genera la versión en memoria y retorna sus bytes"""
+        pil_format = FORMATOS[formato][0]
+        with Image.open(source_path) as img:
+            # Para JPEG, decodificar directamente a escala reducida
+            img.draft('RGB', (ancho, max(1, ancho * img.height // max(img.width, 1))))
+            img.load()
+            if img.mode in ('RGBA', 'LA', 'P'):
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            # No ampliar imágenes más pequeñas que el ancho solicitado
+            if img.width > ancho:
+                alto = max(1, round(img.height * ancho / img.width))
+                img = img.resize((ancho, alto), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            buffer = io.BytesIO()
+            img.save(buffer, pil_format, quality=self.quality.get(formato, 80))
+            return buffer.getvalue()
+
+    def registrar_escritura(self, tamano, conservar=None):
+        """
+        Suma una versión nueva al tamaño estimado y desaloja solo si supera el límite.
+
+        Returns:
+            int: Archivos desalojados
+        """
+        with _lock:
+            total = _tamanos.get(self.cache_dir)
+            if total is not None:
+                total += tamano
+                _tamanos[self.cache_dir] = total
+        if total is not None and total <= self.max_bytes:
+            return 0
+        # Primera escritura del proceso o límite superado: recorrer el disco
+        return self.desalojar(conservar=conservar)
+
+    def desalojar(self, conservar=None):
+        """
+        Recorre la caché y, si supera el límite, elimina los archivos menos usados
+        hasta dejarla en MARGEN_DESALOJO del límite. Nunca elimina `conservar`
+        (la versión recién generada que se va a servir).
+        """
+        entradas = []
+        total = 0
+        if not os.path.isdir(self.cache_dir):
+            with _lock:
+                _tamanos[self.cache_dir] = 0
+            return 0
+        for subdir in os.scandir(self.cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entradas.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        if total <= self.max_bytes:
+            with _lock:
+                _tamanos[self.cache_dir] = total
+            return 0
+
+        objetivo = int(self.max_bytes * MARGEN_DESALOJO)
+        eliminados = 0
+        for _, size, path in sorted(entradas):
+            if total <= objetivo:
+                break
+            if path == conservar:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                eliminados += 1
+            except OSError:
+                pass
+        with _lock:
+            _tamanos[self.cache_dir] = total
+        logger.info(f"Caché de imágenes responsivas: {eliminados} archivos desalojados")
+        return eliminados
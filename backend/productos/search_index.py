@@ -0,0 +1,234 @@
+"""
+Búsqueda de productos sobre un índice invertido propio (TerminoBusquedaProducto).
+
+Los textos se normalizan sin tildes y en minúsculas, de modo que "catéter",
+"CATETER" y "cateter" son el mismo término. Los códigos con guiones o puntos
+se indexan por partes y también unidos ("ECG-12" → "ecg", "12", "ecg12").
+
+Cada término de la consulta se busca por prefijo (LIKE 'abc%' sobre un índice
+B-tree), por lo que la búsqueda funciona mientras se escribe. Se usa
+istartswith: en MySQL startswith genera LIKE BINARY, que no aprovecha el
+índice con la collation de la columna. Un producto debe
+contener todos los términos; el puntaje suma el peso de cada término en el
+producto, con bonificación si la coincidencia es exacta y no solo por prefijo.
+"""
+
+import re
+import logging
+import unicodedata
+from collections import defaultdict
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Palabras vacías en español que no aportan a la búsqueda
+PALABRAS_VACIAS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'sin', 'u', 'un', 'una', 'y',
+))
+
+LONGITUD_MAXIMA_TERMINO = 64
+
+# Peso de cada campo; un término en el código pesa más que uno en la descripción
+PESOS_OFERTADO = {
+    'code': 10,
+    'cudim': 8,
+    'nombre': 5,
+    'especialidad_texto': 2,
+    'referencias': 2,
+    'descripcion': 1,
+}
+PESOS_DISPONIBLE = {
+    'code': 10,
+    'nombre': 5,
+    'modelo': 4,
+    'referencia': 4,
+    'marca': 2,
+}
+
+# Multiplicador cuando el término de la consulta coincide completo
+BONO_EXACTO = 2
+
+# Por encima de esta cantidad de candidatos no se filtra por producto_id en SQL
+MAX_CANDIDATOS_FILTRO = 1000
+
+_separadores = re.compile(r'[^0-9a-zñ]+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, conservando la ñ"""
+    texto = str(texto or '').lower().replace('ñ', '\0')
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.replace('\0', 'ñ')
+
+
+def tokenizar(texto):
+    """
+    Divide un texto en términos normalizados.
+    Las palabras compuestas con guion o punto ("anti-reflujo", "ECG-12")
+    producen también el término unido.
+    """
+    terminos = []
+    for palabra in normalizar(texto).split():
+        partes = [p for p in _separadores.split(palabra) if p]
+        terminos.extend(partes)
+        if len(partes) > 1:
+            terminos.append(''.join(partes))
+    return [
+        t[:LONGITUD_MAXIMA_TERMINO] for t in terminos
+        if t not in PALABRAS_VACIAS
+    ]
+
+
+def _textos_producto(producto, tipo):
+    """Retorna [(texto, peso)] de los campos indexados de un producto"""
+    if tipo == 'ofertado':
+        textos = [(getattr(producto, campo), peso) for campo, peso in PESOS_OFERTADO.items()]
+    else:
+        textos = [
+            (getattr(producto, campo), peso) for campo, peso in PESOS_DISPONIBLE.items()
+            if campo != 'marca'
+        ]
+        if producto.id_marca_id:
+            textos.append((producto.id_marca.nombre, PESOS_DISPONIBLE['marca']))
+    return textos
+
+
+def terminos_producto(producto, tipo):
+    """
+    Calcula {termino: peso} de un producto. El peso de un término es el mayor
+    peso de los campos donde aparece más uno por cada aparición adicional.
+    """
+    pesos = {}
+    for texto, peso in _textos_producto(producto, tipo):
+        for termino in tokenizar(texto):
+            pesos[termino] = max(pesos[termino] + 1, peso) if termino in pesos else peso
+    return pesos
+
+
+def indexar_producto(producto, tipo):
+    """Reemplaza las filas del índice de un producto"""
+    from .models import TerminoBusquedaProducto
+
+    filas = [
+        TerminoBusquedaProducto(
+            termino=termino, tipo_producto=tipo, producto_id=producto.pk,
+            peso=peso, activo=producto.is_active
+        )
+        for termino, peso in terminos_producto(producto, tipo).items()
+    ]
+    with transaction.atomic():
+        TerminoBusquedaProducto.objects.filter(tipo_producto=tipo, producto_id=producto.pk).delete()
+        TerminoBusquedaProducto.objects.bulk_create(filas)
+
+
+def indexar_productos(productos, tipo, batch_size=500):
+    """
+    Reemplaza las filas del índice de varios productos en una sola operación.
+    Se usa en las cargas masivas, que no disparan las señales de guardado.
+    """
+    from .models import TerminoBusquedaProducto
+
+    filas = [
+        TerminoBusquedaProducto(
+            termino=termino, tipo_producto=tipo, producto_id=producto.pk,
+            peso=peso, activo=producto.is_active
+        )
+        for producto in productos
+        for termino, peso in terminos_producto(producto, tipo).items()
+    ]
+    with transaction.atomic():
+        TerminoBusquedaProducto.objects.filter(
+            tipo_producto=tipo, producto_id__in=[producto.pk for producto in productos]
+        ).delete()
+        TerminoBusquedaProducto.objects.bulk_create(filas, batch_size=batch_size)
+
+
+def desindexar_producto(producto_id, tipo):
+    """Elimina un producto del índice"""
+    from .models import TerminoBusquedaProducto
+
+    TerminoBusquedaProducto.objects.filter(tipo_producto=tipo, producto_id=producto_id).delete()
+
+
+def reindexar(tipo, batch_size=500):
+    """
+    Reconstruye el índice completo de un tipo de producto.
+
+    Returns:
+        int: Productos indexados
+    """
+    from .models import ProductoOfertado, ProductoDisponible, TerminoBusquedaProducto
+
+    if tipo == 'ofertado':
+        queryset = ProductoOfertado.objects.all()
+    else:
+        queryset = ProductoDisponible.objects.select_related('id_marca')
+
+    total = 0
+    with transaction.atomic():
+        TerminoBusquedaProducto.objects.filter(tipo_producto=tipo).delete()
+        filas = []
+        for producto in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            for termino, peso in terminos_producto(producto, tipo).items():
+                filas.append(TerminoBusquedaProducto(
+                    termino=termino, tipo_producto=tipo, producto_id=producto.pk,
+                    peso=peso, activo=producto.is_active
+                ))
+            total += 1
+            if len(filas) >= batch_size * 10:
+                TerminoBusquedaProducto.objects.bulk_create(filas, batch_size=batch_size)
+                filas = []
+        TerminoBusquedaProducto.objects.bulk_create(filas, batch_size=batch_size)
+    return total
+
+
+def buscar(consulta, tipos=('ofertado', 'disponible'), limite=20, incluir_inactivos=False):
+    """
+    Busca productos por los términos de la consulta.
+
+    Args:
+        consulta: Texto ingresado por el usuario
+        tipos: Tipos de producto a buscar
+        limite: Cantidad máxima de resultados
+        incluir_inactivos: Si se incluyen productos inactivos
+
+    Returns:
+        list: [(tipo, producto_id, puntaje)] ordenados por puntaje descendente
+    """
+    from .models import TerminoBusquedaProducto
+
+    # Sin repetir términos y empezando por los más largos, que son los más selectivos
+    terminos = sorted(set(tokenizar(consulta)), key=len, reverse=True)
+    if not terminos:
+        return []
+
+    puntajes = None
+    for termino in terminos:
+        queryset = TerminoBusquedaProducto.objects.filter(
+            termino__istartswith=termino, tipo_producto__in=tipos
+        )
+        if not incluir_inactivos:
+            queryset = queryset.filter(activo=True)
+        if puntajes is not None and len(puntajes) <= MAX_CANDIDATOS_FILTRO:
+            # Solo interesan los candidatos que ya cumplieron los términos anteriores
+            queryset = queryset.filter(producto_id__in={pk for _, pk in puntajes})
+
+        mejores = defaultdict(int)
+        for tipo, producto_id, encontrado, peso in queryset.values_list(
+                'tipo_producto', 'producto_id', 'termino', 'peso').iterator():
+            valor = peso * BONO_EXACTO if encontrado == termino else peso
+            clave = (tipo, producto_id)
+            if valor > mejores[clave]:
+                mejores[clave] = valor
+
+        if puntajes is None:
+            puntajes = mejores
+        else:
+            puntajes = {clave: puntajes[clave] + valor for clave, valor in mejores.items() if clave in puntajes}
+        if not puntajes:
+            return []
+
+    ordenados = sorted(puntajes.items(), key=lambda item: (-item[1], item[0]))
+    return [(tipo, producto_id, puntaje) for (tipo, producto_id), puntaje in ordenados[:limite]]
@@ -0,0 +1,64 @@
+from django.http import JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from .models import ProductoOfertado, ProductoDisponible
+from . import search_index
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTADOS = 50
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_products(request):
+    """
+    Búsqueda rápida de productos ofertados y disponibles para el autocompletado.
+
+    Parámetros: q (texto), tipo (ofertado, disponible o todos), limit (máximo 50)
+    e incluir_inactivos (true/false).
+    """
+    inicio = time.perf_counter()
+    consulta = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo', 'todos')
+    if tipo not in ('ofertado', 'disponible', 'todos'):
+        return JsonResponse({'error': 'tipo debe ser ofertado, disponible o todos'}, status=400)
+    try:
+        limite = min(max(int(request.GET.get('limit', 20)), 1), MAX_RESULTADOS)
+    except ValueError:
+        return JsonResponse({'error': 'limit debe ser un número entero'}, status=400)
+    incluir_inactivos = request.GET.get('incluir_inactivos', 'false').lower() == 'true'
+
+    tipos = ('ofertado', 'disponible') if tipo == 'todos' else (tipo,)
+    encontrados = search_index.buscar(consulta, tipos, limite, incluir_inactivos)
+
+    # Una consulta por tipo para los datos a mostrar
+    ids = {'ofertado': [], 'disponible': []}
+    for tipo_producto, producto_id, _ in encontrados:
+        ids[tipo_producto].append(producto_id)
+    datos = {}
+    if ids['ofertado']:
+        for producto in ProductoOfertado.objects.filter(pk__in=ids['ofertado']).values(
+                'id', 'code', 'cudim', 'nombre', 'is_active'):
+            datos[('ofertado', producto['id'])] = producto
+    if ids['disponible']:
+        for producto in ProductoDisponible.objects.filter(pk__in=ids['disponible']).values(
+                'id', 'code', 'nombre', 'modelo', 'id_marca__nombre', 'is_active'):
+            producto['marca'] = producto.pop('id_marca__nombre')
+            datos[('disponible', producto['id'])] = producto
+
+    results = []
+    for tipo_producto, producto_id, puntaje in encontrados:
+        producto = datos.get((tipo_producto, producto_id))
+        # El índice puede ir un instante por detrás de un borrado
+        if producto is None:
+            continue
+        results.append({'tipo': tipo_producto, 'score': puntaje, **producto})
+
+    return JsonResponse({
+        'q': consulta,
+        'count': len(results),
+        'results': results,
+        'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 2),
+    })
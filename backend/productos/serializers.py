@@ -9,9 +9,48 @@ from .models import (
 from basic.serializers import (
     CategoriaSerializer, MarcaSerializer, UnidadSerializer, ProcedenciaSerializer
 )
+from basic import reference_cache
 from directorio.serializers import ProveedorSerializer, ClienteSerializer
 
 
+class CatalogoRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Clave foránea que, si apunta a un catálogo básico, se valida y resuelve
+    desde basic.reference_cache en lugar de consultar la base de datos.
+    """
+    def to_internal_value(self, data):
+        catalogo = reference_cache.catalogo_de_modelo(self.get_queryset().model)
+        if catalogo is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instancia = reference_cache.instancia(catalogo, data)
+        if instancia is None:
+            try:
+                int(data)
+            except (TypeError, ValueError):
+                self.fail('incorrect_type', data_type=type(data).__name__)
+            self.fail('does_not_exist', pk_value=data)
+        return instancia
+
+
+class CamposDinamicosMixin:
+    """
+    Limita los campos serializados a los indicados en el contexto ('campos'),
+    que la vista arma a partir de ?fields=, ?expand= y ?vista=compacta.
+    Solo aplica al serializer raíz; los anidados conservan todos sus campos.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        campos = self.context.get('campos')
+        raiz = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        if campos and raiz:
+            fields = {nombre: campo for nombre, campo in fields.items() if nombre in campos}
+        return fields
+
+
 class ImagenReferenciaProductoOfertadoSerializer(serializers.ModelSerializer):
     """Serializer para el modelo ImagenReferenciaProductoOfertado"""
     imagen_url = serializers.SerializerMethodField()
@@ -22,7 +61,7 @@ class ImagenReferenciaProductoOfertadoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImagenReferenciaProductoOfertado
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'manifest', 'estado_procesamiento')
     
     def get_imagen_url(self, obj):
         """Devuelve la URL completa de la imagen principal (webp o la original)"""
@@ -80,8 +119,9 @@ class DocumentoProductoOfertadoSerializer(serializers.ModelSerializer):
         return None
 
 
-class ProductoOfertadoSerializer(serializers.ModelSerializer):
+class ProductoOfertadoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo ProductoOfertado"""
+    serializer_related_field = CatalogoRelatedField
     categoria_nombre = serializers.CharField(source='id_categoria.nombre', read_only=True)
     especialidad_nombre = serializers.SerializerMethodField()
     especialidad_data = serializers.SerializerMethodField()
@@ -179,7 +219,7 @@ class ImagenProductoDisponibleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImagenProductoDisponible
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at', 'manifest', 'estado_procesamiento')
     
     def get_imagen_url(self, obj):
         """Devuelve la URL completa de la imagen principal (webp o la original)"""
@@ -233,8 +273,9 @@ class ImagenProductoDisponibleSerializer(serializers.ModelSerializer):
         return version_urls
 
 
-class ProductoDisponibleSerializer(serializers.ModelSerializer):
+class ProductoDisponibleSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo ProductoDisponible"""
+    serializer_related_field = CatalogoRelatedField
     categoria_nombre = serializers.CharField(source='id_categoria.nombre', read_only=True)
     producto_ofertado_nombre = serializers.CharField(source='id_producto_ofertado.nombre', read_only=True)
     marca_nombre = serializers.CharField(source='id_marca.nombre', read_only=True)
@@ -297,7 +338,7 @@ class HistorialDeVentasSerializer(serializers.ModelSerializer):
 
 # Serializers detallados para vistas específicas
 
-class ProductoOfertadoDetalladoSerializer(serializers.ModelSerializer):
+class ProductoOfertadoDetalladoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer detallado para el modelo ProductoOfertado con relaciones anidadas"""
     categoria = CategoriaSerializer(source='id_categoria', read_only=True)
     imagenes = ImagenReferenciaProductoOfertadoSerializer(many=True, read_only=True)
@@ -324,7 +365,7 @@ class ProductoOfertadoDetalladoSerializer(serializers.ModelSerializer):
             return None
 
 
-class ProductoDisponibleDetalladoSerializer(serializers.ModelSerializer):
+class ProductoDisponibleDetalladoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer detallado para el modelo ProductoDisponible con relaciones anidadas"""
     categoria = CategoriaSerializer(source='id_categoria', read_only=True)
     producto_ofertado = ProductoOfertadoSerializer(source='id_producto_ofertado', read_only=True)
@@ -0,0 +1,110 @@
+"""
+Señales de la aplicación de productos.
+Mantienen sincronizados el índice de búsqueda (productos/search_index.py),
+los resúmenes de precios (productos/price_analytics.py) y el registro de
+productos eliminados para la sincronización del catálogo.
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+import logging
+
+from basic.models import Marca
+from .models import (
+    ProductoOfertado, ProductoDisponible, ProductsPrice, HistorialDeCompras, HistorialDeVentas,
+    ProductoEliminado
+)
+from . import search_index, price_analytics
+
+logger = logging.getLogger(__name__)
+
+
+def _indexar_al_confirmar(producto, tipo):
+    """Indexa el producto cuando la transacción se confirma"""
+    def indexar():
+        try:
+            search_index.indexar_producto(producto, tipo)
+        except Exception as e:
+            # Un error del índice no debe impedir guardar el producto
+            logger.error(f"Error al indexar producto {tipo} {producto.pk}: {str(e)}")
+    transaction.on_commit(indexar)
+
+
+@receiver(post_save, sender=ProductoOfertado)
+def indexar_producto_ofertado(sender, instance, **kwargs):
+    """Actualiza el índice de búsqueda al guardar un producto ofertado"""
+    _indexar_al_confirmar(instance, 'ofertado')
+
+
+@receiver(post_save, sender=ProductoDisponible)
+def indexar_producto_disponible(sender, instance, **kwargs):
+    """Actualiza el índice de búsqueda al guardar un producto disponible"""
+    _indexar_al_confirmar(instance, 'disponible')
+
+
+@receiver(post_delete, sender=ProductoOfertado)
+def desindexar_producto_ofertado(sender, instance, **kwargs):
+    """Quita del índice un producto ofertado eliminado y registra la baja"""
+    search_index.desindexar_producto(instance.pk, 'ofertado')
+    ProductoEliminado.objects.create(tipo_producto='ofertado', producto_id=instance.pk, code=instance.code)
+
+
+@receiver(post_delete, sender=ProductoDisponible)
+def desindexar_producto_disponible(sender, instance, **kwargs):
+    """Quita del índice un producto disponible eliminado y registra la baja"""
+    search_index.desindexar_producto(instance.pk, 'disponible')
+    ProductoEliminado.objects.create(tipo_producto='disponible', producto_id=instance.pk, code=instance.code)
+
+
+@receiver(post_save, sender=Marca)
+def reindexar_productos_marca(sender, instance, created, **kwargs):
+    """El nombre de la marca forma parte del índice de los productos disponibles"""
+    if created:
+        return
+
+    def reindexar():
+        for producto in ProductoDisponible.objects.filter(id_marca=instance).select_related('id_marca').iterator():
+            search_index.indexar_producto(producto, 'disponible')
+    transaction.on_commit(reindexar)
+
+
+FUENTES_PRECIO = {
+    ProductsPrice: 'precio',
+    HistorialDeCompras: 'compra',
+    HistorialDeVentas: 'venta',
+}
+
+
+def guardar_datos_anteriores(sender, instance, **kwargs):
+    """Recuerda producto y fecha previos de un registro editado"""
+    if instance.pk:
+        anterior = sender.objects.filter(pk=instance.pk).first()
+        instance._datos_precio_anteriores = (
+            price_analytics.datos_registro(FUENTES_PRECIO[sender], anterior) if anterior else None
+        )
+
+
+def actualizar_resumen_precios(sender, instance, created, **kwargs):
+    """Suma los registros nuevos al resumen; los editados recalculan sus períodos"""
+    fuente = FUENTES_PRECIO[sender]
+    if created:
+        price_analytics.registrar(fuente, instance)
+        return
+    actual = price_analytics.datos_registro(fuente, instance)
+    anterior = getattr(instance, '_datos_precio_anteriores', None)
+    for datos in {d[:2] for d in (actual, anterior) if d}:
+        price_analytics.recalcular(fuente, *datos)
+
+
+def descontar_resumen_precios(sender, instance, **kwargs):
+    """Recalcula los períodos de un registro eliminado"""
+    fuente = FUENTES_PRECIO[sender]
+    datos = price_analytics.datos_registro(fuente, instance)
+    if datos:
+        price_analytics.recalcular(fuente, *datos[:2])
+
+
+for model in FUENTES_PRECIO:
+    pre_save.connect(guardar_datos_anteriores, sender=model)
+    post_save.connect(actualizar_resumen_precios, sender=model)
+    post_delete.connect(descontar_resumen_precios, sender=model)
@@ -0,0 +1,1316 @@
+import io
+import os
+import gzip
+import json
+import random
+import shutil
+import tempfile
+import time
+from unittest import mock
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.utils import timezone
+from datetime import date, timedelta
+from decimal import Decimal
+from basic import reference_cache, category_tree
+from . import catalog_snapshot, image_queue, search_index, phash_index, price_analytics
+from .image_processor import ImageProcessor
+from basic.models import Categoria, Marca, Unidad, Procedencia, Especialidad, EmpresaClc
+from directorio.models import Proveedor
+from .models import (
+    ProductoOfertado, ImagenReferenciaProductoOfertado, ProductoDisponible,
+    ImagenProductoDisponible, DocumentoProductoDisponible, ProductsPrice, HistorialDeCompras,
+    TareaProcesamientoImagen, ArchivoContenido, TerminoBusquedaProducto, EjecucionLimpiezaMedia,
+    ResumenPrecioProducto
+)
+
+
+class QueryCountGuardTest(TestCase):
+    """
+    Verifica que los listados de productos ejecuten un número constante de
+    consultas: si una página de 2 registros y una de 8 difieren, algún
+    serializer está consultando por fila (N+1).
+    """
+    TOTAL = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='consultas', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        marca = Marca.objects.create(nombre='Marca', code='MAR')
+        unidad = Unidad.objects.create(nombre='Unidad', code='UND')
+        procedencia = Procedencia.objects.create(nombre='Importado', code='IMP')
+        empresa = EmpresaClc.objects.create(
+            nombre='Empresa', razon_social='Empresa SA', code='EMP', ruc='1790000000001',
+            direccion='Dir', correo='empresa@company.com', representante_legal='Rep'
+        )
+        proveedor = Proveedor.objects.create(
+            ruc='1890000000001', razon_social='Prov SA', nombre='Proveedor',
+            direccion1='Dir', correo='prov@company.com', telefono='0999999998'
+        )
+
+        for i in range(cls.TOTAL):
+            ofertado = ProductoOfertado.objects.create(
+                id_categoria=categoria, especialidad=especialidad,
+                code=f'OF-{i}', cudim=f'CU-{i}', nombre=f'Ofertado {i}'
+            )
+            disponible = ProductoDisponible.objects.create(
+                id_categoria=categoria, id_producto_ofertado=ofertado, id_marca=marca,
+                unidad_presentacion=unidad, procedencia=procedencia, id_especialidad=especialidad,
+                code=f'DI-{i}', nombre=f'Disponible {i}', modelo='M'
+            )
+            for orden in range(2):
+                ImagenReferenciaProductoOfertado.objects.create(
+                    producto_ofertado=ofertado, orden=orden,
+                    imagen_webp=f'productos/OF-{i}/webp/webp_20250101_000000_{orden}.webp'
+                )
+                ImagenProductoDisponible.objects.create(
+                    producto_disponible=disponible, orden=orden,
+                    imagen_webp=f'productos/DI-{i}/webp/webp_20250101_000000_{orden}.webp'
+                )
+            DocumentoProductoDisponible.objects.create(
+                producto_disponible=disponible, tipo_documento='ficha', titulo='Ficha',
+                documento=f'productos/DI-{i}/ficha.pdf'
+            )
+            ProductsPrice.objects.create(producto_disponible=disponible, valor=Decimal('10.00'))
+            HistorialDeCompras.objects.create(
+                producto=disponible, proveedor=proveedor, empresa=empresa, fecha=date(2025, 1, 1),
+                factura=f'F-{i}', valor=Decimal('10.00'), iva=Decimal('1.50'), cantidad=1
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def contar_consultas(self, url, page_size):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'page_size': page_size})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(consultas.captured_queries)
+
+    def assertConsultasConstantes(self, url):
+        pocas = self.contar_consultas(url, 2)
+        muchas = self.contar_consultas(url, self.TOTAL)
+        self.assertEqual(pocas, muchas, f'{url}: {pocas} consultas con 2 filas y {muchas} con {self.TOTAL}')
+
+    def test_listados_productos_ofertados(self):
+        self.assertConsultasConstantes('/api/productos/productos-ofertados/')
+        self.assertConsultasConstantes('/api/productos/productos-ofertados/activos/')
+        self.assertConsultasConstantes('/api/productos/productos-ofertados/listado_detallado/')
+
+    def test_listados_productos_disponibles(self):
+        self.assertConsultasConstantes('/api/productos/productos-disponibles/')
+        self.assertConsultasConstantes('/api/productos/productos-disponibles/activos/')
+        self.assertConsultasConstantes('/api/productos/productos-disponibles/listado_detallado/')
+
+    def test_listados_historial_e_imagenes(self):
+        self.assertConsultasConstantes('/api/productos/compras/')
+        self.assertConsultasConstantes('/api/productos/precios/')
+        self.assertConsultasConstantes('/api/productos/imagenes-disponibles/')
+        self.assertConsultasConstantes('/api/productos/imagenes-referencia/')
+
+    def test_detalle_producto_disponible(self):
+        producto = ProductoDisponible.objects.first()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(f'/api/productos/productos-disponibles/{producto.pk}/')
+        self.assertEqual(response.status_code, 200)
+        # Producto con sus relaciones, imágenes, documentos, precios y el ofertado con sus imágenes
+        self.assertLessEqual(len(consultas.captured_queries), 10)
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Recorre los listados con ?paginacion=cursor siguiendo el enlace next y
+    verifica que cada registro aparezca exactamente una vez.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cursor', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.productos = [
+            ProductoOfertado.objects.create(
+                id_categoria=categoria, especialidad=especialidad,
+                code=f'K{i}', cudim=f'CU-K{i}', nombre=f'Ofertado K{i}'
+            )
+            for i in range(6)
+        ]
+        # Todos en el mismo milisegundo, distinto microsegundo
+        base = timezone.now().replace(microsecond=123000)
+        for i, producto in enumerate(cls.productos):
+            ProductoOfertado.objects.filter(pk=producto.pk).update(created_at=base + timedelta(microseconds=i * 100))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def recorrer(self, ordering):
+        codigos = []
+        params = {'paginacion': 'cursor', 'page_size': 2, 'ordering': ordering}
+        url = '/api/productos/productos-ofertados/'
+        for _ in range(10):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.content[:500])
+            codigos.extend(producto['code'] for producto in response.data['results'])
+            if not response.data['next']:
+                return codigos
+            url, params = response.data['next'], None
+        self.fail(f'La paginación no terminó: {codigos}')
+
+    def test_registros_del_mismo_milisegundo_ascendente(self):
+        self.assertEqual(self.recorrer('created_at'), [f'K{i}' for i in range(6)])
+
+    def test_registros_del_mismo_milisegundo_descendente(self):
+        self.assertEqual(self.recorrer('-created_at'), [f'K{i}' for i in reversed(range(6))])
+
+
+class CargaMasivaTest(TestCase):
+    """
+    Carga masiva de productos disponibles: filas válidas e inválidas en el
+    mismo lote y número de consultas independiente de la cantidad de filas.
+    """
+    URL = '/api/productos/productos-disponibles/carga_masiva/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='carga', password='testpass123')
+        cls.categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        cls.marca = Marca.objects.create(nombre='Marca', code='MAR')
+        cls.existente = ProductoDisponible.objects.create(
+            id_categoria=cls.categoria, id_marca=cls.marca, code='CM-0', nombre='Existente', modelo='M'
+        )
+
+    def setUp(self):
+        for catalogo in ('categoria', 'marca', 'unidad', 'procedencia', 'especialidad'):
+            reference_cache.invalidar(catalogo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def fila(self, code, **campos):
+        return {'id_categoria': self.categoria.pk, 'code': code, 'nombre': f'Producto {code}', 'modelo': 'M', **campos}
+
+    def cargar(self, filas):
+        response = self.client.post(self.URL, filas, format='json')
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data
+
+    def test_crea_actualiza_e_informa_errores(self):
+        datos = self.cargar([
+            self.fila('CM-1', precio='12.50'),
+            {'code': 'CM-0', 'nombre': 'Actualizado'},
+            self.fila('CM-2', id_categoria=999999),
+            self.fila('CM-1'),
+        ])
+        self.assertEqual((datos['creados'], datos['actualizados'], datos['con_errores']), (1, 1, 2))
+        self.assertEqual([error['indice'] for error in datos['errores']], [2, 3])
+
+        creado = ProductoDisponible.objects.get(code='CM-1')
+        self.assertEqual(creado.id_marca.code, 'MNDEF')
+        self.assertEqual(ProductsPrice.objects.get(producto_disponible=creado).valor, Decimal('12.50'))
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.nombre, 'Actualizado')
+        self.assertFalse(ProductoDisponible.objects.filter(code='CM-2').exists())
+
+    def test_consultas_constantes(self):
+        # La primera carga crea los catálogos por defecto y la segunda vuelve a llenar el caché
+        self.cargar([self.fila('CM-W')])
+        self.cargar([self.fila('CM-X')])
+
+        def contar(prefijo, cantidad):
+            filas = [self.fila(f'{prefijo}-{i}', precio='1.00') for i in range(cantidad)]
+            with CaptureQueriesContext(connection) as consultas:
+                datos = self.cargar(filas)
+            self.assertEqual(datos['creados'], cantidad)
+            return len(consultas.captured_queries)
+
+        self.assertEqual(contar('A', 2), contar('B', 20))
+
+
+
+class SubidaMasivaImagenesTest(TestCase):
+    """
+    Subida masiva de imágenes: sin IMAGE_PROCESSING_ASYNC se procesan en la
+    petición; con él se encolan. Las filas se insertan con bulk_create también
+    en motores que no devuelven las claves (MySQL).
+    """
+    URL = '/api/productos/products/images/bulk-upload/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='imagenes', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.producto = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='IMG-1', cudim='CU-IMG', nombre='Con imágenes'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def imagen(self, nombre, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+    def subir(self):
+        return self.client.post(self.URL, {
+            'images': [self.imagen('a.png', 'red'), self.imagen('b.png', 'blue'), self.imagen('c.png', 'red')],
+            'product_id': self.producto.pk,
+        }, format='multipart')
+
+    def verificar_ids(self, response):
+        ids = [resultado['id'] for resultado in response.json()['results']]
+        self.assertEqual(sorted(ids), sorted(
+            ImagenReferenciaProductoOfertado.objects.filter(producto_ofertado=self.producto).values_list('pk', flat=True)
+        ))
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_sin_cola_procesa_en_la_peticion(self):
+        response = self.subir()
+        self.assertEqual(response.status_code, 201, response.content[:500])
+        resultados = response.json()['results']
+        self.assertEqual([r['status'] for r in resultados], ['creado', 'creado', 'reutilizado'])
+        self.assertTrue(all(r['estado_procesamiento'] == 'completado' and r['urls'] for r in resultados))
+        self.assertFalse(TareaProcesamientoImagen.objects.exists())
+        self.verificar_ids(response)
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=True)
+    def test_con_cola_encola_las_imagenes_nuevas(self):
+        response = self.subir()
+        self.assertEqual(response.status_code, 202, response.content[:500])
+        self.assertEqual(response.json()['queued'], 3)
+        self.assertEqual(TareaProcesamientoImagen.objects.count(), 3)
+        self.verificar_ids(response)
+
+    @override_settings(IMAGE_PROCESSING_ASYNC=False)
+    def test_lee_las_claves_si_el_motor_no_las_devuelve(self):
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.subir()
+        self.assertEqual(response.status_code, 201, response.content[:500])
+        self.verificar_ids(response)
+        for imagen in ImagenReferenciaProductoOfertado.objects.filter(producto_ofertado=self.producto):
+            self.assertFalse(imagen.imagen.name.startswith('temp/'))
+            self.assertTrue(imagen.imagen_thumbnail)
+
+
+class RespuestaCondicionalTest(TestCase):
+    """
+    ETag de listados y detalles: 304 mientras nada cambie y 200 cuando cambia
+    algo que devuelve el serializer, incluidas las relaciones del detalle.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='etag', password='testpass123')
+        cls.categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.ofertado = ProductoOfertado.objects.create(
+            id_categoria=cls.categoria, especialidad=especialidad, code='ET-1', cudim='CU-ET', nombre='Ofertado'
+        )
+        cls.disponible = ProductoDisponible.objects.create(
+            id_categoria=cls.categoria, id_producto_ofertado=cls.ofertado, code='ETD-1', nombre='Disponible', modelo='M'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertCambia(self, url, cambio):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cambio()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_listado_cambia_al_editar_un_producto(self):
+        self.assertCambia(
+            '/api/productos/productos-ofertados/',
+            lambda: ProductoOfertado.objects.get(pk=self.ofertado.pk).save()
+        )
+
+    def test_detalle_disponible_cambia_al_agregar_un_precio(self):
+        response = self.assertCambia(
+            f'/api/productos/productos-disponibles/{self.disponible.pk}/',
+            lambda: ProductsPrice.objects.create(producto_disponible=self.disponible, valor=Decimal('25.00'))
+        )
+        self.assertEqual(len(response.data['precios']), 1)
+
+    def test_detalle_ofertado_cambia_al_agregar_un_disponible(self):
+        response = self.assertCambia(
+            f'/api/productos/productos-ofertados/{self.ofertado.pk}/',
+            lambda: ProductoDisponible.objects.create(
+                id_categoria=self.categoria, id_producto_ofertado=self.ofertado,
+                code='ETD-2', nombre='Otro disponible', modelo='M'
+            )
+        )
+        self.assertEqual(response.data['productos_disponibles_count'], 2)
+
+
+class CopiaCatalogoTest(TestCase):
+    """
+    Copia completa y delta del catálogo: la copia se guarda fuera de
+    MEDIA_ROOT y solo se descarga autenticado; el delta devuelve lo cambiado
+    y eliminado desde el token.
+    """
+    URL_COPIA = '/api/productos/catalogo/snapshot/'
+    URL_DELTA = '/api/productos/catalogo/delta/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='catalogo', password='testpass123')
+        cls.categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.ofertado = ProductoOfertado.objects.create(
+            id_categoria=cls.categoria, especialidad=cls.especialidad, code='CAT-1', cudim='CU-CAT', nombre='Monitor'
+        )
+        cls.disponible = ProductoDisponible.objects.create(
+            id_categoria=cls.categoria, id_producto_ofertado=cls.ofertado, code='CATD-1', nombre='Monitor X', modelo='X'
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        for directorio in (self.media_root, self.root):
+            self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CATALOG_SNAPSHOT={'root': self.root, 'delta_margin_seconds': 0},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_copia_fuera_de_media_root_y_descarga_autenticada(self):
+        datos = catalog_snapshot.generar()
+        self.assertTrue(catalog_snapshot.manifiesto()['ruta'].startswith(self.root))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+        self.assertIn(APIClient().get(self.URL_COPIA).status_code, (401, 403))
+
+        response = self.client.get(self.URL_COPIA, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lineas = [json.loads(linea) for linea in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual(lineas[0], {'op': 'meta', 'token': datos['token'], 'generado': lineas[0]['generado']})
+        self.assertEqual(
+            sorted((fila['tipo'], fila['code']) for fila in lineas[1:]),
+            [('disponible', 'CATD-1'), ('ofertado', 'CAT-1')]
+        )
+
+        response = self.client.get(self.URL_COPIA, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_delta_devuelve_cambios_y_bajas(self):
+        token = catalog_snapshot.generar()['token']
+        ProductoOfertado.objects.get(pk=self.ofertado.pk).save()
+        disponible_id = self.disponible.pk
+        ProductoDisponible.objects.get(pk=disponible_id).delete()
+
+        response = self.client.get(self.URL_DELTA, {'since': token})
+        self.assertEqual(response.status_code, 200)
+        resultado = response.json()
+        self.assertEqual([fila['code'] for fila in resultado['ofertados']], ['CAT-1'])
+        self.assertEqual(resultado['disponibles'], [])
+        self.assertEqual(resultado['eliminados'], [
+            {'op': 'delete', 'tipo': 'disponible', 'id': disponible_id, 'code': 'CATD-1'}
+        ])
+
+        # Con el token nuevo ya no hay cambios
+        resultado = self.client.get(self.URL_DELTA, {'since': resultado['token']}).json()
+        self.assertEqual((resultado['ofertados'], resultado['disponibles'], resultado['eliminados']), ([], [], []))
+
+    def test_delta_con_token_invalido(self):
+        response = self.client.get(self.URL_DELTA, {'since': 'no-es-un-token'})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['requiere_copia_completa'])
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class DeduplicacionContenidoTest(TestCase):
+    """
+    Almacén por contenido: un archivo idéntico a otro ya subido reutiliza el
+    archivo guardado (y, en imágenes, sus versiones) en lugar de duplicarlo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        ofertado = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='DUP-1', cudim='CU-DUP', nombre='Ofertado'
+        )
+        cls.disponibles = [
+            ProductoDisponible.objects.create(
+                id_categoria=categoria, id_producto_ofertado=ofertado, code=f'DUPD-{i}', nombre=f'Disponible {i}', modelo='M'
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def documento(self, producto, contenido):
+        return DocumentoProductoDisponible.objects.create(
+            producto_disponible=producto, tipo_documento='ficha', titulo='Ficha técnica',
+            documento=SimpleUploadedFile('ficha.pdf', contenido, content_type='application/pdf')
+        )
+
+    def imagen(self, producto, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return ImagenProductoDisponible.objects.create(
+            producto_disponible=producto,
+            imagen=SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+        )
+
+    def archivos(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nombre), self.media_root)
+            for raiz, _, nombres in os.walk(self.media_root) for nombre in nombres
+        )
+
+    def test_documento_identico_reutiliza_el_archivo(self):
+        primero = self.documento(self.disponibles[0], b'%PDF-1.4 ficha')
+        archivos = self.archivos()
+        segundo = self.documento(self.disponibles[1], b'%PDF-1.4 ficha')
+        distinto = self.documento(self.disponibles[1], b'%PDF-1.4 otra ficha')
+
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertIsNotNone(primero.blob)
+        self.assertEqual(segundo.blob, primero.blob)
+        self.assertEqual(segundo.documento.name, primero.documento.name)
+        self.assertNotEqual(distinto.blob, primero.blob)
+        self.assertEqual(len(self.archivos()), len(archivos) + 1)
+        self.assertEqual(ArchivoContenido.objects.filter(tipo='documento').count(), 2)
+
+    def test_imagen_identica_reutiliza_las_versiones(self):
+        primera = self.imagen(self.disponibles[0], 'red')
+        archivos = self.archivos()
+        segunda = self.imagen(self.disponibles[1], 'red')
+
+        self.assertEqual(segunda.blob, primera.blob)
+        self.assertEqual(segunda.estado_procesamiento, 'completado')
+        self.assertEqual(
+            (segunda.imagen.name, segunda.imagen_thumbnail, segunda.manifest),
+            (primera.imagen.name, primera.imagen_thumbnail, primera.manifest)
+        )
+        self.assertEqual(self.archivos(), archivos)
+
+        distinta = self.imagen(self.disponibles[1], 'blue')
+        self.assertNotEqual(distinta.blob, primera.blob)
+        self.assertEqual(ArchivoContenido.objects.filter(tipo='imagen').count(), 2)
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=True, IMAGE_PROCESSING_MAX_ATTEMPTS=2)
+class ColaImagenesTest(TestCase):
+    """
+    Cola de procesamiento de imágenes: la subida queda pendiente, cada tarea se
+    reclama una sola vez, los fallos se reintentan hasta el máximo y el
+    resultado del worker completa la imagen.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.producto = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='COLA-1', cudim='CU-COLA', nombre='Encolado'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def imagen(self, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return ImagenReferenciaProductoOfertado.objects.create(
+            producto_ofertado=self.producto,
+            imagen=SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+        )
+
+    def test_subida_queda_pendiente(self):
+        imagen = self.imagen('red')
+        self.assertEqual(imagen.estado_procesamiento, 'pendiente')
+        tarea = TareaProcesamientoImagen.objects.get()
+        self.assertEqual(tarea.imagen, imagen)
+        self.assertEqual(tarea.estado, 'pendiente')
+        self.assertEqual(tarea.archivo_origen, imagen.imagen.name)
+
+    def test_cada_tarea_se_reclama_una_vez(self):
+        primera, segunda = self.imagen('red'), self.imagen('blue')
+
+        reclamadas = image_queue.reclamar_tareas(1)
+        self.assertEqual([tarea.imagen for tarea in reclamadas], [primera])
+        self.assertEqual((reclamadas[0].estado, reclamadas[0].intentos), ('procesando', 1))
+        self.assertEqual([tarea.imagen for tarea in image_queue.reclamar_tareas(5)], [segunda])
+        self.assertEqual(image_queue.reclamar_tareas(5), [])
+
+        tarea = TareaProcesamientoImagen.objects.get(pk=reclamadas[0].pk)
+        self.assertEqual((tarea.estado, tarea.intentos), ('procesando', 1))
+        self.assertIsNotNone(tarea.iniciado_en)
+        primera.refresh_from_db()
+        self.assertEqual(primera.estado_procesamiento, 'procesando')
+
+    def test_error_se_reintenta_hasta_el_maximo(self):
+        imagen = self.imagen('red')
+
+        image_queue.registrar_error(image_queue.reclamar_tareas(1)[0], 'fallo')
+        imagen.refresh_from_db()
+        self.assertEqual(TareaProcesamientoImagen.objects.get().estado, 'pendiente')
+        self.assertEqual(imagen.estado_procesamiento, 'pendiente')
+
+        image_queue.registrar_error(image_queue.reclamar_tareas(1)[0], 'fallo')
+        imagen.refresh_from_db()
+        tarea = TareaProcesamientoImagen.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos, tarea.mensaje), ('error', 2, 'fallo'))
+        self.assertEqual(imagen.estado_procesamiento, 'error')
+        self.assertEqual(image_queue.reclamar_tareas(1), [])
+
+    def test_recupera_tareas_bloqueadas(self):
+        self.imagen('red')
+        image_queue.reclamar_tareas(1)
+        self.assertEqual(image_queue.recuperar_tareas_bloqueadas(minutos=30), 0)
+        TareaProcesamientoImagen.objects.update(iniciado_en=timezone.now() - timedelta(hours=1))
+        self.assertEqual(image_queue.recuperar_tareas_bloqueadas(minutos=30), 1)
+        self.assertEqual(TareaProcesamientoImagen.objects.get().estado, 'pendiente')
+
+    def test_resultado_completa_la_imagen(self):
+        imagen = self.imagen('red')
+        subida = imagen.imagen.name
+        tarea = image_queue.reclamar_tareas(1)[0]
+
+        image_queue.aplicar_resultado(tarea, image_queue.generar_versiones(tarea.archivo_origen, tarea.base_path))
+
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.estado_procesamiento, 'completado')
+        self.assertTrue(imagen.imagen_thumbnail and imagen.manifest.get('variants'))
+        self.assertIsNotNone(imagen.blob)
+        self.assertEqual(TareaProcesamientoImagen.objects.get().estado, 'completado')
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, subida)))
+
+
+class BusquedaProductosTest(TestCase):
+    """
+    Índice de búsqueda: sin distinguir tildes ni mayúsculas, por prefijo y
+    exigiendo todos los términos. Las señales lo mantienen al día.
+    """
+    URL = '/api/productos/search/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='busqueda', password='testpass123')
+        cls.categoria = Categoria.objects.create(nombre='Insumos', code='INS')
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.venoso = self.ofertado('ECG-12', 'Catéter venoso central')
+            self.arterial = self.ofertado('ART-1', 'Catéter arterial')
+            self.marca = Marca.objects.create(nombre='Vitalmed', code='VIT')
+            self.disponible = ProductoDisponible.objects.create(
+                id_categoria=self.categoria, id_producto_ofertado=self.venoso, id_marca=self.marca,
+                code='CVC-7', nombre='Kit catéter venoso', modelo='Triple lumen'
+            )
+
+    def ofertado(self, code, nombre, **kwargs):
+        return ProductoOfertado.objects.create(
+            id_categoria=self.categoria, especialidad=self.especialidad,
+            code=code, cudim=f'CU-{code}', nombre=nombre, **kwargs
+        )
+
+    def encontrados(self, consulta, **kwargs):
+        return {(tipo, pk) for tipo, pk, _ in search_index.buscar(consulta, **kwargs)}
+
+    def test_sin_tildes_ni_mayusculas_y_por_prefijo(self):
+        esperados = {('ofertado', self.venoso.pk), ('ofertado', self.arterial.pk), ('disponible', self.disponible.pk)}
+        self.assertEqual(self.encontrados('CATETER'), esperados)
+        self.assertEqual(self.encontrados('caté'), esperados)
+
+    def test_exige_todos_los_terminos(self):
+        self.assertEqual(
+            self.encontrados('cateter venoso', tipos=('ofertado',)),
+            {('ofertado', self.venoso.pk)}
+        )
+        self.assertEqual(self.encontrados('cateter pediatrico'), set())
+
+    def test_codigos_por_partes_y_unidos(self):
+        self.assertEqual(self.encontrados('ecg12'), {('ofertado', self.venoso.pk)})
+        self.assertEqual(self.encontrados('ECG 12'), {('ofertado', self.venoso.pk)})
+
+    def test_coincidencia_exacta_pesa_mas(self):
+        prefijo = search_index.buscar('arteria', tipos=('ofertado',))
+        exacta = search_index.buscar('arterial', tipos=('ofertado',))
+        self.assertEqual([pk for _, pk, _ in prefijo], [self.arterial.pk])
+        self.assertGreater(exacta[0][2], prefijo[0][2])
+
+    def test_senales_mantienen_el_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marca.nombre = 'Medisur'
+            self.marca.save()
+            self.arterial.is_active = False
+            self.arterial.save()
+        self.assertEqual(self.encontrados('medisur'), {('disponible', self.disponible.pk)})
+        self.assertEqual(self.encontrados('vitalmed'), set())
+        self.assertEqual(self.encontrados('arterial'), set())
+        self.assertEqual(self.encontrados('arterial', incluir_inactivos=True), {('ofertado', self.arterial.pk)})
+
+        venoso_id = self.venoso.pk
+        self.disponible.delete()
+        self.venoso.delete()
+        self.assertFalse(search_index.buscar('venoso'))
+        self.assertFalse(TerminoBusquedaProducto.objects.filter(producto_id=venoso_id, tipo_producto='ofertado').exists())
+
+    def test_endpoint(self):
+        response = self.client.get(self.URL, {'q': 'venoso', 'tipo': 'disponible'})
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['count'], 1)
+        self.assertEqual(
+            {clave: datos['results'][0][clave] for clave in ('tipo', 'id', 'code', 'marca')},
+            {'tipo': 'disponible', 'id': self.disponible.pk, 'code': 'CVC-7', 'marca': 'Vitalmed'}
+        )
+        self.assertEqual(self.client.get(self.URL, {'q': 'venoso', 'tipo': 'otro'}).status_code, 400)
+
+
+class SubarbolCategoriasTest(TestCase):
+    """
+    Árbol de categorías materializado: las rutas de los descendientes siguen
+    a su ancestro al moverlo o eliminarlo, y los productos se filtran por
+    subárbol sin confundir categorías con el mismo prefijo de código.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='arbol', password='testpass123')
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.equipos = Categoria.objects.create(nombre='Equipos', code='EQ')
+        self.cardio = Categoria.objects.create(nombre='Cardiología', code='CARD', parent=self.equipos)
+        self.monitores = Categoria.objects.create(nombre='Monitores', code='MON', parent=self.cardio)
+        self.externos = Categoria.objects.create(nombre='Equipos externos', code='EQX')
+        self.monitor = self.ofertado('SUB-1', self.monitores)
+        self.equipo = self.ofertado('SUB-2', self.equipos)
+        self.externo = self.ofertado('SUB-3', self.externos)
+
+    def ofertado(self, code, categoria):
+        return ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=self.especialidad, code=code, cudim=f'CU-{code}', nombre=code
+        )
+
+    def rutas(self):
+        return dict(Categoria.objects.values_list('code', 'path'))
+
+    def test_rutas_y_subarbol(self):
+        self.assertEqual(self.monitores.path, 'EQ/CARD/MON')
+        self.assertEqual(self.monitores.level, 2)
+        self.assertEqual(
+            set(Categoria.objects.filter(category_tree.filtro_subarbol(self.equipos)).values_list('code', flat=True)),
+            {'EQ', 'CARD', 'MON'}
+        )
+
+        response = self.client.get('/api/productos/productos-ofertados/', {'categoria_subarbol': self.equipos.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({producto['code'] for producto in response.data['results']}, {'SUB-1', 'SUB-2'})
+
+    def test_mover_una_rama_actualiza_los_descendientes(self):
+        self.cardio.parent = self.externos
+        self.cardio.save()
+        self.assertEqual(self.rutas()['MON'], 'EQX/CARD/MON')
+        self.assertEqual(Categoria.objects.get(pk=self.monitores.pk).level, 2)
+
+        self.cardio.refresh_from_db()
+        self.cardio.parent = None
+        self.cardio.code = 'CAR2'
+        self.cardio.save()
+        self.assertEqual(Categoria.objects.get(pk=self.monitores.pk).level, 1)
+        self.assertEqual(self.rutas()['MON'], 'CAR2/MON')
+
+    def test_eliminar_convierte_las_hijas_en_raices(self):
+        ProductoOfertado.objects.filter(pk=self.equipo.pk).delete()
+        self.equipos.delete()
+        rutas = self.rutas()
+        self.assertEqual((rutas['CARD'], rutas['MON']), ('CARD', 'CARD/MON'))
+        self.assertEqual(Categoria.objects.get(pk=self.monitores.pk).level, 1)
+        self.assertEqual(category_tree.reconstruir_rutas(), 0)
+
+    def test_arbol_acumula_los_productos(self):
+        response = self.client.get('/api/basic/categorias/arbol/', {'raiz': self.equipos.pk})
+        self.assertEqual(response.status_code, 200)
+        raiz, = response.data
+        self.assertEqual((raiz['code'], raiz['cantidad_ofertados'], raiz['total_ofertados']), ('EQ', 1, 2))
+        self.assertEqual([hijo['code'] for hijo in raiz['hijos']], ['CARD'])
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class ManifiestoImagenTest(TestCase):
+    """
+    Manifiesto de versiones: las URLs se resuelven desde el manifiesto sin
+    listar directorios, y backfill_image_manifests lo genera para las
+    imágenes que no lo tienen.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.producto = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='MAN-1', cudim='CU-MAN', nombre='Con manifiesto'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(buffer, 'PNG')
+        self.imagen = ImagenReferenciaProductoOfertado.objects.create(
+            producto_ofertado=self.producto,
+            imagen=SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+        )
+
+    def test_urls_desde_el_manifiesto_sin_listar_directorios(self):
+        variantes = self.imagen.manifest['variants']
+        self.assertEqual(set(variantes), {'original', 'thumbnail', 'webp'})
+        for variante in variantes.values():
+            self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, variante['path'])))
+
+        with mock.patch('os.listdir', side_effect=AssertionError('no debe listar directorios')):
+            urls = self.imagen.get_version_urls()
+        self.assertEqual(urls['webp'], f"{settings.MEDIA_URL}{variantes['webp']['path']}")
+        self.assertEqual(urls['default'], urls['webp'])
+        self.assertEqual(urls['timestamp'], self.imagen.manifest['timestamp'])
+
+    def test_backfill_genera_los_manifiestos_faltantes(self):
+        manifiesto = self.imagen.manifest
+        ImagenReferenciaProductoOfertado.objects.filter(pk=self.imagen.pk).update(manifest={})
+
+        call_command('backfill_image_manifests', stdout=io.StringIO())
+
+        self.imagen.refresh_from_db()
+        self.assertEqual(self.imagen.manifest['timestamp'], manifiesto['timestamp'])
+        self.assertEqual(
+            {nombre: variante['path'] for nombre, variante in self.imagen.manifest['variants'].items()},
+            {nombre: variante['path'] for nombre, variante in manifiesto['variants'].items()}
+        )
+
+
+class ProcesadorImagenTest(TestCase):
+    """
+    ImageProcessor decodifica la subida una sola vez, guarda el original sin
+    recodificar y encadena las versiones reducidas (WebP y miniatura).
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def subida(self, formato, tamano=(1600, 1200)):
+        buffer = io.BytesIO()
+        Image.new('RGB', tamano, 'red').save(buffer, formato)
+        extension = {'JPEG': 'jpg', 'BMP': 'bmp'}[formato]
+        return SimpleUploadedFile(f'foto.{extension}', buffer.getvalue())
+
+    def procesar(self, subida):
+        with mock.patch('productos.image_processor.Image.open', wraps=Image.open) as abrir:
+            resultado = ImageProcessor().process_image(subida, os.path.join(self.media_root, 'productos', 'P1'))
+        self.assertEqual(abrir.call_count, 1)
+        return resultado
+
+    def test_jpeg_se_decodifica_una_vez_y_conserva_el_original(self):
+        subida = self.subida('JPEG')
+        resultado = self.procesar(subida)
+
+        with open(resultado['original'], 'rb') as f:
+            self.assertEqual(f.read(), subida.file.getvalue())
+        self.assertEqual((resultado.original.width, resultado.original.height), (1600, 1200))
+        self.assertEqual(set(resultado), {'original', 'webp', 'thumbnail'})
+        self.assertTrue({'lectura', 'decodificacion', 'webp', 'thumbnail'} <= set(resultado.timings))
+
+        for nombre, maximo in (('webp', (800, 600)), ('thumbnail', (150, 150))):
+            with Image.open(resultado[nombre]) as img:
+                self.assertEqual(img.size, (resultado.variantes[nombre].width, resultado.variantes[nombre].height))
+                self.assertTrue(img.width <= maximo[0] and img.height <= maximo[1])
+                self.assertAlmostEqual(img.width / img.height, 4 / 3, places=1)
+
+    def test_formato_no_aceptado_se_recodifica(self):
+        resultado = self.procesar(self.subida('BMP', tamano=(40, 30)))
+        self.assertEqual(resultado.original.format, 'BMP')
+        with Image.open(resultado['webp']) as img:
+            self.assertEqual(img.size, (40, 30))
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class MetadatosImagenTest(TestCase):
+    """
+    Los metadatos de la imagen (dimensiones, formato, tamaño y hash perceptual)
+    salen del resultado del procesamiento, sin volver a abrir los archivos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        ofertado = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='META-1', cudim='CU-META', nombre='Ofertado'
+        )
+        cls.producto = ProductoDisponible.objects.create(
+            id_categoria=categoria, id_producto_ofertado=ofertado, code='METAD-1', nombre='Disponible', modelo='M'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_metadatos_sin_releer_los_archivos(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 200), 'green').save(buffer, 'JPEG')
+        releer = mock.patch.object(ImageProcessor, 'describe_file', side_effect=AssertionError('no debe releer'))
+        with releer, mock.patch('productos.image_processor.Image.open', wraps=Image.open) as abrir:
+            imagen = ImagenProductoDisponible.objects.create(
+                producto_disponible=self.producto,
+                imagen=SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+            )
+        self.assertEqual(abrir.call_count, 1)
+
+        imagen.refresh_from_db()
+        self.assertEqual(
+            (imagen.width, imagen.height, imagen.format, imagen.file_size),
+            (320, 200, 'JPEG', len(buffer.getvalue()))
+        )
+        # Los metadatos calculados al escribir coinciden con los de los archivos en disco
+        for nombre, variante in imagen.manifest['variants'].items():
+            en_disco = ImageProcessor.describe_file(os.path.join(settings.MEDIA_ROOT, variante['path']))
+            campos = ('path', 'width', 'height', 'format', 'bytes', 'sha256')
+            self.assertEqual([variante[c] for c in campos], [en_disco[c] for c in campos], nombre)
+        self.assertEqual(imagen.phash, imagen.manifest['variants']['original']['phash'])
+        self.assertEqual(len(imagen.phash), 16)
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class LimpiezaMediaTest(TestCase):
+    """
+    Recolector de huérfanos: elimina los archivos antiguos sin referencias
+    (incluidas las versiones de contenidos que ya nadie usa), respeta los
+    recientes y reanuda el recorrido por tramos sin repetir archivos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.producto = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='GC-1', cudim='CU-GC', nombre='Con imágenes'
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.conservada = self.imagen('red')
+        self.eliminada = self.imagen('blue')
+        self.viejo = self.escribir('productos/sueltos/viejo.txt')
+        hace_dos_dias = time.time() - 2 * 24 * 3600
+        for raiz, _, nombres in os.walk(self.media_root):
+            for nombre in nombres:
+                os.utime(os.path.join(raiz, nombre), (hace_dos_dias, hace_dos_dias))
+        ArchivoContenido.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.reciente = self.escribir('productos/sueltos/reciente.txt')
+
+    def imagen(self, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return ImagenReferenciaProductoOfertado.objects.create(
+            producto_ofertado=self.producto,
+            imagen=SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+        )
+
+    def escribir(self, ruta):
+        ruta = os.path.join(self.media_root, ruta)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'w') as f:
+            f.write('x')
+        return ruta
+
+    def rutas(self, imagen):
+        return [os.path.join(self.media_root, v['path']) for v in imagen.manifest['variants'].values()]
+
+    def archivos(self):
+        return sorted(os.path.join(raiz, nombre) for raiz, _, nombres in os.walk(self.media_root) for nombre in nombres)
+
+    def test_elimina_huerfanos_antiguos(self):
+        blob_id = self.eliminada.blob_id
+        ImagenReferenciaProductoOfertado.objects.filter(pk=self.eliminada.pk).delete()
+
+        call_command('limpiar_media', '--delete', '--max-por-segundo', '0', stdout=io.StringIO())
+
+        self.assertFalse(ArchivoContenido.objects.filter(pk=blob_id).exists())
+        self.assertTrue(ArchivoContenido.objects.filter(pk=self.conservada.blob_id).exists())
+        self.assertEqual(
+            self.archivos(),
+            sorted(self.rutas(self.conservada) + [self.reciente])
+        )
+        self.assertEqual(EjecucionLimpiezaMedia.objects.get().eliminados, len(self.rutas(self.eliminada)) + 1)
+
+    def test_informa_por_tramos_sin_eliminar(self):
+        archivos = self.archivos()
+        for _ in range(len(archivos)):
+            call_command('limpiar_media', '--max-archivos', '2', '--max-por-segundo', '0', stdout=io.StringIO())
+            ejecucion = EjecucionLimpiezaMedia.objects.get()
+            if ejecucion.estado == 'completada':
+                break
+        else:
+            self.fail('El recorrido no terminó')
+
+        self.assertEqual(ejecucion.archivos_revisados, len(archivos))
+        self.assertEqual((ejecucion.huerfanos, ejecucion.eliminados), (1, 0))
+        self.assertEqual(self.archivos(), archivos)
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False)
+class ImagenesSimilaresTest(TestCase):
+    """
+    Índice de hashes perceptuales: el BK-tree encuentra lo mismo que una
+    comparación exhaustiva y el índice se reconstruye cuando cambian los hashes,
+    también si se reescriben en lote.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='similares', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.producto = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='PH-1', cudim='CU-PH', nombre='Con imágenes'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # El índice es compartido por proceso: cada prueba empieza sin él
+        indices = mock.patch.dict(phash_index._indices, clear=True)
+        indices.start()
+        self.addCleanup(indices.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.imagenes = []
+        for color, phash in (('red', '00000000000000ff'), ('blue', '00000000000000fe'), ('green', 'ffffffff00000000')):
+            buffer = io.BytesIO()
+            Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+            imagen = ImagenReferenciaProductoOfertado.objects.create(
+                producto_ofertado=self.producto,
+                imagen=SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+            )
+            ImagenReferenciaProductoOfertado.objects.filter(pk=imagen.pk).update(phash=phash)
+            imagen.phash = phash
+            self.imagenes.append(imagen)
+
+    def test_bktree_coincide_con_la_busqueda_exhaustiva(self):
+        aleatorio = random.Random(10)
+        valores = [aleatorio.getrandbits(64) for _ in range(300)]
+        valores += [valor ^ (1 << aleatorio.randrange(64)) for valor in valores[:50]]
+        arbol = phash_index.BKTree()
+        for indice, valor in enumerate(valores):
+            arbol.agregar(valor, indice)
+        for consulta in valores[:60]:
+            esperados = sorted(
+                (phash_index.hamming(consulta, valor), indice) for indice, valor in enumerate(valores)
+                if phash_index.hamming(consulta, valor) <= 6
+            )
+            self.assertEqual(sorted(arbol.buscar(consulta, 6)), esperados)
+
+    def test_endpoint_similares(self):
+        roja, azul, verde = self.imagenes
+        response = self.client.get(f'/api/productos/imagenes-referencia/{roja.pk}/similares/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(resultado['id'], resultado['distancia']) for resultado in response.data['results']],
+            [(azul.pk, 1)]
+        )
+        response = self.client.get(f'/api/productos/imagenes-referencia/{roja.pk}/similares/', {'distancia': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_indice_detecta_hashes_reescritos_en_lote(self):
+        from productos.management.commands.reporte_imagenes_similares import Command
+
+        roja, azul, verde = self.imagenes
+        indice = phash_index.obtener_indice(ImagenReferenciaProductoOfertado)
+        self.assertEqual(indice.similares(roja.phash, excluir=roja.pk), [(1, azul.pk)])
+
+        verde.phash = '00000000000000f0'
+        Command().guardar_hashes(ImagenReferenciaProductoOfertado, [verde])
+        self.assertEqual(indice.similares(roja.phash, excluir=roja.pk), [(1, azul.pk), (4, verde.pk)])
+
+
+class CamposSeleccionablesTest(TestCase):
+    """
+    Representaciones parciales de los listados: ?fields= y ?vista=compacta
+    devuelven solo los campos pedidos y, si son columnas, sin consultar las
+    relaciones; ?expand= agrega relaciones a la selección.
+    """
+    URL = '/api/productos/productos-disponibles/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='campos', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        marca = Marca.objects.create(nombre='Vitalmed', code='VIT')
+        ofertado = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='FS-1', cudim='CU-FS', nombre='Ofertado'
+        )
+        for i in range(3):
+            disponible = ProductoDisponible.objects.create(
+                id_categoria=categoria, id_producto_ofertado=ofertado, id_marca=marca,
+                code=f'FSD-{i}', nombre=f'Disponible {i}', modelo='M', precio_venta_privado=Decimal('12.50')
+            )
+            ImagenProductoDisponible.objects.create(
+                producto_disponible=disponible, imagen_webp=f'productos/FSD-{i}/webp/webp_20250101_000000_0.webp'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def listar(self, **params):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data['results'], [consulta['sql'] for consulta in consultas.captured_queries]
+
+    def test_fields_devuelve_solo_los_campos_pedidos(self):
+        resultados, consultas = self.listar(fields='code,marca_nombre')
+        self.assertEqual(
+            sorted((fila['id'], fila['code'], fila['marca_nombre']) for fila in resultados),
+            sorted((pk, f'FSD-{i}', 'Vitalmed') for i, pk in enumerate(
+                ProductoDisponible.objects.order_by('code').values_list('pk', flat=True)))
+        )
+        self.assertTrue(all(set(fila) == {'id', 'code', 'marca_nombre'} for fila in resultados))
+        # Ninguna consulta lee las imágenes (la huella del ETag solo las une para agregarlas)
+        imagenes = f'FROM "{ImagenProductoDisponible._meta.db_table}"'
+        self.assertFalse([sql for sql in consultas if imagenes in sql])
+
+    def test_vista_compacta(self):
+        resultados, _ = self.listar(vista='compacta')
+        self.assertEqual(set(resultados[0]), {
+            'id', 'code', 'nombre', 'modelo', 'marca_nombre', 'categoria_nombre',
+            'precio_venta_privado', 'is_active', 'updated_at'
+        })
+        self.assertEqual(resultados[0]['precio_venta_privado'], '12.50')
+
+    def test_expand_agrega_relaciones(self):
+        resultados, _ = self.listar(fields='code', expand='imagenes')
+        self.assertTrue(all(set(fila) == {'id', 'code', 'imagenes'} for fila in resultados))
+        self.assertTrue(all(len(fila['imagenes']) == 1 for fila in resultados))
+
+    def test_campo_desconocido(self):
+        response = self.client.get(self.URL, {'fields': 'code,inexistente'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('inexistente', str(response.data['fields']))
+
+
+class ResumenPreciosTest(TestCase):
+    """
+    Resúmenes de precios por período: las señales mantienen los totales al
+    crear, editar y eliminar registros, igual que una reconstrucción completa,
+    y la analítica se lee de ellos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='precios', password='testpass123')
+        categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        ofertado = ProductoOfertado.objects.create(
+            id_categoria=categoria, especialidad=especialidad, code='PR-1', cudim='CU-PR', nombre='Ofertado'
+        )
+        cls.producto = ProductoDisponible.objects.create(
+            id_categoria=categoria, id_producto_ofertado=ofertado, code='PRD-1', nombre='Disponible', modelo='M'
+        )
+        cls.empresa = EmpresaClc.objects.create(
+            nombre='Empresa', razon_social='Empresa SA', code='EMP', ruc='1790000000001',
+            direccion='Dir', correo='empresa@company.com', representante_legal='Rep'
+        )
+        cls.proveedor = Proveedor.objects.create(
+            ruc='1890000000001', razon_social='Prov SA', nombre='Proveedor',
+            direccion1='Dir', correo='prov@company.com', telefono='0999999998'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.compras = [
+            self.comprar('F-1', date(2025, 1, 6), '100.00', 2),
+            self.comprar('F-2', date(2025, 1, 8), '90.00', 3),
+            self.comprar('F-3', date(2025, 2, 3), '50.00', 1),
+        ]
+
+    def comprar(self, factura, fecha, valor, cantidad):
+        return HistorialDeCompras.objects.create(
+            producto=self.producto, proveedor=self.proveedor, empresa=self.empresa, fecha=fecha,
+            factura=factura, valor=Decimal(valor), iva=Decimal('0'), cantidad=cantidad
+        )
+
+    def mensual(self):
+        return {
+            punto['inicio']: (punto['registros'], punto['unidades'], punto['importe'], punto['minimo'], punto['maximo'])
+            for punto in price_analytics.serie(self.producto.pk, 'compra', 'mes')
+        }
+
+    def resumenes(self):
+        return sorted(ResumenPrecioProducto.objects.values_list(
+            'fuente', 'periodo', 'inicio', 'registros', 'unidades', 'importe', 'minimo', 'maximo'
+        ))
+
+    def test_registros_nuevos_se_suman_a_sus_periodos(self):
+        self.assertEqual(self.mensual(), {
+            '2025-01-01': (2, 5, 190.0, 30.0, 50.0),
+            '2025-02-01': (1, 1, 50.0, 50.0, 50.0),
+        })
+        semanas = [p['inicio'] for p in price_analytics.serie(self.producto.pk, 'compra', 'semana')]
+        self.assertEqual(semanas, ['2025-01-06', '2025-02-03'])
+
+    def test_editar_y_eliminar_recalculan_los_periodos(self):
+        compra = self.compras[2]
+        compra.fecha = date(2025, 1, 20)
+        compra.save()
+        self.assertEqual(self.mensual(), {'2025-01-01': (3, 6, 240.0, 30.0, 50.0)})
+
+        self.compras[0].delete()
+        self.assertEqual(self.mensual(), {'2025-01-01': (2, 4, 140.0, 30.0, 50.0)})
+
+    def test_reconstruccion_coincide_con_los_incrementales(self):
+        ProductsPrice.objects.create(producto_disponible=self.producto, valor=Decimal('25.00'))
+        self.compras[1].delete()
+        incrementales = self.resumenes()
+
+        price_analytics.reconstruir()
+        self.assertEqual(self.resumenes(), incrementales)
+
+    def test_endpoint_analitica(self):
+        url = f'/api/productos/productos-disponibles/{self.producto.pk}/analitica_precios/'
+        response = self.client.get(url, {'periodo': 'mes', 'ventana': 2})
+        self.assertEqual(response.status_code, 200)
+        compras = response.data['series']['compra']
+        self.assertEqual([p['promedio'] for p in compras], [38.0, 50.0])
+        self.assertEqual(compras[1]['media_movil'], 44.0)
+        self.assertEqual(response.data['tendencias']['compra']['direccion'], 'sube')
+        self.assertEqual(self.client.get(url, {'periodo': 'anio'}).status_code, 400)
+
+
+class CacheCatalogosTest(TestCase):
+    """
+    Caché de catálogos básicos: los valores por defecto y las validaciones de
+    claves foráneas se resuelven sin consultar los catálogos, y la copia local
+    se renueva con los cambios propios, los de otros procesos y al vencer.
+    """
+    URL = '/api/productos/productos-disponibles/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cache', password='testpass123')
+        cls.categoria = Categoria.objects.create(nombre='Equipos', code='EQ')
+        especialidad = Especialidad.objects.create(nombre='Cardiología', code='CAR')
+        cls.ofertado = ProductoOfertado.objects.create(
+            id_categoria=cls.categoria, especialidad=especialidad, code='RC-1', cudim='CU-RC', nombre='Ofertado'
+        )
+
+    def setUp(self):
+        for catalogo in ('categoria', 'marca', 'unidad', 'procedencia', 'especialidad'):
+            reference_cache.invalidar(catalogo)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def crear(self, code):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(self.URL, {
+                'id_categoria': self.categoria.pk, 'id_producto_ofertado': self.ofertado.pk,
+                'code': code, 'nombre': f'Producto {code}', 'modelo': 'M',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content[:500])
+        return ProductoDisponible.objects.get(code=code), [c['sql'] for c in consultas.captured_queries]
+
+    def test_valores_por_defecto_desde_el_cache(self):
+        primero, _ = self.crear('RC-A')
+        self.assertEqual(
+            (primero.id_marca.nombre, primero.procedencia.nombre, primero.id_especialidad.nombre),
+            ('Marca no definida', 'Procedencia no definida', 'Especialidad no definida')
+        )
+
+        segundo, consultas = self.crear('RC-B')
+        self.assertEqual(segundo.id_marca_id, primero.id_marca_id)
+        self.assertEqual(Marca.objects.filter(nombre='Marca no definida').count(), 1)
+        marcas = f'FROM "{Marca._meta.db_table}"'
+        self.assertFalse([sql for sql in consultas if marcas in sql])
+
+    def test_cambios_propios_invalidan_la_copia(self):
+        marca = Marca.objects.create(nombre='Vitalmed', code='VIT')
+        self.assertEqual(reference_cache.obtener('marca', marca.pk)['nombre'], 'Vitalmed')
+        with self.captureOnCommitCallbacks(execute=True):
+            marca.nombre = 'Medisur'
+            marca.save()
+        self.assertEqual(reference_cache.obtener('marca', marca.pk)['nombre'], 'Medisur')
+        self.assertEqual(reference_cache.id_por_nombre('marca', 'Medisur'), marca.pk)
+
+    def test_registros_de_otro_proceso(self):
+        reference_cache.obtener('marca', 0)
+        # bulk_create no dispara señales, como un alta hecha en otro worker
+        Marca.objects.bulk_create([Marca(nombre='Nueva', code='NUE')])
+        marca = Marca.objects.get(code='NUE')
+        self.assertTrue(reference_cache.existe('marca', marca.pk))
+        self.assertEqual(reference_cache.id_por_nombre('marca', 'Nueva'), marca.pk)
+
+    @override_settings(REFERENCE_CACHE={'local_ttl_seconds': 0})
+    def test_copia_local_vence(self):
+        marca = Marca.objects.create(nombre='Vitalmed', code='VIT')
+        self.assertEqual(reference_cache.obtener('marca', marca.pk)['nombre'], 'Vitalmed')
+        Marca.objects.filter(pk=marca.pk).update(nombre='Medisur')
+        self.assertEqual(reference_cache.obtener('marca', marca.pk)['nombre'], 'Medisur')
@@ -4,6 +4,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from . import image_views
+from . import document_views
+from . import search_views
+from . import catalog_views
 
 # Crear router para registrar los viewsets
 router = DefaultRouter()
@@ -27,6 +30,12 @@ urlpatterns = [
     path('', include(router.urls)),
 
 
+    # Búsqueda rápida sobre el índice invertido de productos
+    path('search/', search_views.search_products, name='search-products'),
+    # Copia completa y sincronización incremental del catálogo
+    path('catalogo/snapshot/', catalog_views.catalog_snapshot_view, name='catalog-snapshot'),
+    path('catalogo/delta/', catalog_views.catalog_delta_view, name='catalog-delta'),
+
     # Nueva ruta para evitar problemas con file_handler
     path('productos-ofertados-simple/', views.create_producto_ofertado_simple, name='create-producto-ofertado-simple'),
 
@@ -109,10 +118,34 @@ urlpatterns = [
          lambda request, product_id: image_views.upload_product_image(request, product_id, 'disponible'), 
          name='upload-product-image-disponible'),
     
+    path('products/images/bulk-upload/', 
+         image_views.bulk_upload_product_images, 
+         name='bulk-upload-product-images-ofertado'),
+    
+    path('products/disponible/images/bulk-upload/', 
+         lambda request: image_views.bulk_upload_product_images(request, 'disponible'), 
+         name='bulk-upload-product-images-disponible'),
+    
+    path('products/<int:product_id>/images/', 
+         image_views.get_product_images, 
+         name='product-images-ofertado'),
+    
+    path('products/<int:product_id>/disponible/images/', 
+         lambda request, product_id: image_views.get_product_images(request, product_id, 'disponible'), 
+         name='product-images-disponible'),
+    
     path('images/<int:image_id>/', 
          image_views.delete_product_image, 
          name='delete-product-image'),
     
+    path('images/<int:image_id>/responsive/', 
+         image_views.get_responsive_image, 
+         name='responsive-image-ofertado'),
+    
+    path('disponible/images/<int:image_id>/responsive/', 
+         lambda request, image_id: image_views.get_responsive_image(request, image_id, 'disponible'), 
+         name='responsive-image-disponible'),
+    
     path('products/<int:product_id>/images/order/', 
          image_views.update_image_order, 
          name='update-image-order-ofertado'),
@@ -120,4 +153,21 @@ urlpatterns = [
     path('products/<int:product_id>/disponible/images/order/', 
          lambda request, product_id: image_views.update_image_order(request, product_id, 'disponible'), 
          name='update-image-order-disponible'),
-]
\ No newline at end of file
+    
+    # Subida reanudable por partes de documentos
+    path('products/<int:product_id>/documents/uploads/', 
+         document_views.init_document_upload, 
+         name='init-document-upload-ofertado'),
+    
+    path('products/<int:product_id>/disponible/documents/uploads/', 
+         lambda request, product_id: document_views.init_document_upload(request, product_id, 'disponible'), 
+         name='init-document-upload-disponible'),
+    
+    path('documents/uploads/<uuid:upload_id>/', 
+         document_views.document_upload_session, 
+         name='document-upload-session'),
+    
+    path('documents/uploads/<uuid:upload_id>/complete/', 
+         document_views.complete_document_upload, 
+         name='complete-document-upload'),
+]
@@ -1,21 +1,28 @@
 # backend/productos/views.py
 
-from rest_framework import viewsets, filters, status, permissions
+from rest_framework import viewsets, filters, status, permissions, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PKOnlyObject, RelatedField
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Prefetch
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import os
 from django.conf import settings
+from basic import reference_cache, category_tree
+from basic.models import Categoria
+from core.conditional import RespuestaCondicionalMixin
 
 from .models import (
     ProductoOfertado, ImagenReferenciaProductoOfertado, DocumentoProductoOfertado,
     ProductoDisponible, ImagenProductoDisponible, DocumentoProductoDisponible,
     ProductsPrice, HistorialDeCompras, HistorialDeVentas
 )
+from .pagination import SelectablePagination
 from .serializers import (
     ProductoOfertadoSerializer, ProductoOfertadoDetalladoSerializer,
     ImagenReferenciaProductoOfertadoSerializer, DocumentoProductoOfertadoSerializer,
@@ -25,9 +32,222 @@ from .serializers import (
     CompraDetalladaSerializer, VentaDetalladaSerializer
 )
 
+# Planes de consulta: cada serializer recorre relaciones fijas, así que se
+# cargan con select_related/prefetch_related en un número constante de
+# consultas, sin importar el tamaño de la página.
+
+def _imagenes_ordenadas(lookup, model):
+    """Prefetch de imágenes en el orden en que se muestran"""
+    return Prefetch(lookup, queryset=model.objects.order_by('orden', 'id'))
+
+
+def plan_productos_ofertados(queryset, detallado=False):
+    """Relaciones usadas por ProductoOfertadoSerializer (y el detallado)"""
+    queryset = queryset.select_related('id_categoria', 'especialidad').prefetch_related(
+        _imagenes_ordenadas('imagenes', ImagenReferenciaProductoOfertado)
+    )
+    if detallado:
+        queryset = queryset.prefetch_related('documentos').annotate(
+            productos_disponibles_count=Count('productos_disponibles')
+        )
+        if not queryset.query.order_by:
+            # Con GROUP BY Django no aplica Meta.ordering: paginar exige un orden explícito
+            queryset = queryset.order_by('nombre', 'id')
+    return queryset
+
+
+def plan_productos_disponibles(queryset, detallado=False, prefijo=''):
+    """
+    Relaciones usadas por ProductoDisponibleSerializer (y el detallado).
+    `prefijo` permite aplicarlo a productos anidados, p. ej. 'producto__'.
+    """
+    queryset = queryset.select_related(*[
+        prefijo + relacion for relacion in (
+            'id_categoria', 'id_producto_ofertado', 'id_marca',
+            'unidad_presentacion', 'procedencia', 'id_especialidad'
+        )
+    ]).prefetch_related(_imagenes_ordenadas(prefijo + 'imagenes', ImagenProductoDisponible))
+    if detallado:
+        # El producto ofertado anidado usa ProductoOfertadoSerializer
+        queryset = queryset.select_related(
+            prefijo + 'id_producto_ofertado__id_categoria',
+            prefijo + 'id_producto_ofertado__especialidad',
+        ).prefetch_related(
+            _imagenes_ordenadas(prefijo + 'id_producto_ofertado__imagenes', ImagenReferenciaProductoOfertado),
+            prefijo + 'documentos',
+            Prefetch(prefijo + 'precios', queryset=ProductsPrice.objects.order_by('-created_at')),
+        )
+    return queryset
+
+
+def filtrar_subarbol_categoria(queryset, request):
+    """
+    Con ?categoria_subarbol=<id> deja los productos de esa categoría y de todas
+    sus subcategorías (filtro por prefijo de ruta sobre el índice de Categoria.path).
+    """
+    valor = request.query_params.get('categoria_subarbol') if request is not None else None
+    if not valor:
+        return queryset
+    categoria = Categoria.objects.filter(pk=valor).first() if valor.isdigit() else None
+    if categoria is None:
+        return queryset.none()
+    return queryset.filter(category_tree.filtro_subarbol(categoria, 'id_categoria__path'))
+
+
+def ruta_consulta(model, field):
+    """
+    Lookup ORM equivalente a un campo de serializer cuando es una columna del
+    modelo o de una FK (p. ej. 'id_categoria__nombre'); None si no lo es.
+    """
+    if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer,
+                          serializers.ManyRelatedField)) or field.source == '*':
+        return None
+    actual = model
+    for i, attr in enumerate(field.source_attrs):
+        try:
+            model_field = actual._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if model_field.many_to_many or model_field.one_to_many or model_field.one_to_one and model_field.auto_created:
+            return None
+        if i < len(field.source_attrs) - 1:
+            if not model_field.is_relation:
+                return None
+            actual = model_field.related_model
+    return '__'.join(field.source_attrs)
+
+
+# Catálogos que un producto disponible no puede dejar vacíos:
+# (campo, catálogo, nombre del registro por defecto, código si hay que crearlo)
+CATALOGOS_POR_DEFECTO = (
+    ('procedencia', 'procedencia', 'Procedencia no definida', 'PND'),
+    ('unidad_presentacion', 'unidad', 'Unidad no definida', 'NDEF'),
+    ('id_marca', 'marca', 'Marca no definida', 'MNDEF'),
+    ('id_especialidad', 'especialidad', 'Especialidad no definida', 'ENDEF'),
+)
+
+
+def asignar_catalogos_por_defecto(request, solo_enviados=False):
+    """
+    Completa en request.data los catálogos vacíos con su registro por defecto,
+    resuelto desde el caché de catálogos. Con `solo_enviados` solo se completan
+    los campos presentes en la petición (actualizaciones parciales).
+    """
+    for campo, catalogo, nombre, code in CATALOGOS_POR_DEFECTO:
+        if request.data.get(campo) or (solo_enviados and campo not in request.data):
+            continue
+        try:
+            valor = reference_cache.obtener_o_crear(catalogo, nombre, code)
+            if hasattr(request.data, '_mutable'):
+                original_mutable = request.data._mutable
+                request.data._mutable = True
+                request.data[campo] = valor
+                request.data._mutable = original_mutable
+            else:
+                request.data[campo] = valor
+        except Exception as e:
+            print(f"⚠️ Error al asignar {campo} por defecto: {str(e)}")
+
+
+class CamposSeleccionablesMixin:
+    """
+    Representaciones parciales para las vistas de productos (solo GET):
+
+        ?fields=id,code,nombre   solo esos campos
+        ?vista=compacta          los campos de `campos_compactos`
+        ?expand=imagenes         agrega relaciones a la selección anterior
+
+    Sin estos parámetros la respuesta es la completa de siempre. Si todos los
+    campos elegidos son columnas propias o de una FK, el listado se arma con
+    .values(), sin instanciar modelos ni pasar por el serializer.
+    """
+    campos_compactos = ()
+
+    def campos_solicitados(self):
+        """Conjunto de campos pedidos, o None para la representación completa"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return None
+        params = request.query_params
+        if params.get('fields'):
+            campos = {c.strip() for c in params['fields'].split(',') if c.strip()}
+        elif params.get('vista') == 'compacta':
+            campos = set(self.campos_compactos)
+        else:
+            return None
+        campos.update(c.strip() for c in params.get('expand', '').split(',') if c.strip())
+        campos.add('id')
+        return campos
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['campos'] = self.campos_solicitados()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        campos = self.campos_solicitados()
+        if campos is None:
+            return super().list(request, *args, **kwargs)
+
+        fields = self.get_serializer().fields
+        desconocidos = campos - set(fields)
+        if desconocidos:
+            raise ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(desconocidos))}"})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rutas = {nombre: ruta_consulta(queryset.model, field) for nombre, field in fields.items()}
+        if all(rutas.values()):
+            return self.listar_valores(queryset, fields, rutas)
+
+        # Solo se precargan las relaciones de los campos elegidos
+        raices = {field.source_attrs[0] for field in fields.values() if field.source_attrs}
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in raices
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def listar_valores(self, queryset, fields, rutas):
+        """Listado con .values(), representando cada valor con su campo del serializer"""
+        model = queryset.model
+        # Las columnas de ordenamiento se incluyen para la paginación por clave
+        ordenamiento = []
+        for item in list(queryset.query.order_by or model._meta.ordering or []) + ['pk']:
+            nombre = item.lstrip('-') if isinstance(item, str) else None
+            if nombre and '__' not in nombre and nombre != '?':
+                ordenamiento.append(model._meta.pk.attname if nombre == 'pk' else model._meta.get_field(nombre).attname)
+
+        queryset = queryset.prefetch_related(None).values(*dict.fromkeys([*rutas.values(), *ordenamiento]))
+        page = self.paginate_queryset(queryset)
+        filas = page if page is not None else queryset
+
+        data = []
+        for fila in filas:
+            item = {}
+            for nombre, field in fields.items():
+                valor = fila[rutas[nombre]]
+                if valor is None:
+                    item[nombre] = None
+                elif isinstance(field, RelatedField):
+                    item[nombre] = field.to_representation(PKOnlyObject(valor))
+                else:
+                    item[nombre] = field.to_representation(valor)
+            data.append(item)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
 # Clase base para todos los ViewSets
-class ProductsBaseCrudViewSet(viewsets.ModelViewSet):
-    """ViewSet base con funcionalidades comunes para todos los modelos de productos"""
+class ProductsBaseCrudViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
+    """ViewSet base con funcionalidades comunes para todos los modelos de productos (con GET condicional)"""
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     permission_classes = [permissions.IsAuthenticated]
 
@@ -76,7 +296,7 @@ class ProductsBaseCrudViewSet(viewsets.ModelViewSet):
             raise
 
 
-class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
+class ProductoOfertadoViewSet(CamposSeleccionablesMixin, ProductsBaseCrudViewSet):
     """
     API endpoint para gestionar productos ofertados.
 
@@ -88,20 +308,20 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
     filterset_fields = ['id_categoria', 'code', 'cudim', 'is_active']
     search_fields = ['nombre', 'code', 'cudim', 'descripcion', 'especialidad__nombre', 'especialidad__code', 'referencias']
     ordering_fields = ['nombre', 'code', 'created_at', 'updated_at']
+    pagination_class = SelectablePagination
+    campos_compactos = ('id', 'code', 'cudim', 'nombre', 'categoria_nombre', 'is_active', 'updated_at')
+    # Cambios en estas relaciones también invalidan el ETag del listado
+    relaciones_version = ('imagenes', 'id_categoria', 'especialidad')
+    # El detalle también devuelve los documentos y el conteo de disponibles
+    relaciones_version_detalle = ('productos_disponibles', 'documentos')
     
     def get_queryset(self):
         """Personaliza el queryset base según se necesite"""
-        queryset = ProductoOfertado.objects.all()
-        
-        # Optimizar consultas incluyendo relaciones necesarias
-        queryset = queryset.select_related('id_categoria', 'especialidad')
-        queryset = queryset.prefetch_related('imagenes')
-        
-        # Si estamos en retrieve o en la acción que necesita el conteo, lo añadimos
-        if self.action == 'retrieve' or self.action == 'listado_detallado':
-            queryset = queryset.annotate(productos_disponibles_count=Count('productos_disponibles'))
-            
-        return queryset
+        # Optimizar consultas incluyendo relaciones necesarias; retrieve y
+        # listado_detallado agregan documentos y el conteo de disponibles
+        detallado = self.action in ('retrieve', 'listado_detallado')
+        queryset = filtrar_subarbol_categoria(ProductoOfertado.objects.all(), self.request)
+        return plan_productos_ofertados(queryset, detallado)
     
     def get_serializer_class(self):
         """Retorna el serializer apropiado según la acción"""
@@ -122,7 +342,7 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
         """
         Devuelve solo los productos ofertados activos.
         """
-        productos = ProductoOfertado.objects.filter(is_active=True)
+        productos = plan_productos_ofertados(ProductoOfertado.objects.filter(is_active=True))
         page = self.paginate_queryset(productos)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -166,7 +386,8 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
         Devuelve las imágenes asociadas a un producto ofertado.
         """
         producto = self.get_object()
-        imagenes = ImagenReferenciaProductoOfertado.objects.filter(producto_ofertado=producto)
+        # Lista en memoria: indexar un queryset ejecuta una consulta por imagen
+        imagenes = list(ImagenReferenciaProductoOfertado.objects.filter(producto_ofertado=producto))
         serializer = ImagenReferenciaProductoOfertadoSerializer(imagenes, many=True)
         
         # Asegurarnos de que cada imagen tenga sus propias URLs correctas con su timestamp único
@@ -216,7 +437,9 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
         Devuelve los productos disponibles asociados a un producto ofertado.
         """
         producto = self.get_object()
-        productos_disponibles = ProductoDisponible.objects.filter(id_producto_ofertado=producto)
+        productos_disponibles = plan_productos_disponibles(
+            ProductoDisponible.objects.filter(id_producto_ofertado=producto)
+        )
         serializer = ProductoDisponibleSerializer(productos_disponibles, many=True)
         return Response(serializer.data)
 
@@ -271,10 +494,9 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
 
                 # Attempt to validate it's a valid ID if provided
                 if especialidad_value and str(especialidad_value).strip() and str(especialidad_value).lower() != 'none':
-                    from basic.models import Especialidad
                     try:
                         especialidad_id = int(especialidad_value)
-                        especialidad_exists = Especialidad.objects.filter(id=especialidad_id).exists()
+                        especialidad_exists = reference_cache.existe('especialidad', especialidad_id)
                         print(f"🔍 Especialidad ID {especialidad_id} exists: {especialidad_exists}")
                         
                         # Si no existe, eliminar del request data para evitar errores
@@ -522,11 +744,10 @@ class ProductoOfertadoViewSet(ProductsBaseCrudViewSet):
                 print(f"❌ Especialidad value: {especialidad_value} (type: {type(especialidad_value).__name__})")
                 if especialidad_value:
                     try:
-                        from basic.models import Especialidad
                         try:
                             especialidad_id = int(especialidad_value)
-                            exists = Especialidad.objects.filter(id=especialidad_id).exists()
-                            print(f"❌ Especialidad ID {especialidad_id} exists in database: {exists}")
+                            exists = reference_cache.existe('especialidad', especialidad_id)
+                            print(f"❌ Especialidad ID {especialidad_id} exists: {exists}")
                         except (ValueError, TypeError):
                             print(f"❌ Could not convert especialidad value '{especialidad_value}' to integer")
                     except Exception as e:
@@ -785,7 +1006,7 @@ class ImagenReferenciaProductoOfertadoViewSet(ProductsBaseCrudViewSet):
     """
     API endpoint para gestionar imágenes de referencia de productos ofertados.
     """
-    queryset = ImagenReferenciaProductoOfertado.objects.all()
+    queryset = ImagenReferenciaProductoOfertado.objects.select_related('producto_ofertado')
     serializer_class = ImagenReferenciaProductoOfertadoSerializer
     filterset_fields = ['producto_ofertado', 'is_primary']
     search_fields = ['descripcion']
@@ -802,6 +1023,59 @@ class ImagenReferenciaProductoOfertadoViewSet(ProductsBaseCrudViewSet):
             data['urls'] = instance.get_version_urls()
             
         return Response(data)
+    
+    @swagger_auto_schema(
+        operation_description="Obtiene las imágenes casi idénticas a esta según su hash perceptual",
+        manual_parameters=[
+            openapi.Parameter('distancia', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Distancia de Hamming máxima (0-20, por defecto 6)'),
+        ],
+        responses={
+            200: "Lista de imágenes similares",
+            401: "No autenticado",
+            404: "Imagen no encontrada"
+        }
+    )
+    @action(detail=True, methods=['get'])
+    def similares(self, request, pk=None):
+        """
+        Devuelve las imágenes de otros registros cuyo hash perceptual está a una
+        distancia de Hamming menor o igual a ?distancia= de la imagen indicada.
+        """
+        from .phash_index import obtener_indice, DISTANCIA_POR_DEFECTO
+        
+        imagen = self.get_object()
+        try:
+            distancia = min(max(int(request.query_params.get('distancia', DISTANCIA_POR_DEFECTO)), 0), 20)
+        except ValueError:
+            return Response({'error': 'La distancia debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not imagen.phash:
+            return Response({'imagen': imagen.pk, 'distancia': distancia, 'results': [],
+                             'detail': 'La imagen no tiene hash perceptual calculado'})
+        
+        encontrados = obtener_indice(ImagenReferenciaProductoOfertado).similares(
+            imagen.phash, distancia, excluir=imagen.pk
+        )
+        imagenes = ImagenReferenciaProductoOfertado.objects.select_related('producto_ofertado').in_bulk(
+            [pk for _, pk in encontrados]
+        )
+        results = []
+        for d, image_pk in encontrados:
+            similar = imagenes.get(image_pk)
+            if similar is None:
+                continue
+            results.append({
+                'id': similar.pk,
+                'distancia': d,
+                'producto_ofertado': {
+                    'id': similar.producto_ofertado_id,
+                    'code': similar.producto_ofertado.code,
+                    'nombre': similar.producto_ofertado.nombre,
+                },
+                'urls': similar.get_version_urls(),
+            })
+        return Response({'imagen': imagen.pk, 'distancia': distancia, 'results': results})
 
 
 class DocumentoProductoOfertadoViewSet(ProductsBaseCrudViewSet):
@@ -815,7 +1089,7 @@ class DocumentoProductoOfertadoViewSet(ProductsBaseCrudViewSet):
     ordering_fields = ['titulo', 'created_at']
 
 
-class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
+class ProductoDisponibleViewSet(CamposSeleccionablesMixin, ProductsBaseCrudViewSet):
     """
     API endpoint para gestionar productos disponibles.
     
@@ -829,6 +1103,18 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
     ]
     search_fields = ['nombre', 'code', 'modelo', 'referencia']
     ordering_fields = ['nombre', 'code', 'created_at', 'updated_at']
+    pagination_class = SelectablePagination
+    campos_compactos = (
+        'id', 'code', 'nombre', 'modelo', 'marca_nombre', 'categoria_nombre',
+        'precio_venta_privado', 'is_active', 'updated_at'
+    )
+    # Cambios en estas relaciones también invalidan el ETag del listado
+    relaciones_version = (
+        'imagenes', 'id_categoria', 'id_producto_ofertado', 'id_marca',
+        'unidad_presentacion', 'procedencia', 'id_especialidad'
+    )
+    # El detalle también devuelve los documentos y los precios
+    relaciones_version_detalle = ('documentos', 'precios')
     
     def get_serializer_context(self):
         """Añadir request al contexto para generar URLs absolutas"""
@@ -845,6 +1131,12 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
             return ProductoDisponibleDetalladoSerializer
         return ProductoDisponibleSerializer
     
+    def get_queryset(self):
+        """Carga las relaciones que recorre el serializer de cada acción"""
+        detallado = self.action in ('retrieve', 'listado_detallado')
+        queryset = filtrar_subarbol_categoria(ProductoDisponible.objects.all(), self.request)
+        return plan_productos_disponibles(queryset, detallado)
+    
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to handle errors gracefully"""
         try:
@@ -918,85 +1210,8 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
             
             print(f"🖼️ Received {len(uploaded_images)} images and {len(uploaded_documents)} documents")
             
-            # Manejar procedencia vacía o null
-            if 'procedencia' not in request.data or not request.data.get('procedencia'):
-                from basic.models import Procedencia
-                try:
-                    # Buscar o crear la procedencia por defecto
-                    procedencia_default, created = Procedencia.objects.get_or_create(
-                        nombre='Procedencia no definida',
-                        defaults={'code': 'PND'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['procedencia'] = procedencia_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['procedencia'] = procedencia_default.id
-                    print(f"📍 Asignando procedencia por defecto: {procedencia_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar procedencia por defecto: {str(e)}")
-            
-            # Manejar unidad_presentacion vacía o null
-            if 'unidad_presentacion' not in request.data or not request.data.get('unidad_presentacion'):
-                from basic.models import Unidad
-                try:
-                    # Buscar o crear la unidad por defecto
-                    unidad_default, created = Unidad.objects.get_or_create(
-                        nombre='Unidad no definida',
-                        defaults={'code': 'NDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['unidad_presentacion'] = unidad_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['unidad_presentacion'] = unidad_default.id
-                    print(f"📦 Asignando unidad por defecto: {unidad_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar unidad por defecto: {str(e)}")
-            
-            # Manejar marca vacía o null
-            if 'id_marca' not in request.data or not request.data.get('id_marca'):
-                from basic.models import Marca
-                try:
-                    # Buscar o crear la marca por defecto
-                    marca_default, created = Marca.objects.get_or_create(
-                        nombre='Marca no definida',
-                        defaults={'code': 'MNDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['id_marca'] = marca_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['id_marca'] = marca_default.id
-                    print(f"🏷️ Asignando marca por defecto: {marca_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar marca por defecto: {str(e)}")
-            
-            # Manejar especialidad vacía o null
-            if 'id_especialidad' not in request.data or not request.data.get('id_especialidad'):
-                from basic.models import Especialidad
-                try:
-                    # Buscar o crear la especialidad por defecto
-                    especialidad_default, created = Especialidad.objects.get_or_create(
-                        nombre='Especialidad no definida',
-                        defaults={'code': 'ENDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['id_especialidad'] = especialidad_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['id_especialidad'] = especialidad_default.id
-                    print(f"🔬 Asignando especialidad por defecto: {especialidad_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar especialidad por defecto: {str(e)}")
+            # Asignar procedencia, unidad, marca y especialidad por defecto si vienen vacías
+            asignar_catalogos_por_defecto(request)
             
             # Crear el producto primero
             serializer = self.get_serializer(data=request.data)
@@ -1192,85 +1407,8 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
                     print(f"❌ Error al procesar documento {i+1}: {str(e)}")
                     print(traceback.format_exc())
             
-            # Manejar procedencia vacía o null antes de actualizar
-            if 'procedencia' in request.data and not request.data.get('procedencia'):
-                from basic.models import Procedencia
-                try:
-                    # Buscar o crear la procedencia por defecto
-                    procedencia_default, created = Procedencia.objects.get_or_create(
-                        nombre='Procedencia no definida',
-                        defaults={'code': 'PND'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['procedencia'] = procedencia_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['procedencia'] = procedencia_default.id
-                    print(f"📍 Asignando procedencia por defecto: {procedencia_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar procedencia por defecto: {str(e)}")
-            
-            # Manejar unidad_presentacion vacía o null antes de actualizar
-            if 'unidad_presentacion' in request.data and not request.data.get('unidad_presentacion'):
-                from basic.models import Unidad
-                try:
-                    # Buscar o crear la unidad por defecto
-                    unidad_default, created = Unidad.objects.get_or_create(
-                        nombre='Unidad no definida',
-                        defaults={'code': 'NDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['unidad_presentacion'] = unidad_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['unidad_presentacion'] = unidad_default.id
-                    print(f"📦 Asignando unidad por defecto: {unidad_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar unidad por defecto: {str(e)}")
-            
-            # Manejar marca vacía o null antes de actualizar
-            if 'id_marca' in request.data and not request.data.get('id_marca'):
-                from basic.models import Marca
-                try:
-                    # Buscar o crear la marca por defecto
-                    marca_default, created = Marca.objects.get_or_create(
-                        nombre='Marca no definida',
-                        defaults={'code': 'MNDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['id_marca'] = marca_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['id_marca'] = marca_default.id
-                    print(f"🏷️ Asignando marca por defecto: {marca_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar marca por defecto: {str(e)}")
-            
-            # Manejar especialidad vacía o null antes de actualizar
-            if 'id_especialidad' in request.data and not request.data.get('id_especialidad'):
-                from basic.models import Especialidad
-                try:
-                    # Buscar o crear la especialidad por defecto
-                    especialidad_default, created = Especialidad.objects.get_or_create(
-                        nombre='Especialidad no definida',
-                        defaults={'code': 'ENDEF'}
-                    )
-                    # Hacer el request.data mutable si es necesario
-                    if hasattr(request.data, '_mutable'):
-                        request.data._mutable = True
-                        request.data['id_especialidad'] = especialidad_default.id
-                        request.data._mutable = False
-                    else:
-                        request.data['id_especialidad'] = especialidad_default.id
-                    print(f"🔬 Asignando especialidad por defecto: {especialidad_default.nombre}")
-                except Exception as e:
-                    print(f"⚠️ Error al asignar especialidad por defecto: {str(e)}")
+            # Asignar los valores por defecto a los catálogos enviados vacíos
+            asignar_catalogos_por_defecto(request, solo_enviados=True)
             
             # Actualizar el producto
             serializer = self.get_serializer(instance, data=request.data, partial=partial)
@@ -1304,7 +1442,7 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         """
         Devuelve solo los productos disponibles activos.
         """
-        productos = ProductoDisponible.objects.filter(is_active=True)
+        productos = plan_productos_disponibles(ProductoDisponible.objects.filter(is_active=True))
         page = self.paginate_queryset(productos)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -1325,7 +1463,7 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         """
         Devuelve un listado detallado de productos disponibles con sus relaciones.
         """
-        productos = ProductoDisponible.objects.all()
+        productos = self.get_queryset()
         page = self.paginate_queryset(productos)
         if page is not None:
             serializer = ProductoDisponibleDetalladoSerializer(page, many=True)
@@ -1348,7 +1486,8 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         Devuelve las imágenes asociadas a un producto disponible.
         """
         producto = self.get_object()
-        imagenes = ImagenProductoDisponible.objects.filter(producto_disponible=producto)
+        # Lista en memoria: indexar un queryset ejecuta una consulta por imagen
+        imagenes = list(ImagenProductoDisponible.objects.filter(producto_disponible=producto))
         serializer = ImagenProductoDisponibleSerializer(imagenes, many=True, context={'request': request})
         
         # Asegurarnos de que cada imagen tenga sus propias URLs correctas con su timestamp único
@@ -1398,7 +1537,9 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         Devuelve el historial de precios de un producto disponible.
         """
         producto = self.get_object()
-        precios = ProductsPrice.objects.filter(producto_disponible=producto).order_by('-created_at')
+        precios = ProductsPrice.objects.filter(producto_disponible=producto).select_related(
+            'producto_disponible'
+        ).order_by('-created_at')
         serializer = ProductsPriceSerializer(precios, many=True)
         return Response(serializer.data)
     
@@ -1417,7 +1558,9 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         Devuelve el historial de compras de un producto disponible.
         """
         producto = self.get_object()
-        compras = HistorialDeCompras.objects.filter(producto=producto).order_by('-fecha')
+        compras = HistorialDeCompras.objects.filter(producto=producto).select_related(
+            'producto', 'proveedor', 'empresa'
+        ).order_by('-fecha')
         serializer = HistorialDeComprasSerializer(compras, many=True)
         return Response(serializer.data)
     
@@ -1436,16 +1579,105 @@ class ProductoDisponibleViewSet(ProductsBaseCrudViewSet):
         Devuelve el historial de ventas de un producto disponible.
         """
         producto = self.get_object()
-        ventas = HistorialDeVentas.objects.filter(producto=producto).order_by('-fecha')
+        ventas = HistorialDeVentas.objects.filter(producto=producto).select_related(
+            'producto', 'cliente', 'empresa'
+        ).order_by('-fecha')
         serializer = HistorialDeVentasSerializer(ventas, many=True)
         return Response(serializer.data)
+    
+    @swagger_auto_schema(
+        operation_description="Crea o actualiza productos disponibles en lote, con su precio inicial opcional",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(type=openapi.TYPE_OBJECT, description='Campos de ProductoDisponible, "id" opcional y "precio" opcional')
+        ),
+        responses={
+            200: "Filas escritas y filas con errores",
+            400: "El cuerpo no es una lista válida",
+            401: "No autenticado"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def carga_masiva(self, request):
+        """
+        Valida todas las filas contra mapas precargados y escribe las válidas en
+        una sola transacción (ver productos/carga_masiva.py). Las filas con
+        errores se informan sin impedir la carga de las demás.
+        """
+        from . import carga_masiva
+        
+        filas = request.data.get('productos') if isinstance(request.data, dict) else request.data
+        if not isinstance(filas, list) or not filas:
+            return Response({'error': 'Se esperaba una lista de productos'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(filas) > carga_masiva.MAX_FILAS:
+            return Response(
+                {'error': f'Máximo {carga_masiva.MAX_FILAS} productos por carga'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        defectos = {
+            campo: reference_cache.obtener_o_crear(catalogo, nombre, code)
+            for campo, catalogo, nombre, code in CATALOGOS_POR_DEFECTO
+        }
+        plan = carga_masiva.planificar(filas, defectos)
+        escritos = carga_masiva.ejecutar(plan, request.user) if plan['crear'] or plan['actualizar'] else []
+        
+        return Response({
+            'creados': len(plan['crear']),
+            'actualizados': len(plan['actualizar']),
+            'con_errores': len(plan['errores']),
+            'resultados': escritos,
+            'errores': plan['errores'],
+        })
+    
+    @swagger_auto_schema(
+        operation_description="Obtiene series agregadas de precios, compras y ventas con tendencias y márgenes",
+        manual_parameters=[
+            openapi.Parameter('periodo', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=['dia', 'semana', 'mes'], description='Agrupación (por defecto mes)'),
+            openapi.Parameter('desde', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date'),
+            openapi.Parameter('hasta', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date'),
+            openapi.Parameter('ventana', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Períodos de la media móvil (por defecto 3)'),
+            openapi.Parameter('ultimos', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Períodos usados para la tendencia (por defecto 6)'),
+        ],
+        responses={
+            200: "Series, tendencias y márgenes",
+            400: "Parámetros inválidos",
+            401: "No autenticado",
+            404: "Producto no encontrado"
+        }
+    )
+    @action(detail=True, methods=['get'])
+    def analitica_precios(self, request, pk=None):
+        """
+        Devuelve la analítica de precios del producto leyendo los resúmenes por
+        período (ver productos/price_analytics.py), sin recorrer el historial.
+        """
+        from django.utils.dateparse import parse_date
+        from . import price_analytics
+        
+        producto_id = self.get_object().pk
+        periodo = request.query_params.get('periodo', 'mes')
+        if periodo not in price_analytics.PERIODOS:
+            return Response({'error': 'periodo debe ser dia, semana o mes'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            desde = parse_date(request.query_params['desde']) if request.query_params.get('desde') else None
+            hasta = parse_date(request.query_params['hasta']) if request.query_params.get('hasta') else None
+            ventana = min(max(int(request.query_params.get('ventana', 3)), 1), 24)
+            ultimos = min(max(int(request.query_params.get('ultimos', 6)), 2), 120)
+        except ValueError:
+            return Response({'error': 'Parámetros de fecha o número inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(price_analytics.analitica_producto(producto_id, periodo, desde, hasta, ventana, ultimos))
 
 
 class ImagenProductoDisponibleViewSet(ProductsBaseCrudViewSet):
     """
     API endpoint para gestionar imágenes de productos disponibles.
     """
-    queryset = ImagenProductoDisponible.objects.all()
+    queryset = ImagenProductoDisponible.objects.select_related('producto_disponible')
     serializer_class = ImagenProductoDisponibleSerializer
     filterset_fields = ['producto_disponible', 'is_primary']
     search_fields = ['descripcion']
@@ -1496,7 +1728,7 @@ class ProductsPriceViewSet(ProductsBaseCrudViewSet):
     """
     API endpoint para gestionar precios de productos.
     """
-    queryset = ProductsPrice.objects.all()
+    queryset = ProductsPrice.objects.select_related('producto_disponible')
     serializer_class = ProductsPriceSerializer
     filterset_fields = ['producto_disponible']
     ordering_fields = ['created_at']
@@ -1526,7 +1758,7 @@ class ProductsPriceViewSet(ProductsBaseCrudViewSet):
         """
         producto_id = request.query_params.get('producto_id', None)
         if producto_id:
-            precios = ProductsPrice.objects.filter(producto_disponible_id=producto_id).order_by('-created_at')
+            precios = self.get_queryset().filter(producto_disponible_id=producto_id).order_by('-created_at')
             page = self.paginate_queryset(precios)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -1545,6 +1777,7 @@ class HistorialDeComprasViewSet(ProductsBaseCrudViewSet):
     filterset_fields = ['producto', 'proveedor', 'empresa', 'fecha']
     search_fields = ['factura']
     ordering_fields = ['fecha', 'created_at']
+    pagination_class = SelectablePagination
     
     def get_serializer_class(self):
         """Retorna el serializer apropiado según la acción"""
@@ -1552,6 +1785,15 @@ class HistorialDeComprasViewSet(ProductsBaseCrudViewSet):
             return CompraDetalladaSerializer
         return HistorialDeComprasSerializer
     
+    def get_queryset(self):
+        """Carga las relaciones que recorre el serializer de cada acción"""
+        queryset = HistorialDeCompras.objects.select_related('producto', 'proveedor', 'empresa')
+        if self.action == 'retrieve':
+            queryset = plan_productos_disponibles(queryset, prefijo='producto__').select_related(
+                'proveedor__ciudad'
+            ).prefetch_related('proveedor__tags')
+        return queryset
+    
     @swagger_auto_schema(
         operation_description="Obtiene el historial de compras por producto",
         manual_parameters=[
@@ -1577,7 +1819,7 @@ class HistorialDeComprasViewSet(ProductsBaseCrudViewSet):
         """
         producto_id = request.query_params.get('producto_id', None)
         if producto_id:
-            compras = HistorialDeCompras.objects.filter(producto_id=producto_id).order_by('-fecha')
+            compras = self.get_queryset().filter(producto_id=producto_id).order_by('-fecha')
             page = self.paginate_queryset(compras)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -1611,7 +1853,7 @@ class HistorialDeComprasViewSet(ProductsBaseCrudViewSet):
         """
         proveedor_id = request.query_params.get('proveedor_id', None)
         if proveedor_id:
-            compras = HistorialDeCompras.objects.filter(proveedor_id=proveedor_id).order_by('-fecha')
+            compras = self.get_queryset().filter(proveedor_id=proveedor_id).order_by('-fecha')
             page = self.paginate_queryset(compras)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -1630,6 +1872,7 @@ class HistorialDeVentasViewSet(ProductsBaseCrudViewSet):
     filterset_fields = ['producto', 'cliente', 'empresa', 'fecha']
     search_fields = ['factura']
     ordering_fields = ['fecha', 'created_at']
+    pagination_class = SelectablePagination
     
     def get_serializer_class(self):
         """Retorna el serializer apropiado según la acción"""
@@ -1637,6 +1880,15 @@ class HistorialDeVentasViewSet(ProductsBaseCrudViewSet):
             return VentaDetalladaSerializer
         return HistorialDeVentasSerializer
     
+    def get_queryset(self):
+        """Carga las relaciones que recorre el serializer de cada acción"""
+        queryset = HistorialDeVentas.objects.select_related('producto', 'cliente', 'empresa')
+        if self.action == 'retrieve':
+            queryset = plan_productos_disponibles(queryset, prefijo='producto__').select_related(
+                'cliente__zona', 'cliente__ciudad', 'cliente__tipo_cliente'
+            ).prefetch_related('cliente__tags')
+        return queryset
+    
     @swagger_auto_schema(
         operation_description="Obtiene el historial de ventas por producto",
         manual_parameters=[
@@ -1662,7 +1914,7 @@ class HistorialDeVentasViewSet(ProductsBaseCrudViewSet):
         """
         producto_id = request.query_params.get('producto_id', None)
         if producto_id:
-            ventas = HistorialDeVentas.objects.filter(producto_id=producto_id).order_by('-fecha')
+            ventas = self.get_queryset().filter(producto_id=producto_id).order_by('-fecha')
             page = self.paginate_queryset(ventas)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -1696,7 +1948,7 @@ class HistorialDeVentasViewSet(ProductsBaseCrudViewSet):
         """
         cliente_id = request.query_params.get('cliente_id', None)
         if cliente_id:
-            ventas = HistorialDeVentas.objects.filter(cliente_id=cliente_id).order_by('-fecha')
+            ventas = self.get_queryset().filter(cliente_id=cliente_id).order_by('-fecha')
             page = self.paginate_queryset(ventas)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -1732,10 +1984,9 @@ def create_producto_ofertado_simple(request):
         print(f"🔍 ESPECIALIDAD VALUE: {especialidad_value} (type: {type(especialidad_value).__name__})")
 
         if especialidad_value and str(especialidad_value).strip() and str(especialidad_value).lower() != 'none':
-            from basic.models import Especialidad
             try:
                 especialidad_id = int(especialidad_value)
-                especialidad_exists = Especialidad.objects.filter(id=especialidad_id).exists()
+                especialidad_exists = reference_cache.existe('especialidad', especialidad_id)
                 print(f"🔍 Especialidad ID {especialidad_id} exists: {especialidad_exists}")
 
                 if not especialidad_exists:
@@ -4,7 +4,8 @@ from .models import (
     ProformaItem,
     ProformaHistorial,
     SecuenciaProforma,
-    ConfiguracionProforma
+    ConfiguracionProforma,
+    ExportacionPDF
 )
 
 admin.site.register(Proforma)
@@ -12,3 +13,4 @@ admin.site.register(ProformaItem)
 admin.site.register(ProformaHistorial)
 admin.site.register(SecuenciaProforma)
 admin.site.register(ConfiguracionProforma)
+admin.site.register(ExportacionPDF)
@@ -0,0 +1,291 @@
+"""
+Edición masiva de los ítems de una proforma.
+
+Permite crear, modificar, reordenar y eliminar las líneas de una proforma en
+una sola petición, con un número fijo de consultas sin importar la cantidad
+de líneas:
+
+1. Validación: todas las líneas se validan en memoria contra mapas
+   precargados (ítems de la proforma y productos con in_bulk, unidades desde
+   el caché de catálogos básicos). Si alguna línea tiene errores no se
+   escribe nada.
+2. Escritura: en una sola transacción con bulk_create / bulk_update y un
+   único DELETE. Los totales de la proforma se recalculan una vez al
+   confirmar (ver totales.py).
+
+Una línea con "id" modifica ese ítem (solo los campos enviados); una sin
+"id" crea un ítem nuevo.
+"""
+
+import logging
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from basic import reference_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 500
+
+CAMPOS_SIMPLES = (
+    'tipo_item', 'codigo', 'descripcion', 'cpc', 'cudim', 'nombre_generico',
+    'especificaciones_tecnicas', 'presentacion', 'lote', 'fecha_vencimiento',
+    'registro_sanitario', 'serial', 'modelo', 'marca', 'notas', 'observaciones',
+    'cantidad', 'precio_unitario', 'porcentaje_descuento', 'orden',
+)
+
+CAMPOS_PRODUCTO = ('producto_ofertado', 'producto_disponible')
+
+CAMPOS_OBLIGATORIOS = ('tipo_item', 'descripcion', 'unidad', 'cantidad', 'precio_unitario')
+
+# Campos que cambian el total del ítem
+CAMPOS_TOTAL = {'cantidad', 'precio_unitario', 'porcentaje_descuento'}
+
+
+def _mensajes(error):
+    return list(error.messages) if hasattr(error, 'messages') else [str(error)]
+
+
+def _id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _limpiar_simple(campo, valor):
+    """Convierte y valida un campo no relacional con las reglas del modelo"""
+    from .models import ProformaItem
+
+    field = ProformaItem._meta.get_field(campo)
+    if isinstance(valor, str):
+        valor = valor.strip()
+    if valor is None or valor == '':
+        if field.has_default():
+            return field.to_python(field.get_default())
+        if field.blank and not field.null:
+            return ''
+        return None
+    return field.clean(valor, None)
+
+
+def _limpiar_linea(linea, productos):
+    """
+    Valida los campos enviados en una línea.
+
+    Returns:
+        tuple: (valores, errores) con los valores listos para asignar al ítem
+    """
+    valores = {}
+    errores = {}
+
+    for campo in CAMPOS_SIMPLES:
+        if campo not in linea:
+            continue
+        try:
+            valores[campo] = _limpiar_simple(campo, linea[campo])
+        except DjangoValidationError as e:
+            errores[campo] = _mensajes(e)
+
+    if 'unidad' in linea:
+        if linea['unidad'] in (None, ''):
+            valores['unidad_id'] = None
+        elif not reference_cache.existe('unidad', linea['unidad']):
+            errores['unidad'] = ['La unidad especificada no existe']
+        else:
+            valores['unidad_id'] = int(linea['unidad'])
+
+    for campo in CAMPOS_PRODUCTO:
+        if campo not in linea:
+            continue
+        valor = linea[campo]
+        if valor in (None, ''):
+            valores[f'{campo}_id'] = None
+        elif _id(valor) not in productos[campo]:
+            errores[campo] = [f'No existe el producto {valor}.']
+        else:
+            valores[f'{campo}_id'] = _id(valor)
+
+    return valores, errores
+
+
+def _validar_item(item, requeridos):
+    """Reglas que dependen del ítem completo (valores enviados más los guardados)"""
+    from .models import ProformaItem
+
+    errores = {}
+    for campo in CAMPOS_OBLIGATORIOS:
+        valor = getattr(item, 'unidad_id' if campo == 'unidad' else campo)
+        if valor in (None, ''):
+            errores[campo] = ['Este campo es requerido.']
+
+    if item.tipo_item == ProformaItem.TipoItem.PRODUCTO_OFERTADO and not item.producto_ofertado_id:
+        errores['producto_ofertado'] = ['Debe especificar un producto ofertado.']
+    elif item.tipo_item == ProformaItem.TipoItem.PRODUCTO_DISPONIBLE and not item.producto_disponible_id:
+        errores['producto_disponible'] = ['Debe especificar un producto disponible.']
+
+    for campo in requeridos:
+        valor = getattr(item, campo, None)
+        if not valor or (isinstance(valor, str) and not valor.strip()):
+            errores.setdefault(campo, []).append('Es requerido para el modelo de la proforma.')
+    return errores
+
+
+def planificar(proforma, lineas, eliminar=None, orden=None):
+    """
+    Valida la edición y arma el plan de escritura.
+
+    Args:
+        proforma: Proforma a editar
+        lineas: Lista de diccionarios con los campos de ProformaItem
+        eliminar: Ids de ítems a eliminar
+        orden: Ids de ítems en el orden en que deben quedar
+
+    Returns:
+        dict: {'crear': [item], 'actualizar': {pk: (item, campos)},
+               'eliminar': [pk], 'errores': [{'indice', 'id', 'errores'}]}
+    """
+    from productos.models import ProductoOfertado, ProductoDisponible
+    from .models import ProformaItem
+
+    eliminar = eliminar or []
+    orden = orden or []
+    plan = {'crear': [], 'actualizar': {}, 'eliminar': [], 'errores': []}
+    requeridos = proforma.get_campos_visibles()['requeridos']
+
+    ids = {_id(valor) for valor in list(eliminar) + list(orden)}
+    solicitados = {campo: set() for campo in CAMPOS_PRODUCTO}
+    for linea in lineas:
+        if not isinstance(linea, dict):
+            continue
+        if linea.get('id') not in (None, ''):
+            ids.add(_id(linea['id']))
+        for campo in CAMPOS_PRODUCTO:
+            if _id(linea.get(campo)) is not None:
+                solicitados[campo].add(_id(linea[campo]))
+    ids.discard(None)
+
+    # Mapas precargados: una consulta por tabla para toda la edición
+    existentes = proforma.items.in_bulk(ids) if ids else {}
+    for item in existentes.values():
+        item.proforma = proforma
+    productos = {
+        'producto_ofertado': set(ProductoOfertado.objects.filter(
+            pk__in=solicitados['producto_ofertado']
+        ).values_list('pk', flat=True)) if solicitados['producto_ofertado'] else set(),
+        'producto_disponible': set(ProductoDisponible.objects.filter(
+            pk__in=solicitados['producto_disponible']
+        ).values_list('pk', flat=True)) if solicitados['producto_disponible'] else set(),
+    }
+
+    for valor in eliminar:
+        if _id(valor) not in existentes:
+            plan['errores'].append({'indice': None, 'id': valor, 'errores': {'eliminar': [f'El ítem {valor} no pertenece a la proforma.']}})
+        else:
+            plan['eliminar'].append(_id(valor))
+    eliminados = set(plan['eliminar'])
+
+    for indice, linea in enumerate(lineas):
+        if not isinstance(linea, dict):
+            plan['errores'].append({'indice': indice, 'id': None, 'errores': {'linea': ['Debe ser un objeto.']}})
+            continue
+
+        item = None
+        if linea.get('id') not in (None, ''):
+            item = existentes.get(_id(linea['id']))
+            if item is None:
+                plan['errores'].append({
+                    'indice': indice, 'id': linea['id'],
+                    'errores': {'id': [f"El ítem {linea['id']} no pertenece a la proforma."]}
+                })
+                continue
+            if item.pk in eliminados or item.pk in plan['actualizar']:
+                plan['errores'].append({
+                    'indice': indice, 'id': item.pk,
+                    'errores': {'id': ['El ítem aparece más de una vez en la edición.']}
+                })
+                continue
+
+        valores, errores = _limpiar_linea(linea, productos)
+        if not errores:
+            if item is None:
+                item = ProformaItem(proforma=proforma)
+                for campo in CAMPOS_SIMPLES:
+                    # Los campos no enviados toman su valor por defecto
+                    valores.setdefault(campo, _limpiar_simple(campo, None))
+            for campo, valor in valores.items():
+                setattr(item, campo, valor)
+            errores = _validar_item(item, requeridos)
+
+        if errores:
+            plan['errores'].append({'indice': indice, 'id': linea.get('id'), 'errores': errores})
+        elif item.pk is None:
+            plan['crear'].append(item)
+        else:
+            plan['actualizar'][item.pk] = (item, {campo.removesuffix('_id') for campo in valores})
+
+    for posicion, valor in enumerate(orden, start=1):
+        pk = _id(valor)
+        if pk not in existentes or pk in eliminados:
+            plan['errores'].append({'indice': None, 'id': valor, 'errores': {'orden': [f'El ítem {valor} no pertenece a la proforma.']}})
+            continue
+        item, campos = plan['actualizar'].setdefault(pk, (existentes[pk], set()))
+        item.orden = posicion
+        campos.add('orden')
+
+    return plan
+
+
+def ejecutar(plan, proforma, usuario=None, batch_size=500):
+    """
+    Escribe el plan en una sola transacción y recalcula los totales una vez.
+
+    Returns:
+        dict: Cantidad de ítems creados, actualizados y eliminados
+    """
+    from .models import ProformaItem, ProformaHistorial
+    from .totales import edicion_masiva
+
+    usuario = usuario if usuario is not None and usuario.is_authenticated else None
+    ahora = timezone.now()
+    resumen = {
+        'creados': len(plan['crear']),
+        'actualizados': len(plan['actualizar']),
+        'eliminados': len(plan['eliminar']),
+    }
+
+    with transaction.atomic(), edicion_masiva(proforma):
+        if plan['eliminar']:
+            ProformaItem.objects.filter(proforma=proforma, pk__in=plan['eliminar']).delete()
+
+        for item in plan['crear']:
+            item.calcular_total()
+        ProformaItem.objects.bulk_create(plan['crear'], batch_size=batch_size)
+
+        campos = {'updated_at'}
+        modificados = []
+        for item, campos_item in plan['actualizar'].values():
+            if campos_item & CAMPOS_TOTAL:
+                item.calcular_total()
+                campos.add('total')
+            item.updated_at = ahora
+            campos.update(campos_item)
+            modificados.append(item)
+        if modificados:
+            ProformaItem.objects.bulk_update(modificados, sorted(campos), batch_size=batch_size)
+
+        ProformaHistorial.objects.create(
+            proforma=proforma,
+            accion=ProformaHistorial.TipoAccion.MODIFICACION,
+            estado_anterior=proforma.estado,
+            estado_nuevo=proforma.estado,
+            campo_modificado='items',
+            notas=(
+                f"Edición masiva de ítems: {resumen['creados']} creados, "
+                f"{resumen['actualizados']} actualizados, {resumen['eliminados']} eliminados"
+            ),
+            created_by=usuario
+        )
+
+    logger.info(f"Edición masiva de ítems en proforma {proforma.numero}: {resumen}")
+    return resumen
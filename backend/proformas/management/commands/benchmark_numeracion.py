@@ -0,0 +1,117 @@
+"""
+Comando para medir la creación concurrente de proformas con cada política
+de numeración (ver proformas/numeracion.py).
+
+Varios hilos, cada uno con su conexión, asignan números en paralelo dentro de
+una transacción que queda abierta --trabajo-ms milisegundos, como la de una
+proforma que se guarda con sus ítems. Con --proforma se crean proformas
+reales copiando la cabecera de la indicada. Usa una secuencia de un año
+aparte (--anio) y al terminar borra lo creado.
+
+Los resultados solo son representativos en MySQL: SQLite serializa todas las
+escrituras sin importar el modo.
+"""
+
+import time
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from proformas import numeracion
+from proformas.models import Proforma, SecuenciaProforma
+
+PREFIJO = 'BENCH'
+
+
+class Command(BaseCommand):
+    help = 'Mide la creación concurrente de proformas con numeración estricta y por bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos concurrentes (default: 8)')
+        parser.add_argument('--por-hilo', type=int, default=50, help='Proformas por hilo (default: 50)')
+        parser.add_argument(
+            '--modos', nargs='+', choices=numeracion.MODOS, default=list(numeracion.MODOS),
+            help='Modos a medir (default: todos)'
+        )
+        parser.add_argument(
+            '--trabajo-ms', type=float, default=5,
+            help='Milisegundos que la transacción sigue abierta después de numerar (default: 5)'
+        )
+        parser.add_argument('--proforma', type=int, help='Crear proformas reales copiando esta proforma')
+        parser.add_argument('--anio', type=int, default=9999, help='Año de la secuencia de prueba (default: 9999)')
+
+    def handle(self, *args, **options):
+        base = None
+        if options['proforma']:
+            base = Proforma.objects.filter(pk=options['proforma']).values().first()
+            if base is None:
+                raise CommandError(f"No existe la proforma {options['proforma']}")
+            for campo in ('id', 'numero', 'created_at', 'updated_at'):
+                base.pop(campo, None)
+
+        anio = options['anio']
+        if SecuenciaProforma.objects.filter(anio=anio).exists():
+            raise CommandError(f'Ya existe una secuencia para {anio}; use otro --anio')
+
+        self.stdout.write(
+            f"{options['hilos']} hilos x {options['por_hilo']} proformas, "
+            f"{options['trabajo_ms']} ms por transacción, {'proformas reales' if base else 'solo numeración'}"
+        )
+        try:
+            for modo in options['modos']:
+                self._limpiar(anio)
+                self._medir(modo, anio, base, options)
+        finally:
+            self._limpiar(anio)
+
+    def _limpiar(self, anio):
+        Proforma.objects.filter(numero__startswith=f'{PREFIJO}-{anio}-').delete()
+        SecuenciaProforma.objects.filter(anio=anio).delete()
+        numeracion.descartar_bloques(anio)
+
+    def _medir(self, modo, anio, base, options):
+
+        numeros = []
+        errores = []
+        lock = threading.Lock()
+        inicio_comun = threading.Barrier(options['hilos'])
+        trabajo = options['trabajo_ms'] / 1000
+
+        def crear():
+            propios = []
+            try:
+                inicio_comun.wait()
+                for _ in range(options['por_hilo']):
+                    with transaction.atomic():
+                        numero = numeracion.generar_numero(PREFIJO, 5, anio, modo)
+                        if base is not None:
+                            Proforma(numero=numero, **base).save()
+                        time.sleep(trabajo)
+                    propios.append(numero)
+            except Exception as e:
+                with lock:
+                    errores.append(str(e))
+            finally:
+                connection.close()
+                with lock:
+                    numeros.extend(propios)
+
+        hilos = [threading.Thread(target=crear) for _ in range(options['hilos'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        segundos = time.perf_counter() - inicio
+
+        valores = [int(numero.rsplit('-', 1)[1]) for numero in numeros]
+        ultimo = SecuenciaProforma.objects.filter(anio=anio).values_list('ultimo_numero', flat=True).first() or 0
+        duplicados = len(valores) - len(set(valores))
+        self.stdout.write(
+            f"{modo:>6}: {len(valores)} en {segundos:.2f} s ({len(valores) / segundos:.0f}/s), "
+            f"duplicados: {duplicados}, huecos: {ultimo - len(set(valores))}, errores: {len(errores)}"
+        )
+        for error in sorted(set(errores))[:5]:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
+        if duplicados:
+            raise CommandError(f'La numeración {modo} entregó números duplicados')
@@ -0,0 +1,41 @@
+# Exportación en lote de PDF de proformas
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('proformas', '0006_add_modelo_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportacionPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('plantilla', models.CharField(help_text='Plantilla de PDF usada para todas las proformas', max_length=20, verbose_name='Plantilla')),
+                ('filtros', models.JSONField(blank=True, default=dict, help_text='Filtros con los que se seleccionaron las proformas', verbose_name='Filtros')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total de proformas')),
+                ('procesadas', models.PositiveIntegerField(default=0, verbose_name='Proformas procesadas')),
+                ('fallidas', models.PositiveIntegerField(default=0, verbose_name='Proformas con error')),
+                ('errores', models.JSONField(blank=True, default=list, help_text='Proformas que no se pudieron generar y su error', verbose_name='Errores')),
+                ('archivo', models.CharField(blank=True, help_text='Ruta del ZIP relativa a MEDIA_ROOT', max_length=255, verbose_name='Archivo')),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado en')),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado en')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exportaciones_pdf', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Exportación de PDF',
+                'verbose_name_plural': 'Exportaciones de PDF',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_by', '-created_at'], name='proformas_e_created_fc033f_idx')],
+            },
+        ),
+    ]
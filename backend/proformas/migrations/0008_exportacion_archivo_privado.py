@@ -0,0 +1,18 @@
+# Los ZIP de exportación se guardan fuera de MEDIA_ROOT
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proformas', '0007_pdf_exports'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportacionpdf',
+            name='archivo',
+            field=models.CharField(blank=True, help_text="Ruta del ZIP relativa a PROFORMA_PDF_EXPORT['root']", max_length=255, verbose_name='Archivo'),
+        ),
+    ]
@@ -254,11 +254,6 @@ class Proforma(TimeStampedModel):
         """Sobrescribe save para lógica de negocio."""
         user = kwargs.pop('user', None)
         
-        # Autogenerar número si es una proforma nueva
-        if not self.numero:
-            secuencia = SecuenciaProforma.get_or_create_for_year()
-            self.numero = f"PRO-{secuencia.anio}-{secuencia.ultimo_numero:04d}"
-
         # Establecer fecha de vencimiento por defecto
         if not self.fecha_vencimiento and hasattr(self, 'fecha_emision'):
             config = ConfiguracionProforma.get_active_config()
@@ -272,10 +267,32 @@ class Proforma(TimeStampedModel):
                 self.created_by = user
             self.modified_by = user
 
-        super().save(*args, **kwargs)
-
-        # Recalcular totales después de guardar (para tener pk disponible)
-        self.recalcular_totales()
+        if self.numero:
+            super().save(*args, **kwargs)
+        else:
+            # Autogenerar número si es una proforma nueva. Se asigna justo antes
+            # del INSERT y en la misma transacción (ver numeracion.py)
+            from . import numeracion
+            try:
+                with transaction.atomic():
+                    self.numero = numeracion.generar_numero()
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.numero = None
+                raise
+
+        # Recalcular totales después de guardar (para tener pk disponible).
+        # Se agrupa con los cambios de ítems de la misma transacción.
+        from .totales import marcar
+        marcar(self.pk, self)
+
+    @staticmethod
+    def calcular_totales(suma_items, porcentaje_impuesto):
+        """Retorna (subtotal, impuesto, total) a partir de la suma de los ítems."""
+        subtotal = suma_items or Decimal('0.00')
+        # Redondeado como se guarda, para comparar con los totales guardados
+        impuesto = (subtotal * (porcentaje_impuesto / 100)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return subtotal, impuesto, subtotal + impuesto
 
     def recalcular_totales(self):
         """Recalcula los totales de la proforma basado en sus ítems."""
@@ -287,9 +304,9 @@ class Proforma(TimeStampedModel):
             subtotal_calculado=Sum('total')
         )
         
-        nuevo_subtotal = totales['subtotal_calculado'] or Decimal('0.00')
-        nuevo_impuesto = nuevo_subtotal * (self.porcentaje_impuesto / 100)
-        nuevo_total = nuevo_subtotal + nuevo_impuesto
+        nuevo_subtotal, nuevo_impuesto, nuevo_total = self.calcular_totales(
+            totales['subtotal_calculado'], self.porcentaje_impuesto
+        )
 
         # Solo actualizar si hay cambios para evitar loops
         if (self.subtotal != nuevo_subtotal or 
@@ -412,7 +429,9 @@ class Proforma(TimeStampedModel):
 
     def duplicar(self, user=None):
         """Crea una copia de la proforma con estado borrador."""
-        with transaction.atomic():
+        from .totales import edicion_masiva
+
+        with transaction.atomic(), edicion_masiva():
             # Clonar proforma
             nueva_proforma = Proforma.objects.get(pk=self.pk)
             nueva_proforma.pk = None
@@ -681,15 +700,17 @@ class ProformaItem(TimeStampedModel):
 
     def save(self, *args, **kwargs):
         """Sobrescribe save para lógica de cálculos."""
-        # Calcular el total del ítem (precio * cantidad - descuento)
+        self.calcular_total()
+        super().save(*args, **kwargs)
+
+    def calcular_total(self):
+        """Calcula el total del ítem (precio * cantidad - descuento)."""
         if self.precio_unitario is not None and self.cantidad is not None:
             precio_con_descuento = self.precio_unitario * (1 - (self.porcentaje_descuento / 100))
             self.total = (self.cantidad * precio_con_descuento).quantize(
                 Decimal('0.01'), rounding=ROUND_HALF_UP
             )
 
-        super().save(*args, **kwargs)
-
     def get_campo_identificador(self):
         """
         Retorna el campo identificador principal según el modelo de template de la proforma.
@@ -854,30 +875,26 @@ class SecuenciaProforma(TimeStampedModel):
     @classmethod
     def get_or_create_for_year(cls, year=None):
         """
-        Obtiene o crea la secuencia para el año especificado.
-        Si no se especifica año, usa el año actual.
+        Incrementa en uno la secuencia del año especificado (o del actual) y
+        la devuelve. Para numerar proformas usar numeracion.generar_numero().
         """
-        if year is None:
-            year = timezone.now().year
+        from . import numeracion
 
+        year = year or timezone.now().year
         with transaction.atomic():
-            # Usar select_for_update para evitar condiciones de carrera
-            try:
-                secuencia = cls.objects.select_for_update().get(anio=year)
-                secuencia.ultimo_numero += 1
-                secuencia.save()
-            except cls.DoesNotExist:
-                secuencia = cls.objects.create(anio=year, ultimo_numero=1)
-
-        return secuencia
+            numeracion.reservar(year, 1)
+            return cls.objects.get(anio=year)
 
     @classmethod
     def reset_secuencia(cls, year):
         """Reinicia la secuencia para un año específico."""
+        from . import numeracion
+
         with transaction.atomic():
             secuencia, created = cls.objects.get_or_create(anio=year)
             secuencia.ultimo_numero = 0
             secuencia.save()
+        numeracion.descartar_bloques(year)
         return secuencia
 
 
@@ -1020,9 +1037,100 @@ class ConfiguracionProforma(TimeStampedModel):
 
     def generar_numero_proforma(self, year=None):
         """Genera un nuevo número de proforma según la configuración."""
-        secuencia = SecuenciaProforma.get_or_create_for_year(year)
-        numero_formateado = str(secuencia.ultimo_numero).zfill(self.longitud_numero)
-        return f"{self.prefijo_numeracion}-{secuencia.anio}-{numero_formateado}"
+        from . import numeracion
+        return numeracion.generar_numero(self.prefijo_numeracion, self.longitud_numero, year)
+
+
+
+class ExportacionPDF(TimeStampedModel):
+    """
+    Trabajo de exportación en lote de los PDF de varias proformas a un ZIP.
+    Se procesa en segundo plano (ver pdf_export.py).
+    """
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', _('Pendiente')
+        PROCESANDO = 'procesando', _('Procesando')
+        COMPLETADA = 'completada', _('Completada')
+        FALLIDA = 'fallida', _('Fallida')
+
+    estado = models.CharField(
+        max_length=20,
+        choices=Estado.choices,
+        default=Estado.PENDIENTE,
+        verbose_name=_('Estado')
+    )
+    plantilla = models.CharField(
+        max_length=20,
+        verbose_name=_('Plantilla'),
+        help_text=_('Plantilla de PDF usada para todas las proformas')
+    )
+    filtros = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('Filtros'),
+        help_text=_('Filtros con los que se seleccionaron las proformas')
+    )
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Total de proformas')
+    )
+    procesadas = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Proformas procesadas')
+    )
+    fallidas = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Proformas con error')
+    )
+    errores = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_('Errores'),
+        help_text=_('Proformas que no se pudieron generar y su error')
+    )
+    archivo = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Archivo'),
+        help_text=_("Ruta del ZIP relativa a PROFORMA_PDF_EXPORT['root']")
+    )
+    iniciado_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Iniciado en')
+    )
+    finalizado_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Finalizado en')
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='exportaciones_pdf',
+        verbose_name=_('Solicitado por')
+    )
+
+    class Meta:
+        verbose_name = _('Exportación de PDF')
+        verbose_name_plural = _('Exportaciones de PDF')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.pk} - {self.get_estado_display()} ({self.procesadas}/{self.total})"
+
+    @property
+    def progreso(self):
+        """Porcentaje de proformas procesadas."""
+        if not self.total:
+            return 0
+        return round(self.procesadas * 100 / self.total)
 
 
 # Las signals para automatización están en signals.py
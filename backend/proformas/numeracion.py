@@ -0,0 +1,154 @@
+"""
+Asignación de números de proforma a partir de SecuenciaProforma.
+
+Proforma.save() y ConfiguracionProforma.generar_numero_proforma() piden el
+número con generar_numero(). La secuencia se incrementa con un UPDATE
+atómico (ultimo_numero = ultimo_numero + n) en lugar de leer la fila con
+select_for_update y volver a guardarla, y la política de huecos se elige en
+settings.PROFORMA_NUMERACION:
+
+- 'strict': un número por proforma, reservado dentro de la misma transacción
+  que la inserta. Si la inserción falla, el número vuelve a la secuencia y
+  no quedan huecos. El precio es que la fila de la secuencia queda bloqueada
+  hasta que la transacción se confirma, así que las creaciones concurrentes
+  se hacen de a una.
+- 'block': cada proceso reserva un bloque de block_size números en una
+  transacción corta y los reparte en memoria entre sus hilos, así que la fila
+  se bloquea una vez por bloque. Los números siguen siendo únicos, pero no
+  son correlativos en el tiempo entre procesos y los que quedan sin usar en
+  un bloque cuando el proceso termina (o una proforma falla) se pierden.
+
+Si el bloque se reserva dentro de una transacción, el resto del bloque solo
+pasa a estar disponible cuando se confirma: si se revierte, la secuencia
+también vuelve atrás y esos números no se reparten.
+"""
+
+import threading
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+MODOS = ('strict', 'block')
+
+# {anio: [[siguiente, limite], ...]} bloques reservados por este proceso
+_bloques = {}
+_lock = threading.Lock()
+
+
+def configuracion():
+    config = {
+        'mode': 'strict',
+        'block_size': 20,
+    }
+    config.update(getattr(settings, 'PROFORMA_NUMERACION', {}))
+    return config
+
+
+def reservar(anio, cantidad=1):
+    """
+    Incrementa la secuencia del año en `cantidad` con un UPDATE atómico.
+
+    Returns:
+        int: Último número reservado; el bloque es (ultimo - cantidad, ultimo]
+    """
+    from .models import SecuenciaProforma
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        actualizadas = SecuenciaProforma.objects.filter(anio=anio).update(
+            ultimo_numero=F('ultimo_numero') + cantidad,
+            ultima_actualizacion=ahora,
+            updated_at=ahora,
+        )
+        if not actualizadas:
+            try:
+                with transaction.atomic():
+                    SecuenciaProforma.objects.create(anio=anio, ultimo_numero=cantidad)
+                return cantidad
+            except IntegrityError:
+                # Otra conexión creó la secuencia del año al mismo tiempo
+                SecuenciaProforma.objects.filter(anio=anio).update(
+                    ultimo_numero=F('ultimo_numero') + cantidad,
+                    ultima_actualizacion=ahora,
+                    updated_at=ahora,
+                )
+        return SecuenciaProforma.objects.filter(anio=anio).values_list('ultimo_numero', flat=True).get()
+
+
+def _tomar_de_bloque(anio):
+    """Siguiente número libre de los bloques de este proceso, o None"""
+    with _lock:
+        bloques = _bloques.get(anio, [])
+        while bloques:
+            bloque = bloques[0]
+            if bloque[0] <= bloque[1]:
+                numero = bloque[0]
+                bloque[0] += 1
+                return numero
+            bloques.pop(0)
+    return None
+
+
+def _agregar_bloque(anio, desde, hasta):
+    if desde > hasta:
+        return
+    with _lock:
+        _bloques.setdefault(anio, []).append([desde, hasta])
+
+
+def siguiente(anio=None, modo=None):
+    """
+    Asigna el siguiente número de la secuencia del año.
+
+    Args:
+        anio: Año de la secuencia (por defecto el actual)
+        modo: 'strict' o 'block' (por defecto el configurado)
+
+    Returns:
+        tuple: (anio, numero)
+    """
+    config = configuracion()
+    anio = anio or timezone.now().year
+    modo = modo or config['mode']
+    if modo not in MODOS:
+        raise ValueError(f"Modo de numeración '{modo}' no válido. Modos: {', '.join(MODOS)}")
+
+    if modo == 'strict':
+        return anio, reservar(anio, 1)
+
+    numero = _tomar_de_bloque(anio)
+    if numero is not None:
+        return anio, numero
+
+    tamano = max(int(config['block_size']), 1)
+    ultimo = reservar(anio, tamano)
+    numero = ultimo - tamano + 1
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _agregar_bloque(anio, numero + 1, ultimo))
+    else:
+        _agregar_bloque(anio, numero + 1, ultimo)
+    return anio, numero
+
+
+def formatear(anio, numero, prefijo='PRO', longitud=4):
+    return f"{prefijo}-{anio}-{str(numero).zfill(longitud)}"
+
+
+def generar_numero(prefijo='PRO', longitud=4, anio=None, modo=None):
+    """Asigna y formatea el número de una proforma nueva, p. ej. PRO-2025-0042"""
+    anio, numero = siguiente(anio, modo)
+    return formatear(anio, numero, prefijo, longitud)
+
+
+def descartar_bloques(anio=None):
+    """
+    Olvida los bloques reservados por este proceso (todos, o los de un año).
+    Se usa al reiniciar una secuencia; los demás procesos conservan los suyos
+    hasta que se reinician.
+    """
+    with _lock:
+        if anio is None:
+            _bloques.clear()
+        else:
+            _bloques.pop(anio, None)
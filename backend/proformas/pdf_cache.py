@@ -0,0 +1,151 @@
+"""
+Caché en disco de los PDF de proformas.
+
+Cada PDF generado se guarda en MEDIA_ROOT/<folder> con un nombre que incluye
+una huella de la versión de la proforma: plantilla, updated_at de la
+proforma, del cliente, de la empresa y del tipo de contratación, y una
+huella de sus ítems (cantidad, suma de ids, último updated_at, suma de
+totales y último updated_at de sus unidades). Mientras la proforma no cambie, las
+descargas siguientes se sirven desde el archivo sin volver a maquetar el
+documento; cualquier edición cambia la huella y el PDF se regenera.
+
+Además de la huella, los archivos de una proforma se borran cuando se
+recalculan sus totales o se elimina (ver totales.py y signals.py), para no
+acumular versiones viejas.
+"""
+
+import os
+import glob
+import hashlib
+import threading
+import logging
+from io import BytesIO
+from django.conf import settings
+from django.db.models import Count, Max, Prefetch, Sum
+
+logger = logging.getLogger(__name__)
+
+# Plantilla -> (módulo en pdf_templates, clase)
+PLANTILLAS = {
+    'classic': ('classic_template', 'PremiumTemplate'),
+    'modern': ('modern_template', 'ModernTemplate'),
+}
+
+
+def configuracion():
+    config = {
+        'folder': 'proformas/pdf',
+        'enabled': True,
+    }
+    config.update(getattr(settings, 'PROFORMA_PDF_CACHE', {}))
+    return config
+
+
+def directorio():
+    return os.path.join(settings.MEDIA_ROOT, configuracion()['folder'])
+
+
+def clase_plantilla(plantilla):
+    """Clase del template de PDF; importa reportlab solo cuando hace falta"""
+    from importlib import import_module
+
+    modulo, clase = PLANTILLAS[plantilla]
+    return getattr(import_module(f'proformas.pdf_templates.{modulo}'), clase)
+
+
+def huella(proforma, plantilla):
+    """
+    Huella de la versión de la proforma para una plantilla (una consulta).
+    Incluye los datos relacionados que se imprimen: cliente, empresa, tipo de
+    contratación y unidades de los ítems.
+    """
+    from .models import Proforma
+
+    filas = Proforma.objects.filter(pk=proforma.pk).values(
+        'updated_at', 'cliente__updated_at', 'empresa__updated_at', 'tipo_contratacion__updated_at'
+    ).annotate(
+        cantidad=Count('items'),
+        suma_ids=Sum('items__id'),
+        ultima=Max('items__updated_at'),
+        suma_totales=Sum('items__total'),
+        unidades=Max('items__unidad__updated_at'),
+    ).order_by()
+    datos = filas[0] if filas else {}
+    contenido = '|'.join(str(valor) for valor in (
+        proforma.pk, plantilla,
+        *(valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in (
+            datos.get('updated_at'), datos.get('cliente__updated_at'), datos.get('empresa__updated_at'),
+            datos.get('tipo_contratacion__updated_at'), datos.get('cantidad'), datos.get('suma_ids'),
+            datos.get('ultima'), datos.get('suma_totales'), datos.get('unidades'),
+        )),
+    ))
+    return hashlib.sha1(contenido.encode()).hexdigest()[:16]
+
+
+def _ruta(proforma_id, plantilla, clave):
+    return os.path.join(directorio(), f'proforma_{proforma_id}_{plantilla}_{clave}.pdf')
+
+
+def renderizar(proforma, plantilla):
+    """
+    Genera el PDF de la proforma.
+    Recarga la proforma con sus relaciones y los ítems con su unidad en tres
+    consultas, en lugar de una por ítem.
+
+    Returns:
+        bytes: Contenido del PDF
+    """
+    from .models import Proforma, ProformaItem
+
+    proforma = Proforma.objects.select_related('cliente', 'empresa', 'tipo_contratacion').prefetch_related(
+        Prefetch('items', queryset=ProformaItem.objects.select_related('unidad'))
+    ).get(pk=proforma.pk)
+    return clase_plantilla(plantilla)(proforma).generate().getvalue()
+
+
+def obtener(proforma, plantilla):
+    """
+    PDF de la proforma desde el caché, generándolo si no existe.
+
+    Returns:
+        Archivo binario abierto (o BytesIO si el caché está desactivado);
+        quien lo recibe debe cerrarlo
+    """
+    if not configuracion()['enabled']:
+        return BytesIO(renderizar(proforma, plantilla))
+
+    clave = huella(proforma, plantilla)
+    ruta = _ruta(proforma.pk, plantilla, clave)
+    try:
+        return open(ruta, 'rb')
+    except FileNotFoundError:
+        pass
+
+    contenido = renderizar(proforma, plantilla)
+    os.makedirs(directorio(), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+    # Las versiones anteriores de la misma plantilla ya no se sirven
+    for anterior in glob.glob(_ruta(proforma.pk, plantilla, '*')):
+        if anterior != ruta:
+            try:
+                os.remove(anterior)
+            except OSError:
+                pass
+    logger.info(f"PDF de proforma {proforma.numero} ({plantilla}) generado: {len(contenido)} bytes")
+    return BytesIO(contenido)
+
+
+def invalidar(proforma_id):
+    """Borra los PDF guardados de una proforma"""
+    borrados = 0
+    for ruta in glob.glob(os.path.join(directorio(), f'proforma_{proforma_id}_*.pdf')):
+        try:
+            os.remove(ruta)
+            borrados += 1
+        except OSError:
+            pass
+    return borrados
@@ -0,0 +1,317 @@
+"""
+Exportación en lote de los PDF de varias proformas a un ZIP.
+
+La petición solo registra el trabajo (ExportacionPDF) y lo lanza en un hilo
+de fondo, así que el worker web responde de inmediato. El hilo reparte las
+proformas entre un pool de procesos, porque el maquetado con ReportLab es
+CPU puro y no avanza en paralelo dentro de un mismo proceso. Cada PDF se
+obtiene con pdf_cache, de modo que las proformas sin cambios no se vuelven
+a maquetar. A medida que llegan los resultados se escriben en el ZIP en
+disco y se actualiza el avance del trabajo; el cliente consulta el estado
+y descarga el ZIP cuando está completo.
+
+El hilo no sobrevive a un reinicio del worker web: un trabajo que deja de
+avanzar (updated_at sin cambios durante stale_minutes) se marca como fallido
+con marcar_interrumpidas() para que el cliente no espere para siempre.
+
+Los procesos del pool se crean con 'spawn' e inicializan Django por su
+cuenta: no heredan las conexiones a la base de datos del proceso web.
+
+Los ZIP se escriben fuera de MEDIA_ROOT (PROFORMA_PDF_EXPORT['root']), que se
+sirve sin autenticación: solo se descargan con descargar_exportacion, que
+verifica que la exportación sea del usuario.
+"""
+
+import os
+import glob
+import logging
+import threading
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Filtros aceptados: nombre -> campo de Proforma
+FILTROS_ID = {
+    'cliente': 'cliente_id',
+    'empresa': 'empresa_id',
+    'vendedor': 'vendedor_id',
+}
+FILTROS_TEXTO = ('estado', 'modelo_template')
+
+
+def configuracion():
+    config = {
+        'root': os.path.join(settings.BASE_DIR, 'privado', 'exportaciones'),
+        'workers': 2,
+        'max_proformas': 500,
+        'retention_hours': 24,
+        'stale_minutes': 15,
+    }
+    config.update(getattr(settings, 'PROFORMA_PDF_EXPORT', {}))
+    return config
+
+
+def directorio():
+    return str(configuracion()['root'])
+
+
+def seleccionar(datos):
+    """
+    Arma el queryset de proformas a exportar a partir de los filtros recibidos.
+
+    Returns:
+        tuple: (queryset, filtros normalizados)
+
+    Raises:
+        ValueError: Si algún filtro no es válido o no se envió ninguno
+    """
+    from .models import Proforma
+
+    filtros = {}
+    queryset = Proforma.objects.all()
+
+    if datos.get('ids') not in (None, '', []):
+        try:
+            filtros['ids'] = sorted({int(valor) for valor in datos['ids']})
+        except (TypeError, ValueError):
+            raise ValueError("'ids' debe ser una lista de números")
+        queryset = queryset.filter(pk__in=filtros['ids'])
+
+    for nombre, campo in FILTROS_ID.items():
+        if datos.get(nombre) in (None, ''):
+            continue
+        try:
+            filtros[nombre] = int(datos[nombre])
+        except (TypeError, ValueError):
+            raise ValueError(f"'{nombre}' debe ser un número")
+        queryset = queryset.filter(**{campo: filtros[nombre]})
+
+    for nombre in FILTROS_TEXTO:
+        if datos.get(nombre) in (None, ''):
+            continue
+        opciones = dict(Proforma._meta.get_field(nombre).choices)
+        if datos[nombre] not in opciones:
+            raise ValueError(f"'{nombre}' no es válido. Valores permitidos: {', '.join(opciones)}")
+        filtros[nombre] = datos[nombre]
+        queryset = queryset.filter(**{nombre: filtros[nombre]})
+
+    if datos.get('mes') not in (None, ''):
+        try:
+            anio, mes = (int(parte) for parte in str(datos['mes']).split('-'))
+            inicio = date(anio, mes, 1)
+        except (TypeError, ValueError):
+            raise ValueError("'mes' debe tener el formato AAAA-MM")
+        filtros['mes'] = inicio.strftime('%Y-%m')
+        queryset = queryset.filter(fecha_emision__year=inicio.year, fecha_emision__month=inicio.month)
+
+    for nombre, lookup in (('desde', 'fecha_emision__gte'), ('hasta', 'fecha_emision__lte')):
+        if datos.get(nombre) in (None, ''):
+            continue
+        try:
+            filtros[nombre] = date.fromisoformat(str(datos[nombre])).isoformat()
+        except ValueError:
+            raise ValueError(f"'{nombre}' debe ser una fecha AAAA-MM-DD")
+        queryset = queryset.filter(**{lookup: filtros[nombre]})
+
+    if not filtros:
+        raise ValueError('Debe indicar al menos un filtro (ids, cliente, empresa, vendedor, estado, modelo_template, mes, desde o hasta)')
+    return queryset.order_by('fecha_emision', 'numero'), filtros
+
+
+def crear(queryset, filtros, plantilla, usuario=None):
+    """
+    Registra el trabajo y lo lanza en segundo plano al confirmarse la transacción.
+
+    Raises:
+        ValueError: Si no hay proformas o superan el máximo configurado
+    """
+    from .models import ExportacionPDF
+
+    total = queryset.count()
+    if not total:
+        raise ValueError('No hay proformas que cumplan los filtros')
+    maximo = configuracion()['max_proformas']
+    if total > maximo:
+        raise ValueError(f'Los filtros seleccionan {total} proformas; el máximo por exportación es {maximo}')
+
+    purgar()
+    marcar_interrumpidas()
+    exportacion = ExportacionPDF.objects.create(
+        plantilla=plantilla,
+        filtros=filtros,
+        total=total,
+        created_by=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: procesar_en_segundo_plano(exportacion.pk))
+    return exportacion
+
+
+def _iniciar_proceso():
+    """Inicializa Django en cada proceso del pool"""
+    import django
+    django.setup()
+
+
+def _renderizar(proforma_id, plantilla):
+    """
+    Obtiene el PDF de una proforma dentro de un proceso del pool.
+
+    Returns:
+        tuple: (proforma_id, nombre del archivo, contenido o None, error o None)
+    """
+    from .models import Proforma
+    from . import pdf_cache
+
+    try:
+        proforma = Proforma.objects.get(pk=proforma_id)
+        with pdf_cache.obtener(proforma, plantilla) as pdf:
+            return proforma_id, f'proforma_{proforma.numero}_{plantilla}.pdf', pdf.read(), None
+    except Exception as e:
+        return proforma_id, None, None, str(e)
+
+
+def _resultados(ids, plantilla, workers):
+    """Genera los resultados a medida que terminan, en paralelo si hay workers"""
+    if workers <= 1 or len(ids) == 1:
+        for proforma_id in ids:
+            yield _renderizar(proforma_id, plantilla)
+        return
+
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(ids)), mp_context=contexto,
+                             initializer=_iniciar_proceso) as pool:
+        futuros = [pool.submit(_renderizar, proforma_id, plantilla) for proforma_id in ids]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
+
+
+def procesar(exportacion_id):
+    """Genera el ZIP de una exportación pendiente y registra su avance"""
+    from .models import ExportacionPDF
+
+    exportacion = ExportacionPDF.objects.get(pk=exportacion_id)
+    if exportacion.estado != ExportacionPDF.Estado.PENDIENTE:
+        return exportacion
+
+    ExportacionPDF.objects.filter(pk=exportacion.pk).update(
+        estado=ExportacionPDF.Estado.PROCESANDO, iniciado_en=timezone.now()
+    )
+    relativo = f'exportacion_{exportacion.pk}.zip'
+    ruta = os.path.join(directorio(), relativo)
+    temporal = ruta + '.tmp'
+    procesadas = fallidas = 0
+    errores = []
+    try:
+        queryset, _ = seleccionar(exportacion.filtros)
+        ids = list(queryset.values_list('pk', flat=True))
+        os.makedirs(directorio(), exist_ok=True)
+        nombres = set()
+        with zipfile.ZipFile(temporal, 'w', compression=zipfile.ZIP_DEFLATED) as zip_salida:
+            for proforma_id, nombre, contenido, error in _resultados(ids, exportacion.plantilla, configuracion()['workers']):
+                procesadas += 1
+                if error:
+                    fallidas += 1
+                    errores.append({'proforma': proforma_id, 'error': error})
+                else:
+                    if nombre in nombres:
+                        nombre = f'{nombre[:-4]}_{proforma_id}.pdf'
+                    nombres.add(nombre)
+                    zip_salida.writestr(nombre, contenido)
+                ExportacionPDF.objects.filter(pk=exportacion.pk).update(
+                    procesadas=procesadas, fallidas=fallidas, total=len(ids), updated_at=timezone.now()
+                )
+        os.replace(temporal, ruta)
+        ExportacionPDF.objects.filter(pk=exportacion.pk).update(
+            estado=ExportacionPDF.Estado.COMPLETADA, archivo=relativo, errores=errores,
+            finalizado_en=timezone.now(), updated_at=timezone.now()
+        )
+        logger.info(f"Exportación de PDF {exportacion.pk}: {procesadas - fallidas} generados, {fallidas} con error")
+    except Exception as e:
+        logger.error(f"Error en la exportación de PDF {exportacion.pk}: {str(e)}")
+        errores.append({'proforma': None, 'error': str(e)})
+        ExportacionPDF.objects.filter(pk=exportacion.pk).update(
+            estado=ExportacionPDF.Estado.FALLIDA, errores=errores,
+            finalizado_en=timezone.now(), updated_at=timezone.now()
+        )
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+    exportacion.refresh_from_db()
+    return exportacion
+
+
+def procesar_en_segundo_plano(exportacion_id):
+    """Procesa la exportación en un hilo para no bloquear al worker web"""
+
+    def tarea():
+        try:
+            procesar(exportacion_id)
+        except Exception as e:
+            logger.error(f"Error al procesar la exportación de PDF {exportacion_id}: {str(e)}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=tarea, name=f'exportacion-pdf-{exportacion_id}', daemon=True).start()
+
+
+def marcar_interrumpidas():
+    """
+    Marca como fallidas las exportaciones pendientes o en proceso que no
+    avanzan desde hace más de stale_minutes (el hilo murió con el worker).
+
+    Returns:
+        int: Cantidad de exportaciones marcadas
+    """
+    from .models import ExportacionPDF
+
+    ahora = timezone.now()
+    limite = ahora - timedelta(minutes=configuracion()['stale_minutes'])
+    marcadas = ExportacionPDF.objects.filter(
+        estado__in=(ExportacionPDF.Estado.PENDIENTE, ExportacionPDF.Estado.PROCESANDO),
+        updated_at__lt=limite,
+    ).update(
+        estado=ExportacionPDF.Estado.FALLIDA,
+        errores=[{'proforma': None, 'error': 'La exportación se interrumpió; vuelva a solicitarla'}],
+        finalizado_en=ahora,
+        updated_at=ahora,
+    )
+    if marcadas:
+        logger.warning(f"{marcadas} exportaciones de PDF interrumpidas marcadas como fallidas")
+    return marcadas
+
+
+def ruta_archivo(exportacion):
+    """Ruta absoluta del ZIP de una exportación completada, o None"""
+    if not exportacion.archivo:
+        return None
+    ruta = os.path.join(directorio(), exportacion.archivo)
+    return ruta if os.path.exists(ruta) else None
+
+
+def purgar():
+    """Borra las exportaciones (y sus ZIP) más antiguas que el plazo configurado"""
+    from .models import ExportacionPDF
+
+    limite = timezone.now() - timedelta(hours=configuracion()['retention_hours'])
+    antiguas = ExportacionPDF.objects.filter(created_at__lt=limite)
+    for archivo in antiguas.exclude(archivo='').values_list('archivo', flat=True):
+        try:
+            os.remove(os.path.join(directorio(), archivo))
+        except OSError:
+            pass
+    for temporal in glob.glob(os.path.join(directorio(), '*.zip.tmp')):
+        # Restos de exportaciones interrumpidas
+        if timezone.now().timestamp() - os.path.getmtime(temporal) > configuracion()['retention_hours'] * 3600:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+    eliminadas, _ = antiguas.delete()
+    return eliminadas
@@ -1,5 +1,6 @@
 # backend/proformas/pdf_templates/base_template.py
 
+import threading
 from abc import ABC, abstractmethod
 from io import BytesIO
 from reportlab.lib import colors
@@ -10,6 +11,31 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 
 
+# Estilos fijos de las secciones comunes
+INFO_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+])
+
+CONDITIONS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+# Hojas de estilo y TableStyle por clase de template, creados una vez por proceso.
+# Los templates solo los leen al armar el documento, así que se comparten.
+_estilos_compartidos = {}
+_lock = threading.Lock()
+
+
 class BasePDFTemplate(ABC):
     """
     Clase base abstracta para templates de PDF de proformas.
@@ -20,8 +46,29 @@ class BasePDFTemplate(ABC):
     def __init__(self, proforma):
         self.proforma = proforma
         self.buffer = BytesIO()
+        self.styles = self._shared('styles', self._build_styles)
+    
+    def _build_styles(self):
+        """Crea la hoja de estilos del template (una vez por proceso)"""
         self.styles = getSampleStyleSheet()
         self._create_custom_styles()
+        return self.styles
+    
+    def _shared(self, nombre, fabrica):
+        """Objeto de estilo compartido entre todas las instancias de la clase"""
+        clave = (type(self), nombre)
+        objeto = _estilos_compartidos.get(clave)
+        if objeto is None:
+            with _lock:
+                objeto = _estilos_compartidos.get(clave)
+                if objeto is None:
+                    objeto = fabrica()
+                    _estilos_compartidos[clave] = objeto
+        return objeto
+    
+    def _table_style(self, metodo):
+        """TableStyle de uno de los métodos _get_*_table_style, compartido por clase"""
+        return self._shared(metodo, getattr(self, metodo))
         
     @abstractmethod
     def _create_custom_styles(self):
@@ -53,7 +100,7 @@ class BasePDFTemplate(ABC):
         ]
         
         table = Table(data, colWidths=[100, 400])
-        table.setStyle(self._get_client_table_style())
+        table.setStyle(self._table_style('_get_client_table_style'))
         return table
     
     def _create_items_table(self):
@@ -77,7 +124,7 @@ class BasePDFTemplate(ABC):
         
         col_widths = [25, 70, 200, 50, 50, 60, 40, 55]
         table = Table(data, colWidths=col_widths)
-        table.setStyle(self._get_items_table_style())
+        table.setStyle(self._table_style('_get_items_table_style'))
         return table
     
     def _create_totals_table(self):
@@ -89,7 +136,7 @@ class BasePDFTemplate(ABC):
         ]
         
         table = Table(data, colWidths=[100, 100])
-        table.setStyle(self._get_totals_table_style())
+        table.setStyle(self._table_style('_get_totals_table_style'))
         return table
     
     @abstractmethod
@@ -189,13 +236,7 @@ class BasePDFTemplate(ABC):
         ]
         
         info_table = Table(info_data, colWidths=[275, 275])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
+        info_table.setStyle(INFO_TABLE_STYLE)
         
         return [info_table]
     
@@ -211,15 +252,7 @@ class BasePDFTemplate(ABC):
         ]
         
         conditions_table = Table(conditions_data, colWidths=[120, 430])
-        conditions_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]))
+        conditions_table.setStyle(CONDITIONS_TABLE_STYLE)
         
         elements.append(conditions_table)
         elements.append(Spacer(1, 20))
@@ -101,24 +101,24 @@ class PremiumTemplate(BasePDFTemplate):
         # Crear header con banda turquesa y elementos geométricos
         header_data = [['']]
         header_table = Table(header_data, colWidths=[550], rowHeights=[80])
-        header_table.setStyle(TableStyle([
+        header_table.setStyle(self._shared('header_table', lambda: TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#4FD1C7')),
             ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        ])))
         
         elements.append(header_table)
         
         # Título PROFORMA sobre la banda
         title_data = [['PROFORMA']]
         title_table = Table(title_data, colWidths=[550], rowHeights=[60])
-        title_table.setStyle(TableStyle([
+        title_table.setStyle(self._shared('title_table', lambda: TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#4FD1C7')),
             ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
             ('FONTSIZE', (0, 0), (-1, -1), 32),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ]))
+        ])))
         
         # Superponer título sobre header
         elements[-1] = title_table  # Reemplazar la tabla anterior
@@ -136,12 +136,12 @@ class PremiumTemplate(BasePDFTemplate):
         # Crear tabla para información de empresa
         company_data = [['', company_info]]
         company_table = Table(company_data, colWidths=[350, 200])
-        company_table.setStyle(TableStyle([
+        company_table.setStyle(self._shared('company_table', lambda: TableStyle([
             ('VALIGN', (0, 0), (-1, -1), 'TOP'),
             ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
             ('FONTSIZE', (1, 0), (1, -1), 10),
             ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#1F2937')),
-        ]))
+        ])))
         
         elements.append(company_table)
         elements.append(Spacer(1, 30))
@@ -155,14 +155,14 @@ class PremiumTemplate(BasePDFTemplate):
         # Total destacado en la parte superior
         total_data = [[f'Total Due: USD $ {self.proforma.total:,.2f}']]
         total_table = Table(total_data, colWidths=[550])
-        total_table.setStyle(TableStyle([
+        total_table.setStyle(self._shared('total_table', lambda: TableStyle([
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
             ('FONTSIZE', (0, 0), (-1, -1), 20),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#4FD1C7')),
             ('TOPPADDING', (0, 0), (-1, -1), 10),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ]))
+        ])))
         
         elements.append(total_table)
         elements.append(Spacer(1, 20))
@@ -194,7 +194,7 @@ class PremiumTemplate(BasePDFTemplate):
         ]
         
         info_table = Table(info_data, colWidths=[275, 275])
-        info_table.setStyle(TableStyle([
+        info_table.setStyle(self._shared('info_table', lambda: TableStyle([
             # Headers
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4FD1C7')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -215,7 +215,7 @@ class PremiumTemplate(BasePDFTemplate):
             
             # Borders
             ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
-        ]))
+        ])))
         
         elements.append(info_table)
         elements.append(Spacer(1, 30))
@@ -279,7 +279,7 @@ class PremiumTemplate(BasePDFTemplate):
         
         col_widths = [50, 250, 50, 100, 100]
         table = Table(data, colWidths=col_widths)
-        table.setStyle(self._get_items_table_style())
+        table.setStyle(self._table_style('_get_items_table_style'))
         return table
     
     def _create_totals_section(self):
@@ -297,14 +297,14 @@ class PremiumTemplate(BasePDFTemplate):
             subtotals_data.append(['DISCOUNT 5%', f'-${self.proforma.descuento:,.2f}'])
         
         subtotals_table = Table(subtotals_data, colWidths=[200, 100])
-        subtotals_table.setStyle(TableStyle([
+        subtotals_table.setStyle(self._shared('subtotals_table', lambda: TableStyle([
             ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
             ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
             ('FONTSIZE', (0, 0), (-1, -1), 11),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#374151')),
             ('TOPPADDING', (0, 0), (-1, -1), 5),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
+        ])))
         
         # Alinear subtotales a la derecha
         subtotals_container = Table([['', subtotals_table]], colWidths=[250, 300])
@@ -314,7 +314,7 @@ class PremiumTemplate(BasePDFTemplate):
         # Grand Total en caja destacada
         grand_total_data = [[f'GRAND TOTAL    ${self.proforma.total:,.2f}']]
         grand_total_table = Table(grand_total_data, colWidths=[300])
-        grand_total_table.setStyle(TableStyle([
+        grand_total_table.setStyle(self._shared('grand_total_table', lambda: TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#4FD1C7')),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -322,7 +322,7 @@ class PremiumTemplate(BasePDFTemplate):
             ('FONTSIZE', (0, 0), (-1, -1), 18),
             ('TOPPADDING', (0, 0), (-1, -1), 15),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-        ]))
+        ])))
         
         # Alinear grand total a la derecha
         total_container = Table([['', grand_total_table]], colWidths=[250, 300])
@@ -359,13 +359,13 @@ class PremiumTemplate(BasePDFTemplate):
         ]
         
         footer_table = Table(footer_data, colWidths=[275, 275])
-        footer_table.setStyle(TableStyle([
+        footer_table.setStyle(self._shared('footer_table', lambda: TableStyle([
             ('VALIGN', (0, 0), (-1, -1), 'TOP'),
             ('FONTSIZE', (0, 0), (-1, -1), 9),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#6B7280')),
             ('TOPPADDING', (0, 0), (-1, -1), 10),
             ('SPAN', (0, 1), (1, 1)),  # Terms span both columns
-        ]))
+        ])))
         
         elements.append(footer_table)
         elements.append(Spacer(1, 20))
@@ -373,7 +373,7 @@ class PremiumTemplate(BasePDFTemplate):
         # Thank you message
         thanks_data = [['Thank you for your Business.']]
         thanks_table = Table(thanks_data, colWidths=[550])
-        thanks_table.setStyle(TableStyle([
+        thanks_table.setStyle(self._shared('thanks_table', lambda: TableStyle([
             ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#4FD1C7')),
             ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -381,7 +381,7 @@ class PremiumTemplate(BasePDFTemplate):
             ('FONTSIZE', (0, 0), (-1, -1), 14),
             ('TOPPADDING', (0, 0), (-1, -1), 15),
             ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-        ]))
+        ])))
         
         elements.append(thanks_table)
         
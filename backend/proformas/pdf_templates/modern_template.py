@@ -174,13 +174,13 @@ class ModernTemplate(BasePDFTemplate):
         elements.append(Spacer(1, 40))
         
         # Footer con diseño moderno
-        footer_style = ParagraphStyle(
+        footer_style = self._shared('footer_style', lambda: ParagraphStyle(
             name='ModernFooter',
             parent=self.styles['Normal'],
             fontSize=9,
             textColor=colors.HexColor('#6b7280'),
             alignment=TA_CENTER,
-        )
+        ))
         
         elements.append(Paragraph(
             "🌟 <b>Gracias por su confianza</b> 🌟",
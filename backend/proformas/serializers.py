@@ -3,15 +3,15 @@
 from rest_framework import serializers
 from .models import (
     Proforma, ProformaItem, ProformaHistorial, 
-    SecuenciaProforma, ConfiguracionProforma
+    SecuenciaProforma, ConfiguracionProforma, ExportacionPDF
 )
 
 class ProformaItemSerializer(serializers.ModelSerializer):
     """Serializer para el modelo ProformaItem"""
     unidad_nombre = serializers.CharField(source='unidad.nombre', read_only=True)
     campo_identificador = serializers.CharField(source='get_campo_identificador', read_only=True)
-    precio_con_descuento = serializers.DecimalField(source='precio_con_descuento', max_digits=15, decimal_places=2, read_only=True)
-    valor_descuento = serializers.DecimalField(source='valor_descuento', max_digits=15, decimal_places=2, read_only=True)
+    precio_con_descuento = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    valor_descuento = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
     
     class Meta:
         model = ProformaItem
@@ -131,6 +131,17 @@ class ConfiguracionProformaSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at')
 
 
+class ExportacionPDFSerializer(serializers.ModelSerializer):
+    """Serializer para el estado de una exportación de PDF en lote"""
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    progreso = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ExportacionPDF
+        exclude = ('archivo',)
+        read_only_fields = ('created_at', 'updated_at')
+
+
 class ProformaSerializer(serializers.ModelSerializer):
     """Serializer básico para el modelo Proforma"""
     cliente_nombre = serializers.CharField(source='cliente.nombre', read_only=True)
@@ -140,10 +151,10 @@ class ProformaSerializer(serializers.ModelSerializer):
     modelo_template_display = serializers.CharField(source='get_modelo_template_display', read_only=True)
     titulo_modelo = serializers.CharField(source='get_titulo_modelo', read_only=True)
     campos_visibles = serializers.SerializerMethodField()
-    puede_ser_enviada = serializers.BooleanField(source='puede_ser_enviada', read_only=True)
-    esta_vencida = serializers.BooleanField(source='esta_vencida', read_only=True)
-    dias_hasta_vencimiento = serializers.IntegerField(source='dias_hasta_vencimiento', read_only=True)
-    cantidad_items = serializers.IntegerField(source='cantidad_items', read_only=True)
+    puede_ser_enviada = serializers.BooleanField(read_only=True)
+    esta_vencida = serializers.BooleanField(read_only=True)
+    dias_hasta_vencimiento = serializers.IntegerField(read_only=True)
+    cantidad_items = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Proforma
@@ -211,9 +222,9 @@ class ProformaDetalladoSerializer(serializers.ModelSerializer):
     titulo_modelo = serializers.CharField(source='get_titulo_modelo', read_only=True)
     campos_visibles = serializers.SerializerMethodField()
     items_validacion = serializers.SerializerMethodField()
-    puede_ser_enviada = serializers.BooleanField(source='puede_ser_enviada', read_only=True)
-    esta_vencida = serializers.BooleanField(source='esta_vencida', read_only=True)
-    dias_hasta_vencimiento = serializers.IntegerField(source='dias_hasta_vencimiento', read_only=True)
+    puede_ser_enviada = serializers.BooleanField(read_only=True)
+    esta_vencida = serializers.BooleanField(read_only=True)
+    dias_hasta_vencimiento = serializers.IntegerField(read_only=True)
     
     # Datos adicionales del cliente
     cliente_ruc = serializers.CharField(source='cliente.ruc', read_only=True)
@@ -262,8 +273,8 @@ class ProformaItemDetalladoSerializer(serializers.ModelSerializer):
     proforma_modelo_template = serializers.CharField(source='proforma.modelo_template', read_only=True)
     proforma_titulo_modelo = serializers.CharField(source='proforma.get_titulo_modelo', read_only=True)
     campo_identificador = serializers.CharField(source='get_campo_identificador', read_only=True)
-    precio_con_descuento = serializers.DecimalField(source='precio_con_descuento', max_digits=15, decimal_places=2, read_only=True)
-    valor_descuento = serializers.DecimalField(source='valor_descuento', max_digits=15, decimal_places=2, read_only=True)
+    precio_con_descuento = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    valor_descuento = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
     
     class Meta:
         model = ProformaItem
@@ -8,6 +8,7 @@ from django.db import transaction
 import logging
 
 from .models import Proforma, ProformaItem, ProformaHistorial, ConfiguracionProforma
+from . import totales, pdf_cache
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -16,31 +17,40 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=ProformaItem)
 def actualizar_totales_proforma_on_item_save(sender, instance, created, **kwargs):
     """
-    Actualiza totales de la proforma cuando se guarda un ítem.
+    Marca la proforma del ítem para recalcular sus totales.
+    El recálculo se agrupa por transacción (ver totales.py).
     """
     if instance.proforma_id:
-        # Usar transaction.on_commit para evitar loops en save()
-        transaction.on_commit(lambda: instance.proforma.recalcular_totales())
-        
+        proforma = instance.proforma if ProformaItem.proforma.is_cached(instance) else None
+        totales.marcar(instance.proforma_id, proforma)
+        if totales.en_edicion_masiva():
+            return
+
         # Log para auditoría
         if created:
-            logger.info(f"Nuevo ítem agregado a proforma {instance.proforma.numero}: {instance.codigo}")
+            logger.info(f"Nuevo ítem agregado a proforma {instance.proforma_id}: {instance.codigo}")
         else:
-            logger.info(f"Ítem actualizado en proforma {instance.proforma.numero}: {instance.codigo}")
+            logger.info(f"Ítem actualizado en proforma {instance.proforma_id}: {instance.codigo}")
 
 
 @receiver(post_delete, sender=ProformaItem)
 def actualizar_totales_proforma_on_item_delete(sender, instance, **kwargs):
     """
-    Actualiza totales de la proforma cuando se elimina un ítem.
+    Marca la proforma del ítem eliminado para recalcular sus totales.
     """
     if instance.proforma_id:
-        try:
-            proforma = Proforma.objects.get(pk=instance.proforma_id)
-            proforma.recalcular_totales()
-            logger.info(f"Ítem eliminado de proforma {proforma.numero}: {instance.codigo}")
-        except Proforma.DoesNotExist:
-            logger.warning(f"Proforma no encontrada al eliminar ítem: {instance.proforma_id}")
+        totales.marcar(instance.proforma_id)
+        if not totales.en_edicion_masiva():
+            logger.info(f"Ítem eliminado de proforma {instance.proforma_id}: {instance.codigo}")
+
+
+@receiver(post_delete, sender=Proforma)
+def borrar_pdf_proforma_on_delete(sender, instance, **kwargs):
+    """
+    Borra los PDF guardados de la proforma eliminada.
+    """
+    proforma_id = instance.pk
+    transaction.on_commit(lambda: pdf_cache.invalidar(proforma_id))
 
 
 @receiver(pre_save, sender=Proforma)
@@ -179,21 +189,22 @@ def marcar_proformas_vencidas():
     )
     
     count = 0
-    for proforma in proformas_vencidas:
-        proforma.estado = Proforma.EstadoProforma.VENCIDA
-        proforma.save()
-        
-        # Crear entrada en historial
-        ProformaHistorial.objects.create(
-            proforma=proforma,
-            accion=ProformaHistorial.TipoAccion.VENCIMIENTO,
-            estado_anterior=Proforma.EstadoProforma.ENVIADA,
-            estado_nuevo=Proforma.EstadoProforma.VENCIDA,
-            notas="Proforma marcada como vencida automáticamente",
-            created_by=User.objects.filter(is_superuser=True).first()
-        )
-        
-        count += 1
+    with totales.edicion_masiva():
+        for proforma in proformas_vencidas:
+            proforma.estado = Proforma.EstadoProforma.VENCIDA
+            proforma.save()
+            
+            # Crear entrada en historial
+            ProformaHistorial.objects.create(
+                proforma=proforma,
+                accion=ProformaHistorial.TipoAccion.VENCIMIENTO,
+                estado_anterior=Proforma.EstadoProforma.ENVIADA,
+                estado_nuevo=Proforma.EstadoProforma.VENCIDA,
+                notas="Proforma marcada como vencida automáticamente",
+                created_by=User.objects.filter(is_superuser=True).first()
+            )
+            
+            count += 1
     
     if count > 0:
         logger.info(f"Se marcaron {count} proformas como vencidas")
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from basic.models import EmpresaClc, TipoContratacion, Unidad
+from directorio.models import Cliente
+from .models import ConfiguracionProforma, ExportacionPDF, Proforma, ProformaItem, SecuenciaProforma
+from . import numeracion, pdf_cache, pdf_export, totales
 
-# Create your tests here.
+
+class ProformaDatosMixin:
+    """Crea una proforma con sus relaciones para las pruebas"""
+
+    @classmethod
+    def crear_datos(cls):
+        cls.usuario = get_user_model().objects.create_user(username='proformas', password='testpass123')
+        cls.cliente = Cliente.objects.create(
+            nombre='Hospital', alias='HOS', razon_social='Hospital SA', ruc='1790000000001',
+            email='compras@hospital.com', telefono='0999999998', direccion='Av. Principal'
+        )
+        cls.empresa = EmpresaClc.objects.create(
+            nombre='Empresa', razon_social='Empresa SA', code='EMP', ruc='1790000000002',
+            direccion='Dir', correo='empresa@company.com', representante_legal='Rep'
+        )
+        cls.tipo_contratacion = TipoContratacion.objects.create(nombre='Directa', code='DIR')
+        cls.unidad = Unidad.objects.create(nombre='Unidad', code='UND')
+
+    def crear_proforma(self, items=0):
+        proforma = Proforma.objects.create(
+            nombre='Proforma de prueba', fecha_emision=date.today(), cliente=self.cliente,
+            empresa=self.empresa, tipo_contratacion=self.tipo_contratacion,
+            porcentaje_impuesto=Decimal('15'), created_by=self.usuario
+        )
+        for i in range(items):
+            self.crear_item(proforma, i)
+        return proforma
+
+    def crear_item(self, proforma, orden, cantidad=1, precio='10.00'):
+        return ProformaItem.objects.create(
+            proforma=proforma, tipo_item='personalizado', codigo=f'C{orden}', descripcion=f'Ítem {orden}',
+            unidad=self.unidad, cantidad=cantidad, precio_unitario=Decimal(precio), orden=orden,
+            porcentaje_descuento=Decimal('0')
+        )
+
+
+class PdfCacheTest(ProformaDatosMixin, TestCase):
+    """El PDF guardado se reutiliza mientras no cambie nada de lo que se imprime"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proforma = self.crear_proforma(items=2)
+
+    def obtener(self):
+        with pdf_cache.obtener(self.proforma, 'classic') as pdf:
+            return pdf.read()
+
+    def archivos(self):
+        return sorted(os.listdir(pdf_cache.directorio()))
+
+    def test_reutiliza_el_pdf_sin_cambios(self):
+        primero = self.obtener()
+        self.assertTrue(primero.startswith(b'%PDF'))
+        archivos = self.archivos()
+        self.assertEqual(len(archivos), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.obtener(), primero)
+        self.assertEqual(self.archivos(), archivos)
+
+    def test_regenera_al_cambiar_datos_impresos(self):
+        cambios = (
+            lambda: Cliente.objects.get(pk=self.cliente.pk).save(),
+            lambda: EmpresaClc.objects.get(pk=self.empresa.pk).save(),
+            lambda: TipoContratacion.objects.get(pk=self.tipo_contratacion.pk).save(),
+            lambda: Unidad.objects.get(pk=self.unidad.pk).save(),
+        )
+        self.obtener()
+        for cambio in cambios:
+            anterior = self.archivos()
+            cambio()
+            self.obtener()
+            self.assertEqual(len(self.archivos()), 1)
+            self.assertNotEqual(self.archivos(), anterior)
+
+    def test_invalida_al_editar_items(self):
+        self.obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_item(self.proforma, 5)
+        self.assertEqual(self.archivos(), [])
+
+
+class ItemsMasivoTest(ProformaDatosMixin, TestCase):
+    """Edición masiva de ítems: todo o nada y totales recalculados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proforma = self.crear_proforma(items=3)
+        self.items = list(self.proforma.items.order_by('orden'))
+        self.url = f'/api/proformas/proformas/{self.proforma.pk}/items_masivo/'
+
+    def test_crea_modifica_y_elimina_en_una_peticion(self):
+        datos = {
+            'items': [
+                {'id': self.items[0].pk, 'cantidad': 3},
+                {'tipo_item': 'personalizado', 'codigo': 'N1', 'descripcion': 'Nuevo', 'unidad': self.unidad.pk,
+                 'cantidad': 2, 'precio_unitario': '5.00', 'orden': 9},
+            ],
+            'eliminar': [self.items[2].pk],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, datos, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            (response.data['creados'], response.data['actualizados'], response.data['eliminados']), (1, 1, 1)
+        )
+        self.proforma.refresh_from_db()
+        # 3 x 10 + 1 x 10 + 2 x 5
+        self.assertEqual(self.proforma.subtotal, Decimal('50.00'))
+        self.assertEqual(self.proforma.items.count(), 3)
+
+    def test_una_linea_invalida_no_aplica_nada(self):
+        datos = {
+            'items': [
+                {'id': self.items[0].pk, 'cantidad': 3},
+                {'descripcion': 'Sin unidad ni precio'},
+            ],
+            'eliminar': [self.items[2].pk],
+        }
+        response = self.client.post(self.url, datos, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['indice'] for error in response.data['errores']], [1])
+        self.assertEqual(self.proforma.items.count(), 3)
+        self.items[0].refresh_from_db()
+        self.assertEqual(self.items[0].cantidad, 1)
+
+    def test_cuerpo_que_no_es_objeto(self):
+        response = self.client.post(self.url, [{'id': self.items[0].pk}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportacionPdfTest(ProformaDatosMixin, TestCase):
+    """Validación de la petición y trabajos interrumpidos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.usuario)
+
+    def test_cuerpo_que_no_es_objeto(self):
+        response = self.client.post('/api/proformas/proformas/exportar_pdf/', [1, 2], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_id_no_numerico(self):
+        response = self.client.get('/api/proformas/proformas/exportaciones/abc/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_zip_fuera_de_media_root_y_descarga_autenticada(self):
+        media_root, privado = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directorio in (media_root, privado):
+            self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, PROFORMA_PDF_EXPORT={'root': privado, 'workers': 1}):
+            with self.captureOnCommitCallbacks(execute=True):
+                proforma = self.crear_proforma(items=1)
+            queryset, filtros = pdf_export.seleccionar({'ids': [proforma.pk]})
+            with mock.patch.object(pdf_export, 'procesar_en_segundo_plano'):
+                exportacion = pdf_export.crear(queryset, filtros, 'classic', self.usuario)
+            exportacion = pdf_export.procesar(exportacion.pk)
+            self.assertEqual(exportacion.estado, ExportacionPDF.Estado.COMPLETADA)
+            self.assertEqual(os.listdir(privado), [exportacion.archivo])
+            self.assertFalse(any(archivo.endswith('.zip') for _, _, archivos in os.walk(media_root) for archivo in archivos))
+
+            url = f'/api/proformas/proformas/exportaciones/{exportacion.pk}/descargar/'
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+            otro = get_user_model().objects.create_user(username='otro', password='testpass123', email='otro@x.com')
+            self.client.force_authenticate(user=otro)
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_marca_como_fallidas_las_exportaciones_sin_avance(self):
+        detenida = ExportacionPDF.objects.create(
+            plantilla='classic', estado=ExportacionPDF.Estado.PROCESANDO, created_by=self.usuario
+        )
+        activa = ExportacionPDF.objects.create(
+            plantilla='classic', estado=ExportacionPDF.Estado.PROCESANDO, created_by=self.usuario
+        )
+        minutos = pdf_export.configuracion()['stale_minutes'] + 1
+        ExportacionPDF.objects.filter(pk=detenida.pk).update(updated_at=timezone.now() - timedelta(minutes=minutos))
+
+        response = self.client.get(f'/api/proformas/proformas/exportaciones/{detenida.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado'], ExportacionPDF.Estado.FALLIDA)
+        activa.refresh_from_db()
+        self.assertEqual(activa.estado, ExportacionPDF.Estado.PROCESANDO)
+
+
+class TotalesTest(ProformaDatosMixin, TestCase):
+    """Recálculo agrupado de totales por transacción"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proforma = self.crear_proforma()
+
+    def test_recalcula_una_vez_por_transaccion(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for orden in range(5):
+                        self.crear_item(self.proforma, orden, cantidad=2)
+        sumas = [consulta for consulta in consultas.captured_queries if 'SUM(' in consulta['sql']]
+        self.assertEqual(len(sumas), 1)
+        self.proforma.refresh_from_db()
+        self.assertEqual(self.proforma.subtotal, Decimal('100.00'))
+
+    def test_descarta_marcas_de_transacciones_revertidas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            otra = self.crear_proforma()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.crear_item(self.proforma, 1)
+                raise RuntimeError
+        with self.captureOnCommitCallbacks() as callbacks:
+            totales.marcar(otra.pk)
+            self.assertEqual(set(totales._pendientes()), {otra.pk})
+        for callback in callbacks:
+            callback()
+        self.proforma.refresh_from_db()
+        self.assertEqual(self.proforma.subtotal, Decimal('0'))
+
+
+class NumeracionTest(ProformaDatosMixin, TestCase):
+    """Números de proforma únicos en los modos strict y block"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.crear_datos()
+
+    def setUp(self):
+        numeracion.descartar_bloques()
+        self.addCleanup(numeracion.descartar_bloques)
+
+    def test_strict_correlativo_sin_huecos_tras_un_error(self):
+        anio = timezone.now().year
+        with self.captureOnCommitCallbacks(execute=True):
+            primera = self.crear_proforma()
+            with self.assertRaises(IntegrityError):
+                Proforma.objects.create(
+                    nombre='Sin cliente', fecha_emision=date.today(), empresa=self.empresa,
+                    tipo_contratacion=self.tipo_contratacion, created_by=self.usuario
+                )
+            segunda = self.crear_proforma()
+        self.assertEqual(primera.numero, f'PRO-{anio}-0001')
+        self.assertEqual(segunda.numero, f'PRO-{anio}-0002')
+
+    def test_formato_de_la_configuracion(self):
+        configuracion = ConfiguracionProforma(prefijo_numeracion='COT', longitud_numero=6)
+        self.assertEqual(configuracion.generar_numero_proforma(2031), 'COT-2031-000001')
+        self.assertEqual(configuracion.generar_numero_proforma(2031), 'COT-2031-000002')
+
+    @override_settings(PROFORMA_NUMERACION={'mode': 'block', 'block_size': 5})
+    def test_block_reparte_el_bloque_y_reserva_otro_al_agotarlo(self):
+        numeros = []
+        for _ in range(7):
+            with self.captureOnCommitCallbacks(execute=True):
+                numeros.append(numeracion.siguiente(2032)[1])
+        self.assertEqual(numeros, list(range(1, 8)))
+        self.assertEqual(SecuenciaProforma.objects.get(anio=2032).ultimo_numero, 10)
+
+    @override_settings(PROFORMA_NUMERACION={'mode': 'block', 'block_size': 5})
+    def test_block_no_reparte_bloques_revertidos(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                numeracion.siguiente(2033)
+                raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(numeracion.siguiente(2033), (2033, 1))
@@ -0,0 +1,164 @@
+"""
+Recálculo agrupado de los totales de proformas.
+
+Las señales de ProformaItem y Proforma.save() no recalculan por su cuenta:
+marcan la proforma como pendiente con marcar(). Las pendientes se recalculan
+juntas al confirmarse la transacción (de inmediato en autocommit), con una
+única consulta agregada para todas y un UPDATE solo para las que cambiaron,
+así que guardar 150 ítems de una proforma en una transacción la recalcula
+una sola vez.
+
+Para operaciones masivas (duplicar, importar, cargar ítems en lote) se usa
+edicion_masiva(): dentro del bloque las señales de ProformaItem no hacen
+nada más que anotar la proforma, y cada proforma se recalcula una sola vez
+al salir del bloque.
+
+El estado es por hilo, igual que las conexiones de Django. Cada transacción
+registra un solo callback de recálculo; si se revierte, Django descarta el
+callback y las marcas que quedaron huérfanas se descartan la próxima vez que
+el hilo marca una proforma (sus cambios tampoco llegaron a la base de datos).
+Las instancias en memoria se guardan con referencias débiles, así que las
+marcas huérfanas no las mantienen vivas mientras tanto.
+"""
+
+import threading
+import weakref
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Sum
+
+_estado = threading.local()
+
+
+def _pendientes():
+    """{pk: {id(instancia): instancia}} de las proformas marcadas en este hilo"""
+    if not hasattr(_estado, 'pendientes'):
+        _estado.pendientes = {}
+        _estado.profundidad = 0
+        _estado.callback = None
+    return _estado.pendientes
+
+
+def _programado():
+    """Indica si el callback de las marcas actuales sigue registrado en la transacción"""
+    _pendientes()
+    callback = _estado.callback
+    if callback is None:
+        return False
+    conexion = transaction.get_connection()
+    return conexion.in_atomic_block and any(func is callback for _, func, _ in conexion.run_on_commit)
+
+
+def _descartar_revertidas():
+    """Olvida las marcas cuyo callback se descartó porque la transacción se revirtió"""
+    pendientes = _pendientes()
+    if pendientes and _estado.profundidad == 0 and not _programado():
+        pendientes.clear()
+
+
+def _programar():
+    """Registra el recálculo al confirmar la transacción, una sola vez por transacción"""
+    if _programado():
+        return
+
+    def callback():
+        if _estado.callback is callback:
+            _estado.callback = None
+        recalcular_pendientes()
+
+    _estado.callback = callback
+    transaction.on_commit(callback)
+
+
+def en_edicion_masiva():
+    """Indica si el hilo está dentro de un bloque edicion_masiva()"""
+    _pendientes()
+    return _estado.profundidad > 0
+
+
+def marcar(proforma_id, instancia=None):
+    """
+    Marca una proforma para recalcular sus totales.
+
+    Args:
+        proforma_id: Id de la proforma
+        instancia: Proforma en memoria que debe quedar con los totales nuevos
+    """
+    if not proforma_id:
+        return
+    _descartar_revertidas()
+    instancias = _pendientes().setdefault(proforma_id, weakref.WeakValueDictionary())
+    if instancia is not None:
+        instancias[id(instancia)] = instancia
+    if not en_edicion_masiva():
+        _programar()
+
+
+def recalcular_pendientes():
+    """Recalcula las proformas marcadas en este hilo"""
+    pendientes = _pendientes()
+    if not pendientes:
+        return 0
+    trabajo = dict(pendientes)
+    pendientes.clear()
+    # Las proformas marcadas cambiaron: sus PDF guardados ya no sirven
+    from . import pdf_cache
+    for pk in trabajo:
+        pdf_cache.invalidar(pk)
+    return recalcular(trabajo.keys(), trabajo)
+
+
+def recalcular(ids, instancias=None):
+    """
+    Recalcula los totales de varias proformas con una sola consulta agregada.
+
+    Args:
+        ids: Ids de las proformas
+        instancias: {pk: {id(instancia): instancia}} a actualizar en memoria
+
+    Returns:
+        int: Proformas cuyos totales cambiaron
+    """
+    from .models import Proforma
+
+    instancias = instancias or {}
+    filas = Proforma.objects.filter(pk__in=list(ids)).order_by().annotate(
+        suma_items=Sum('items__total')
+    ).values_list('pk', 'porcentaje_impuesto', 'subtotal', 'impuesto', 'total', 'suma_items')
+
+    cambiadas = 0
+    for pk, porcentaje, subtotal, impuesto, total, suma_items in filas:
+        nuevos = Proforma.calcular_totales(suma_items, porcentaje)
+        if nuevos != (subtotal, impuesto, total):
+            Proforma.objects.filter(pk=pk).update(
+                subtotal=nuevos[0], impuesto=nuevos[1], total=nuevos[2]
+            )
+            cambiadas += 1
+        for instancia in instancias.get(pk, {}).values():
+            instancia.subtotal, instancia.impuesto, instancia.total = nuevos
+    return cambiadas
+
+
+@contextmanager
+def edicion_masiva(*proformas):
+    """
+    Agrupa el recálculo de totales durante una operación masiva.
+
+    Las proformas recibidas (instancias o ids) y las que se modifiquen dentro
+    del bloque se recalculan una vez al salir; si el bloque está dentro de una
+    transacción, al confirmarse. Los bloques anidados recalculan al salir del
+    más externo.
+    """
+    _descartar_revertidas()
+    _estado.profundidad += 1
+    for proforma in proformas:
+        if isinstance(proforma, int):
+            marcar(proforma)
+        else:
+            marcar(proforma.pk, proforma)
+    try:
+        yield
+    finally:
+        _estado.profundidad -= 1
+        if _estado.profundidad == 0 and _pendientes():
+            _programar()
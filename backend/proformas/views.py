@@ -8,21 +8,24 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.utils import timezone
 from datetime import datetime, timedelta
+from django.db import transaction
 from django.db.models import Sum, Count, Q
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 # PDF generator will be imported in the method to handle potential import errors
 
 from .models import (
     Proforma, ProformaItem, ProformaHistorial, 
-    SecuenciaProforma, ConfiguracionProforma
+    SecuenciaProforma, ConfiguracionProforma, ExportacionPDF
 )
 from .serializers import (
     ProformaSerializer, ProformaDetalladoSerializer, ProformaReporteSerializer,
     ProformaItemSerializer, ProformaItemDetalladoSerializer,
     ProformaHistorialSerializer, SecuenciaProformaSerializer,
     ConfiguracionProformaSerializer, ModeloTemplateChoicesSerializer,
-    ProformaItemsValidacionSerializer
+    ProformaItemsValidacionSerializer, ExportacionPDFSerializer
 )
+from .totales import edicion_masiva
+from . import items_masivo, pdf_cache, pdf_export
 from basic.pagination import BasicStandardResultsSetPagination
 
 
@@ -483,60 +486,62 @@ class ProformaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Crear una copia de la proforma
-        proforma_nueva = Proforma.objects.create(
-            nombre=f"Copia de {proforma_original.nombre}",
-            fecha_emision=timezone.now().date(),
-            fecha_vencimiento=timezone.now().date() + timedelta(days=30),
-            cliente=proforma_original.cliente,
-            empresa=proforma_original.empresa,
-            tipo_contratacion=proforma_original.tipo_contratacion,
-            modelo_template=nuevo_modelo,
-            atencion_a=proforma_original.atencion_a,
-            condiciones_pago=proforma_original.condiciones_pago,
-            tiempo_entrega=proforma_original.tiempo_entrega,
-            porcentaje_impuesto=proforma_original.porcentaje_impuesto,
-            notas=proforma_original.notas,
-            estado=Proforma.EstadoProforma.BORRADOR,
-            subtotal=0,
-            impuesto=0,
-            total=0
-        )
-        
-        # Copiar los ítems de la proforma original
-        for item_original in proforma_original.items.all():
-            ProformaItem.objects.create(
-                proforma=proforma_nueva,
-                tipo_item=item_original.tipo_item,
-                producto_ofertado=item_original.producto_ofertado,
-                producto_disponible=item_original.producto_disponible,
-                # inventario=item_original.inventario,
-                codigo=item_original.codigo,
-                descripcion=item_original.descripcion,
-                unidad=item_original.unidad,
-                # Copiar todos los campos adicionales
-                cpc=item_original.cpc,
-                cudim=item_original.cudim,
-                nombre_generico=item_original.nombre_generico,
-                especificaciones_tecnicas=item_original.especificaciones_tecnicas,
-                presentacion=item_original.presentacion,
-                lote=item_original.lote,
-                fecha_vencimiento=item_original.fecha_vencimiento,
-                registro_sanitario=item_original.registro_sanitario,
-                serial=item_original.serial,
-                modelo=item_original.modelo,
-                marca=item_original.marca,
-                notas=item_original.notas,
-                observaciones=item_original.observaciones,
-                cantidad=item_original.cantidad,
-                precio_unitario=item_original.precio_unitario,
-                porcentaje_descuento=item_original.porcentaje_descuento,
-                total=item_original.total,
-                orden=item_original.orden
+        # Los totales se recalculan una sola vez al confirmar la copia
+        with transaction.atomic(), edicion_masiva():
+            # Crear una copia de la proforma
+            proforma_nueva = Proforma.objects.create(
+                nombre=f"Copia de {proforma_original.nombre}",
+                fecha_emision=timezone.now().date(),
+                fecha_vencimiento=timezone.now().date() + timedelta(days=30),
+                cliente=proforma_original.cliente,
+                empresa=proforma_original.empresa,
+                tipo_contratacion=proforma_original.tipo_contratacion,
+                modelo_template=nuevo_modelo,
+                atencion_a=proforma_original.atencion_a,
+                condiciones_pago=proforma_original.condiciones_pago,
+                tiempo_entrega=proforma_original.tiempo_entrega,
+                porcentaje_impuesto=proforma_original.porcentaje_impuesto,
+                notas=proforma_original.notas,
+                estado=Proforma.EstadoProforma.BORRADOR,
+                subtotal=0,
+                impuesto=0,
+                total=0
             )
         
-        # Actualizar los totales
-        proforma_nueva.save()
+            # Copiar los ítems de la proforma original
+            for item_original in proforma_original.items.all():
+                ProformaItem.objects.create(
+                    proforma=proforma_nueva,
+                    tipo_item=item_original.tipo_item,
+                    producto_ofertado=item_original.producto_ofertado,
+                    producto_disponible=item_original.producto_disponible,
+                    # inventario=item_original.inventario,
+                    codigo=item_original.codigo,
+                    descripcion=item_original.descripcion,
+                    unidad=item_original.unidad,
+                    # Copiar todos los campos adicionales
+                    cpc=item_original.cpc,
+                    cudim=item_original.cudim,
+                    nombre_generico=item_original.nombre_generico,
+                    especificaciones_tecnicas=item_original.especificaciones_tecnicas,
+                    presentacion=item_original.presentacion,
+                    lote=item_original.lote,
+                    fecha_vencimiento=item_original.fecha_vencimiento,
+                    registro_sanitario=item_original.registro_sanitario,
+                    serial=item_original.serial,
+                    modelo=item_original.modelo,
+                    marca=item_original.marca,
+                    notas=item_original.notas,
+                    observaciones=item_original.observaciones,
+                    cantidad=item_original.cantidad,
+                    precio_unitario=item_original.precio_unitario,
+                    porcentaje_descuento=item_original.porcentaje_descuento,
+                    total=item_original.total,
+                    orden=item_original.orden
+                )
+        
+            # Actualizar los totales
+            proforma_nueva.save()
         
         # Registrar en el historial
         notas_historial = f"Duplicada de la proforma {proforma_original.numero}"
@@ -647,6 +652,88 @@ class ProformaViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    @swagger_auto_schema(
+        operation_description="Crea, modifica, reordena y elimina ítems de la proforma en una sola operación",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'items': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Líneas con los campos de ProformaItem; con 'id' modifican ese ítem, sin 'id' lo crean"
+                ),
+                'eliminar': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                    description="Ids de ítems a eliminar"
+                ),
+                'orden': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                    description="Ids de ítems existentes en el orden en que deben quedar"
+                ),
+            }
+        ),
+        responses={
+            200: "Resumen de la edición, totales e ítems de la proforma",
+            400: "Errores de validación por línea; no se escribe nada",
+            401: "No autenticado",
+            403: "Permiso denegado",
+            404: "Proforma no encontrada"
+        }
+    )
+    @action(detail=True, methods=['post'])
+    def items_masivo(self, request, pk=None):
+        """
+        Edita varios ítems de la proforma en una sola transacción.
+        Todas las líneas se validan antes de escribir; si alguna tiene errores
+        no se aplica ningún cambio. Los totales se recalculan una sola vez.
+        """
+        proforma = self.get_object()
+        if not isinstance(request.data, dict):
+            return Response(
+                {"error": "El cuerpo debe ser un objeto con 'items', 'eliminar' y/o 'orden'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lineas = request.data.get('items', [])
+        eliminar = request.data.get('eliminar', [])
+        orden = request.data.get('orden', [])
+
+        if not all(isinstance(valor, list) for valor in (lineas, eliminar, orden)):
+            return Response(
+                {"error": "'items', 'eliminar' y 'orden' deben ser listas"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (lineas or eliminar or orden):
+            return Response({"error": "No hay cambios para aplicar"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lineas) > items_masivo.MAX_ITEMS:
+            return Response(
+                {"error": f"Máximo {items_masivo.MAX_ITEMS} ítems por operación"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        plan = items_masivo.planificar(proforma, lineas, eliminar, orden)
+        if plan['errores']:
+            return Response({
+                "error": "Algunas líneas no son válidas; no se aplicó ningún cambio",
+                "errores": plan['errores']
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        resumen = items_masivo.ejecutar(plan, proforma, request.user)
+
+        items = list(ProformaItem.objects.filter(proforma=proforma).select_related(
+            'unidad', 'producto_ofertado', 'producto_disponible'
+        ).order_by('orden', 'id'))
+        for item in items:
+            item.proforma = proforma
+        return Response({
+            **resumen,
+            'subtotal': proforma.subtotal,
+            'impuesto': proforma.impuesto,
+            'total': proforma.total,
+            'items': ProformaItemSerializer(items, many=True).data
+        })
+    
     @swagger_auto_schema(
         operation_description="Obtiene el reporte completo de una proforma",
         responses={
@@ -726,28 +813,17 @@ class ProformaViewSet(viewsets.ModelViewSet):
             template_name = request.query_params.get('template', 'classic').lower()
             
             # Validar plantilla
-            templates_disponibles = ['classic', 'modern']
+            templates_disponibles = list(pdf_cache.PLANTILLAS)
             if template_name not in templates_disponibles:
                 return Response({
                     "error": f"Plantilla '{template_name}' no válida. Plantillas disponibles: {', '.join(templates_disponibles)}"
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Importar las plantillas
-            if template_name == 'classic':
-                from .pdf_templates.classic_template import PremiumTemplate
-                pdf_generator = PremiumTemplate(proforma)
-            elif template_name == 'modern':
-                from .pdf_templates.modern_template import ModernTemplate
-                pdf_generator = ModernTemplate(proforma)
-            
-            # Generar el PDF con configuración del modelo de template
-            pdf_buffer = pdf_generator.generate()
+            # Servir el PDF guardado si la proforma no cambió; si no, generarlo
+            pdf = pdf_cache.obtener(proforma, template_name)
             
             # Preparar la respuesta
-            response = HttpResponse(
-                pdf_buffer.getvalue(),
-                content_type='application/pdf'
-            )
+            response = FileResponse(pdf, content_type='application/pdf')
             
             # Establecer el nombre del archivo incluyendo la plantilla y modelo
             filename = f"proforma_{proforma.numero}_{template_name}_{proforma.modelo_template}_{proforma.fecha_emision.strftime('%Y%m%d')}.pdf"
@@ -798,6 +874,111 @@ class ProformaViewSet(viewsets.ModelViewSet):
             'nota': 'Las plantillas se adaptan automáticamente al modelo de template de la proforma'
         })
 
+    def _get_exportacion(self, request, exportacion_id):
+        """Exportación visible para el usuario: la propia o cualquiera si es staff"""
+        pdf_export.marcar_interrumpidas()
+        exportaciones = ExportacionPDF.objects.all()
+        if not request.user.is_staff:
+            exportaciones = exportaciones.filter(created_by=request.user)
+        return exportaciones.filter(pk=exportacion_id).first()
+
+    @swagger_auto_schema(
+        operation_description="Inicia la exportación en segundo plano de los PDF de varias proformas a un ZIP",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'template': openapi.Schema(type=openapi.TYPE_STRING, description="Plantilla (classic, modern). Default: classic"),
+                'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                'cliente': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'empresa': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'vendedor': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'estado': openapi.Schema(type=openapi.TYPE_STRING),
+                'modelo_template': openapi.Schema(type=openapi.TYPE_STRING),
+                'mes': openapi.Schema(type=openapi.TYPE_STRING, description="AAAA-MM"),
+                'desde': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+                'hasta': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            }
+        ),
+        responses={
+            202: ExportacionPDFSerializer,
+            400: "Filtros o plantilla no válidos",
+            401: "No autenticado",
+            403: "Permiso denegado"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def exportar_pdf(self, request):
+        """
+        Registra una exportación de PDF en lote y la procesa en segundo plano.
+        Devuelve el trabajo de inmediato; el avance se consulta en
+        exportaciones/{id}/ y el ZIP se descarga en exportaciones/{id}/descargar/.
+        """
+        if not isinstance(request.data, dict):
+            return Response({"error": "El cuerpo debe ser un objeto con la plantilla y los filtros"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        template_name = str(request.data.get('template', 'classic')).lower()
+        if template_name not in pdf_cache.PLANTILLAS:
+            return Response({
+                "error": f"Plantilla '{template_name}' no válida. Plantillas disponibles: {', '.join(pdf_cache.PLANTILLAS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            queryset, filtros = pdf_export.seleccionar(request.data)
+            exportacion = pdf_export.crear(queryset, filtros, template_name, request.user)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ExportacionPDFSerializer(exportacion).data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        operation_description="Consulta el estado y el avance de una exportación de PDF en lote",
+        responses={
+            200: ExportacionPDFSerializer,
+            401: "No autenticado",
+            404: "Exportación no encontrada"
+        }
+    )
+    @action(detail=False, methods=['get'], url_path=r'exportaciones/(?P<exportacion_id>\d+)')
+    def estado_exportacion(self, request, exportacion_id=None):
+        """
+        Devuelve el estado de una exportación de PDF en lote.
+        """
+        exportacion = self._get_exportacion(request, exportacion_id)
+        if exportacion is None:
+            return Response({"error": "Exportación no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ExportacionPDFSerializer(exportacion).data)
+
+    @swagger_auto_schema(
+        operation_description="Descarga el ZIP de una exportación de PDF completada",
+        responses={
+            200: "Archivo ZIP con los PDF",
+            401: "No autenticado",
+            404: "Exportación no encontrada",
+            409: "La exportación aún no está completa"
+        }
+    )
+    @action(detail=False, methods=['get'], url_path=r'exportaciones/(?P<exportacion_id>\d+)/descargar')
+    def descargar_exportacion(self, request, exportacion_id=None):
+        """
+        Descarga el ZIP generado por una exportación de PDF en lote.
+        """
+        exportacion = self._get_exportacion(request, exportacion_id)
+        if exportacion is None:
+            return Response({"error": "Exportación no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        if exportacion.estado != ExportacionPDF.Estado.COMPLETADA:
+            return Response({
+                "error": f"La exportación está {exportacion.get_estado_display().lower()}",
+                "progreso": exportacion.progreso
+            }, status=status.HTTP_409_CONFLICT)
+
+        ruta = pdf_export.ruta_archivo(exportacion)
+        if ruta is None:
+            return Response({"error": "El archivo de la exportación ya no está disponible"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = FileResponse(open(ruta, 'rb'), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="proformas_{exportacion.plantilla}_{exportacion.pk}.zip"'
+        return response
+
 
 class ProformaItemViewSet(viewsets.ModelViewSet):
     """
@@ -840,22 +1021,25 @@ class ProformaItemViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Guardar ítem y actualizar la proforma relacionada"""
         print(f"[DEBUG] perform_create - Validated data: {serializer.validated_data}")
-        item = serializer.save()
-        # Actualizar totales de la proforma
-        item.proforma.save()
+        with edicion_masiva():
+            item = serializer.save()
+            # Actualizar totales de la proforma
+            item.proforma.save()
     
     def perform_update(self, serializer):
         """Guardar ítem actualizado y actualizar la proforma"""
-        item = serializer.save()
-        # Actualizar totales de la proforma
-        item.proforma.save()
+        with edicion_masiva():
+            item = serializer.save()
+            # Actualizar totales de la proforma
+            item.proforma.save()
     
     def perform_destroy(self, instance):
         """Eliminar ítem y actualizar la proforma"""
         proforma = instance.proforma
-        instance.delete()
-        # Actualizar totales de la proforma
-        proforma.save()
+        with edicion_masiva():
+            instance.delete()
+            # Actualizar totales de la proforma
+            proforma.save()
     
     @swagger_auto_schema(
         operation_description="Valida múltiples ítems contra un modelo de template específico",